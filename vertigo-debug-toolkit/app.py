@@ -108,6 +108,14 @@ def load_sample_data():
     loader.load_all()
     print("Sample data loaded successfully")
 
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups():
+    """Recompute every metric rollup from live_traces."""
+    from app.services.metric_rollups import metric_rollup_service
+    
+    metric_rollup_service.rebuild()
+    print("Metric rollups rebuilt")
+
 @app.cli.command('simulate-workflow')
 def simulate_workflow_cli():
     """Simulate Vertigo workflow from CLI."""
@@ -53,6 +53,9 @@ def create_app(config_name=None):
     app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
     app.config['PERMANENT_SESSION_LIFETIME'] = 3600  # 1 hour
     
+    # Per-request tenant context and tenant_id criteria on tenant-aware queries
+    app.config['TENANT_ISOLATION_ENABLED'] = os.getenv('TENANT_ISOLATION_ENABLED', 'false').lower() == 'true'
+    
     # Initialize extensions
     db.init_app(app)
     migrate.init_app(app, db)
@@ -110,6 +113,10 @@ def create_app(config_name=None):
         
         security_monitor = MockSecurityMonitor()
     
+    if app.config['TENANT_ISOLATION_ENABLED']:
+        from app.middleware.tenant_isolation import TenantIsolationMiddleware
+        TenantIsolationMiddleware(app)
+    
     # Initialize rate limiter (will use Redis if available, fallback to memory)
     try:
         # Test Redis connection for rate limiter
@@ -233,6 +240,23 @@ def create_app(config_name=None):
                 app.logger.info("Firestore sync scheduler started successfully")
             except Exception as e:
                 app.logger.error(f"Failed to start sync scheduler: {e}")
+        
+        # Backfill missing metric rollups off the request path
+        from app.services.metric_rollups import metric_rollup_service
+        metric_rollup_service.start_backfill(app)
+        
+        # Probe cloud services on a schedule so the dashboard never probes on a cold cache
+        from app.services.cloud_monitor import cloud_monitor
+        if cloud_monitor.background_probes:
+            cloud_monitor.start()
+        
+        # Bind the webhook ingestion queue; resumes draining a leftover backlog
+        try:
+            from app.services.webhook_queue import webhook_queue
+            from app.services.webhook_service import webhook_service
+            webhook_queue.init_app(app, webhook_service.process_queued_payload)
+        except Exception as e:
+            app.logger.error(f"Failed to initialize webhook queue: {e}")
     
     # Register shutdown handler
     @app.teardown_appcontext
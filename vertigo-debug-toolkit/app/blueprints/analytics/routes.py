@@ -6,6 +6,7 @@ from flask import render_template, jsonify, request
 from flask_login import login_required
 from app.blueprints.analytics import analytics_bp
 from app.services.analytics_service import analytics_service
+from app.services.cache_service import cached_response
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,6 +19,7 @@ def index():
 
 @analytics_bp.route('/api/trends')
 @login_required
+@cached_response()
 def get_trends():
     """Get performance trend analysis."""
     try:
@@ -154,6 +156,7 @@ def get_predictions():
 
 @analytics_bp.route('/api/summary')
 @login_required
+@cached_response()
 def get_summary():
     """Get comprehensive analytics summary."""
     try:
@@ -174,6 +177,7 @@ def get_summary():
 
 @analytics_bp.route('/api/health-score')
 @login_required
+@cached_response()
 def get_health_score():
     """Get current system health score."""
     try:
@@ -197,6 +201,7 @@ def get_health_score():
 
 @analytics_bp.route('/api/trend-chart-data')
 @login_required
+@cached_response()
 def get_trend_chart_data():
     """Get formatted data for trend charts."""
     try:
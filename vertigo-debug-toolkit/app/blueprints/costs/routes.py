@@ -5,6 +5,7 @@ Advanced cost optimization routes for the Vertigo Debug Toolkit.
 from flask import render_template, jsonify, request
 from flask_login import login_required
 from app.blueprints.costs import costs_bp
+from app.services.cache_service import cached_response
 from app.services.cost_optimization_service import cost_optimization_service
 import logging
 
@@ -20,6 +21,7 @@ def index():
 
 @costs_bp.route('/api/cost-breakdown')
 @login_required
+@cached_response()
 def get_cost_breakdown():
     """Get cost breakdown by model."""
     try:
@@ -96,6 +98,7 @@ def get_optimization_recommendations():
 
 @costs_bp.route('/api/cost-trends')
 @login_required
+@cached_response()
 def get_cost_trends():
     """Get cost trend analysis."""
     try:
@@ -167,6 +170,7 @@ def get_monthly_prediction():
 
 @costs_bp.route('/api/efficiency-metrics')
 @login_required
+@cached_response()
 def get_efficiency_metrics():
     """Get cost efficiency metrics."""
     try:
@@ -198,6 +202,7 @@ def get_efficiency_metrics():
 
 @costs_bp.route('/api/cost-summary')
 @login_required
+@cached_response()
 def get_cost_summary():
     """Get comprehensive cost summary."""
     try:
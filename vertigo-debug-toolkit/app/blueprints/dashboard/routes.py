@@ -5,7 +5,7 @@ Dashboard routes for the Vertigo Debug Toolkit.
 import json
 import logging
 from datetime import datetime, timedelta
-from flask import render_template, jsonify, request, current_app
+from flask import render_template, jsonify, request, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
 from app.utils.auth_decorators import api_login_required
 from app import csrf
@@ -13,7 +13,8 @@ from app.blueprints.dashboard import dashboard_bp
 from app.models import db, Trace, Cost, Prompt, User
 from app.services.langwatch_client import LangWatchClient
 from app.services.prompt_evaluator import PromptEvaluator
-from app.services.cloud_monitor import CloudServiceMonitor
+from app.services.cache_service import cached_response
+from app.services.cloud_monitor import cloud_monitor
 from app.services.semantic_search import SemanticPromptSearch
 from app.services.email_formatter import EmailFormatter
 from app.services.live_data_service import live_data_service
@@ -64,6 +65,7 @@ def index():
 
 @dashboard_bp.route('/api/metrics')
 @api_login_required
+@cached_response()
 def get_metrics():
     """Get dashboard metrics using live data service."""
     try:
@@ -110,13 +112,23 @@ def get_metrics():
 def get_cloud_status():
     """Get cloud service status."""
     try:
-        monitor = CloudServiceMonitor()
-        status = monitor.check_all_services()
+        refresh = request.args.get('refresh', 'false').lower() == 'true'
+        status = cloud_monitor.check_all_services(refresh=refresh)
         return jsonify(status)
     except Exception as e:
         logger.error(f"Error getting cloud status: {e}")
         return jsonify({'error': str(e)}), 500
 
+@dashboard_bp.route('/api/cloud-status/latency')
+@login_required
+def get_cloud_latency():
+    """Get per-service probe latency histograms."""
+    try:
+        return jsonify(cloud_monitor.get_latency_histograms())
+    except Exception as e:
+        logger.error(f"Error getting cloud latency histograms: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @dashboard_bp.route('/api/prompts/performance/<int:prompt_id>')
 @login_required
 def get_prompt_performance(prompt_id):
@@ -231,6 +243,15 @@ def generate_evaluation_report():
             return jsonify({'error': 'prompt_ids array is required'}), 400
         
         evaluator = PromptEvaluator()
+        
+        # Large catalogs: one NDJSON line per prompt as pages are aggregated, summary last
+        if data.get('stream'):
+            records = evaluator.stream_evaluation_report(prompt_ids, days)
+            return Response(
+                stream_with_context(json.dumps(record) + '\n' for record in records),
+                mimetype='application/x-ndjson'
+            )
+        
         report = evaluator.generate_evaluation_report(prompt_ids, days)
         return jsonify(report)
     except Exception as e:
@@ -290,6 +311,7 @@ def get_prompts_list():
 
 @dashboard_bp.route('/api/recent-activity')
 @api_login_required
+@cached_response()
 def get_recent_activity():
     """Get recent activity data."""
     try:
@@ -547,8 +569,7 @@ def get_sample_comparison():
 def test_email_processor():
     """Test the email processor Cloud Function."""
     try:
-        monitor = CloudServiceMonitor()
-        result = monitor.test_email_processor()
+        result = cloud_monitor.test_email_processor()
         return jsonify(result)
     except Exception as e:
         logger.error(f"Error testing email processor: {e}")
@@ -559,8 +580,7 @@ def test_email_processor():
 def test_meeting_processor():
     """Test the meeting processor Cloud Function."""
     try:
-        monitor = CloudServiceMonitor()
-        result = monitor.test_meeting_processor()
+        result = cloud_monitor.test_meeting_processor()
         return jsonify(result)
     except Exception as e:
         logger.error(f"Error testing meeting processor: {e}")
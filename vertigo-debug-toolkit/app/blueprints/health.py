@@ -9,6 +9,7 @@ from flask import Blueprint, jsonify, request
 from app.services.sync_scheduler import sync_scheduler
 from app.services.firestore_sync import firestore_sync_service
 from app.services.langwatch_client import langwatch_client
+from app.services.webhook_queue import webhook_queue
 from app.models import db
 from sqlalchemy import text
 
@@ -122,6 +123,24 @@ def detailed_health():
             'message': f'LangWatch check failed: {str(e)}'
         }
     
+    # Webhook ingestion queue health check
+    try:
+        queue_metrics = webhook_queue.get_metrics()
+        queue_healthy = 'error' not in queue_metrics and queue_metrics['lag_seconds'] < 300
+        
+        health_status['checks']['webhook_queue'] = {
+            'status': 'healthy' if queue_healthy else 'degraded',
+            **queue_metrics,
+            'message': 'Webhook queue draining' if queue_healthy else 'Webhook queue lagging or unavailable'
+        }
+        
+    except Exception as e:
+        logger.warning(f"Error checking webhook queue health: {e}")
+        health_status['checks']['webhook_queue'] = {
+            'status': 'degraded',
+            'message': f'Webhook queue check failed: {str(e)}'
+        }
+    
     # Set overall status
     if not overall_healthy:
         health_status['status'] = 'unhealthy'
@@ -183,7 +202,8 @@ def basic_metrics():
             'database': {},
             'sync_scheduler': {},
             'firestore_sync': {},
-            'langwatch': {}
+            'langwatch': {},
+            'webhook_queue': {}
         }
         
         # Database metrics
@@ -220,6 +240,9 @@ def basic_metrics():
         except Exception as e:
             metrics['langwatch']['error'] = str(e)
         
+        # Webhook queue metrics (depth, lag, dead letters)
+        metrics['webhook_queue'] = webhook_queue.get_metrics()
+        
         return jsonify(metrics), 200
         
     except Exception as e:
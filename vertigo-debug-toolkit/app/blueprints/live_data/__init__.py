@@ -4,4 +4,7 @@ Live Data Blueprint for real-time data integration.
 
 from flask import Blueprint
 
-live_data_bp = Blueprint('live_data', __name__, url_prefix='/live-data')
\ No newline at end of file
+live_data_bp = Blueprint('live_data', __name__, url_prefix='/live-data')
+
+# Only the export routes are registered; the handlers in routes.py are not wired up
+from . import export_routes
@@ -0,0 +1,85 @@
+"""
+Live trace export routes.
+"""
+
+from datetime import datetime, timezone
+from flask import jsonify, request, Response, stream_with_context
+from flask_login import login_required
+
+from app.blueprints.live_data import live_data_bp
+from app.services.tenant_scope import current_tenant_id
+from app.services.trace_export import (
+    ARROW_AVAILABLE, EXPORT_FIELDS, EXPORT_FORMATS, ExportFilters, trace_exporter
+)
+
+
+def _parse_export_time(name: str):
+    """ISO-8601 query arg as a naive UTC datetime, or None when absent."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _export_tenant_id():
+    """The tenant_id query arg if it names the request's tenant; anything else is ignored."""
+    tenant_id = request.args.get('tenant_id')
+    return tenant_id if tenant_id and tenant_id == current_tenant_id() else None
+
+
+@live_data_bp.route('/api/live-traces/export')
+@login_required
+def export_live_traces():
+    """
+    Stream live traces as NDJSON, CSV or Arrow IPC.
+    
+    Query Parameters:
+    - format: 'ndjson' (default), 'csv' or 'arrow'
+    - start, end: ISO-8601 bounds on start_time (end exclusive)
+    - status, model: exact filters
+    - source: data source name
+    - tenant_id: tenant filter; only honoured when it is the request's own tenant
+    - fields: comma-separated columns (id and start_time are always included)
+    - after_time, after_id: resume after the last row received
+    - limit: maximum rows
+    
+    Rows are ordered by (start_time, id) and read from a server-side cursor,
+    so memory use does not grow with the size of the export.
+    """
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    if fmt == 'arrow' and not ARROW_AVAILABLE:
+        return jsonify({'success': False, 'error': 'Arrow export requires pyarrow'}), 400
+    
+    fields = None
+    if request.args.get('fields'):
+        fields = [field for field in request.args['fields'].split(',') if field]
+        unknown = [field for field in fields if field not in EXPORT_FIELDS]
+        if unknown:
+            return jsonify({'success': False, 'error': f"Unknown fields: {', '.join(unknown)}"}), 400
+    
+    try:
+        filters = ExportFilters(
+            start=_parse_export_time('start'),
+            end=_parse_export_time('end'),
+            status=request.args.get('status'),
+            model=request.args.get('model'),
+            source=request.args.get('source'),
+            tenant_id=_export_tenant_id(),
+            after_time=_parse_export_time('after_time'),
+            after_id=request.args.get('after_id', type=int),
+            limit=request.args.get('limit', type=int)
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f"Invalid timestamp: {e}"}), 400
+    
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    return Response(
+        stream_with_context(trace_exporter.export(fmt, filters, fields)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="live_traces.{extension}"'}
+    )
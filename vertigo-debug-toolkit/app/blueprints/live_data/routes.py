@@ -12,6 +12,8 @@ from sqlalchemy import text, func
 from sqlalchemy.exc import SQLAlchemyError
 
 from app.blueprints.live_data import live_data_bp
+from app.middleware.security_middleware import lazy_json_sanitization
+from app.services.tenant_scope import tenant_text
 from app.models import db
 from app.services.firestore_sync import firestore_sync_service
 from app.services.webhook_handler import webhook_handler
@@ -165,7 +167,7 @@ def get_live_traces():
         
         query_params.update({'limit': limit, 'offset': offset})
         
-        results = db.session.execute(text(query), query_params).fetchall()
+        results = db.session.execute(tenant_text(query), query_params).fetchall()
         
         # Format results
         traces = []
@@ -195,7 +197,7 @@ def get_live_traces():
         """
         
         total_count = db.session.execute(
-            text(count_query), 
+            tenant_text(count_query), 
             {k: v for k, v in query_params.items() if k not in ['limit', 'offset']}
         ).scalar()
         
@@ -268,6 +270,7 @@ def get_sync_status():
 # ============================================================================
 
 @live_data_bp.route('/webhooks/<source>', methods=['POST'])
+@lazy_json_sanitization
 def receive_webhook(source):
     """
     Secure webhook endpoint for receiving real-time data updates.
@@ -334,6 +337,7 @@ def trigger_sync():
                 'success': result.success,
                 'sync_type': sync_type,
                 'records_processed': result.records_processed,
+                'records_per_second': round(result.records_per_second, 1),
                 'errors': result.errors,
                 'metadata': result.metadata
             })
@@ -371,7 +375,7 @@ def _get_firestore_metrics(start_time: datetime, end_time: datetime) -> dict:
         AND start_time BETWEEN :start_time AND :end_time
         """
         
-        result = db.session.execute(text(query), {
+        result = db.session.execute(tenant_text(query), {
             'start_time': start_time,
             'end_time': end_time
         }).fetchone()
@@ -439,7 +443,7 @@ def _get_webhook_metrics(start_time: datetime, end_time: datetime) -> dict:
         AND start_time BETWEEN :start_time AND :end_time
         """
         
-        trace_result = db.session.execute(text(trace_query), {
+        trace_result = db.session.execute(tenant_text(trace_query), {
             'start_time': start_time,
             'end_time': end_time
         }).fetchone()
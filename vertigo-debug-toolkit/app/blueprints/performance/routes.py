@@ -8,7 +8,7 @@ from app.blueprints.performance import performance_bp
 from app.services.langwatch_client import langwatch_client
 from app.services.live_data_service import live_data_service
 from app.services.performance_optimizer import performance_optimizer
-from app.services.cache_service import default_cache_service
+from app.services.cache_service import cached_response, default_cache_service
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,6 +21,7 @@ def index():
 
 @performance_bp.route('/api/metrics')
 @login_required
+@cached_response()
 def get_metrics():
     """Get unified performance metrics from all available sources."""
     try:
@@ -46,6 +47,7 @@ def get_metrics():
 
 @performance_bp.route('/api/latency-series')
 @login_required
+@cached_response()
 def get_latency_series():
     """Get latency time series data for charts."""
     try:
@@ -71,6 +73,7 @@ def get_latency_series():
 
 @performance_bp.route('/api/error-rates')
 @login_required
+@cached_response()
 def get_error_rates():
     """Get error rate metrics."""
     try:
@@ -95,6 +98,7 @@ def get_error_rates():
 
 @performance_bp.route('/api/recent-traces')
 @login_required
+@cached_response()
 def get_recent_traces():
     """Get recent traces for display."""
     try:
@@ -140,6 +144,7 @@ def get_data_sources():
 
 @performance_bp.route('/api/performance-summary')
 @login_required
+@cached_response()
 def get_performance_summary():
     """Get comprehensive performance summary."""
     try:
@@ -9,6 +9,7 @@ from app.blueprints.prompts import prompts_bp
 from app.models import Prompt, db
 from app.utils.validators import InputValidator
 from datetime import datetime, timezone
+from sqlalchemy import case, func, select
 from app.models import Cost
 from app.models import Trace
 
@@ -755,67 +756,122 @@ def test_selection():
     """Test page for selection functionality."""
     return render_template('test_selection.html')
 
+PROMPT_LIST_FIELDS = ('id', 'name', 'version', 'type', 'tags', 'is_active', 'created_at', 'updated_at', 'metrics')
+PROMPT_LIST_PAGE_SIZE = 100
+PROMPT_LIST_MAX_PAGE_SIZE = 500
+
+
+def _prompt_list_page(after_id, limit, with_metrics):
+    """
+    One page of prompts (id > after_id, ordered by id) with usage counts.
+    
+    The page is selected first and the traces aggregate is grouped over that
+    page only, so the statement count and cost stay fixed as the catalog grows.
+    """
+    page = (
+        select(Prompt)
+        .where(Prompt.id > after_id)
+        .order_by(Prompt.id)
+        .limit(limit)
+        .cte('prompt_page')
+    )
+    if not with_metrics:
+        return db.session.execute(select(page).order_by(page.c.id)).all()
+    
+    usage = (
+        select(
+            Trace.prompt_id,
+            func.count(Trace.id).label('total_uses'),
+            func.sum(case((Trace.status == 'success', 1), else_=0)).label('success_count')
+        )
+        .where(Trace.prompt_id.in_(select(page.c.id)))
+        .group_by(Trace.prompt_id)
+        .subquery()
+    )
+    query = (
+        select(
+            page,
+            func.coalesce(usage.c.total_uses, 0).label('total_uses'),
+            func.coalesce(usage.c.success_count, 0).label('success_count')
+        )
+        .outerjoin(usage, usage.c.prompt_id == page.c.id)
+        .order_by(page.c.id)
+    )
+    return db.session.execute(query).all()
+
+
+def _prompt_list_item(row, fields):
+    item = {
+        'id': row.id,
+        'name': row.name,
+        'version': row.version,
+        'type': row.prompt_type,
+        'tags': row.tags or [],
+        'is_active': row.is_active,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+        'updated_at': row.updated_at.isoformat() if row.updated_at else None,
+    }
+    if 'metrics' in fields:
+        total_uses = row.total_uses
+        success_rate = (row.success_count / total_uses * 100) if total_uses > 0 else 0
+        item['metrics'] = {
+            'total_uses': total_uses,
+            'success_rate': round(success_rate, 1),
+            'success_count': row.success_count
+        }
+    return {field: item[field] for field in fields}
+
+
 @prompts_bp.route('/api/prompts/list')
 # @login_required  # Temporarily disabled for testing
 def get_prompts_list():
-    """Get list of prompts for the manager page."""
+    """
+    Get a page of prompts for the manager page.
+    
+    Query args: ``limit`` (page size), ``after`` (the ``next_cursor`` of the
+    previous page) and ``fields`` (comma-separated subset of PROMPT_LIST_FIELDS).
+    Responses carry an ETag and answer If-None-Match with 304.
+    """
     import logging
     logger = logging.getLogger(__name__)
     
     try:
-        logger.info("=== API CALL DEBUG ===")
-        logger.info(f"Request method: {request.method}")
-        logger.info(f"Request headers: {dict(request.headers)}")
-        logger.info(f"Request URL: {request.url}")
-        logger.info(f"User agent: {request.headers.get('User-Agent', 'None')}")
-        
-        # Get all prompts with basic info
-        prompts = Prompt.query.all()
-        logger.info(f"Found {len(prompts)} prompts in database")
+        limit = request.args.get('limit', PROMPT_LIST_PAGE_SIZE, type=int)
+        limit = max(1, min(limit, PROMPT_LIST_MAX_PAGE_SIZE))
+        after_id = request.args.get('after', 0, type=int)
         
-        prompts_data = []
-        for prompt in prompts:
-            # Calculate basic metrics
-            total_uses = prompt.traces.count()
-            success_count = prompt.traces.filter_by(status='success').count()
-            success_rate = (success_count / total_uses * 100) if total_uses > 0 else 0
-            
-            prompts_data.append({
-                'id': prompt.id,
-                'name': prompt.name,
-                'version': prompt.version,
-                'type': prompt.prompt_type,
-                'tags': prompt.tags or [],
-                'is_active': prompt.is_active,
-                'created_at': prompt.created_at.isoformat() if prompt.created_at else None,
-                'updated_at': prompt.updated_at.isoformat() if prompt.updated_at else None,
-                'metrics': {
-                    'total_uses': total_uses,
-                    'success_rate': round(success_rate, 1),
-                    'success_count': success_count
-                }
-            })
+        requested = request.args.get('fields')
+        if requested:
+            fields = [field for field in PROMPT_LIST_FIELDS if field in requested.split(',')]
+            if not fields:
+                return jsonify({
+                    'status': 'error',
+                    'message': f"fields must include one of: {', '.join(PROMPT_LIST_FIELDS)}"
+                }), 400
+        else:
+            fields = list(PROMPT_LIST_FIELDS)
         
-        logger.info(f"Returning {len(prompts_data)} prompts in response")
-        logger.info("=== API CALL COMPLETE ===")
+        # Fetch one extra row to know whether another page exists
+        rows = _prompt_list_page(after_id, limit + 1, 'metrics' in fields)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
         
         response = jsonify({
             'status': 'success',
-            'data': prompts_data
+            'data': [_prompt_list_item(row, fields) for row in rows],
+            'next_cursor': rows[-1].id if has_more else None
         })
         
         # Add CORS headers just in case
         response.headers['Access-Control-Allow-Origin'] = '*'
         response.headers['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, If-None-Match'
+        response.headers['Cache-Control'] = 'private, no-cache'
         
-        return response
+        response.add_etag()
+        return response.make_conditional(request)
     except Exception as e:
-        logger.error(f"=== API ERROR ===")
-        logger.error(f"Error getting prompts: {str(e)}")
-        logger.error(f"Error type: {type(e).__name__}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.error(f"Error getting prompts list: {e}")
         
         return jsonify({
             'status': 'error',
@@ -1018,12 +1074,12 @@ def semantic_search():
             logger.info("🔍 Attempting to import SemanticPromptSearch...")
             
             # Import within the Flask request context to ensure proper app context
-            from app.services.semantic_search import SemanticPromptSearch
+            from app.services.semantic_search import get_semantic_search
             logger.info("✅ SemanticPromptSearch import successful")
             
-            logger.info("🔧 Initializing SemanticPromptSearch...")
-            search_service = SemanticPromptSearch()
-            logger.info("✅ SemanticPromptSearch initialized successfully")
+            # Shared instance: the model and vector index are loaded once per process
+            search_service = get_semantic_search()
+            logger.info("✅ SemanticPromptSearch ready")
             
             # Perform semantic search
             logger.info(f"🔍 Performing semantic search for: '{query}'")
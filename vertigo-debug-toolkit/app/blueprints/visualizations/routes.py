@@ -6,6 +6,7 @@ from flask import render_template, jsonify, request
 from flask_login import login_required
 from datetime import datetime
 from app.blueprints.visualizations import visualizations_bp
+from app.services.cache_service import cached_response
 from app.services.visualization_service import visualization_service
 from app.services.websocket_service import get_websocket_service, MessageType
 import logging
@@ -27,6 +28,7 @@ def visualization_dashboard():
 
 @visualizations_bp.route('/api/chart/<chart_type>')
 @login_required
+@cached_response()
 def get_chart_data(chart_type):
     """Get chart data for specific visualization type."""
     try:
@@ -3,18 +3,23 @@ Webhook Routes for LangWatch Integration
 Secure endpoints for receiving real-time trace data.
 """
 
+import os
 import json
 import logging
 from flask import request, jsonify, current_app
 from flask_login import login_required
 from app.blueprints.webhooks import webhooks_bp
-from app.services.webhook_service import webhook_service
+from app.services.tenant_scope import current_tenant_id
+from app.services.webhook_service import QUEUED_TENANT_KEY, webhook_service
+from app.services.webhook_queue import webhook_queue
 from app import csrf
+from app.middleware.security_middleware import lazy_json_sanitization
 
 logger = logging.getLogger(__name__)
 
 @webhooks_bp.route('/langwatch', methods=['POST'])
 @csrf.exempt
+@lazy_json_sanitization
 def langwatch_webhook():
     """
     Primary webhook endpoint for LangWatch trace events.
@@ -24,6 +29,10 @@ def langwatch_webhook():
     - Event deduplication
     - Rate limiting (if configured)
     
+    Verified events are acknowledged with 202 once durably queued and
+    processed by the webhook queue workers (WEBHOOK_QUEUE_ENABLED=false
+    processes them inline instead).
+    
     Supported Events:
     - trace.created
     - trace.updated
@@ -54,6 +63,26 @@ def langwatch_webhook():
                 'error': 'Invalid JSON payload'
             }), 400
         
+        if os.getenv('WEBHOOK_QUEUE_ENABLED', 'true').lower() == 'true':
+            try:
+                # Queue workers have no request; the tenant travels with the payload
+                queue_id = webhook_queue.enqueue({**data, QUEUED_TENANT_KEY: current_tenant_id()})
+                webhook_queue.start()
+            except Exception as e:
+                logger.error(f"Failed to queue webhook: {e}")
+                # Not acknowledged: LangWatch retries the delivery
+                return jsonify({
+                    'success': False,
+                    'error': 'Webhook queue unavailable'
+                }), 503
+            
+            return jsonify({
+                'success': True,
+                'queued': True,
+                'queue_id': queue_id,
+                'event_type': data.get('type')
+            }), 202
+        
         # Process webhook payload
         result = webhook_service.process_webhook_payload(data)
         
@@ -127,7 +156,8 @@ def webhook_status():
                 'supported_events': stats.get('supported_events', [])
             },
             'statistics': stats.get('event_statistics', []),
-            'recent_events': stats.get('recent_events', [])
+            'recent_events': stats.get('recent_events', []),
+            'queue': webhook_queue.get_metrics()
         })
         
     except Exception as e:
@@ -8,7 +8,8 @@ CORS configuration, and request security monitoring.
 import os
 import json
 import re
-from typing import Tuple, Dict, List, Any, Optional, Union
+from collections.abc import Mapping
+from typing import Callable, Tuple, Dict, Iterator, List, Any, Optional, Union
 import bleach
 from datetime import datetime, timedelta
 from flask import request, jsonify, g, current_app
@@ -49,6 +50,7 @@ class SecurityConfig:
     
     # Request Validation
     MAX_JSON_SIZE = 1024 * 1024  # 1MB
+    MAX_JSON_DEPTH = 32
     MAX_FORM_FIELDS = 50
     MAX_FIELD_LENGTH = 10000
     
@@ -66,6 +68,12 @@ class SecurityConfig:
         r'document\.write',
         r'window\.location',
     ]
+    
+    # Lowercase literals such that every dangerous pattern match contains one of them
+    DANGEROUS_LITERALS = (
+        'script', 'data:text/html', 'eval', 'settimeout', 'setinterval', 'function',
+        'innerhtml', 'document.write', 'window.location',
+    )
 
 
 class RequestValidator:
@@ -74,9 +82,15 @@ class RequestValidator:
     def __init__(self):
         self.config = SecurityConfig()
         
-        # Compile dangerous patterns for performance
-        self.dangerous_regex = [re.compile(pattern, re.IGNORECASE | re.DOTALL) 
-                               for pattern in self.config.DANGEROUS_PATTERNS]
+        # All dangerous patterns in one alternation (one scan per string);
+        # group n matches DANGEROUS_PATTERNS[n - 1]
+        self.dangerous_regex = re.compile(
+            '|'.join(f"({pattern})" for pattern in self.config.DANGEROUS_PATTERNS),
+            re.IGNORECASE | re.DOTALL
+        )
+        
+        # Characters bleach.clean(strip=True) rewrites; strings without them come back unchanged
+        self.markup_chars = re.compile(r'[\x00-\x08\x0b-\x1f&<>]')
     
     def validate_request_size(self, request) -> bool:
         """Validate request size limits."""
@@ -112,19 +126,21 @@ class RequestValidator:
         return True
     
     def sanitize_string(self, value: str) -> str:
-        """Sanitize string input."""
+        """Sanitize string input; clean strings are returned as-is."""
         if not isinstance(value, str):
             return str(value)
         
-        # Check for dangerous patterns
-        for pattern in self.dangerous_regex:
-            if pattern.search(value):
-                logger.warning(f"Dangerous pattern detected in input: {pattern.pattern}")
-                # Remove the dangerous content
-                value = pattern.sub('', value)
+        # Check for dangerous patterns (repeat, as a removal can join a new match)
+        match = self.dangerous_regex.search(value) if self._may_be_dangerous(value) else None
+        while match:
+            logger.warning(f"Dangerous pattern detected in input: {self.config.DANGEROUS_PATTERNS[match.lastindex - 1]}")
+            # Remove the dangerous content
+            value = self.dangerous_regex.sub('', value)
+            match = self.dangerous_regex.search(value)
         
         # Use bleach for HTML sanitization
-        value = bleach.clean(value, tags=[], attributes={}, strip=True)
+        if self.markup_chars.search(value):
+            value = bleach.clean(value, tags=[], attributes={}, strip=True)
         
         # Limit string length
         if len(value) > self.config.MAX_FIELD_LENGTH:
@@ -133,56 +149,75 @@ class RequestValidator:
         
         return value
     
+    def _may_be_dangerous(self, value: str) -> bool:
+        """Cheap substring prefilter for the pattern scan (non-ASCII text always gets the full scan)."""
+        if not value.isascii():
+            return True
+        lowered = value.lower()
+        return any(literal in lowered for literal in self.config.DANGEROUS_LITERALS)
+    
     def validate_json_data(self, data: Any) -> Tuple[bool, Any]:
-        """Validate and sanitize JSON data recursively."""
+        """
+        Validate and sanitize JSON data.
+        
+        Walks the structure with an explicit stack rather than recursion, and
+        rejects it as soon as a container exceeds MAX_FORM_FIELDS, nesting
+        exceeds MAX_JSON_DEPTH or the strings exceed MAX_JSON_SIZE in total.
+        """
         try:
-            if isinstance(data, dict):
-                if len(data) > self.config.MAX_FORM_FIELDS:
-                    logger.warning(f"Too many form fields: {len(data)}")
+            budget = self.config.MAX_JSON_SIZE
+            root, pending = self._sanitize_node(data, 1)
+            while pending:
+                source, target, depth = pending.pop()
+                if len(source) > self.config.MAX_FORM_FIELDS:
+                    logger.warning(f"Too many {'form fields' if isinstance(source, dict) else 'list items'}: {len(source)}")
                     return False, None
-                
-                sanitized = {}
-                for key, value in data.items():
-                    # Sanitize key
-                    clean_key = self.sanitize_string(str(key))
-                    
-                    # Recursively validate value
-                    valid, clean_value = self.validate_json_data(value)
-                    if not valid:
-                        return False, None
-                    
-                    sanitized[clean_key] = clean_value
-                
-                return True, sanitized
-            
-            elif isinstance(data, list):
-                if len(data) > self.config.MAX_FORM_FIELDS:
-                    logger.warning(f"Too many list items: {len(data)}")
+                if depth > self.config.MAX_JSON_DEPTH:
+                    logger.warning(f"JSON nested deeper than {self.config.MAX_JSON_DEPTH} levels")
                     return False, None
                 
-                sanitized = []
-                for item in data:
-                    valid, clean_item = self.validate_json_data(item)
-                    if not valid:
-                        return False, None
-                    sanitized.append(clean_item)
+                if isinstance(source, dict):
+                    for key, value in source.items():
+                        key = str(key)
+                        budget -= len(key)
+                        clean_value, children = self._sanitize_node(value, depth + 1)
+                        if isinstance(value, str):
+                            budget -= len(value)
+                        pending.extend(children)
+                        target[self.sanitize_string(key)] = clean_value
+                else:
+                    for value in source:
+                        clean_value, children = self._sanitize_node(value, depth + 1)
+                        if isinstance(value, str):
+                            budget -= len(value)
+                        pending.extend(children)
+                        target.append(clean_value)
                 
-                return True, sanitized
-            
-            elif isinstance(data, str):
-                return True, self.sanitize_string(data)
-            
-            elif isinstance(data, (int, float, bool)) or data is None:
-                return True, data
+                if budget < 0:
+                    logger.warning(f"JSON strings exceed {self.config.MAX_JSON_SIZE} characters")
+                    return False, None
             
-            else:
-                # Unknown type, convert to string and sanitize
-                return True, self.sanitize_string(str(data))
+            return True, root
         
         except Exception as e:
             logger.error(f"Error validating JSON data: {e}")
             return False, None
     
+    def _sanitize_node(self, value: Any, depth: int) -> Tuple[Any, List[Tuple[Any, Any, int]]]:
+        """Sanitized scalar, or an empty container plus the (source, target, depth) work to fill it."""
+        if isinstance(value, dict):
+            target = {}
+            return target, [(value, target, depth)]
+        if isinstance(value, list):
+            target = []
+            return target, [(value, target, depth)]
+        if isinstance(value, str):
+            return self.sanitize_string(value), []
+        if isinstance(value, (int, float, bool)) or value is None:
+            return value, []
+        # Unknown type, convert to string and sanitize
+        return self.sanitize_string(str(value)), []
+    
     def validate_file_upload(self, file: FileStorage) -> Tuple[bool, str]:
         """Validate file upload."""
         if not file or not file.filename:
@@ -206,6 +241,50 @@ class RequestValidator:
         return True, safe_filename
 
 
+class LazySanitizedJSON(Mapping):
+    """
+    Read-only view of a JSON object that sanitizes each top-level field on first access.
+    
+    Keys are sanitized up front; a field whose value fails validation raises
+    ValueError when it is read. ``to_dict()`` sanitizes everything.
+    """
+    
+    def __init__(self, data: Dict[str, Any], validator: RequestValidator):
+        self._data = data
+        self._validator = validator
+        self._keys = {validator.sanitize_string(str(key)): key for key in data}
+        self._clean: Dict[str, Any] = {}
+    
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._clean:
+            valid, value = self._validator.validate_json_data(self._data[self._keys[key]])
+            if not valid:
+                raise ValueError(f"Invalid request data in field {key!r}")
+            self._clean[key] = value
+        return self._clean[key]
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+    
+    def __len__(self) -> int:
+        return len(self._keys)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: self[key] for key in self}
+
+
+def lazy_json_sanitization(view: Callable) -> Callable:
+    """
+    Opt a view out of up-front JSON sanitization.
+    
+    For large bodies the view reads selectively (or verifies raw bytes), so
+    g.sanitized_json becomes a LazySanitizedJSON that only sanitizes the
+    fields the view reads.
+    """
+    view.lazy_json_sanitization = True
+    return view
+
+
 class CORSManager:
     """CORS (Cross-Origin Resource Sharing) management."""
     
@@ -367,9 +446,24 @@ class SecurityMiddleware:
             return jsonify({'error': 'Invalid content type'}), 415
         
         # Validate and sanitize JSON data
-        if request.is_json and request.get_json(silent=True):
+        if request.is_json:
+            # Content-Length can be absent (chunked bodies); check the body before parsing it
+            body_size = len(request.get_data(cache=True))
+            if body_size > self.validator.config.MAX_JSON_SIZE:
+                self._log_security_event('request_too_large', {
+                    'content_length': body_size,
+                    'ip': request.remote_addr,
+                    'path': request.path
+                })
+                return jsonify({'error': 'Request too large'}), 413
+            data = request.get_json(silent=True)
+        else:
+            data = None
+        
+        if data and isinstance(data, dict) and self._is_lazy_view():
+            g.sanitized_json = LazySanitizedJSON(data, self.validator)
+        elif data:
             try:
-                data = request.get_json()
                 valid, sanitized_data = self.validator.validate_json_data(data)
                 if not valid:
                     self._log_security_event('invalid_json_data', {
@@ -446,6 +540,10 @@ class SecurityMiddleware:
         
         return response
     
+    def _is_lazy_view(self) -> bool:
+        view = current_app.view_functions.get(request.endpoint)
+        return bool(getattr(view, 'lazy_json_sanitization', False))
+    
     def _is_suspicious_user_agent(self, user_agent: str) -> bool:
         """Check for suspicious user agents."""
         suspicious_patterns = [
@@ -6,6 +6,7 @@ import logging
 from functools import wraps
 from flask import g, request, current_app, jsonify
 from app.services.tenant_service import tenant_service
+from app.services.tenant_scope import install_tenant_scoping
 
 logger = logging.getLogger(__name__)
 
@@ -24,24 +25,10 @@ class TenantIsolationMiddleware:
         app.before_request(self.before_request)
         app.after_request(self.after_request)
         
-        # Register SQL query interceptor for automatic tenant filtering
-        from sqlalchemy import event
+        # Scope ORM statements on tenant-aware tables to g.current_tenant with bound
+        # tenant_id criteria; raw SQL goes through tenant_scope.tenant_text
         from app import db
-        
-        @event.listens_for(db.engine, "before_cursor_execute")
-        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
-            """Intercept SQL queries to add tenant filtering."""
-            if hasattr(g, 'current_tenant') and g.current_tenant:
-                # Only apply isolation to SELECT, UPDATE, DELETE queries
-                statement_upper = statement.upper().strip()
-                if any(statement_upper.startswith(cmd) for cmd in ['SELECT', 'UPDATE', 'DELETE']):
-                    # Skip if query already has tenant_id filter or is a system table
-                    if 'tenant_id' not in statement.lower() and not any(
-                        table in statement.lower() 
-                        for table in ['users', 'tenants', 'tenant_users', 'alembic_version']
-                    ):
-                        # This is a simplified approach - in production, use proper SQL parsing
-                        logger.debug(f"Tenant isolation applied to query: {statement[:100]}...")
+        install_tenant_scoping(db)
     
     def before_request(self):
         """Process request before handling to establish tenant context."""
@@ -55,7 +42,8 @@ class TenantIsolationMiddleware:
             if any(request.path.startswith(path) for path in skip_paths):
                 return
             
-            # Establish tenant context
+            # Establish tenant context; g outlives the request when an app context was already pushed
+            g.pop('current_tenant', None)
             current_tenant = tenant_service.get_current_tenant()
             
             if current_tenant:
@@ -75,8 +63,8 @@ class TenantIsolationMiddleware:
                             "tenant_id": current_tenant.id
                         }), 403
             else:
-                # For API requests, require tenant context
-                if request.path.startswith('/api/') and not request.path.startswith('/api/auth'):
+                # For API requests, require tenant context (webhooks authenticate by signature)
+                if request.path.startswith('/api/') and not request.path.startswith(('/api/auth', '/api/webhooks')):
                     logger.warning(f"API request without tenant context: {request.path}")
                     return jsonify({
                         "error": "Tenant context required for API access",
@@ -134,6 +134,7 @@ class Cost(db.Model):
     total_tokens = db.Column(db.Integer, default=0)
     cost_usd = db.Column(db.Numeric(10, 6), default=0)  # Cost in USD
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    tenant_id = db.Column(db.String(36))
     
     def __repr__(self):
         return f'<Cost {self.model}: ${self.cost_usd}>'
@@ -247,6 +248,7 @@ class LiveTrace(db.Model):
     # Source Tracking
     data_source_id = db.Column(db.Integer, db.ForeignKey('data_sources.id'))
     source_updated_at = db.Column(db.DateTime)
+    tenant_id = db.Column(db.String(36))
     
     # Local Tracking
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -269,7 +271,7 @@ class PerformanceMetric(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     period_start = db.Column(db.DateTime, nullable=False)
     period_end = db.Column(db.DateTime, nullable=False)
-    period_type = db.Column(db.String(20), nullable=False)  # 'hour', 'day', 'week', 'month'
+    period_type = db.Column(db.String(20), nullable=False)  # 'minute', 'hour', 'day', 'week', 'month'
     
     # Core Performance Metrics
     total_traces = db.Column(db.Integer, default=0)
@@ -285,6 +287,11 @@ class PerformanceMetric(db.Model):
     p99_latency_ms = db.Column(db.Numeric(10, 2), default=0.0)
     min_latency_ms = db.Column(db.Numeric(10, 2), default=0.0)
     max_latency_ms = db.Column(db.Numeric(10, 2), default=0.0)
+    # Additive latency totals so rollups can be combined exactly
+    latency_sum_ms = db.Column(db.Float, default=0.0)
+    latency_count = db.Column(db.Integer, default=0)
+    # Mergeable DDSketch bins {index: count} (see app.services.latency_sketch)
+    latency_sketch = db.Column(db.JSON)
     
     # Cost Metrics
     total_cost = db.Column(db.Numeric(10, 6), default=0.0)
@@ -298,6 +305,7 @@ class PerformanceMetric(db.Model):
     
     # Source Information
     data_source_id = db.Column(db.Integer, db.ForeignKey('data_sources.id'))
+    model = db.Column(db.String(100))  # Rollup rows are kept per model
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -462,16 +470,43 @@ class AlertEvent(db.Model):
     acknowledgment_user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     acknowledgment_note = db.Column(db.Text)
     
+    tenant_id = db.Column(db.String(36))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def __repr__(self):
         return f'<AlertEvent {self.alert_rule.name if self.alert_rule else "Unknown"} - {self.triggered_at}>'
 
+class APIKey(db.Model):
+    """API key record; only the SHA-256 hash of the secret is stored."""
+    
+    __tablename__ = 'api_keys'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    key_id = db.Column(db.String(64), unique=True, nullable=False)
+    key_hash = db.Column(db.String(64), unique=True, nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    scopes = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='active')  # 'active', 'suspended', 'expired', 'revoked'
+    rate_limit_tier = db.Column(db.String(20), default='free')
+    
+    # Usage Tracking (updated in batches)
+    usage_count = db.Column(db.Integer, default=0)
+    last_used_at = db.Column(db.DateTime)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<APIKey {self.key_id}>'
+
 # Indexes for better performance (existing)
 db.Index('idx_traces_trace_id', Trace.trace_id)
 db.Index('idx_traces_start_time', Trace.start_time)
 db.Index('idx_traces_status', Trace.status)
+db.Index('idx_traces_prompt_status', Trace.prompt_id, Trace.status)
 db.Index('idx_costs_timestamp', Cost.timestamp)
+db.Index('idx_costs_tenant_time', Cost.tenant_id, Cost.timestamp)
 db.Index('idx_prompts_type', Prompt.prompt_type)
 db.Index('idx_prompts_active', Prompt.is_active)
 
@@ -480,9 +515,11 @@ db.Index('idx_live_traces_external_id', LiveTrace.external_trace_id)
 db.Index('idx_live_traces_start_time', LiveTrace.start_time)
 db.Index('idx_live_traces_status_time', LiveTrace.status, LiveTrace.start_time)
 db.Index('idx_live_traces_data_source', LiveTrace.data_source_id, LiveTrace.updated_at)
+db.Index('idx_live_traces_tenant_time', LiveTrace.tenant_id, LiveTrace.start_time)
 
 db.Index('idx_performance_metrics_period', PerformanceMetric.period_start, PerformanceMetric.period_end, PerformanceMetric.period_type)
 db.Index('idx_performance_metrics_data_source', PerformanceMetric.data_source_id, PerformanceMetric.created_at)
+db.Index('idx_performance_metrics_rollup', PerformanceMetric.period_type, PerformanceMetric.period_start, PerformanceMetric.data_source_id)
 
 db.Index('idx_sync_status_data_source', SyncStatus.data_source_id, SyncStatus.sync_type)
 db.Index('idx_sync_status_timestamp', SyncStatus.last_sync_timestamp)
@@ -499,6 +536,9 @@ db.Index('idx_data_sources_health', DataSource.health_status, DataSource.last_he
 
 db.Index('idx_alert_rules_active', AlertRule.is_active, AlertRule.alert_type)
 db.Index('idx_alert_events_rule', AlertEvent.rule_id, AlertEvent.triggered_at)
+db.Index('idx_alert_events_tenant_time', AlertEvent.tenant_id, AlertEvent.triggered_at)
+
+db.Index('idx_api_keys_user', APIKey.user_id, APIKey.status)
 
 # Tenant Models for Multi-Tenant Architecture
 from enum import Enum
@@ -593,6 +633,19 @@ class TenantUserModel(db.Model):
         return f'<TenantUserModel {self.tenant_id}:{self.user_id}>'
 
 
+class RegistryVersion(db.Model):
+    """Change counter per cached registry; workers compare it to drop stale caches."""
+    
+    __tablename__ = 'registry_versions'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<RegistryVersion {self.name}={self.version}>'
+
+
 # Add tenant indexes for performance
 db.Index('idx_tenants_domain', TenantModel.domain)
 db.Index('idx_tenants_status', TenantModel.status)
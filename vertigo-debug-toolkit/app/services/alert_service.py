@@ -84,6 +84,7 @@ class AlertService:
         self.alert_evaluators = {
             'error_rate': self._evaluate_error_rate,
             'latency_spike': self._evaluate_latency_spike,
+            'latency_p95': self._evaluate_latency_p95,
             'cost_threshold': self._evaluate_cost_threshold,
             'trace_volume': self._evaluate_trace_volume,
             'success_rate_drop': self._evaluate_success_rate_drop,
@@ -305,6 +306,43 @@ class AlertService:
             logger.error(f"Error evaluating latency spike rule: {e}")
             return None
     
+    def _evaluate_latency_p95(self, rule: AlertRule) -> Optional[AlertEvent]:
+        """Evaluate p95 latency SLO alert rule (from rollup latency sketches)."""
+        try:
+            data_source = 'all' if not rule.data_source_id else self._get_data_source_name(rule.data_source_id)
+            metrics = live_data_service.get_unified_performance_metrics(
+                hours=rule.time_window_minutes / 60,
+                data_source=data_source
+            )
+            
+            current_p95 = (metrics.get('latency_percentiles') or {}).get('p95')
+            if current_p95 is None:
+                return None
+            
+            if self._compare_values(current_p95, rule.threshold_value, rule.comparison_operator):
+                return AlertEvent(
+                    id=None,
+                    rule_id=rule.id,
+                    triggered_at=datetime.utcnow(),
+                    status=AlertStatus.ACTIVE,
+                    trigger_value=current_p95,
+                    threshold_value=rule.threshold_value,
+                    message=f"p95 latency {current_p95}ms exceeds threshold {rule.threshold_value}ms",
+                    severity=rule.severity,
+                    context_data={
+                        'total_traces': metrics.get('total_traces', 0),
+                        'latency_percentiles': metrics.get('latency_percentiles'),
+                        'time_window_minutes': rule.time_window_minutes,
+                        'data_source': data_source
+                    }
+                )
+            
+            return None
+            
+        except Exception as e:
+            logger.error(f"Error evaluating p95 latency rule: {e}")
+            return None
+    
     def _evaluate_cost_threshold(self, rule: AlertRule) -> Optional[AlertEvent]:
         """Evaluate cost threshold alert rule."""
         try:
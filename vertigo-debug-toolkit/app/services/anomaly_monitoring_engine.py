@@ -14,7 +14,6 @@ from typing import Dict, List, Optional, Any, Callable, Tuple
 from dataclasses import dataclass, field
 from enum import Enum
 from collections import defaultdict, deque
-import statistics
 import math
 
 from app.models import db
@@ -22,9 +21,14 @@ from sqlalchemy import text, func
 from app.services.live_data_service import live_data_service
 from app.services.analytics_service import analytics_service, Anomaly
 from app.services.alert_service import alert_service, AlertEvent, AlertSeverity
+from app.services.rolling_stats import RollingMetricStore, TraceWindow
+from app.services.trace_stream import trace_stream
 
 logger = logging.getLogger(__name__)
 
+# Polls scanned for recent cost-per-trace samples in correlation detection
+CORRELATION_LOOKBACK = 50
+
 class MonitoringStatus(Enum):
     STOPPED = "stopped"
     STARTING = "starting"
@@ -38,15 +42,6 @@ class AnomalyType(Enum):
     PATTERN = "pattern"
     CORRELATION = "correlation"
 
-@dataclass
-class MetricPoint:
-    """Single metric data point."""
-    timestamp: datetime
-    metric_name: str
-    value: float
-    source: str
-    metadata: Dict[str, Any] = field(default_factory=dict)
-
 @dataclass
 class AnomalyAlert:
     """Real-time anomaly alert."""
@@ -72,6 +67,12 @@ class MonitoringConfig:
     correlation_threshold: float = 0.8
     max_alerts_per_minute: int = 10
     enable_auto_response: bool = True
+    history_size: int = 1000  # samples kept per metric
+    ewma_alpha: float = 0.1
+    # 'poll' queries live_data_service every interval; 'stream' consumes the
+    # ingest trace stream and detects within stream_detection_interval_seconds
+    mode: str = field(default_factory=lambda: os.getenv('ANOMALY_MONITORING_MODE', 'poll'))
+    stream_detection_interval_seconds: float = 0.5
     monitored_metrics: List[str] = field(default_factory=lambda: [
         'error_rate', 'avg_latency_ms', 'total_cost', 'total_traces', 'success_rate'
     ])
@@ -95,7 +96,10 @@ class AnomalyMonitoringEngine:
         self.status = MonitoringStatus.STOPPED
         self.monitoring_thread = None
         self.alert_queue = queue.Queue()
-        self.metric_history = defaultdict(lambda: deque(maxlen=1000))
+        self.metric_store = RollingMetricStore(
+            capacity=self.config.history_size,
+            ewma_alpha=self.config.ewma_alpha
+        )
         self.alert_rate_limiter = deque(maxlen=100)
         
         # Detection methods
@@ -120,6 +124,13 @@ class AnomalyMonitoringEngine:
         # Correlation tracking for multi-metric anomalies
         self.correlation_matrix = {}
         
+        # Streaming mode state: sliding window over ingested traces, and the
+        # last time each (type, metric) alerted so a persisting anomaly is
+        # not re-raised on every event
+        self.trace_window = TraceWindow(self.config.poll_interval_seconds)
+        self._last_sample_time = 0.0
+        self._last_alerted: Dict[Tuple[str, str], float] = {}
+        
         logger.info("Anomaly monitoring engine initialized")
     
     def start_monitoring(self) -> bool:
@@ -131,16 +142,26 @@ class AnomalyMonitoringEngine:
             
             self.status = MonitoringStatus.STARTING
             
+            streaming = self.config.mode == 'stream'
+            if streaming:
+                self.trace_window = TraceWindow(self.config.poll_interval_seconds)
+                trace_stream.attach()
+            
+            # The loop runs while status is RUNNING, so set it before starting
+            self.status = MonitoringStatus.RUNNING
+            
             # Start monitoring thread
             self.monitoring_thread = threading.Thread(
-                target=self._monitoring_loop,
+                target=self._stream_loop if streaming else self._monitoring_loop,
                 name="AnomalyMonitoringThread",
                 daemon=True
             )
             self.monitoring_thread.start()
             
-            self.status = MonitoringStatus.RUNNING
-            logger.info(f"Anomaly monitoring engine started with {self.config.poll_interval_seconds}s intervals")
+            if streaming:
+                logger.info("Anomaly monitoring engine started in streaming mode")
+            else:
+                logger.info(f"Anomaly monitoring engine started with {self.config.poll_interval_seconds}s intervals")
             return True
             
         except Exception as e:
@@ -159,6 +180,9 @@ class AnomalyMonitoringEngine:
             if self.monitoring_thread and self.monitoring_thread.is_alive():
                 self.monitoring_thread.join(timeout=5)
             
+            if self.config.mode == 'stream':
+                trace_stream.detach()
+            
             logger.info("Anomaly monitoring engine stopped")
             return True
             
@@ -172,14 +196,14 @@ class AnomalyMonitoringEngine:
             'status': self.status.value,
             'config': {
                 'poll_interval_seconds': self.config.poll_interval_seconds,
+                'mode': self.config.mode,
                 'monitored_metrics': self.config.monitored_metrics,
                 'enable_auto_response': self.config.enable_auto_response
             },
             'statistics': self.detection_stats.copy(),
             'active_alerts': self.alert_queue.qsize(),
-            'metric_history_size': {
-                metric: len(history) for metric, history in self.metric_history.items()
-            },
+            'trace_stream': dict(trace_stream.stats, queued=trace_stream.qsize()),
+            'metric_history_size': self.metric_store.sizes(),
             'thread_alive': self.monitoring_thread.is_alive() if self.monitoring_thread else False
         }
     
@@ -195,15 +219,7 @@ class AnomalyMonitoringEngine:
                 current_metrics = self._collect_metrics()
                 
                 # Update metric history
-                for metric_name, value in current_metrics.items():
-                    if value is not None and not math.isnan(value):
-                        metric_point = MetricPoint(
-                            timestamp=datetime.utcnow(),
-                            metric_name=metric_name,
-                            value=value,
-                            source='live_data_service'
-                        )
-                        self.metric_history[metric_name].append(metric_point)
+                self._record_metrics(current_metrics)
                 
                 # Run anomaly detection
                 anomalies = self._run_anomaly_detection(current_metrics)
@@ -223,6 +239,57 @@ class AnomalyMonitoringEngine:
                 logger.error(f"Error in monitoring loop: {e}")
                 time.sleep(min(self.config.poll_interval_seconds, 10))
     
+    def _stream_loop(self):
+        """Streaming loop: update from ingested traces instead of polling the database."""
+        logger.info("Starting streaming anomaly monitoring loop")
+        
+        while self.status == MonitoringStatus.RUNNING:
+            try:
+                batch = trace_stream.get_batch(timeout=self.config.stream_detection_interval_seconds)
+                self._process_trace_batch(batch)
+            except Exception as e:
+                logger.error(f"Error in streaming monitoring loop: {e}")
+                time.sleep(1)
+    
+    def _process_trace_batch(self, batch: List[Dict[str, Any]], now: Optional[float] = None) -> List[AnomalyAlert]:
+        """Fold a batch of trace events into the window and run detection on it."""
+        start_time = time.time()
+        now = start_time if now is None else now
+        
+        for trace in batch:
+            self.trace_window.add(trace, now)
+        current_metrics = self.trace_window.metrics(now)
+        
+        # Keep one history sample per interval, as polling did
+        if now - self._last_sample_time >= self.config.poll_interval_seconds:
+            self._record_metrics(current_metrics, now)
+            self._last_sample_time = now
+        
+        if not batch:
+            return []
+        
+        anomalies = [a for a in self._run_anomaly_detection(current_metrics) if self._should_alert(a, now)]
+        for anomaly in anomalies:
+            self._process_anomaly(anomaly)
+        
+        self._update_detection_stats((time.time() - start_time) * 1000, len(anomalies))
+        return anomalies
+    
+    def _should_alert(self, anomaly: AnomalyAlert, now: float) -> bool:
+        """Suppress repeats of the same anomaly within one interval (streaming mode)."""
+        key = (anomaly.anomaly_type.value, anomaly.metric_name)
+        if now - self._last_alerted.get(key, float('-inf')) < self.config.poll_interval_seconds:
+            return False
+        self._last_alerted[key] = now
+        return True
+    
+    def _record_metrics(self, current_metrics: Dict[str, float], timestamp: Optional[float] = None):
+        """Append one poll's metric values to the rolling store."""
+        timestamp = time.time() if timestamp is None else timestamp
+        for metric_name, value in current_metrics.items():
+            if value is not None and not math.isnan(value):
+                self.metric_store.append(metric_name, value, timestamp)
+    
     def _collect_metrics(self) -> Dict[str, float]:
         """Collect current performance metrics."""
         try:
@@ -278,48 +345,45 @@ class AnomalyMonitoringEngine:
                 continue
                 
             current_value = current_metrics[metric_name]
-            history = self.metric_history[metric_name]
+            series = self.metric_store.get(metric_name)
             
-            if len(history) < 10:  # Need sufficient history
+            if series is None or len(series) < 10:  # Need sufficient history
                 continue
             
-            # Calculate statistical bounds
-            values = [point.value for point in history if point.value is not None]
-            if len(values) < 5:
+            # Calculate statistical bounds from the running window statistics
+            mean_value = series.mean
+            std_value = series.std
+            
+            if std_value == 0:
                 continue
+            
+            deviation = abs(current_value - mean_value) / std_value
+            
+            if deviation > self.config.statistical_threshold:
+                severity = self._calculate_severity(deviation, metric_name)
                 
-            try:
-                mean_value = statistics.mean(values)
-                std_value = statistics.stdev(values) if len(values) > 1 else 0
-                
-                if std_value == 0:
-                    continue
-                
-                deviation = abs(current_value - mean_value) / std_value
-                
-                if deviation > self.config.statistical_threshold:
-                    severity = self._calculate_severity(deviation, metric_name)
-                    
-                    anomalies.append(AnomalyAlert(
-                        id=f"stat_{metric_name}_{int(time.time())}",
-                        timestamp=datetime.utcnow(),
-                        anomaly_type=AnomalyType.STATISTICAL,
-                        metric_name=metric_name,
-                        severity=severity,
-                        actual_value=current_value,
-                        expected_value=mean_value,
-                        deviation_score=deviation,
-                        message=f"Statistical anomaly in {metric_name}: {current_value:.3f} (expected ~{mean_value:.3f}, σ={deviation:.2f})",
-                        context_data={
-                            'standard_deviation': std_value,
-                            'sample_size': len(values),
-                            'detection_method': 'statistical',
-                            'threshold_used': self.config.statistical_threshold
-                        }
-                    ))
-                    
-            except statistics.StatisticsError as e:
-                logger.debug(f"Statistical calculation error for {metric_name}: {e}")
+                anomalies.append(AnomalyAlert(
+                    id=f"stat_{metric_name}_{int(time.time())}",
+                    timestamp=datetime.utcnow(),
+                    anomaly_type=AnomalyType.STATISTICAL,
+                    metric_name=metric_name,
+                    severity=severity,
+                    actual_value=current_value,
+                    expected_value=mean_value,
+                    deviation_score=deviation,
+                    message=f"Statistical anomaly in {metric_name}: {current_value:.3f} (expected ~{mean_value:.3f}, σ={deviation:.2f})",
+                    context_data={
+                        'standard_deviation': std_value,
+                        'sample_size': len(series),
+                        'ewma_mean': series.ewma_mean,
+                        'ewma_std': series.ewma_std,
+                        'median': series.median,
+                        'mad': series.mad,
+                        'robust_z': series.robust_z(current_value),
+                        'detection_method': 'statistical',
+                        'threshold_used': self.config.statistical_threshold
+                    }
+                ))
         
         return anomalies
     
@@ -398,11 +462,11 @@ class AnomalyMonitoringEngine:
             if metric_name not in current_metrics:
                 continue
             
-            history = self.metric_history[metric_name]
-            if len(history) < 5:
+            series = self.metric_store.get(metric_name)
+            if series is None or len(series) < 5:
                 continue
             
-            recent_values = [point.value for point in list(history)[-5:]]
+            recent_values = series.tail(5).tolist()
             current_value = current_metrics[metric_name]
             
             # Detect rapid increases
@@ -473,14 +537,17 @@ class AnomalyMonitoringEngine:
             if traces > 0:
                 cost_per_trace = cost / traces
                 
-                # Compare with historical cost per trace
-                cost_history = [p.value for p in self.metric_history['total_cost'] if p.value > 0]
-                trace_history = [p.value for p in self.metric_history['total_traces'] if p.value > 0]
+                # Compare with historical cost per trace (the last five polls
+                # that had both cost and traces)
+                cost_history, trace_history = self.metric_store.aligned_tail(
+                    'total_cost', 'total_traces', CORRELATION_LOOKBACK
+                )
+                active = (cost_history > 0) & (trace_history > 0)
                 
-                if len(cost_history) >= 5 and len(trace_history) >= 5:
-                    historical_cpt = [c/t for c, t in zip(cost_history[-5:], trace_history[-5:]) if t > 0]
-                    if historical_cpt:
-                        avg_historical_cpt = statistics.mean(historical_cpt)
+                if active.sum() >= 5:
+                    historical_cpt = cost_history[active][-5:] / trace_history[active][-5:]
+                    if historical_cpt.size:
+                        avg_historical_cpt = float(historical_cpt.mean())
                         
                         if cost_per_trace > avg_historical_cpt * 3:  # 3x higher cost per trace
                             anomalies.append(AnomalyAlert(
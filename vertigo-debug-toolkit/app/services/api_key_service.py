@@ -6,20 +6,33 @@ and security monitoring for the Vertigo Debug Toolkit.
 """
 
 import os
+import hmac
 import secrets
 import hashlib
+import threading
+import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any, Tuple, Set
-from flask import request, g
+from flask import request, g, current_app
 from dataclasses import dataclass
 from enum import Enum
 import logging
 import json
 
-from app.models import User, db
+from sqlalchemy import text
+
+from app.models import APIKey, User, db
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+INVALIDATION_CHANNEL = 'vertigo:api_keys:invalidate'
+
 
 class APIKeyStatus(Enum):
     """API key status."""
@@ -59,11 +72,39 @@ class APIKeyInfo:
 
 
 class APIKeyService:
-    """API key authentication and management service."""
+    """
+    API key authentication and management service.
     
-    def __init__(self):
-        # API key storage (in production, use database)
-        self.api_keys: Dict[str, APIKeyInfo] = {}
+    Keys live in the ``api_keys`` table and are looked up by the hash of
+    their secret. Verified keys are cached per process for
+    ``cache_ttl_seconds``; revoking or suspending a key drops it from the
+    cache here and, when Redis is configured, in every other worker through
+    a pub/sub message (the TTL bounds staleness otherwise). Usage counters
+    are accumulated in memory and written in one batch every
+    ``usage_flush_seconds``.
+    """
+    
+    def __init__(self, cache_ttl_seconds: float = 30.0, cache_size: int = 10000,
+                 usage_flush_seconds: float = 5.0, redis_url: Optional[str] = None):
+        # Verified key cache: key_hash -> (APIKeyInfo, expires_monotonic)
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.cache_size = cache_size
+        self._cache: Dict[str, Tuple[APIKeyInfo, float]] = {}
+        # Bumped on every invalidation so a lookup racing a revoke is not cached
+        self._cache_version = 0
+        self._cache_lock = threading.Lock()
+        
+        # Pending usage: key_id -> (requests, last_used_at)
+        self.usage_flush_seconds = usage_flush_seconds
+        self._usage: Dict[str, Tuple[int, datetime]] = {}
+        self._usage_lock = threading.Lock()
+        self._app = None
+        self._usage_thread: Optional[threading.Thread] = None
+        
+        self.redis_url = redis_url
+        self._redis_client = None
+        self._subscriber: Optional[threading.Thread] = None
+        self.stats = {'cache_hits': 0, 'cache_misses': 0, 'invalidations': 0, 'usage_flushes': 0}
         
         # Default scopes by user role
         self.default_scopes = {
@@ -106,20 +147,19 @@ class APIKeyService:
         if expires_days:
             expires_at = datetime.utcnow() + timedelta(days=expires_days)
         
-        # Create API key info
-        api_key_info = APIKeyInfo(
+        # Store the key (only the hash of the secret)
+        db.session.add(APIKey(
             key_id=key_id,
+            key_hash=key_hash,
             name=name,
             user_id=user.id,
             scopes=scopes,
-            status=APIKeyStatus.ACTIVE,
+            status=APIKeyStatus.ACTIVE.value,
             created_at=datetime.utcnow(),
             expires_at=expires_at,
             rate_limit_tier=rate_limit_tier
-        )
-        
-        # Store the key (hash as key, info as value)
-        self.api_keys[key_hash] = api_key_info
+        ))
+        db.session.commit()
         
         # Log key creation
         logger.info(f"API key created: {key_id} for user {user.username}")
@@ -150,40 +190,194 @@ class APIKeyService:
         # Hash the secret to find in storage
         key_hash = self._hash_key(key_secret)
         
-        # Find key info
-        api_key_info = self.api_keys.get(key_hash)
-        if not api_key_info:
-            logger.warning(f"API key not found: {key_id}")
-            return False, None, "Invalid API key"
+        api_key_info = self._cached_key(key_hash)
+        if api_key_info is None:
+            try:
+                api_key_info, error = self._load_key(key_hash)
+            except Exception as e:
+                logger.error(f"Error loading API key {key_id}: {e}")
+                return False, None, "API key verification unavailable"
+            if error:
+                return False, None, error
         
         # Verify key ID matches
-        if api_key_info.key_id != key_id:
+        if not hmac.compare_digest(api_key_info.key_id, key_id):
             logger.warning(f"API key ID mismatch: {key_id}")
             return False, None, "Invalid API key"
         
-        # Check key status
-        if api_key_info.status != APIKeyStatus.ACTIVE:
-            return False, None, f"API key is {api_key_info.status.value}"
-        
         # Check expiration
-        if api_key_info.expires_at and datetime.utcnow() > api_key_info.expires_at:
-            # Update status to expired
-            api_key_info.status = APIKeyStatus.EXPIRED
+        now = datetime.utcnow()
+        if api_key_info.expires_at and now > api_key_info.expires_at:
+            self._set_status(api_key_info.key_id, APIKeyStatus.EXPIRED)
             return False, None, "API key has expired"
         
-        # Update usage stats
-        api_key_info.last_used_at = datetime.utcnow()
-        api_key_info.usage_count += 1
+        # Update usage stats (written in the next batch)
+        self._record_usage(api_key_info.key_id, now)
         
-        # Get user info
-        user = User.query.get(api_key_info.user_id)
-        if not user or not user.is_active:
-            return False, None, "Associated user account is inactive"
-        
-        logger.debug(f"API key authenticated: {key_id} for user {user.username}")
+        logger.debug(f"API key authenticated: {key_id} for user {api_key_info.user_id}")
         
         return True, api_key_info, None
     
+    def _cached_key(self, key_hash: str) -> Optional[APIKeyInfo]:
+        entry = self._cache.get(key_hash)
+        if entry is not None and entry[1] > time.monotonic():
+            self.stats['cache_hits'] += 1
+            return entry[0]
+        self.stats['cache_misses'] += 1
+        return None
+    
+    def _load_key(self, key_hash: str) -> Tuple[Optional[APIKeyInfo], Optional[str]]:
+        """Look the key up by hash (one indexed query with the owner's status) and cache it if usable."""
+        version = self._cache_version
+        row = db.session.query(APIKey, User.is_active).join(User, User.id == APIKey.user_id).filter(
+            APIKey.key_hash == key_hash
+        ).first()
+        if row is None:
+            logger.warning("API key not found")
+            return None, "Invalid API key"
+        
+        record, user_active = row
+        if record.status != APIKeyStatus.ACTIVE.value:
+            return None, f"API key is {record.status}"
+        if not user_active:
+            return None, "Associated user account is inactive"
+        
+        api_key_info = self._to_info(record)
+        with self._cache_lock:
+            if version == self._cache_version:
+                if len(self._cache) >= self.cache_size:
+                    self._prune_cache()
+                self._cache[key_hash] = (api_key_info, time.monotonic() + self.cache_ttl_seconds)
+        self._ensure_subscriber()
+        return api_key_info, None
+    
+    def _prune_cache(self):
+        """Drop expired entries, then the oldest ones, to stay within cache_size."""
+        now = time.monotonic()
+        for key_hash in [h for h, (_, expires) in self._cache.items() if expires <= now]:
+            del self._cache[key_hash]
+        while len(self._cache) >= self.cache_size:
+            del self._cache[next(iter(self._cache))]
+    
+    def invalidate(self, key_id: Optional[str] = None, broadcast: bool = True):
+        """Drop a key (or every key) from the verified-key cache, in all workers when broadcasting."""
+        with self._cache_lock:
+            self._cache_version += 1
+            if key_id is None:
+                self._cache.clear()
+            else:
+                for key_hash in [h for h, (info, _) in self._cache.items() if info.key_id == key_id]:
+                    del self._cache[key_hash]
+            self.stats['invalidations'] += 1
+        
+        client = self._redis() if broadcast else None
+        if client is not None:
+            try:
+                client.publish(INVALIDATION_CHANNEL, key_id or '*')
+            except Exception as e:
+                logger.error(f"Error broadcasting API key invalidation: {e}")
+    
+    def _redis(self):
+        """Redis client for cross-worker invalidation; None when not configured or unreachable."""
+        if not (self.redis_url and REDIS_AVAILABLE):
+            return None
+        if self._redis_client is None:
+            try:
+                client = redis.from_url(self.redis_url, decode_responses=True)
+                client.ping()
+                self._redis_client = client
+            except Exception as e:
+                logger.warning(f"API key invalidation limited to this process (Redis unavailable): {e}")
+                self.redis_url = None
+                return None
+        return self._redis_client
+    
+    def _ensure_subscriber(self):
+        if self._subscriber is not None or self._redis() is None:
+            return
+        self._subscriber = threading.Thread(target=self._listen, name="APIKeyInvalidation", daemon=True)
+        self._subscriber.start()
+    
+    def _listen(self):
+        try:
+            pubsub = self._redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            for message in pubsub.listen():
+                key_id = message.get('data')
+                self.invalidate(None if key_id == '*' else key_id, broadcast=False)
+        except Exception as e:
+            # Cached keys now expire by TTL only
+            logger.error(f"API key invalidation subscriber stopped: {e}")
+    
+    def _record_usage(self, key_id: str, used_at: datetime):
+        with self._usage_lock:
+            count, _ = self._usage.get(key_id, (0, used_at))
+            self._usage[key_id] = (count + 1, used_at)
+            if self._usage_thread is None:
+                self._app = current_app._get_current_object()
+                self._usage_thread = threading.Thread(target=self._flush_usage_loop, name="APIKeyUsage",
+                                                      daemon=True)
+                self._usage_thread.start()
+    
+    def flush_usage(self) -> int:
+        """Write accumulated usage counters in one batch. Returns keys updated."""
+        with self._usage_lock:
+            pending, self._usage = self._usage, {}
+        if not pending:
+            return 0
+        try:
+            db.session.execute(
+                text("""
+                UPDATE api_keys
+                SET usage_count = COALESCE(usage_count, 0) + :requests, last_used_at = :last_used_at
+                WHERE key_id = :key_id
+                """),
+                [{'key_id': key_id, 'requests': count, 'last_used_at': used_at}
+                 for key_id, (count, used_at) in pending.items()]
+            )
+            db.session.commit()
+            self.stats['usage_flushes'] += 1
+            return len(pending)
+        except Exception as e:
+            logger.error(f"Error flushing API key usage for {len(pending)} keys: {e}")
+            db.session.rollback()
+            return 0
+    
+    def _flush_usage_loop(self):
+        while True:
+            time.sleep(self.usage_flush_seconds)
+            try:
+                with self._app.app_context():
+                    self.flush_usage()
+            except Exception as e:
+                logger.error(f"Error in API key usage flush: {e}")
+    
+    def _to_info(self, record: APIKey) -> APIKeyInfo:
+        return APIKeyInfo(
+            key_id=record.key_id,
+            name=record.name,
+            user_id=record.user_id,
+            scopes=list(record.scopes or []),
+            status=APIKeyStatus(record.status),
+            created_at=record.created_at,
+            expires_at=record.expires_at,
+            last_used_at=record.last_used_at,
+            usage_count=record.usage_count or 0,
+            rate_limit_tier=record.rate_limit_tier or 'free'
+        )
+    
+    def _set_status(self, key_id: str, status: APIKeyStatus) -> bool:
+        """Persist a status change and invalidate the key everywhere."""
+        try:
+            updated = APIKey.query.filter_by(key_id=key_id).update({'status': status.value})
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Error updating API key {key_id} status: {e}")
+            db.session.rollback()
+            return False
+        self.invalidate(key_id)
+        return bool(updated)
+    
     def check_api_key_scope(self, api_key_info: APIKeyInfo, required_scope: str) -> bool:
         """Check if API key has required scope."""
         if not api_key_info or not api_key_info.scopes:
@@ -197,32 +391,32 @@ class APIKeyService:
     
     def get_api_keys_for_user(self, user_id: int) -> List[APIKeyInfo]:
         """Get all API keys for a user."""
-        return [info for info in self.api_keys.values() if info.user_id == user_id]
+        self.flush_usage()
+        return [self._to_info(record) for record in APIKey.query.filter_by(user_id=user_id).order_by(APIKey.id).all()]
     
     def revoke_api_key(self, key_id: str, user_id: int = None) -> bool:
         """Revoke an API key."""
-        for key_hash, info in self.api_keys.items():
-            if info.key_id == key_id:
-                # Check if user has permission to revoke
-                if user_id and info.user_id != user_id:
-                    # Allow admin to revoke any key
-                    user = User.query.get(user_id)
-                    if not user or not user.is_admin:
-                        return False
-                
-                info.status = APIKeyStatus.REVOKED
-                logger.info(f"API key revoked: {key_id}")
-                return True
+        record = APIKey.query.filter_by(key_id=key_id).first()
+        if not record:
+            return False
         
+        # Check if user has permission to revoke
+        if user_id and record.user_id != user_id:
+            # Allow admin to revoke any key
+            user = db.session.get(User, user_id)
+            if not user or not user.is_admin:
+                return False
+        
+        if self._set_status(key_id, APIKeyStatus.REVOKED):
+            logger.info(f"API key revoked: {key_id}")
+            return True
         return False
     
     def suspend_api_key(self, key_id: str, reason: str = None) -> bool:
         """Suspend an API key."""
-        for info in self.api_keys.values():
-            if info.key_id == key_id:
-                info.status = APIKeyStatus.SUSPENDED
-                logger.warning(f"API key suspended: {key_id}, reason: {reason}")
-                return True
+        if self._set_status(key_id, APIKeyStatus.SUSPENDED):
+            logger.warning(f"API key suspended: {key_id}, reason: {reason}")
+            return True
         
         return False
     
@@ -234,53 +428,61 @@ class APIKeyService:
     def cleanup_expired_keys(self):
         """Clean up expired API keys."""
         now = datetime.utcnow()
-        expired_keys = []
-        
-        for key_hash, info in self.api_keys.items():
-            if info.expires_at and now > info.expires_at:
-                info.status = APIKeyStatus.EXPIRED
-                expired_keys.append(info.key_id)
+        expired_keys = [key_id for (key_id,) in db.session.query(APIKey.key_id).filter(
+            APIKey.expires_at.isnot(None), APIKey.expires_at < now,
+            APIKey.status != APIKeyStatus.EXPIRED.value
+        ).all()]
         
         if expired_keys:
+            APIKey.query.filter(APIKey.key_id.in_(expired_keys)).update(
+                {'status': APIKeyStatus.EXPIRED.value}, synchronize_session=False
+            )
+            db.session.commit()
+            for key_id in expired_keys:
+                self.invalidate(key_id)
             logger.info(f"Marked {len(expired_keys)} API keys as expired")
         
         return expired_keys
     
     def get_usage_stats(self, days: int = 7) -> Dict[str, Any]:
         """Get API key usage statistics."""
+        self.flush_usage()
         stats = {
-            'total_keys': len(self.api_keys),
+            'total_keys': 0,
             'active_keys': 0,
             'suspended_keys': 0,
             'expired_keys': 0,
             'revoked_keys': 0,
             'usage_by_tier': {},
             'usage_by_scope': {},
-            'recent_usage': []
+            'recent_usage': [],
+            'cache': dict(self.stats, cached_keys=len(self._cache))
         }
         
         now = datetime.utcnow()
         cutoff_date = now - timedelta(days=days)
         
-        for info in self.api_keys.values():
+        for record in APIKey.query.all():
+            stats['total_keys'] += 1
+            
             # Count by status
-            stats[f"{info.status.value}_keys"] += 1
+            stats[f"{record.status}_keys"] += 1
             
             # Count by tier
-            tier = info.rate_limit_tier
+            tier = record.rate_limit_tier
             stats['usage_by_tier'][tier] = stats['usage_by_tier'].get(tier, 0) + 1
             
             # Count by scope
-            for scope in info.scopes:
+            for scope in record.scopes or []:
                 stats['usage_by_scope'][scope] = stats['usage_by_scope'].get(scope, 0) + 1
             
             # Recent usage
-            if info.last_used_at and info.last_used_at > cutoff_date:
+            if record.last_used_at and record.last_used_at > cutoff_date:
                 stats['recent_usage'].append({
-                    'key_id': info.key_id,
-                    'name': info.name,
-                    'last_used': info.last_used_at.isoformat(),
-                    'usage_count': info.usage_count
+                    'key_id': record.key_id,
+                    'name': record.name,
+                    'last_used': record.last_used_at.isoformat(),
+                    'usage_count': record.usage_count
                 })
         
         return stats
@@ -292,19 +494,20 @@ class APIKeyService:
     
     def export_key_info(self, key_id: str, user_id: int) -> Optional[Dict[str, Any]]:
         """Export API key information (excluding secret)."""
-        for info in self.api_keys.values():
-            if info.key_id == key_id and info.user_id == user_id:
-                return {
-                    'key_id': info.key_id,
-                    'name': info.name,
-                    'scopes': info.scopes,
-                    'status': info.status.value,
-                    'created_at': info.created_at.isoformat(),
-                    'expires_at': info.expires_at.isoformat() if info.expires_at else None,
-                    'last_used_at': info.last_used_at.isoformat() if info.last_used_at else None,
-                    'usage_count': info.usage_count,
-                    'rate_limit_tier': info.rate_limit_tier
-                }
+        self.flush_usage()
+        record = APIKey.query.filter_by(key_id=key_id, user_id=user_id).first()
+        if record:
+            return {
+                'key_id': record.key_id,
+                'name': record.name,
+                'scopes': record.scopes,
+                'status': record.status,
+                'created_at': record.created_at.isoformat(),
+                'expires_at': record.expires_at.isoformat() if record.expires_at else None,
+                'last_used_at': record.last_used_at.isoformat() if record.last_used_at else None,
+                'usage_count': record.usage_count,
+                'rate_limit_tier': record.rate_limit_tier
+            }
         
         return None
 
@@ -347,14 +550,10 @@ class APIKeyAuthenticator:
                 if not self.service.check_api_key_scope(api_key_info, scope):
                     return False, f"Insufficient permissions: {scope} scope required"
         
-        # Store API key info in request context
+        # Store API key info in request context (load the user by g.api_user_id when needed)
         g.api_key_info = api_key_info
         g.api_authenticated = True
-        
-        # Get user for context
-        user = User.query.get(api_key_info.user_id)
-        if user:
-            g.api_user = user
+        g.api_user_id = api_key_info.user_id
         
         return True, None
     
@@ -375,7 +574,12 @@ class APIKeyAuthenticator:
 
 
 # Global API key service instance
-api_key_service = APIKeyService()
+api_key_service = APIKeyService(
+    cache_ttl_seconds=float(os.getenv('API_KEY_CACHE_TTL_SECONDS', '30')),
+    cache_size=int(os.getenv('API_KEY_CACHE_SIZE', '10000')),
+    usage_flush_seconds=float(os.getenv('API_KEY_USAGE_FLUSH_SECONDS', '5')),
+    redis_url=os.getenv('REDIS_URL')
+)
 
 # Global API key authenticator
 api_key_authenticator = APIKeyAuthenticator(api_key_service)
\ No newline at end of file
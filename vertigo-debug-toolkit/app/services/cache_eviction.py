@@ -0,0 +1,344 @@
+"""
+Cache Eviction Engine
+Constant-time eviction policies and cheap size estimation for the in-process MemoryCache.
+"""
+
+import sys
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterator, Optional
+
+
+# Fixed per-object overheads used by estimate_size (CPython 64-bit)
+_STR_OVERHEAD = sys.getsizeof("")
+_BYTES_OVERHEAD = sys.getsizeof(b"")
+_SCALAR_SIZE = sys.getsizeof(0)
+_SAMPLE_LIMIT = 16
+_MAX_DEPTH = 3
+
+# Byte translation table mapping every counter value to half of it
+_HALVE_TABLE = bytes(count >> 1 for count in range(256))
+
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """
+    Estimate the in-memory footprint of a cached value in bytes.
+
+    Strings and bytes are measured exactly; containers are measured by sampling
+    at most a handful of elements and extrapolating, so the cost is bounded
+    regardless of payload size (unlike pickling the whole value).
+    """
+    if value is None or isinstance(value, (bool, int, float)):
+        return _SCALAR_SIZE
+    if isinstance(value, str):
+        return _STR_OVERHEAD + len(value)
+    if isinstance(value, (bytes, bytearray)):
+        return _BYTES_OVERHEAD + len(value)
+
+    size = sys.getsizeof(value)
+    if _depth >= _MAX_DEPTH:
+        return size
+
+    if isinstance(value, dict):
+        count = len(value)
+        if count == 0:
+            return size
+        sampled = 0
+        sample_bytes = 0
+        for k, v in value.items():
+            sample_bytes += estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1)
+            sampled += 1
+            if sampled >= _SAMPLE_LIMIT:
+                break
+        return size + (sample_bytes * count) // sampled
+
+    if isinstance(value, (list, tuple, set, frozenset)):
+        count = len(value)
+        if count == 0:
+            return size
+        sampled = 0
+        sample_bytes = 0
+        for item in value:
+            sample_bytes += estimate_size(item, _depth + 1)
+            sampled += 1
+            if sampled >= _SAMPLE_LIMIT:
+                break
+        return size + (sample_bytes * count) // sampled
+
+    # Arbitrary objects: account for their attribute dict when present
+    attrs = getattr(value, '__dict__', None)
+    if isinstance(attrs, dict):
+        size += estimate_size(attrs, _depth + 1)
+    return size
+
+
+class EvictionPolicy:
+    """Base class for eviction policies. All hooks must run in O(1)."""
+
+    name = "base"
+
+    def on_insert(self, key: Hashable) -> None:
+        """Record that a new key was stored."""
+        raise NotImplementedError
+
+    def on_access(self, key: Hashable) -> None:
+        """Record a read (or overwrite) of an existing key."""
+        raise NotImplementedError
+
+    def on_remove(self, key: Hashable) -> None:
+        """Record that a key left the cache (delete, expiry or eviction)."""
+        raise NotImplementedError
+
+    def victim(self) -> Optional[Hashable]:
+        """Return the key that should be evicted next, without removing it."""
+        return next(self.victims(), None)
+
+    def victims(self) -> Iterator[Hashable]:
+        """Yield keys in eviction order, without removing them."""
+        raise NotImplementedError
+
+    def admit(self, candidate: Hashable, victim: Hashable) -> bool:
+        """Decide whether a new key may displace the given victim."""
+        return True
+
+    def clear(self) -> None:
+        """Forget all tracked keys."""
+        raise NotImplementedError
+
+
+class LRUPolicy(EvictionPolicy):
+    """Least-recently-used ordering backed by an OrderedDict."""
+
+    name = "lru"
+
+    def __init__(self):
+        self._order: "OrderedDict[Hashable, None]" = OrderedDict()
+
+    def on_insert(self, key: Hashable) -> None:
+        self._order[key] = None
+        self._order.move_to_end(key)
+
+    def on_access(self, key: Hashable) -> None:
+        if key in self._order:
+            self._order.move_to_end(key)
+
+    def on_remove(self, key: Hashable) -> None:
+        self._order.pop(key, None)
+
+    def victims(self) -> Iterator[Hashable]:
+        return iter(self._order)
+
+    def clear(self) -> None:
+        self._order.clear()
+
+
+class _FrequencyNode:
+    """Bucket of keys sharing one access count, linked in ascending order."""
+
+    __slots__ = ('count', 'keys', 'prev', 'next')
+
+    def __init__(self, count: int):
+        self.count = count
+        self.keys: "OrderedDict[Hashable, None]" = OrderedDict()
+        self.prev: Optional["_FrequencyNode"] = None
+        self.next: Optional["_FrequencyNode"] = None
+
+
+class LFUPolicy(EvictionPolicy):
+    """
+    Least-frequently-used eviction with O(1) updates.
+
+    Keys live in frequency buckets kept in a doubly linked list, so promoting a
+    key or finding the minimum-frequency victim never scans. Ties within a
+    bucket are broken by recency (oldest first).
+    """
+
+    name = "lfu"
+
+    def __init__(self):
+        self._head = _FrequencyNode(0)  # sentinel; head.next is the lowest count
+        self._head.next = self._head
+        self._head.prev = self._head
+        self._nodes: Dict[Hashable, _FrequencyNode] = {}
+
+    def _insert_after(self, node: _FrequencyNode, count: int) -> _FrequencyNode:
+        new_node = _FrequencyNode(count)
+        new_node.prev = node
+        new_node.next = node.next
+        node.next.prev = new_node
+        node.next = new_node
+        return new_node
+
+    def _unlink(self, node: _FrequencyNode) -> None:
+        node.prev.next = node.next
+        node.next.prev = node.prev
+
+    def on_insert(self, key: Hashable) -> None:
+        if key in self._nodes:
+            self.on_access(key)
+            return
+        first = self._head.next
+        if first is self._head or first.count != 1:
+            first = self._insert_after(self._head, 1)
+        first.keys[key] = None
+        self._nodes[key] = first
+
+    def on_access(self, key: Hashable) -> None:
+        node = self._nodes.get(key)
+        if node is None:
+            return
+        next_node = node.next
+        if next_node is self._head or next_node.count != node.count + 1:
+            next_node = self._insert_after(node, node.count + 1)
+        next_node.keys[key] = None
+        self._nodes[key] = next_node
+        del node.keys[key]
+        if not node.keys:
+            self._unlink(node)
+
+    def on_remove(self, key: Hashable) -> None:
+        node = self._nodes.pop(key, None)
+        if node is None:
+            return
+        del node.keys[key]
+        if not node.keys:
+            self._unlink(node)
+
+    def victim(self) -> Optional[Hashable]:
+        first = self._head.next
+        if first is self._head:
+            return None
+        return next(iter(first.keys))
+
+    def victims(self) -> Iterator[Hashable]:
+        node = self._head.next
+        while node is not self._head:
+            yield from node.keys
+            node = node.next
+
+    def frequency(self, key: Hashable) -> int:
+        """Return the tracked access count for a key (0 if absent)."""
+        node = self._nodes.get(key)
+        return node.count if node else 0
+
+    def clear(self) -> None:
+        self._head.next = self._head
+        self._head.prev = self._head
+        self._nodes.clear()
+
+
+class FrequencySketch:
+    """
+    Count-min sketch with 4-bit saturating counters and periodic aging.
+
+    Used by TinyLFU to estimate how popular a key has been recently, including
+    keys that are not (or no longer) cached.
+    """
+
+    _DEPTH = 4
+    _MAX_COUNT = 15
+    _SEEDS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0x27D4EB2F165667C5)
+    _MASK64 = (1 << 64) - 1
+
+    def __init__(self, capacity: int):
+        # Several counters per cached key keep collisions from inflating the
+        # estimates of one-off keys above genuinely hot ones
+        width = 1024
+        while width < max(capacity, 1) * 8:
+            width <<= 1
+        self._width_mask = width - 1
+        self._table = bytearray(width * self._DEPTH)
+        self._width = width
+        self._additions = 0
+        # Small caches still need a long enough window to tell hot keys apart
+        self._sample_size = max(capacity * 10, 1000)
+
+    def _indexes(self, key: Hashable):
+        h = hash(key) & self._MASK64
+        width = self._width
+        mask = self._width_mask
+        for row, seed in enumerate(self._SEEDS):
+            # 64-bit finalizer: the xor-shifts fold high bits back down so
+            # keys colliding in one row are unlikely to collide in the others
+            mixed = h ^ seed
+            mixed = ((mixed ^ (mixed >> 33)) * 0xFF51AFD7ED558CCD) & self._MASK64
+            mixed = ((mixed ^ (mixed >> 33)) * 0xC4CEB9FE1A85EC53) & self._MASK64
+            mixed ^= mixed >> 33
+            yield row * width + (mixed & mask)
+
+    def increment(self, key: Hashable) -> None:
+        table = self._table
+        for idx in self._indexes(key):
+            if table[idx] < self._MAX_COUNT:
+                table[idx] += 1
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            self._age()
+
+    def estimate(self, key: Hashable) -> int:
+        table = self._table
+        return min(table[idx] for idx in self._indexes(key))
+
+    def _age(self) -> None:
+        """Halve every counter so old popularity decays (amortized O(1) per add)."""
+        # One C-level pass over the table; this runs under the cache lock
+        self._table = self._table.translate(_HALVE_TABLE)
+        self._additions //= 2
+
+    def clear(self) -> None:
+        self._table = bytearray(len(self._table))
+        self._additions = 0
+
+
+class TinyLFUPolicy(LRUPolicy):
+    """
+    LRU eviction guarded by a TinyLFU admission filter.
+
+    A new key only displaces the LRU victims when the frequency sketch says it
+    has been requested more often, which keeps one-off scans from flushing
+    the hot working set. Each request counts once: the insert that fills a
+    lookup miss (cache-aside) is not counted again.
+    """
+
+    name = "tinylfu"
+
+    def __init__(self, capacity: int):
+        super().__init__()
+        self.sketch = FrequencySketch(capacity)
+        # Keys whose latest lookup missed, oldest first; bounded like the cache
+        self._misses: "OrderedDict[Hashable, None]" = OrderedDict()
+        self._max_misses = max(capacity, 1)
+
+    def record_request(self, key: Hashable, hit: bool = True) -> None:
+        """Count a lookup, hit or miss, towards the key's popularity."""
+        self.sketch.increment(key)
+        if not hit:
+            self._misses[key] = None
+            self._misses.move_to_end(key)
+            if len(self._misses) > self._max_misses:
+                self._misses.popitem(last=False)
+
+    def record_insert(self, key: Hashable) -> None:
+        """Count a write of an uncached key, unless it fills a miss already counted."""
+        if key in self._misses:
+            del self._misses[key]
+            return
+        self.sketch.increment(key)
+
+    def admit(self, candidate: Hashable, victim: Hashable) -> bool:
+        return self.sketch.estimate(candidate) > self.sketch.estimate(victim)
+
+    def clear(self) -> None:
+        super().clear()
+        self.sketch.clear()
+        self._misses.clear()
+
+
+def create_eviction_policy(strategy_name: str, capacity: int) -> EvictionPolicy:
+    """Build the eviction policy matching a CacheStrategy value."""
+    if strategy_name == LFUPolicy.name:
+        return LFUPolicy()
+    if strategy_name == TinyLFUPolicy.name:
+        return TinyLFUPolicy(capacity)
+    # TTL and the write/read-through strategies only affect persistence,
+    # so they evict in recency order.
+    return LRUPolicy()
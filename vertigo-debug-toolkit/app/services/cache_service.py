@@ -4,11 +4,11 @@ Provides multi-level caching with Redis, memory, and database-level optimization
 """
 
 import os
+import gzip
 import json
 import hashlib
 import logging
 import pickle
-from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional, Union, Callable
 from dataclasses import dataclass, field
 from enum import Enum
@@ -16,8 +16,20 @@ from functools import wraps
 import threading
 import time
 
+from flask import current_app, request
+
+from app.services.cache_eviction import create_eviction_policy, estimate_size, TinyLFUPolicy
+from app.services.tenant_scope import current_tenant_id
+
 logger = logging.getLogger(__name__)
 
+# Conditional-GET response cache (see cached_response)
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv('RESPONSE_CACHE_TTL_SECONDS', '60'))
+RESPONSE_GZIP_MIN_BYTES = int(os.getenv('RESPONSE_GZIP_MIN_BYTES', '1024'))
+
+# Data version bumped whenever traces or costs are ingested
+TRACES_VERSION = 'traces'
+
 # Try to import Redis, fall back to memory cache if unavailable
 try:
     import redis
@@ -44,6 +56,7 @@ class CacheStrategy(Enum):
     WRITE_THROUGH = "write_through"
     WRITE_BACK = "write_back"
     READ_THROUGH = "read_through"
+    TINY_LFU = "tinylfu"
 
 
 @dataclass
@@ -84,68 +97,91 @@ class CacheConfig:
     cluster_mode: bool = False
 
 
+class _CacheEntry:
+    """Stored value with its expiry deadline and estimated size."""
+
+    __slots__ = ('value', 'expires_at', 'size')
+
+    def __init__(self, value: Any, expires_at: Optional[float], size: int):
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+
+
 class MemoryCache:
     """High-performance in-memory cache implementation."""
     
-    def __init__(self, max_items: int = 1000, max_size_mb: float = 100.0):
+    def __init__(self, max_items: int = 1000, max_size_mb: float = 100.0,
+                 strategy: CacheStrategy = CacheStrategy.LRU):
         """Initialize memory cache."""
         self.max_items = max_items
         self.max_size_bytes = int(max_size_mb * 1024 * 1024)
-        self.cache: Dict[str, Dict] = {}
-        self.access_times: Dict[str, float] = {}
-        self.access_counts: Dict[str, int] = {}
+        self.strategy = strategy
+        self.cache: Dict[str, _CacheEntry] = {}
+        self.policy = create_eviction_policy(strategy.value, max_items)
+        self._counts_requests = isinstance(self.policy, TinyLFUPolicy)
         self.lock = threading.RLock()
         self.current_size = 0
+        self.evictions = 0
+        self.rejections = 0
     
     def get(self, key: str) -> Any:
         """Get item from memory cache."""
         with self.lock:
-            if key not in self.cache:
-                return None
-            
-            item = self.cache[key]
+            item = self.cache.get(key)
             
             # Check TTL
-            if item.get('expires_at') and datetime.now() > item['expires_at']:
+            if item is not None and item.expires_at is not None and time.monotonic() > item.expires_at:
                 self._remove_key(key)
-                return None
+                item = None
             
-            # Update access statistics
-            self.access_times[key] = time.time()
-            self.access_counts[key] = self.access_counts.get(key, 0) + 1
+            if self._counts_requests:
+                self.policy.record_request(key, hit=item is not None)
+            if item is None:
+                return None
             
-            return item['value']
+            self.policy.on_access(key)
+            return item.value
     
     def set(self, key: str, value: Any, ttl_seconds: Optional[int] = None) -> bool:
-        """Set item in memory cache."""
+        """
+        Set item in memory cache.
+        
+        Returns False when the item is too large to fit or when the TinyLFU
+        admission filter rejects it in favour of the current eviction victim.
+        """
+        item_size = estimate_size(value)
+        if item_size > self.max_size_bytes:
+            return False
+        
+        expires_at = time.monotonic() + ttl_seconds if ttl_seconds else None
+        
         with self.lock:
-            # Calculate item size
-            try:
-                item_size = len(pickle.dumps(value))
-            except Exception:
-                item_size = 1024  # Estimate
-            
-            # Evict items if necessary
-            while (len(self.cache) >= self.max_items or 
-                   self.current_size + item_size > self.max_size_bytes):
-                if not self._evict_one():
-                    break
-            
-            # Calculate expiration
-            expires_at = None
-            if ttl_seconds:
-                expires_at = datetime.now() + timedelta(seconds=ttl_seconds)
+            existing = self.cache.get(key)
+            if existing is not None:
+                self.current_size += item_size - existing.size
+                existing.value = value
+                existing.expires_at = expires_at
+                existing.size = item_size
+                self.policy.on_access(key)
+                self._evict_until_within_limits()
+                return True
+            
+            if self._counts_requests:
+                self.policy.record_insert(key)
+            
+            # Every victim must be displaceable before any of them is evicted
+            victims = self._victims_for(item_size)
+            if not all(self.policy.admit(key, victim) for victim in victims):
+                self.rejections += 1
+                return False
+            for victim in victims:
+                self._remove_key(victim)
+                self.evictions += 1
             
             # Store item
-            self.cache[key] = {
-                'value': value,
-                'expires_at': expires_at,
-                'size': item_size,
-                'created_at': datetime.now()
-            }
-            
-            self.access_times[key] = time.time()
-            self.access_counts[key] = 1
+            self.cache[key] = _CacheEntry(value, expires_at, item_size)
+            self.policy.on_insert(key)
             self.current_size += item_size
             
             return True
@@ -159,8 +195,7 @@ class MemoryCache:
         """Clear all items from memory cache."""
         with self.lock:
             self.cache.clear()
-            self.access_times.clear()
-            self.access_counts.clear()
+            self.policy.clear()
             self.current_size = 0
     
     def keys(self) -> List[str]:
@@ -177,28 +212,47 @@ class MemoryCache:
                 'size_bytes': self.current_size,
                 'max_size_bytes': self.max_size_bytes,
                 'utilization': len(self.cache) / self.max_items,
-                'size_utilization': self.current_size / self.max_size_bytes
+                'size_utilization': self.current_size / self.max_size_bytes,
+                'strategy': self.policy.name,
+                'evictions': self.evictions,
+                'rejections': self.rejections
             }
     
     def _remove_key(self, key: str) -> bool:
         """Remove key from cache."""
-        if key in self.cache:
-            item_size = self.cache[key]['size']
-            del self.cache[key]
-            self.access_times.pop(key, None)
-            self.access_counts.pop(key, None)
-            self.current_size -= item_size
-            return True
-        return False
+        item = self.cache.pop(key, None)
+        if item is None:
+            return False
+        self.policy.on_remove(key)
+        self.current_size -= item.size
+        return True
+    
+    def _victims_for(self, item_size: int) -> List[str]:
+        """Keys to evict, in policy order, to make room for a new item of item_size bytes."""
+        victims = []
+        items, size = len(self.cache), self.current_size
+        for victim in self.policy.victims():
+            if items < self.max_items and size + item_size <= self.max_size_bytes:
+                break
+            victims.append(victim)
+            items -= 1
+            size -= self.cache[victim].size
+        return victims
     
     def _evict_one(self) -> bool:
-        """Evict one item using LRU strategy."""
-        if not self.cache:
+        """Evict one item chosen by the configured eviction policy."""
+        victim = self.policy.victim()
+        if victim is None:
             return False
-        
-        # Find least recently used item
-        oldest_key = min(self.access_times.keys(), key=lambda k: self.access_times[k])
-        return self._remove_key(oldest_key)
+        self.evictions += 1
+        return self._remove_key(victim)
+    
+    def _evict_until_within_limits(self) -> None:
+        """Evict until item count and size budgets are respected."""
+        while (len(self.cache) > self.max_items or
+               self.current_size > self.max_size_bytes):
+            if not self._evict_one():
+                break
 
 
 class RedisCache:
@@ -369,7 +423,8 @@ class CacheService:
         # Initialize cache layers
         self.memory_cache = MemoryCache(
             max_items=self.config.max_memory_items,
-            max_size_mb=self.config.max_memory_size_mb
+            max_size_mb=self.config.max_memory_size_mb,
+            strategy=self.config.strategy
         )
         
         self.redis_cache = None
@@ -382,6 +437,10 @@ class CacheService:
             except Exception as e:
                 logger.warning(f"Redis cache initialization failed: {e}")
         
+        # Data versions for keys that must change when the underlying data does
+        self._versions: Dict[str, int] = {}
+        self._versions_lock = threading.Lock()
+        
         # Background refresh thread
         self.refresh_thread = None
         self.refresh_stop_event = threading.Event()
@@ -529,6 +588,28 @@ class CacheService:
         
         return count
     
+    def get_version(self, name: str) -> int:
+        """Current value of a data version counter (shared through Redis when available)."""
+        if self.redis_cache:
+            try:
+                value = self.redis_cache.redis_client.get(self.redis_cache._make_key(f"version:{name}"))
+                return int(value or 0)
+            except Exception as e:
+                logger.error(f"Redis version read error: {e}")
+        with self._versions_lock:
+            return self._versions.get(name, 0)
+    
+    def bump_version(self, name: str) -> int:
+        """Advance a data version counter so keys built on the old value are no longer used."""
+        if self.redis_cache:
+            try:
+                return int(self.redis_cache.redis_client.incr(self.redis_cache._make_key(f"version:{name}")))
+            except Exception as e:
+                logger.error(f"Redis version bump error: {e}")
+        with self._versions_lock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+            return self._versions[name]
+    
     def get_stats(self) -> Dict[str, Any]:
         """Get comprehensive cache statistics."""
         stats = {
@@ -545,7 +626,7 @@ class CacheService:
                 'hit_ratio': self.metrics.hit_ratio,
                 'operations': self.metrics.operations,
                 'avg_operation_time_ms': self.metrics.avg_operation_time_ms,
-                'evictions': self.metrics.evictions
+                'evictions': self.memory_cache.evictions
             },
             'memory_cache': self.memory_cache.stats(),
             'redis_cache': self.redis_cache.stats() if self.redis_cache else None
@@ -619,6 +700,7 @@ class CacheService:
         """Update cache metrics."""
         memory_stats = self.memory_cache.stats()
         self.metrics.memory_usage_bytes = memory_stats['size_bytes']
+        self.metrics.evictions = memory_stats['evictions']
 
 
 def cached(
@@ -666,6 +748,80 @@ def cached(
     return decorator
 
 
+class CachedResponse:
+    """A serialized JSON response body, its gzip encoding and ETag."""
+    
+    def __init__(self, body: bytes, mimetype: str, headers: List[tuple]):
+        self.body = body
+        self.gzipped = gzip.compress(body, 6) if len(body) >= RESPONSE_GZIP_MIN_BYTES else None
+        self.etag = hashlib.md5(body).hexdigest()
+        self.mimetype = mimetype
+        self.headers = headers
+
+
+def response_cache_key(versions: List[int]) -> str:
+    """Key for the current request: endpoint, normalized query args, tenant and data versions."""
+    parts = [
+        request.endpoint,
+        sorted(request.view_args.items()) if request.view_args else [],
+        sorted(request.args.items(multi=True)),
+        current_tenant_id(),
+        versions
+    ]
+    return f"response:{hashlib.md5(json.dumps(parts, default=str).encode()).hexdigest()}"
+
+
+def cached_response(
+    ttl_seconds: Optional[int] = None,
+    versions: tuple = (TRACES_VERSION,),
+    cache_service: Optional[CacheService] = None
+):
+    """
+    Cache a GET view's 200 JSON response and answer If-None-Match with 304.
+    
+    The key includes the data versions named in ``versions``, so bumping one
+    (on trace ingest) makes the next request recompute; the TTL bounds how
+    stale time-window results can get between bumps. The view's output must
+    not depend on the logged-in user. Place below the login decorator.
+    """
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET':
+                return func(*args, **kwargs)
+            
+            service = cache_service or default_cache_service
+            key = response_cache_key([service.get_version(name) for name in versions])
+            entry = service.get(key)
+            status = 'HIT'
+            if entry is None:
+                status = 'MISS'
+                response = current_app.make_response(func(*args, **kwargs))
+                if response.status_code != 200 or response.mimetype != 'application/json' or response.direct_passthrough:
+                    return response
+                headers = [(name, value) for name, value in response.headers.items()
+                           if name not in ('Content-Type', 'Content-Length')]
+                entry = CachedResponse(response.get_data(), response.mimetype, headers)
+                service.set(key, entry, ttl_seconds or RESPONSE_CACHE_TTL_SECONDS)
+            
+            if request.if_none_match.contains(entry.etag):
+                response = current_app.response_class(status=304)
+            elif entry.gzipped is not None and 'gzip' in request.accept_encodings:
+                response = current_app.response_class(entry.gzipped, mimetype=entry.mimetype, headers=entry.headers)
+                response.headers['Content-Encoding'] = 'gzip'
+            else:
+                response = current_app.response_class(entry.body, mimetype=entry.mimetype, headers=entry.headers)
+            
+            response.set_etag(entry.etag)
+            response.headers['Vary'] = 'Accept-Encoding'
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.headers['X-Response-Cache'] = status
+            return response
+        
+        return wrapper
+    return decorator
+
+
 # Global cache service instance
 cache_config = CacheConfig(
     level=CacheLevel.HYBRID,
@@ -7,16 +7,37 @@ Monitors the health and status of all Vertigo cloud services deployed on Google
 import requests
 import json
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 import os
 
+from requests.adapters import HTTPAdapter
+
+from app.services.latency_sketch import LatencySketch
+
 logger = logging.getLogger(__name__)
 
+# Background probe schedule; cached results older than the max age are reported as stale
+PROBE_INTERVAL_SECONDS = float(os.getenv('CLOUD_MONITOR_PROBE_INTERVAL_SECONDS', '60'))
+PROBE_MAX_AGE_SECONDS = float(os.getenv('CLOUD_MONITOR_MAX_AGE_SECONDS', '180'))
+BACKGROUND_PROBES = os.getenv('CLOUD_MONITOR_BACKGROUND_PROBES', 'true').lower() == 'true'
+
 class CloudServiceMonitor:
-    """Monitor for Vertigo cloud services."""
+    """
+    Monitor for Vertigo cloud services.
+    
+    Services are probed concurrently over one pooled HTTP session, so a
+    round takes as long as the slowest probe rather than the sum. A daemon
+    thread repeats the round every PROBE_INTERVAL_SECONDS and
+    check_all_services answers from the cached results, with their age and
+    per-service latency histograms.
+    """
     
-    def __init__(self):
+    def __init__(self, probe_interval_seconds: float = PROBE_INTERVAL_SECONDS,
+                 max_age_seconds: float = PROBE_MAX_AGE_SECONDS, background_probes: bool = BACKGROUND_PROBES):
         self.project_id = "vertigo-466116"
         self.region = "us-central1"
         self.services = {
@@ -42,6 +63,25 @@ class CloudServiceMonitor:
                 "expected_response_time": 45.0  # seconds
             }
         }
+        
+        self.probe_interval_seconds = probe_interval_seconds
+        self.max_age_seconds = max_age_seconds
+        self.background_probes = background_probes
+        
+        # One keep-alive connection pool shared by all probe threads
+        self._http = requests.Session()
+        self._http.mount('https://', HTTPAdapter(pool_maxsize=len(self.services)))
+        self._http.mount('http://', HTTPAdapter(pool_maxsize=len(self.services)))
+        self._http.headers["User-Agent"] = "Vertigo-Debug-Toolkit/1.0"
+        self._pool = ThreadPoolExecutor(max_workers=len(self.services), thread_name_prefix='CloudProbe')
+        
+        self._lock = threading.Lock()
+        self._round_lock = threading.Lock()
+        self._results: Dict[str, Dict] = {}
+        self._probed_at: Dict[str, float] = {}
+        self._latency: Dict[str, LatencySketch] = {key: LatencySketch() for key in self.services}
+        self._scheduler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
     
     def check_service_health(self, service_key: str) -> Dict:
         """Check health of a specific service."""
@@ -57,11 +97,7 @@ class CloudServiceMonitor:
             start_time = datetime.now()
             
             # Send a health check request
-            response = requests.get(
-                service["url"],
-                timeout=service["expected_response_time"],
-                headers={"User-Agent": "Vertigo-Debug-Toolkit/1.0"}
-            )
+            response = self._http.get(service["url"], timeout=service["expected_response_time"])
             
             end_time = datetime.now()
             response_time = (end_time - start_time).total_seconds()
@@ -127,25 +163,143 @@ class CloudServiceMonitor:
                 "last_check": datetime.now().isoformat()
             }
     
-    def check_all_services(self) -> Dict:
-        """Check health of all services."""
+    def probe_all_services(self, max_age_seconds: Optional[float] = None) -> Dict[str, Dict]:
+        """
+        Probe every service concurrently and cache the results.
+        
+        With max_age_seconds, a cache younger than that is returned instead;
+        a caller that waited on another thread's round then reuses its results.
+        """
+        with self._round_lock:
+            if max_age_seconds is not None:
+                with self._lock:
+                    if len(self._probed_at) == len(self.services) and \
+                            time.time() - min(self._probed_at.values()) <= max_age_seconds:
+                        return dict(self._results)
+            
+            results = dict(zip(self.services, self._pool.map(self.check_service_health, self.services)))
+            now = time.time()
+            with self._lock:
+                for service_key, result in results.items():
+                    self._results[service_key] = result
+                    self._probed_at[service_key] = now
+                    if "response_time" in result:
+                        self._latency[service_key].add(result["response_time"] * 1000)
+            return results
+    
+    def start(self):
+        """Start the background probe schedule (idempotent)."""
+        with self._lock:
+            if self._scheduler and self._scheduler.is_alive():
+                return
+            self._stop.clear()
+            self._scheduler = threading.Thread(target=self._probe_loop, name='CloudServiceMonitor', daemon=True)
+            self._scheduler.start()
+        logger.info(f"Cloud service probes scheduled every {self.probe_interval_seconds}s")
+    
+    def stop(self):
+        self._stop.set()
+        if self._scheduler:
+            self._scheduler.join(timeout=5)
+            self._scheduler = None
+    
+    def _probe_loop(self):
+        while not self._stop.is_set():
+            self._probe_round()
+            self._stop.wait(self.probe_interval_seconds)
+    
+    def _probe_round(self, max_age_seconds: Optional[float] = None):
+        try:
+            self.probe_all_services(max_age_seconds=max_age_seconds)
+        except Exception as e:
+            logger.error(f"Error probing cloud services: {e}")
+    
+    def _probe_in_background(self):
+        """Run one probe round on a daemon thread unless a round is already running."""
+        if self._round_lock.locked():
+            return
+        threading.Thread(target=self._probe_round, kwargs={"max_age_seconds": self.max_age_seconds},
+                         name='CloudServiceProbe', daemon=True).start()
+    
+    def get_latency_histograms(self) -> Dict[str, Dict]:
+        """Per-service probe latency quantiles (ms) and sketch bins since startup."""
+        with self._lock:
+            return {
+                service_key: {"count": sketch.count, **sketch.quantiles(), "bins": sketch.to_dict()}
+                for service_key, sketch in self._latency.items()
+            }
+    
+    def check_all_services(self, refresh: bool = False) -> Dict:
+        """
+        Health of all services from the probe cache.
+        
+        Probes synchronously (concurrently) only when asked to refresh. Until
+        the first round finishes, services are reported as "pending" and the
+        round runs in the background, so no request waits on a probe timeout.
+        The background schedule is normally started with the app; the first
+        call starts it otherwise, when enabled.
+        """
+        if self.background_probes:
+            self.start()
+        if refresh:
+            self.probe_all_services()
+        elif not self.background_probes:
+            with self._lock:
+                probed = len(self._results) == len(self.services)
+            if not probed:
+                self._probe_in_background()
+        
+        now = time.time()
         results = {}
         overall_status = "healthy"
         critical_services_down = 0
+        stale_services = 0
+        pending_services = 0
         
-        for service_key in self.services.keys():
-            result = self.check_service_health(service_key)
-            results[service_key] = result
-            
-            if result["status"] != "healthy" and result.get("critical", False):
-                critical_services_down += 1
-                overall_status = "unhealthy"
+        with self._lock:
+            for service_key, service in self.services.items():
+                sketch = self._latency[service_key]
+                if service_key not in self._results:
+                    results[service_key] = {
+                        "service": service_key,
+                        "name": service["name"],
+                        "status": "pending",
+                        "url": service["url"],
+                        "description": service["description"],
+                        "critical": service["critical"],
+                        "age_seconds": None,
+                        "stale": False,
+                        "latency_ms": {"count": sketch.count, **sketch.quantiles()}
+                    }
+                    pending_services += 1
+                    continue
+                
+                age = now - self._probed_at[service_key]
+                result = {
+                    **self._results[service_key],
+                    "age_seconds": round(age, 3),
+                    "stale": age > self.max_age_seconds,
+                    "latency_ms": {"count": sketch.count, **sketch.quantiles()}
+                }
+                results[service_key] = result
+                stale_services += result["stale"]
+                
+                if result["status"] != "healthy" and result.get("critical", False):
+                    critical_services_down += 1
+                    overall_status = "unhealthy"
+            last_probe = max(self._probed_at.values()) if self._probed_at else None
+        
+        if pending_services and overall_status == "healthy":
+            overall_status = "pending"
         
         return {
             "overall_status": overall_status,
             "critical_services_down": critical_services_down,
             "total_services": len(self.services),
+            "stale_services": stale_services,
+            "pending_services": pending_services,
             "services": results,
+            "last_probe": datetime.fromtimestamp(last_probe).isoformat() if last_probe else None,
             "timestamp": datetime.now().isoformat()
         }
     
@@ -261,4 +415,8 @@ class CloudServiceMonitor:
                 "timeout": "540s",
                 "max_instances": "10"
             }
-        } 
\ No newline at end of file
+        }
+
+
+# Global cloud service monitor (shares its probe cache across requests)
+cloud_monitor = CloudServiceMonitor()
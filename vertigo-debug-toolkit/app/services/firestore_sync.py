@@ -14,11 +14,18 @@ import time
 
 from google.cloud import firestore
 from google.api_core import exceptions as firestore_exceptions
+from google.cloud.firestore_v1.field_path import FieldPath
 from flask import current_app
 from app.models import db
 from app.models import Trace, Cost, User
+from app.services.cache_service import TRACES_VERSION, default_cache_service
+from app.services.metric_rollups import metric_rollup_service
+from app.services.tenant_scope import ingest_tenant_id
+from app.services.trace_stream import trace_stream
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError, DisconnectionError
-from sqlalchemy import text
+from sqlalchemy import text, bindparam, table, column, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
 from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
@@ -30,12 +37,35 @@ class SyncResult:
     records_processed: int = 0
     errors: List[str] = None
     metadata: Dict[str, Any] = None
+    duration_seconds: float = 0.0
     
     def __post_init__(self):
         if self.errors is None:
             self.errors = []
         if self.metadata is None:
             self.metadata = {}
+    
+    @property
+    def records_per_second(self) -> float:
+        """Sync throughput over the measured duration."""
+        if self.duration_seconds <= 0:
+            return 0.0
+        return self.records_processed / self.duration_seconds
+
+# Dialects that support multi-row INSERT ... ON CONFLICT DO UPDATE
+UPSERT_DIALECTS = {
+    'sqlite': sqlite_insert,
+    'postgresql': postgresql_insert
+}
+
+# Bound parameters per statement (SQLite builds before 3.32 cap this at 999)
+MAX_UPSERT_PARAMETERS = {
+    'sqlite': 900,
+    'postgresql': 30000
+}
+
+# Columns that keep their stored value when an existing trace is re-synced
+UPSERT_PRESERVED_COLUMNS = ('external_trace_id', 'created_at')
 
 class FirestoreSyncService:
     """
@@ -55,6 +85,11 @@ class FirestoreSyncService:
         self.batch_size = 100
         self.max_workers = 4
         
+        # Streaming sync pages through each collection with start_after cursors
+        # and checkpoints progress, instead of reading one capped window
+        self.streaming_sync = os.getenv('FIRESTORE_STREAMING_SYNC', 'true').lower() == 'true'
+        self.max_sync_duration_seconds = int(os.getenv('FIRESTORE_SYNC_MAX_SECONDS', '0')) or None
+        
         # Database connection management
         self.max_retries = 3
         self.retry_delay = 1.0
@@ -139,31 +174,34 @@ class FirestoreSyncService:
                         pass
                 raise e
     
+    def _get_data_source_id(self, session) -> int:
+        """Return the Firestore data source ID, creating the row if needed."""
+        ds_result = session.execute(
+            text("SELECT id FROM data_sources WHERE name = 'firestore' LIMIT 1")
+        ).fetchone()
+        
+        if not ds_result:
+            logger.warning("Firestore data source not found, creating it...")
+            session.execute(
+                text("""
+                INSERT INTO data_sources 
+                (name, source_type, connection_config, is_active, sync_enabled, sync_interval_minutes, created_at, updated_at)
+                VALUES ('firestore', 'firestore', '{}', 1, 1, 5, :now, :now)
+                """),
+                {"now": datetime.utcnow()}
+            )
+            session.commit()
+            ds_result = session.execute(
+                text("SELECT id FROM data_sources WHERE name = 'firestore' LIMIT 1")
+            ).fetchone()
+        
+        return ds_result[0]
+    
     def get_last_sync_timestamp(self, sync_type: str) -> datetime:
         """Get the last successful sync timestamp with proper connection management."""
         try:
             with self._database_session() as session:
-                # Get Firestore data source ID
-                ds_result = session.execute(
-                    text("SELECT id FROM data_sources WHERE name = 'firestore' LIMIT 1")
-                ).fetchone()
-                
-                if not ds_result:
-                    logger.warning("Firestore data source not found, creating it...")
-                    session.execute(
-                        text("""
-                        INSERT INTO data_sources 
-                        (name, source_type, connection_config, is_active, sync_enabled, sync_interval_minutes, created_at, updated_at)
-                        VALUES ('firestore', 'firestore', '{}', 1, 1, 5, :now, :now)
-                        """),
-                        {"now": datetime.utcnow()}
-                    )
-                    session.commit()
-                    ds_result = session.execute(
-                        text("SELECT id FROM data_sources WHERE name = 'firestore' LIMIT 1")
-                    ).fetchone()
-                
-                data_source_id = ds_result[0]
+                data_source_id = self._get_data_source_id(session)
                 
                 result = session.execute(
                     text("SELECT last_successful_sync FROM sync_status WHERE data_source_id = :ds_id AND sync_type = :type"),
@@ -186,27 +224,7 @@ class FirestoreSyncService:
         try:
             with self._database_session() as session:
                 current_time = datetime.utcnow()
-                
-                # Get or create Firestore data source ID
-                ds_result = session.execute(
-                    text("SELECT id FROM data_sources WHERE name = 'firestore' LIMIT 1")
-                ).fetchone()
-                
-                if not ds_result:
-                    session.execute(
-                        text("""
-                        INSERT INTO data_sources 
-                        (name, source_type, connection_config, is_active, sync_enabled, sync_interval_minutes, created_at, updated_at)
-                        VALUES ('firestore', 'firestore', '{}', 1, 1, 5, :now, :now)
-                        """),
-                        {"now": datetime.utcnow()}
-                    )
-                    session.commit()
-                    ds_result = session.execute(
-                        text("SELECT id FROM data_sources WHERE name = 'firestore' LIMIT 1")
-                    ).fetchone()
-                
-                data_source_id = ds_result[0]
+                data_source_id = self._get_data_source_id(session)
                 
                 # Check if sync status record exists
                 existing = session.execute(
@@ -268,6 +286,7 @@ class FirestoreSyncService:
         if not self.is_available():
             return SyncResult(False, errors=["Firestore client not available"])
         
+        started = time.perf_counter()
         try:
             self.update_sync_status('firestore', 'running')
             
@@ -275,38 +294,227 @@ class FirestoreSyncService:
             last_sync = self.get_last_sync_timestamp('firestore')
             logger.info(f"Starting Firestore sync from {last_sync}")
             
+            # Resolve the data source once for the whole run
+            with self._database_session() as session:
+                data_source_id = self._get_data_source_id(session)
+            
             total_processed = 0
             errors = []
+            metadata = {'inserted': 0, 'updated': 0, 'collections': {}}
             
             # Sync each configured collection
             for config_name, config in self.collection_configs.items():
                 try:
-                    result = self._sync_collection(config, last_sync)
+                    result = self._sync_collection(config, last_sync, data_source_id)
                     total_processed += result.records_processed
                     errors.extend(result.errors)
+                    metadata['inserted'] += result.metadata.get('inserted', 0)
+                    metadata['updated'] += result.metadata.get('updated', 0)
+                    metadata['collections'][config_name] = {
+                        'records_processed': result.records_processed,
+                        'records_per_second': round(result.records_per_second, 1)
+                    }
                     
                 except Exception as e:
                     error_msg = f"Error syncing collection {config_name}: {e}"
                     logger.error(error_msg)
                     errors.append(error_msg)
             
+            duration = time.perf_counter() - started
             if errors:
                 self.update_sync_status('firestore', 'error', total_processed, '; '.join(errors))
-                return SyncResult(False, total_processed, errors)
+                result = SyncResult(False, total_processed, errors, metadata, duration)
             else:
                 self.update_sync_status('firestore', 'success', total_processed)
-                return SyncResult(True, total_processed)
+                result = SyncResult(True, total_processed, metadata=metadata, duration_seconds=duration)
+            
+            result.metadata['records_per_second'] = round(result.records_per_second, 1)
+            logger.info(f"Firestore sync processed {total_processed} records "
+                        f"({result.records_per_second:.1f} records/s)")
+            return result
                 
         except Exception as e:
             error_msg = f"Firestore sync failed: {e}"
             logger.error(error_msg)
             self.update_sync_status('firestore', 'error', 0, error_msg)
-            return SyncResult(False, errors=[error_msg])
+            return SyncResult(False, errors=[error_msg], duration_seconds=time.perf_counter() - started)
     
-    def _sync_collection(self, config: Dict, since_timestamp: datetime) -> SyncResult:
+    def _sync_collection(self, config: Dict, since_timestamp: datetime,
+                         data_source_id: Optional[int] = None) -> SyncResult:
         """Sync a specific Firestore collection."""
+        if self.streaming_sync:
+            return self._stream_collection(config, since_timestamp, data_source_id)
+        return self._sync_collection_window(config, since_timestamp, data_source_id)
+    
+    def _stream_collection(self, config: Dict, since_timestamp: datetime,
+                           data_source_id: Optional[int] = None,
+                           sync_type: str = 'firestore') -> SyncResult:
+        """
+        Stream a collection page by page using start_after cursors.
+        
+        Only one page of batch_size documents is held in memory at a time.
+        After each committed page the cursor is checkpointed in
+        SyncStatus.sync_metadata, so a crashed or timed-out run resumes from
+        the last committed document instead of re-reading (or dropping) the
+        window. The checkpoint is cleared once the collection is drained.
+        """
+        collection_name = config['collection_name']
+        started = time.perf_counter()
+        deadline = started + self.max_sync_duration_seconds if self.max_sync_duration_seconds else None
+        
+        checkpoint = self._load_sync_checkpoint(sync_type, collection_name)
+        cursor = None
+        if checkpoint:
+            since_timestamp = self._parse_firestore_timestamp(checkpoint.get('since')) or since_timestamp
+            if checkpoint.get('doc_id'):
+                cursor = (self._parse_firestore_timestamp(checkpoint.get('timestamp')), checkpoint['doc_id'])
+            logger.info(f"Resuming {collection_name} sync from checkpoint {checkpoint}")
+        
+        processed = 0
+        pages = 0
+        errors = []
+        metadata = {'inserted': 0, 'updated': 0, 'pages': 0, 'completed': False}
+        
+        try:
+            for page, cursor in self._iter_collection_pages(config, since_timestamp, cursor):
+                batch_result = self._process_document_batch(page, config, data_source_id)
+                processed += batch_result.records_processed
+                errors.extend(batch_result.errors)
+                metadata['inserted'] += batch_result.metadata.get('inserted', 0)
+                metadata['updated'] += batch_result.metadata.get('updated', 0)
+                pages += 1
+                
+                if batch_result.records_processed == 0 and batch_result.errors:
+                    # Leave the checkpoint on the last good page so the batch is retried
+                    break
+                
+                self._save_sync_checkpoint(sync_type, collection_name, {
+                    'since': since_timestamp.isoformat(),
+                    'timestamp': cursor[0].isoformat() if cursor[0] else None,
+                    'doc_id': cursor[1]
+                })
+                
+                if deadline and time.perf_counter() > deadline:
+                    logger.info(f"Sync time budget reached for {collection_name}; "
+                                f"will resume from checkpoint after {cursor[1]}")
+                    break
+            else:
+                self._save_sync_checkpoint(sync_type, collection_name, None)
+                metadata['completed'] = True
+            
+            metadata['pages'] = pages
+            logger.info(f"Streamed {processed} documents from {collection_name} in {pages} pages")
+            return SyncResult(True, processed, errors, metadata, time.perf_counter() - started)
+            
+        except Exception as e:
+            logger.error(f"Error streaming collection {collection_name}: {e}")
+            metadata['pages'] = pages
+            return SyncResult(False, processed, errors + [str(e)], metadata, time.perf_counter() - started)
+    
+    def _iter_collection_pages(self, config: Dict, since_timestamp: datetime,
+                               cursor: Optional[Tuple[Optional[datetime], str]] = None):
+        """
+        Yield (documents, cursor) pages ordered by timestamp then document ID.
+        
+        The document ID tiebreaker keeps pagination exact when many documents
+        share a timestamp.
+        """
+        collection_name = config['collection_name']
+        timestamp_field = config['timestamp_field']
+        collection = self.client.collection(collection_name)
+        base_query = (collection
+                      .where(timestamp_field, '>=', since_timestamp)
+                      .order_by(timestamp_field)
+                      .order_by(FieldPath.document_id()))
+        
+        while True:
+            query = base_query
+            if cursor:
+                query = query.start_after([cursor[0], collection.document(cursor[1])])
+            
+            page = list(query.limit(self.batch_size).stream())
+            if not page:
+                return
+            
+            last_doc = page[-1]
+            cursor = (self._parse_firestore_timestamp(last_doc.get(timestamp_field)), last_doc.id)
+            yield page, cursor
+            
+            if len(page) < self.batch_size:
+                return
+    
+    def _load_sync_checkpoint(self, sync_type: str, collection_name: str) -> Optional[Dict[str, Any]]:
+        """Load the stored stream cursor for a collection, if any."""
+        try:
+            with self._database_session() as session:
+                data_source_id = self._get_data_source_id(session)
+                row = session.execute(
+                    text("SELECT sync_metadata FROM sync_status WHERE data_source_id = :ds_id AND sync_type = :type"),
+                    {"ds_id": data_source_id, "type": sync_type}
+                ).fetchone()
+        except Exception as e:
+            logger.warning(f"Could not load sync checkpoint for {collection_name}: {e}")
+            return None
+        
+        sync_metadata = self._decode_sync_metadata(row[0] if row else None)
+        return sync_metadata.get('checkpoints', {}).get(collection_name)
+    
+    def _save_sync_checkpoint(self, sync_type: str, collection_name: str,
+                              checkpoint: Optional[Dict[str, Any]]) -> None:
+        """Store (or clear, when checkpoint is None) the stream cursor for a collection."""
+        try:
+            with self._database_session() as session:
+                data_source_id = self._get_data_source_id(session)
+                row = session.execute(
+                    text("SELECT sync_metadata FROM sync_status WHERE data_source_id = :ds_id AND sync_type = :type"),
+                    {"ds_id": data_source_id, "type": sync_type}
+                ).fetchone()
+                if not row:
+                    logger.warning(f"No sync_status row for {sync_type}; checkpoint not saved")
+                    return
+                
+                sync_metadata = self._decode_sync_metadata(row[0])
+                checkpoints = sync_metadata.setdefault('checkpoints', {})
+                if checkpoint is None:
+                    checkpoints.pop(collection_name, None)
+                else:
+                    checkpoint['saved_at'] = datetime.utcnow().isoformat()
+                    checkpoints[collection_name] = checkpoint
+                
+                session.execute(
+                    text("""
+                    UPDATE sync_status SET sync_metadata = :metadata, updated_at = :now
+                    WHERE data_source_id = :ds_id AND sync_type = :type
+                    """),
+                    {
+                        "metadata": json.dumps(sync_metadata),
+                        "now": datetime.utcnow(),
+                        "ds_id": data_source_id,
+                        "type": sync_type
+                    }
+                )
+                session.commit()
+        except Exception as e:
+            logger.error(f"Error saving sync checkpoint for {collection_name}: {e}")
+    
+    def _decode_sync_metadata(self, value) -> Dict[str, Any]:
+        """Normalize sync_metadata read through raw SQL (JSON text or dict)."""
+        if not value:
+            return {}
+        if isinstance(value, dict):
+            return value
+        try:
+            decoded = json.loads(value)
+            return decoded if isinstance(decoded, dict) else {}
+        except (TypeError, ValueError):
+            return {}
+    
+    def _sync_collection_window(self, config: Dict, since_timestamp: datetime,
+                                data_source_id: Optional[int] = None) -> SyncResult:
+        """Sync a single capped window of a collection (non-streaming mode)."""
         collection_name = config['collection_name']
         timestamp_field = config['timestamp_field']
+        started = time.perf_counter()
         
         try:
             # Query Firestore for recent documents
@@ -320,55 +528,134 @@ class FirestoreSyncService:
             
             processed = 0
             errors = []
+            metadata = {'inserted': 0, 'updated': 0}
             
             # Process documents in batches
             for i in range(0, len(docs), self.batch_size):
                 batch_docs = docs[i:i + self.batch_size]
-                batch_result = self._process_document_batch(batch_docs, config)
+                batch_result = self._process_document_batch(batch_docs, config, data_source_id)
                 processed += batch_result.records_processed
                 errors.extend(batch_result.errors)
+                metadata['inserted'] += batch_result.metadata.get('inserted', 0)
+                metadata['updated'] += batch_result.metadata.get('updated', 0)
             
-            return SyncResult(True, processed, errors)
+            return SyncResult(True, processed, errors, metadata, time.perf_counter() - started)
             
         except Exception as e:
             logger.error(f"Error syncing collection {collection_name}: {e}")
-            return SyncResult(False, errors=[str(e)])
+            return SyncResult(False, errors=[str(e)], duration_seconds=time.perf_counter() - started)
     
-    def _process_document_batch(self, docs: List, config: Dict) -> SyncResult:
+    def _process_document_batch(self, docs: List, config: Dict,
+                                data_source_id: Optional[int] = None) -> SyncResult:
         """Process a batch of Firestore documents with proper transaction management."""
-        processed = 0
         errors = []
+        records = []
+        metadata = {'inserted': 0, 'updated': 0}
+        
+        for doc in docs:
+            try:
+                # Transform Firestore document to local format
+                records.append(self._transform_firestore_document(doc.id, doc.to_dict(), config))
+            except Exception as e:
+                error_msg = f"Error processing document {doc.id}: {e}"
+                logger.warning(error_msg)
+                errors.append(error_msg)
+        
+        if not records:
+            return SyncResult(True, 0, errors, metadata)
         
         try:
             with self._database_session() as session:
-                for doc in docs:
-                    try:
-                        doc_data = doc.to_dict()
-                        doc_id = doc.id
-                        
-                        # Transform Firestore document to local format
-                        local_record = self._transform_firestore_document(
-                            doc_id, doc_data, config
-                        )
-                        
-                        # Insert or update local record
-                        self._upsert_local_record_with_session(local_record, config, session)
-                        processed += 1
-                        
-                    except Exception as e:
-                        error_msg = f"Error processing document {doc.id}: {e}"
-                        logger.warning(error_msg)
-                        errors.append(error_msg)
-                
-                # Commit batch
+                if data_source_id is None:
+                    data_source_id = self._get_data_source_id(session)
+                tenant_id = ingest_tenant_id()
+                for record in records:
+                    record['data_source_id'] = data_source_id
+                    record['tenant_id'] = tenant_id
+                
+                inserted, updated = self._bulk_upsert_records(records, config, session)
                 session.commit()
+                default_cache_service.bump_version(TRACES_VERSION)
+                trace_stream.publish_many(records)
+                metadata['inserted'] = inserted
+                metadata['updated'] = updated
                 
         except Exception as e:
             error_msg = f"Error processing batch: {e}"
             logger.error(error_msg)
             errors.append(error_msg)
+            return SyncResult(True, 0, errors, metadata)
+        
+        return SyncResult(True, inserted + updated, errors, metadata)
+    
+    def _bulk_upsert_records(self, records: List[Dict], config: Dict, session) -> Tuple[int, int]:
+        """
+        Write a batch of transformed records to live_traces.
         
-        return SyncResult(True, processed, errors)
+        Existing rows are looked up with a single IN query, then records are
+        written with multi-row INSERT ... ON CONFLICT DO UPDATE. Null fields in
+        an incoming record never overwrite stored values, matching the
+        single-row update path. Dialects without upsert support fall back to
+        per-record writes.
+        
+        Returns:
+            Tuple of (inserted, updated) record counts
+        """
+        # Last write wins for duplicate IDs inside one batch
+        by_external_id = {record['external_trace_id']: record for record in records}
+        
+        existing_rows = session.execute(
+            text("SELECT external_trace_id, id, start_time FROM live_traces WHERE external_trace_id IN :ids")
+            .bindparams(bindparam('ids', expanding=True)),
+            {"ids": list(by_external_id)}
+        ).fetchall()
+        existing_ids = {row[0]: row[1] for row in existing_rows}
+        
+        # Rollup buckets touched by this batch, including ones traces move out of
+        touched_times = [row[2] for row in existing_rows]
+        touched_times.extend(record.get('start_time') for record in by_external_id.values())
+        
+        updated = sum(1 for external_id in by_external_id if external_id in existing_ids)
+        inserted = len(by_external_id) - updated
+        
+        dialect = session.get_bind().dialect.name
+        insert_factory = UPSERT_DIALECTS.get(dialect)
+        if insert_factory is None:
+            for external_id, record in by_external_id.items():
+                self._upsert_local_record_with_session(
+                    record, config, session, existing_id=existing_ids.get(external_id, 0)
+                )
+            metric_rollup_service.refresh_for_timestamps(touched_times, session)
+            return inserted, updated
+        
+        # Rows sharing a column set can go into one multi-row statement
+        now = datetime.utcnow()
+        groups: Dict[Tuple[str, ...], List[Dict]] = {}
+        for record in by_external_id.values():
+            row = dict(record, created_at=now, updated_at=now)
+            groups.setdefault(tuple(sorted(row)), []).append(row)
+        
+        for columns, rows in groups.items():
+            live_traces = table('live_traces', *[column(name) for name in columns])
+            stmt = insert_factory(live_traces)
+            update_set = {
+                name: func.coalesce(stmt.excluded[name], live_traces.c[name])
+                for name in columns if name not in UPSERT_PRESERVED_COLUMNS
+            }
+            update_set['updated_at'] = stmt.excluded['updated_at']
+            
+            rows_per_statement = max(1, MAX_UPSERT_PARAMETERS[dialect] // len(columns))
+            for i in range(0, len(rows), rows_per_statement):
+                chunk = rows[i:i + rows_per_statement]
+                session.execute(
+                    stmt.values(chunk).on_conflict_do_update(
+                        index_elements=['external_trace_id'],
+                        set_=update_set
+                    )
+                )
+        
+        metric_rollup_service.refresh_for_timestamps(touched_times, session)
+        return inserted, updated
     
     def _transform_firestore_document(self, doc_id: str, doc_data: Dict, 
                                     config: Dict) -> Dict:
@@ -454,36 +741,29 @@ class FirestoreSyncService:
         with self._database_session() as session:
             self._upsert_local_record_with_session(record, config, session)
     
-    def _upsert_local_record_with_session(self, record: Dict, config: Dict, session):
-        """Insert or update local database record with provided session."""
+    def _upsert_local_record_with_session(self, record: Dict, config: Dict, session,
+                                          existing_id: Optional[int] = None):
+        """
+        Insert or update local database record with provided session.
+        
+        Pass existing_id (0 for "known missing") when the caller has already
+        looked the record up, to skip the per-record existence query.
+        """
         try:
-            # Get Firestore data source ID
-            ds_result = session.execute(
-                text("SELECT id FROM data_sources WHERE name = 'firestore' LIMIT 1")
-            ).fetchone()
-            
-            if not ds_result:
-                session.execute(
-                    text("""
-                    INSERT INTO data_sources 
-                    (name, source_type, connection_config, is_active, sync_enabled, sync_interval_minutes, created_at, updated_at)
-                    VALUES ('firestore', 'firestore', '{}', 1, 1, 5, :now, :now)
-                    """),
-                    {"now": datetime.utcnow()}
-                )
-                session.commit()
-                ds_result = session.execute(
-                    text("SELECT id FROM data_sources WHERE name = 'firestore' LIMIT 1")
-                ).fetchone()
-            
-            record['data_source_id'] = ds_result[0]
+            if record.get('data_source_id') is None:
+                record['data_source_id'] = self._get_data_source_id(session)
+            if record.get('tenant_id') is None:
+                record['tenant_id'] = ingest_tenant_id()
             
             # Check if record exists
             external_id = record['external_trace_id']
-            existing = session.execute(
-                text("SELECT id FROM live_traces WHERE external_trace_id = :id"),
-                {"id": external_id}
-            ).fetchone()
+            if existing_id is None:
+                existing = session.execute(
+                    text("SELECT id FROM live_traces WHERE external_trace_id = :id"),
+                    {"id": external_id}
+                ).fetchone()
+            else:
+                existing = (existing_id,) if existing_id else None
             
             if existing:
                 # Update existing record
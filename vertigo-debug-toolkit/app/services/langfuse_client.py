@@ -6,18 +6,45 @@ import os
 import logging
 import json
 import requests
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Any, Set, Tuple
 from dotenv import load_dotenv
 from langfuse import Langfuse
+from sqlalchemy import insert, select
 from app import db
-from app.models import Trace, Cost, Prompt
+from app.models import Trace, Cost, Prompt, DataSource, SyncStatus
+from app.services.cache_service import TRACES_VERSION, default_cache_service
+from app.services.tenant_scope import ingest_tenant_id
 
 # Load environment variables
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Public API page size (Langfuse caps limit at 100), pages fetched ahead while one is written,
+# and how far back the first sync reaches
+SYNC_PAGE_SIZE = int(os.getenv('LANGFUSE_SYNC_PAGE_SIZE', '100'))
+SYNC_PREFETCH_PAGES = int(os.getenv('LANGFUSE_SYNC_PREFETCH_PAGES', '4'))
+SYNC_LOOKBACK_HOURS = int(os.getenv('LANGFUSE_SYNC_LOOKBACK_HOURS', '24'))
+
+SYNC_TYPE = 'langfuse_traces'
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Langfuse ISO timestamp as naive UTC, like the rest of the database."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _format_timestamp(value: datetime) -> str:
+    return value.isoformat(timespec='milliseconds') + 'Z'
+
 class LangfuseClient:
     """Client for interacting with Langfuse API."""
     
@@ -176,45 +203,222 @@ class LangfuseClient:
             logger.error(f"Error getting metrics: {e}")
             return {}
     
-    def sync_traces_to_db(self, limit: int = 1000) -> int:
-        """Sync traces from Langfuse to local database."""
+    def sync_traces_to_db(self, limit: Optional[int] = None) -> int:
+        """
+        Incrementally sync traces and their generation costs to the local database.
+        
+        Each stream (traces, then generations) is read in ascending time order
+        from a watermark stored in SyncStatus.sync_metadata, SYNC_PREFETCH_PAGES
+        pages ahead of the page being written. Per page there is one ``IN``
+        query for existing/parent traces and one bulk insert, and the
+        watermark is committed with the page, so an interrupted run resumes
+        where it stopped. ``limit`` caps the traces read in this run; the
+        generations stream stops at the first generation whose trace may
+        still arrive, so its cost is written by a later run.
+        
+        Returns the number of new traces.
+        """
         try:
-            traces = self.get_traces(limit=limit)
-            synced_count = 0
+            sync_status = self._get_sync_status()
+            watermarks = dict((sync_status.sync_metadata or {}).get('watermarks', {}))
+            counts = {'traces': 0, 'costs': 0, 'pages': 0}
             
-            for trace_data in traces.data:
-                # Check if trace already exists
-                existing_trace = Trace.query.filter_by(trace_id=trace_data.id).first()
-                if existing_trace:
-                    continue
+            with requests.Session() as http:
+                http.auth = (self.public_key or '', self.secret_key or '')
                 
-                # Create new trace record
-                trace = Trace(
-                    trace_id=trace_data.id,
-                    name=trace_data.name,
-                    status=trace_data.status,
-                    start_time=datetime.fromisoformat(trace_data.timestamp.replace('Z', '+00:00')),
-                    end_time=datetime.fromisoformat(trace_data.end_time.replace('Z', '+00:00')) if trace_data.end_time else None,
-                    duration_ms=trace_data.latency or 0,
-                    trace_metadata=trace_data.metadata or {},
-                    error_message=trace_data.error or '',
-                    vertigo_operation=trace_data.metadata.get('operation') if trace_data.metadata else None,
-                    project=trace_data.metadata.get('project') if trace_data.metadata else None,
-                    meeting_id=trace_data.metadata.get('meeting_id') if trace_data.metadata else None
-                )
-                
-                db.session.add(trace)
-                synced_count += 1
-            
+                for stream, path, params, write_page in (
+                    ('traces', '/api/public/traces', {'orderBy': 'timestamp.asc'}, self._insert_new_traces),
+                    ('generations', '/api/public/observations', {'type': 'GENERATION', 'orderBy': 'startTime.asc'},
+                     lambda items: self._insert_new_costs(items, watermarks['traces'])),
+                ):
+                    watermark = watermarks.get(stream) or {
+                        'timestamp': _format_timestamp(datetime.utcnow() - timedelta(hours=SYNC_LOOKBACK_HOURS)),
+                        'ids': []
+                    }
+                    time_param = 'fromTimestamp' if stream == 'traces' else 'fromStartTime'
+                    time_field = 'timestamp' if stream == 'traces' else 'startTime'
+                    read = 0
+                    
+                    for items in self._iter_api_pages(http, path, {**params, time_param: watermark['timestamp']}):
+                        # fromTimestamp is inclusive: skip what was already written at the watermark
+                        seen = set(watermark['ids'])
+                        items = [item for item in items if item['id'] not in seen]
+                        if limit is not None and stream == 'traces':
+                            items = items[:limit - read]
+                        read += len(items)
+                        
+                        written, consumed = write_page(items)
+                        counts['traces' if stream == 'traces' else 'costs'] += written
+                        watermark = self._advance_watermark(watermark, consumed, time_field)
+                        watermarks[stream] = watermark
+                        sync_status.sync_metadata = {**(sync_status.sync_metadata or {}), 'watermarks': dict(watermarks)}
+                        db.session.commit()
+                        counts['pages'] += 1
+                        
+                        if len(consumed) < len(items) or (limit is not None and stream == 'traces' and read >= limit):
+                            break
+            
+            now = datetime.utcnow()
+            sync_status.last_sync_timestamp = now
+            sync_status.last_successful_sync = now
+            sync_status.sync_status = 'success'
+            sync_status.records_processed = counts['traces'] + counts['costs']
+            sync_status.consecutive_failures = 0
+            sync_status.error_message = None
             db.session.commit()
-            logger.info(f"Synced {synced_count} traces to database")
-            return synced_count
+            if counts['traces'] or counts['costs']:
+                default_cache_service.bump_version(TRACES_VERSION)
+            
+            logger.info(f"Synced {counts['traces']} traces and {counts['costs']} costs "
+                        f"from {counts['pages']} pages to database")
+            return counts['traces']
             
         except Exception as e:
             logger.error(f"Error syncing traces: {e}")
             db.session.rollback()
             return 0
     
+    def _get_sync_status(self) -> SyncStatus:
+        """The SyncStatus row holding the sync watermarks (created on first sync)."""
+        data_source = DataSource.query.filter_by(name='langfuse').first()
+        if data_source is None:
+            data_source = DataSource(name='langfuse', source_type='langfuse',
+                                     connection_config={'host': self.host}, sync_interval_minutes=5)
+            db.session.add(data_source)
+            db.session.flush()
+        
+        sync_status = SyncStatus.query.filter_by(data_source_id=data_source.id, sync_type=SYNC_TYPE).first()
+        if sync_status is None:
+            sync_status = SyncStatus(data_source_id=data_source.id, sync_type=SYNC_TYPE,
+                                     last_sync_timestamp=datetime.utcnow(), sync_metadata={})
+            db.session.add(sync_status)
+            db.session.commit()
+        return sync_status
+    
+    def _get_api_page(self, http: requests.Session, path: str, params: Dict[str, Any], page: int) -> Dict[str, Any]:
+        response = http.get(f"{self.host}{path}", params={**params, 'page': page, 'limit': SYNC_PAGE_SIZE},
+                            timeout=30)
+        response.raise_for_status()
+        return response.json()
+    
+    def _iter_api_pages(self, http: requests.Session, path: str,
+                        params: Dict[str, Any]) -> Iterator[List[Dict[str, Any]]]:
+        """Yield the items of each page in order while the next pages are fetched concurrently."""
+        first = self._get_api_page(http, path, params, 1)
+        yield first.get('data', [])
+        
+        total_pages = first.get('meta', {}).get('totalPages', 1)
+        if total_pages <= 1:
+            return
+        
+        pool = ThreadPoolExecutor(max_workers=SYNC_PREFETCH_PAGES, thread_name_prefix='LangfusePrefetch')
+        try:
+            pending = deque()
+            next_page = 2
+            while next_page <= total_pages or pending:
+                while next_page <= total_pages and len(pending) < SYNC_PREFETCH_PAGES:
+                    pending.append(pool.submit(self._get_api_page, http, path, params, next_page))
+                    next_page += 1
+                yield pending.popleft().result().get('data', [])
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+    
+    def _advance_watermark(self, watermark: Dict[str, Any], items: List[Dict[str, Any]],
+                           time_field: str) -> Dict[str, Any]:
+        """Latest timestamp written, plus the ids written at exactly that timestamp."""
+        current = _parse_timestamp(watermark['timestamp'])
+        ids: Set[str] = set(watermark['ids'])
+        for item in items:
+            timestamp = _parse_timestamp(item.get(time_field))
+            if timestamp is None or timestamp < current:
+                continue
+            if timestamp > current:
+                current, ids = timestamp, set()
+            ids.add(item['id'])
+        return {'timestamp': _format_timestamp(current), 'ids': sorted(ids)}
+    
+    def _insert_new_traces(self, items: List[Dict[str, Any]]) -> Tuple[int, List[Dict[str, Any]]]:
+        """Bulk-insert the traces of a page that are not stored yet; returns (inserted, items consumed)."""
+        if not items:
+            return 0, items
+        
+        existing = set(db.session.scalars(
+            select(Trace.trace_id).where(Trace.trace_id.in_([item['id'] for item in items]))
+        ))
+        rows = []
+        for item in items:
+            if item['id'] in existing:
+                continue
+            existing.add(item['id'])
+            
+            metadata = item.get('metadata') if isinstance(item.get('metadata'), dict) else {}
+            start_time = _parse_timestamp(item['timestamp'])
+            # Langfuse reports latency in seconds
+            duration_ms = int((item.get('latency') or 0) * 1000)
+            rows.append({
+                'trace_id': item['id'],
+                'name': item.get('name') or 'unnamed',
+                'status': item.get('status') or metadata.get('status') or 'success',
+                'start_time': start_time,
+                'end_time': start_time + timedelta(milliseconds=duration_ms) if duration_ms else None,
+                'duration_ms': duration_ms,
+                'trace_metadata': metadata,
+                'error_message': item.get('error') or '',
+                'vertigo_operation': metadata.get('operation'),
+                'project': metadata.get('project'),
+                'meeting_id': metadata.get('meeting_id')
+            })
+        
+        if rows:
+            db.session.execute(insert(Trace), rows)
+        return len(rows), items
+    
+    def _insert_new_costs(self, items: List[Dict[str, Any]],
+                          traces_watermark: Dict[str, Any]) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Bulk-insert a Cost row per generation of a page whose trace is stored locally.
+        
+        Stops at the first generation without a local trace that is not older
+        than the traces watermark: its trace can still be synced, so it and
+        everything after it are left for the next run. Returns (inserted,
+        items consumed).
+        """
+        trace_ids = {item.get('traceId') for item in items if item.get('traceId')}
+        local_ids = dict(db.session.execute(
+            select(Trace.trace_id, Trace.id).where(Trace.trace_id.in_(trace_ids))
+        ).all()) if trace_ids else {}
+        traces_until = _parse_timestamp(traces_watermark['timestamp'])
+        tenant_id = ingest_tenant_id()
+        rows = []
+        for position, item in enumerate(items):
+            trace_id = local_ids.get(item.get('traceId'))
+            if trace_id is None:
+                started = _parse_timestamp(item.get('startTime'))
+                if item.get('traceId') and started is not None and started >= traces_until:
+                    items = items[:position]
+                    break
+                continue
+            
+            usage = item.get('usage') or {}
+            input_tokens = int(usage.get('input') or item.get('promptTokens') or 0)
+            output_tokens = int(usage.get('output') or item.get('completionTokens') or 0)
+            model = item.get('model') or 'unknown'
+            cost = item.get('calculatedTotalCost')
+            rows.append({
+                'trace_id': trace_id,
+                'model': model,
+                'input_tokens': input_tokens,
+                'output_tokens': output_tokens,
+                'total_tokens': int(usage.get('total') or input_tokens + output_tokens),
+                'cost_usd': cost if cost is not None else self._calculate_cost(model, input_tokens, output_tokens),
+                'timestamp': _parse_timestamp(item.get('startTime')) or datetime.utcnow(),
+                'tenant_id': tenant_id
+            })
+        
+        if rows:
+            db.session.execute(insert(Cost), rows)
+        return len(rows), items
+    
     def sync_prompts_to_db(self) -> int:
         """Sync prompts from Langfuse to local database."""
         try:
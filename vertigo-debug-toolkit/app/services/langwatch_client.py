@@ -11,6 +11,8 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from dotenv import load_dotenv
 
+from app.services.latency_sketch import LatencySketch
+
 # Load environment variables
 load_dotenv()
 
@@ -201,10 +203,17 @@ class LangWatchClient:
             time_series = []
             for hour, latencies in sorted(hourly_data.items()):
                 avg_latency = sum(latencies) / len(latencies) if latencies else 0
+                sketch = LatencySketch()
+                for latency in latencies:
+                    sketch.add(latency)
+                percentiles = sketch.quantiles()
                 time_series.append({
                     'time': hour + ':00:00Z',
                     'latency_avg': round(avg_latency, 2),
-                    'latency_p95': round(max(latencies) * 0.95, 2) if latencies else 0,
+                    'latency_p50': percentiles['p50'] or 0,
+                    'latency_p90': percentiles['p90'] or 0,
+                    'latency_p95': percentiles['p95'] or 0,
+                    'latency_p99': percentiles['p99'] or 0,
                     'trace_count': len(latencies)
                 })
             
@@ -0,0 +1,93 @@
+"""
+Mergeable latency quantile sketch (DDSketch).
+
+Values are counted in logarithmic bins: bin ``i`` holds values in
+(gamma^(i-1), gamma^i] with gamma = (1 + alpha) / (1 - alpha), so every
+quantile is reported within a relative error of alpha. Sketches merge by
+adding bin counts, which lets per-bucket sketches be combined across time
+buckets, data sources and models. The bin index is simple enough to compute
+in SQL (see metric_rollups), so raw durations never have to leave the
+database.
+"""
+
+import math
+from typing import Dict, Iterable, Optional, Tuple
+
+# Relative accuracy of reported quantiles (1%)
+SKETCH_RELATIVE_ACCURACY = 0.01
+
+SKETCH_GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+SKETCH_LN_GAMMA = math.log(SKETCH_GAMMA)
+
+# Quantiles reported by the dashboard APIs
+DEFAULT_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+def sketch_index(value: float) -> int:
+    """Bin index for a latency; values below 1ms share the 1ms bin."""
+    return int(math.ceil(math.log(max(value, 1.0)) / SKETCH_LN_GAMMA))
+
+
+def bin_value(index: int) -> float:
+    """Representative value of a bin (relative error <= alpha for its members)."""
+    return 2 * SKETCH_GAMMA ** index / (SKETCH_GAMMA + 1)
+
+
+def quantile_key(q: float) -> str:
+    """Response key for a quantile, e.g. 0.95 -> 'p95', 0.999 -> 'p99.9'."""
+    return f"p{q * 100:g}"
+
+
+class LatencySketch:
+    """
+    DDSketch over positive latencies in milliseconds.
+
+    Bins are a sparse {index: count} mapping, which is also the JSON form
+    stored on metric rollup rows.
+    """
+
+    __slots__ = ('bins', 'count')
+
+    def __init__(self, bins: Optional[Dict[int, int]] = None):
+        self.bins: Dict[int, int] = {}
+        self.count = 0
+        if bins:
+            self.merge_bins(bins.items())
+
+    def add(self, value: float, count: int = 1) -> None:
+        index = sketch_index(value)
+        self.bins[index] = self.bins.get(index, 0) + count
+        self.count += count
+
+    def merge_bins(self, bins: Iterable[Tuple[int, int]]) -> None:
+        """Add (index, count) pairs, e.g. rows from a grouped SQL query."""
+        for index, count in bins:
+            index, count = int(index), int(count)
+            self.bins[index] = self.bins.get(index, 0) + count
+            self.count += count
+
+    def merge(self, other: 'LatencySketch') -> None:
+        self.merge_bins(other.bins.items())
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Value at quantile q (0..1), or None for an empty sketch."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return bin_value(index)
+        return bin_value(max(self.bins))
+
+    def quantiles(self, qs: Iterable[float] = DEFAULT_QUANTILES) -> Dict[str, Optional[float]]:
+        """Quantiles keyed like {'p50': ..., 'p95': ...}, rounded to 0.01ms."""
+        result = {}
+        for q in qs:
+            value = self.quantile(q)
+            result[quantile_key(q)] = round(value, 2) if value is not None else None
+        return result
+
+    def to_dict(self) -> Dict[str, int]:
+        return {str(index): count for index, count in self.bins.items()}
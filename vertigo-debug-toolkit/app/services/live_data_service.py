@@ -16,6 +16,8 @@ from app.models import db
 from sqlalchemy import text, func
 from app.services.langwatch_client import langwatch_client
 from app.services.firestore_sync import firestore_sync_service
+from app.services.metric_rollups import metric_rollup_service
+from app.services.tenant_scope import tenant_text
 
 logger = logging.getLogger(__name__)
 
@@ -122,6 +124,10 @@ class LiveDataService:
             db_metrics = self._get_database_metrics(start_time, end_time, hours)
             if db_metrics['total_traces'] > 0:
                 source_metrics.append(('database', db_metrics))
+                # Percentiles come from the database's latency sketches; other
+                # sources only report averages and cannot be merged in
+                aggregated_metrics['latency_percentiles'] = db_metrics['latency_percentiles']
+                aggregated_metrics['model_latency_percentiles'] = db_metrics['model_latency_percentiles']
         
         if self.available_sources.get('langwatch', False):
             lw_metrics = self._get_langwatch_metrics(hours)
@@ -182,32 +188,27 @@ class LiveDataService:
         return aggregated_metrics
     
     def _get_database_metrics(self, start_time: datetime, end_time: datetime, hours: int) -> Dict[str, Any]:
-        """Get metrics from local live_traces database."""
+        """Get metrics from local live_traces database (served from metric rollups)."""
         try:
-            # Query live traces within time window
-            result = db.session.execute(
-                text("""
-                SELECT 
-                    COUNT(*) as total_traces,
-                    SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END) as success_count,
-                    SUM(CASE WHEN status IN ('error', 'failed') THEN 1 ELSE 0 END) as error_count,
-                    AVG(duration_ms) as avg_latency,
-                    SUM(cost_usd) as total_cost,
-                    MAX(start_time) as latest_trace_time
-                FROM live_traces 
-                WHERE start_time >= :start_time 
-                AND start_time <= :end_time
-                """),
-                {"start_time": start_time, "end_time": end_time}
-            ).fetchone()
+            totals = metric_rollup_service.window_totals(start_time, end_time)
             
-            if result and result[0] > 0:
-                total_traces = result[0] or 0
-                success_count = result[1] or 0
-                error_count = result[2] or 0
-                avg_latency = result[3] or 0.0
-                total_cost = result[4] or 0.0
-                latest_trace_time = result[5]
+            if totals['total_traces'] > 0:
+                total_traces = totals['total_traces']
+                success_count = totals['success_count']
+                error_count = totals['error_count']
+                avg_latency = self._average_latency(totals)
+                total_cost = totals['total_cost']
+                latest_trace_time = db.session.execute(
+                    tenant_text("""
+                    SELECT start_time FROM live_traces 
+                    WHERE start_time >= :start_time 
+                    AND start_time <= :end_time
+                    ORDER BY start_time DESC 
+                    LIMIT 1
+                    """),
+                    {"start_time": start_time, "end_time": end_time}
+                ).scalar()
+                percentiles = metric_rollup_service.window_quantiles(start_time, end_time)
                 
                 return {
                     'total_traces': total_traces,
@@ -216,6 +217,8 @@ class LiveDataService:
                     'success_rate': round((success_count / total_traces) * 100, 2) if total_traces > 0 else 0,
                     'error_rate': round((error_count / total_traces) * 100, 2) if total_traces > 0 else 0,
                     'avg_latency_ms': round(avg_latency, 2),
+                    'latency_percentiles': percentiles,
+                    'model_latency_percentiles': metric_rollup_service.model_quantiles(start_time, end_time),
                     'total_cost': round(total_cost, 4),
                     'period_hours': hours,
                     'latest_trace_time': self._parse_datetime(latest_trace_time).isoformat() if latest_trace_time else None,
@@ -294,30 +297,15 @@ class LiveDataService:
     def _get_firestore_metrics(self, start_time: datetime, end_time: datetime, hours: int) -> Dict[str, Any]:
         """Get metrics specifically from Firestore synced data."""
         try:
-            # Query only Firestore-sourced data
-            result = db.session.execute(
-                text("""
-                SELECT 
-                    COUNT(*) as total_traces,
-                    SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END) as success_count,
-                    SUM(CASE WHEN status IN ('error', 'failed') THEN 1 ELSE 0 END) as error_count,
-                    AVG(duration_ms) as avg_latency,
-                    SUM(cost_usd) as total_cost
-                FROM live_traces lt
-                JOIN data_sources ds ON lt.data_source_id = ds.id
-                WHERE ds.name = 'firestore'
-                AND lt.start_time >= :start_time 
-                AND lt.start_time <= :end_time
-                """),
-                {"start_time": start_time, "end_time": end_time}
-            ).fetchone()
+            totals = metric_rollup_service.window_totals(start_time, end_time, data_source='firestore')
             
-            if result and result[0] > 0:
-                total_traces = result[0] or 0
-                success_count = result[1] or 0
-                error_count = result[2] or 0
-                avg_latency = result[3] or 0.0
-                total_cost = result[4] or 0.0
+            if totals['total_traces'] > 0:
+                total_traces = totals['total_traces']
+                success_count = totals['success_count']
+                error_count = totals['error_count']
+                avg_latency = self._average_latency(totals)
+                total_cost = totals['total_cost']
+                percentiles = metric_rollup_service.window_quantiles(start_time, end_time, data_source='firestore')
                 
                 return {
                     'total_traces': total_traces,
@@ -326,6 +314,7 @@ class LiveDataService:
                     'success_rate': round((success_count / total_traces) * 100, 2) if total_traces > 0 else 0,
                     'error_rate': round((error_count / total_traces) * 100, 2) if total_traces > 0 else 0,
                     'avg_latency_ms': round(avg_latency, 2),
+                    'latency_percentiles': percentiles,
                     'total_cost': round(total_cost, 4),
                     'period_hours': hours,
                     'is_live': firestore_sync_service.is_available(),
@@ -398,36 +387,25 @@ class LiveDataService:
             return langwatch_client._generate_demo_latency_series(hours)
     
     def _get_database_latency_series(self, hours: int) -> List[Dict]:
-        """Get latency time series from database."""
+        """Get latency time series from database (hourly metric rollups)."""
         try:
             end_time = datetime.utcnow()
             start_time = end_time - timedelta(hours=hours)
             
-            # Group by hour and calculate metrics
-            result = db.session.execute(
-                text("""
-                SELECT 
-                    strftime('%Y-%m-%dT%H:00:00Z', start_time) as hour_bucket,
-                    AVG(duration_ms) as avg_latency,
-                    MAX(duration_ms) as max_latency,
-                    COUNT(*) as trace_count
-                FROM live_traces 
-                WHERE start_time >= :start_time 
-                AND start_time <= :end_time
-                AND duration_ms IS NOT NULL
-                GROUP BY strftime('%Y-%m-%dT%H:00:00Z', start_time)
-                ORDER BY hour_bucket
-                """),
-                {"start_time": start_time, "end_time": end_time}
-            ).fetchall()
+            buckets = metric_rollup_service.series(start_time, end_time, period='hour')
             
             time_series = []
-            for row in result:
+            for bucket in buckets:
+                if not bucket['latency_count']:
+                    continue
                 time_series.append({
-                    'time': row[0],
-                    'latency_avg': round(row[1] or 0, 2),
-                    'latency_p95': round((row[2] or 0) * 0.95, 2),  # Approximation
-                    'trace_count': row[3] or 0
+                    'time': bucket['period_start'].strftime('%Y-%m-%dT%H:00:00Z'),
+                    'latency_avg': round(bucket['avg_latency_ms'], 2),
+                    'latency_p50': bucket['p50'],
+                    'latency_p90': bucket['p90'],
+                    'latency_p95': bucket['p95'],
+                    'latency_p99': bucket['p99'],
+                    'trace_count': bucket['latency_count']
                 })
             
             # Fill in missing hours with zero values if needed
@@ -444,7 +422,10 @@ class LiveDataService:
                         filled_series.append({
                             'time': hour_key,
                             'latency_avg': 0,
+                            'latency_p50': 0,
+                            'latency_p90': 0,
                             'latency_p95': 0,
+                            'latency_p99': 0,
                             'trace_count': 0
                         })
                     current_time += timedelta(hours=1)
@@ -475,7 +456,7 @@ class LiveDataService:
         """Get recent traces from local database."""
         try:
             result = db.session.execute(
-                text("""
+                tenant_text("""
                 SELECT 
                     external_trace_id,
                     name,
@@ -511,6 +492,12 @@ class LiveDataService:
             logger.error(f"Error getting traces from database: {e}")
             return langwatch_client._generate_demo_traces(limit)
     
+    def _average_latency(self, totals: Dict[str, Any]) -> float:
+        """Mean latency over traces that reported a duration."""
+        if not totals['latency_count']:
+            return 0.0
+        return totals['latency_sum_ms'] / totals['latency_count']
+    
     def _parse_datetime(self, date_value: Any) -> datetime:
         """Parse datetime from various formats (string, datetime object)."""
         if isinstance(date_value, datetime):
@@ -535,7 +522,7 @@ class LiveDataService:
             # Database status
             if self.available_sources.get('database', False):
                 try:
-                    count = db.session.execute(text("SELECT COUNT(*) FROM live_traces")).fetchone()[0]
+                    count = db.session.execute(tenant_text("SELECT COUNT(*) FROM live_traces")).fetchone()[0]
                     source_statuses['database'] = {
                         'available': True,
                         'total_traces': count,
@@ -0,0 +1,718 @@
+"""
+Metric Rollup Service for Live Data Dashboards
+Maintains minute, hour and day rollups of live_traces in performance_metrics.
+
+Ingest paths report the start times of the traces they wrote; the affected
+minute buckets are recomputed from live_traces and the hour and day buckets
+above them from the minute rows, inside the ingest transaction. Recomputing
+a bucket is idempotent, so re-synced or updated traces never double count.
+
+Window queries combine whole day, hour and minute rollups and only scan raw
+rows for the partial minutes at either edge of the window.
+
+Rollup rows are kept per data source and model and carry a DDSketch of their
+latencies (see latency_sketch). Sketch bins are computed and merged in SQL,
+so window percentiles are built from bin counts, never raw durations.
+
+Rollups aggregate every tenant, so reads inside a tenant context scan that
+tenant's raw rows instead (through tenant_text). Rollup maintenance reads
+every tenant's traces on purpose.
+"""
+
+import os
+import math
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Any, Iterable, Tuple
+
+from dateutil import parser as date_parser
+from sqlalchemy import TextClause, event, text
+from sqlalchemy.pool import Pool
+
+from app.models import db
+from app.services.latency_sketch import DEFAULT_QUANTILES, SKETCH_LN_GAMMA, LatencySketch
+from app.services.tenant_scope import current_tenant_id, tenant_text
+
+logger = logging.getLogger(__name__)
+
+# Rollup levels from finest to coarsest; each is built from the one before it
+ROLLUP_PERIODS = ('minute', 'hour', 'day')
+
+PERIOD_DELTAS = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1)
+}
+
+# SQL that truncates a timestamp column to the start of a period, and that
+# moves a truncated value to the end of the period. SQLite output matches the
+# string format SQLAlchemy stores DateTime values in.
+BUCKET_SQL = {
+    'sqlite': {
+        'start': {
+            'minute': "strftime('%Y-%m-%d %H:%M:00.000000', {col})",
+            'hour': "strftime('%Y-%m-%d %H:00:00.000000', {col})",
+            'day': "strftime('%Y-%m-%d 00:00:00.000000', {col})"
+        },
+        'end': "strftime('%Y-%m-%d %H:%M:%S.000000', {col}, '+1 {period}')"
+    },
+    'postgresql': {
+        'start': {
+            'minute': "date_trunc('minute', {col})",
+            'hour': "date_trunc('hour', {col})",
+            'day': "date_trunc('day', {col})"
+        },
+        'end': "{col} + interval '1 {period}'"
+    }
+}
+
+# SQL for latency sketches: the bin index of a duration (matching
+# latency_sketch.sketch_index), building a {index: count} JSON object,
+# expanding one into key/value rows, and null-safe equality
+SKETCH_SQL = {
+    'sqlite': {
+        'index': "CAST(ceil(ln(MAX({col}, 1)) / " + repr(SKETCH_LN_GAMMA) + ") AS INTEGER)",
+        'build': "json_group_object(CAST({key} AS TEXT), {value})",
+        'each': "json_each({col})",
+        'same': "{left} IS {right}"
+    },
+    'postgresql': {
+        'index': "CAST(ceil(ln(GREATEST({col}, 1)::float8) / " + repr(SKETCH_LN_GAMMA) + ") AS INTEGER)",
+        'build': "json_object_agg({key}, {value})",
+        'each': "json_each_text({col})",
+        'same': "{left} IS NOT DISTINCT FROM {right}"
+    }
+}
+
+# Aggregate expressions over raw traces and over finer rollup rows; both
+# produce the same additive totals
+RAW_AGGREGATES = {
+    'total_traces': "COUNT(*)",
+    'success_count': "SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END)",
+    'error_count': "SUM(CASE WHEN status IN ('error', 'failed') THEN 1 ELSE 0 END)",
+    'latency_sum_ms': "SUM(duration_ms)",
+    'latency_count': "COUNT(duration_ms)",
+    'min_latency_ms': "MIN(duration_ms)",
+    'max_latency_ms': "MAX(duration_ms)",
+    'total_cost': "SUM(cost_usd)",
+    'input_tokens_total': "SUM(input_tokens)",
+    'output_tokens_total': "SUM(output_tokens)"
+}
+
+RAW_COLUMNS = "status, duration_ms, cost_usd, input_tokens, output_tokens"
+
+# Rollup rows are unique per (period_type, period_start) and this key
+ROLLUP_KEY = "data_source_id, model"
+
+ROLLUP_AGGREGATES = {
+    'total_traces': "SUM(total_traces)",
+    'success_count': "SUM(success_count)",
+    'error_count': "SUM(error_count)",
+    'latency_sum_ms': "SUM(latency_sum_ms)",
+    'latency_count': "SUM(latency_count)",
+    'min_latency_ms': "MIN(min_latency_ms)",
+    'max_latency_ms': "MAX(max_latency_ms)",
+    'total_cost': "SUM(total_cost)",
+    'input_tokens_total': "SUM(input_tokens_total)",
+    'output_tokens_total': "SUM(output_tokens_total)"
+}
+
+# Dirty buckets closer than this many periods are refreshed as one range
+MERGE_GAP_BUCKETS = 16
+
+# Serializes rollup refreshes across PostgreSQL connections
+ROLLUP_LOCK_KEY = 7301
+
+
+@event.listens_for(Pool, 'connect')
+def _register_sqlite_math(dbapi_connection, connection_record):
+    """Provide ln() and ceil() on SQLite builds compiled without math functions."""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    try:
+        dbapi_connection.execute("SELECT ln(2.0), ceil(0.5)").fetchone()
+    except sqlite3.OperationalError:
+        dbapi_connection.create_function('ln', 1, math.log, deterministic=True)
+        dbapi_connection.create_function('ceil', 1, math.ceil, deterministic=True)
+
+
+def floor_period(value: datetime, period: str) -> datetime:
+    """Truncate a datetime to the start of its minute, hour or day."""
+    if period == 'minute':
+        return value.replace(second=0, microsecond=0)
+    if period == 'hour':
+        return value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def ceil_period(value: datetime, period: str) -> datetime:
+    """Round a datetime up to the next period boundary (unchanged if aligned)."""
+    floored = floor_period(value, period)
+    return floored if floored == value else floored + PERIOD_DELTAS[period]
+
+
+def decompose_window(start: datetime, end: datetime) -> Tuple[List[Tuple[datetime, datetime]],
+                                                              List[Tuple[str, datetime, datetime]]]:
+    """
+    Split a window into the fewest rollup ranges plus raw edge ranges.
+
+    Returns:
+        Tuple of (raw_ranges, rollup_ranges). Raw ranges are [start, end) except
+        the last, which includes its end. Rollup ranges are (period, lo, hi)
+        covering whole buckets with period_start in [lo, hi).
+    """
+    lo, hi = ceil_period(start, 'minute'), floor_period(end, 'minute')
+    if lo >= hi:
+        return [(start, end)], []
+
+    raw_ranges = []
+    if start < lo:
+        raw_ranges.append((start, lo))
+    raw_ranges.append((hi, end))
+
+    rollup_ranges = []
+
+    def cover(range_lo: datetime, range_hi: datetime, level: int):
+        period = ROLLUP_PERIODS[level]
+        if level + 1 < len(ROLLUP_PERIODS):
+            coarser = ROLLUP_PERIODS[level + 1]
+            inner_lo, inner_hi = ceil_period(range_lo, coarser), floor_period(range_hi, coarser)
+            if inner_lo < inner_hi:
+                for edge_lo, edge_hi in ((range_lo, inner_lo), (inner_hi, range_hi)):
+                    if edge_lo < edge_hi:
+                        rollup_ranges.append((period, edge_lo, edge_hi))
+                cover(inner_lo, inner_hi, level + 1)
+                return
+        rollup_ranges.append((period, range_lo, range_hi))
+
+    cover(lo, hi, 0)
+    return raw_ranges, rollup_ranges
+
+
+def merge_buckets(buckets: Iterable[datetime], period: str) -> List[Tuple[datetime, datetime]]:
+    """Merge bucket starts into [lo, hi) ranges, bridging small gaps."""
+    step = PERIOD_DELTAS[period]
+    max_gap = step * MERGE_GAP_BUCKETS
+    ranges: List[List[datetime]] = []
+    for bucket in sorted(set(buckets)):
+        if ranges and bucket - ranges[-1][1] <= max_gap:
+            ranges[-1][1] = bucket + step
+        else:
+            ranges.append([bucket, bucket + step])
+    return [(lo, hi) for lo, hi in ranges]
+
+
+class MetricRollupService:
+    """
+    Incremental minute/hour/day rollups of live trace metrics.
+
+    Features:
+    - Dirty-bucket refresh on ingest (sync, webhooks) in the same transaction
+    - Window totals from combined rollups with raw scans only at the edges
+    - Hourly series read straight from hour rollups
+    - Mergeable latency sketches per bucket, data source and model
+    - Background backfill at startup when rollups are missing for existing
+      traces; reads scan raw rows until it has finished
+    """
+
+    def __init__(self):
+        """Initialize metric rollup service."""
+        self.enabled = os.getenv('METRIC_ROLLUPS_ENABLED', 'true').lower() == 'true'
+        self._lock = threading.Lock()
+        self._pending: set = set()  # minute buckets whose refresh failed
+        self._backfilled = False  # rollups known to cover every trace
+
+    def _session(self, session=None):
+        return session if session is not None else db.session
+
+    def is_supported(self, session=None) -> bool:
+        """Rollups are used when enabled and the database dialect is supported."""
+        return self.enabled and self._session(session).get_bind().dialect.name in BUCKET_SQL
+
+    def _to_utc(self, value: Any) -> Optional[datetime]:
+        """Normalize a stored or incoming timestamp to naive UTC."""
+        if value is None:
+            return None
+        if isinstance(value, str):
+            try:
+                value = datetime.fromisoformat(value)
+            except ValueError:
+                try:
+                    value = date_parser.parse(value)
+                except (ValueError, OverflowError):
+                    return None
+        if not isinstance(value, datetime):
+            return None
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    def _bind(self, value: datetime, dialect: str, inclusive_upper: bool = False):
+        # SQLite compares timestamps as text, and rows may be stored with or
+        # without fractional seconds. Omitting a zero fraction sorts a lower
+        # bound before both forms; an inclusive upper bound needs it to sort
+        # after both.
+        if dialect != 'sqlite':
+            return value
+        if value.microsecond or inclusive_upper:
+            return value.strftime('%Y-%m-%d %H:%M:%S.%f')
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+
+    def refresh_for_timestamps(self, timestamps: Iterable[Any], session=None) -> int:
+        """
+        Recompute the rollup buckets containing the given trace start times.
+
+        Call after writing traces and before committing, passing both the new
+        and (for updates) the previous start times. Failures are logged and
+        the buckets retried on the next refresh instead of failing ingest.
+
+        Returns:
+            Number of minute buckets refreshed
+        """
+        session = self._session(session)
+        if not self.is_supported(session):
+            return 0
+
+        minutes = {floor_period(ts, 'minute') for ts in map(self._to_utc, timestamps) if ts is not None}
+        with self._lock:
+            minutes |= self._pending
+            self._pending = set()
+        if not minutes:
+            return 0
+
+        try:
+            with session.begin_nested():
+                self._lock_rollups(session)
+                self._refresh_buckets(minutes, session)
+            return len(minutes)
+        except Exception as e:
+            logger.error(f"Error refreshing metric rollups: {e}")
+            with self._lock:
+                self._pending |= minutes
+            return 0
+
+    def _lock_rollups(self, session):
+        if session.get_bind().dialect.name == 'postgresql':
+            session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ROLLUP_LOCK_KEY})
+
+    def _refresh_buckets(self, minutes: set, session):
+        """Recompute dirty minute buckets, then the hours and days above them."""
+        buckets = minutes
+        for period in ROLLUP_PERIODS:
+            if period != 'minute':
+                buckets = {floor_period(bucket, period) for bucket in buckets}
+            for lo, hi in merge_buckets(buckets, period):
+                self._rebuild_range(period, lo, hi, session)
+
+    def _rebuild_range(self, period: str, lo: Optional[datetime], hi: Optional[datetime], session):
+        """Replace the rollup rows of one period in [lo, hi) (all rows when unbounded)."""
+        dialect = session.get_bind().dialect.name
+        bucket_sql, sketch_sql = BUCKET_SQL[dialect], SKETCH_SQL[dialect]
+
+        if period == 'minute':
+            source_table, time_column, aggregates = 'live_traces', 'start_time', RAW_AGGREGATES
+            source_columns, source_filter = RAW_COLUMNS, ""
+            # One bin per trace duration
+            bins_sql = f"""
+                SELECT bucket, {ROLLUP_KEY}, {sketch_sql['index'].format(col='duration_ms')} AS bin, COUNT(*) AS n
+                FROM src
+                WHERE duration_ms IS NOT NULL
+                GROUP BY bucket, {ROLLUP_KEY}, bin"""
+        else:
+            source_table, time_column, aggregates = 'performance_metrics', 'period_start', ROLLUP_AGGREGATES
+            source_columns = ', '.join(ROLLUP_AGGREGATES) + ', latency_sketch'
+            source_filter = " AND period_type = :source_period"
+            # Merge the sketches of the finer rows by adding bin counts
+            bins_sql = f"""
+                SELECT src.bucket, src.data_source_id, src.model,
+                       CAST(j.key AS BIGINT) AS bin, SUM(CAST(j.value AS BIGINT)) AS n
+                FROM src, {sketch_sql['each'].format(col='src.latency_sketch')} AS j
+                GROUP BY src.bucket, src.data_source_id, src.model, bin"""
+
+        params = {
+            "period_type": period,
+            "source_period": ROLLUP_PERIODS[ROLLUP_PERIODS.index(period) - 1] if period != 'minute' else None,
+            "now": datetime.utcnow()
+        }
+        if lo is not None:
+            params.update(lo=self._bind(lo, dialect), hi=self._bind(hi, dialect))
+            target_range = " AND period_start >= :lo AND period_start < :hi"
+            source_range = f"{time_column} >= :lo AND {time_column} < :hi"
+        else:
+            target_range = ""
+            source_range = f"{time_column} IS NOT NULL"
+
+        session.execute(
+            text(f"DELETE FROM performance_metrics WHERE period_type = :period_type{target_range}"),
+            params
+        )
+
+        same = sketch_sql['same']
+        session.execute(
+            text(f"""
+            WITH src AS (
+                SELECT {bucket_sql['start'][period].format(col=time_column)} AS bucket,
+                       {source_columns}, {ROLLUP_KEY}
+                FROM {source_table}
+                WHERE {source_range}{source_filter}
+            ),
+            totals AS (
+                SELECT bucket, {ROLLUP_KEY}, {self._select_list(aggregates)}
+                FROM src
+                GROUP BY bucket, {ROLLUP_KEY}
+            ),
+            bins AS ({bins_sql}
+            ),
+            sketches AS (
+                SELECT bucket, {ROLLUP_KEY}, {sketch_sql['build'].format(key='bin', value='n')} AS latency_sketch
+                FROM bins
+                GROUP BY bucket, {ROLLUP_KEY}
+            )
+            INSERT INTO performance_metrics
+                (period_type, period_start, period_end, data_source_id, model,
+                 total_traces, success_count, error_count, success_rate, error_rate,
+                 avg_latency_ms, min_latency_ms, max_latency_ms, latency_sum_ms, latency_count, latency_sketch,
+                 total_cost, avg_cost_per_request, input_tokens_total, output_tokens_total,
+                 created_at, updated_at)
+            SELECT
+                :period_type, t.bucket, {bucket_sql['end'].format(col='t.bucket', period=period)},
+                t.data_source_id, t.model,
+                t.total_traces, t.success_count, t.error_count,
+                ROUND(100.0 * t.success_count / t.total_traces, 2),
+                ROUND(100.0 * t.error_count / t.total_traces, 2),
+                t.latency_sum_ms * 1.0 / NULLIF(t.latency_count, 0),
+                t.min_latency_ms, t.max_latency_ms,
+                COALESCE(t.latency_sum_ms, 0), t.latency_count, s.latency_sketch,
+                COALESCE(t.total_cost, 0),
+                COALESCE(t.total_cost, 0) / t.total_traces,
+                COALESCE(t.input_tokens_total, 0), COALESCE(t.output_tokens_total, 0),
+                :now, :now
+            FROM totals AS t
+            LEFT JOIN sketches AS s
+                ON s.bucket = t.bucket
+                AND {same.format(left='s.data_source_id', right='t.data_source_id')}
+                AND {same.format(left='s.model', right='t.model')}
+            """),
+            params
+        )
+
+    def rebuild(self, session=None):
+        """Recompute every rollup from live_traces (backfill or repair)."""
+        session = self._session(session)
+        if not self.is_supported(session):
+            return
+
+        started = datetime.utcnow()
+        self._lock_rollups(session)
+        for period in ROLLUP_PERIODS:
+            self._rebuild_range(period, None, None, session)
+        session.commit()
+        logger.info(f"Rebuilt metric rollups in {(datetime.utcnow() - started).total_seconds():.1f}s")
+
+    def ensure_backfilled(self, session=None) -> bool:
+        """
+        Rebuild if rollups do not account for every trace with a start time.
+
+        Rollup reads scan raw rows until this has run. Returns True if a
+        rebuild was needed.
+        """
+        session = self._session(session)
+        if not self.is_supported(session):
+            return False
+
+        trace_count = session.execute(
+            text("SELECT COUNT(*) FROM live_traces WHERE start_time IS NOT NULL")
+        ).scalar() or 0
+        rolled_up = session.execute(
+            text("SELECT COALESCE(SUM(total_traces), 0) FROM performance_metrics WHERE period_type = 'day'")
+        ).scalar() or 0
+        rebuilt = trace_count != rolled_up
+        if rebuilt:
+            logger.info(f"Metric rollups cover {rolled_up} of {trace_count} traces; rebuilding")
+            self.rebuild(session)
+        else:
+            session.rollback()
+        self._backfilled = True
+        return rebuilt
+
+    def start_backfill(self, app):
+        """Run ensure_backfilled in a background thread so no request waits for a rebuild."""
+        if self._backfilled or not self.enabled:
+            return
+        if app.config['SQLALCHEMY_DATABASE_URI'] in ('sqlite://', 'sqlite:///:memory:'):
+            # A fresh in-memory database has no traces to backfill
+            self._backfilled = True
+            return
+
+        def backfill():
+            try:
+                with app.app_context():
+                    self.ensure_backfilled()
+            except Exception as e:
+                logger.error(f"Metric rollup backfill failed, dashboards keep scanning raw traces: {e}")
+
+        threading.Thread(target=backfill, name="MetricRollupBackfill", daemon=True).start()
+
+    def _rollups_ready(self, session) -> bool:
+        return self._backfilled and current_tenant_id() is None and self.is_supported(session)
+
+    def _source_filter(self, data_source: Optional[str], params: Dict[str, Any],
+                       model: Optional[str] = None) -> str:
+        filters = ""
+        if data_source:
+            params['data_source'] = data_source
+            filters += " AND data_source_id IN (SELECT id FROM data_sources WHERE name = :data_source)"
+        if model:
+            params['model'] = model
+            filters += " AND model = :model"
+        return filters
+
+    def window_totals(self, start: datetime, end: datetime, data_source: Optional[str] = None,
+                      model: Optional[str] = None, session=None) -> Dict[str, Any]:
+        """
+        Additive totals for traces with start_time in [start, end].
+
+        Uses rollups where possible and falls back to a raw scan of the whole
+        window when rollups are disabled, unsupported or unavailable.
+        """
+        session = self._session(session)
+        if self._rollups_ready(session):
+            try:
+                raw_ranges, rollup_ranges = decompose_window(start, end)
+                totals = self._scan_raw(raw_ranges, data_source, model, session)
+                if rollup_ranges:
+                    totals = self._combine(totals, self._scan_rollups(rollup_ranges, data_source, model, session))
+                return totals
+            except Exception as e:
+                logger.error(f"Error reading metric rollups, scanning raw traces: {e}")
+                session.rollback()
+        return self._scan_raw([(start, end)], data_source, model, session)
+
+    def _raw_conditions(self, ranges: List[Tuple[datetime, datetime]], params: Dict[str, Any],
+                        dialect: str) -> str:
+        conditions = []
+        for i, (lo, hi) in enumerate(ranges):
+            upper = '<=' if i == len(ranges) - 1 else '<'
+            conditions.append(f"(start_time >= :lo{i} AND start_time {upper} :hi{i})")
+            params[f"lo{i}"] = self._bind(lo, dialect)
+            params[f"hi{i}"] = self._bind(hi, dialect, inclusive_upper=(upper == '<='))
+        return ' OR '.join(conditions)
+
+    def _rollup_conditions(self, ranges: List[Tuple[str, datetime, datetime]], params: Dict[str, Any],
+                           dialect: str) -> str:
+        conditions = []
+        for i, (period, lo, hi) in enumerate(ranges):
+            conditions.append(f"(period_type = :p{i} AND period_start >= :lo{i} AND period_start < :hi{i})")
+            params.update({f"p{i}": period, f"lo{i}": self._bind(lo, dialect), f"hi{i}": self._bind(hi, dialect)})
+        return ' OR '.join(conditions)
+
+    def _scan_raw(self, ranges: List[Tuple[datetime, datetime]], data_source: Optional[str],
+                  model: Optional[str], session) -> Dict[str, Any]:
+        params: Dict[str, Any] = {}
+        conditions = self._raw_conditions(ranges, params, session.get_bind().dialect.name)
+        source_filter = self._source_filter(data_source, params, model)
+
+        return self._fetch_totals(
+            tenant_text(f"SELECT {self._select_list(RAW_AGGREGATES)} FROM live_traces "
+                        f"WHERE ({conditions}){source_filter}"),
+            params, session
+        )
+
+    def _scan_rollups(self, ranges: List[Tuple[str, datetime, datetime]], data_source: Optional[str],
+                      model: Optional[str], session) -> Dict[str, Any]:
+        params: Dict[str, Any] = {}
+        conditions = self._rollup_conditions(ranges, params, session.get_bind().dialect.name)
+        source_filter = self._source_filter(data_source, params, model)
+
+        return self._fetch_totals(
+            text(f"SELECT {self._select_list(ROLLUP_AGGREGATES)} FROM performance_metrics "
+                 f"WHERE ({conditions}){source_filter}"),
+            params, session
+        )
+
+    def _select_list(self, aggregates: Dict[str, str]) -> str:
+        return ', '.join(f"{expr} AS {name}" for name, expr in aggregates.items())
+
+    def _fetch_totals(self, sql: TextClause, params: Dict[str, Any], session) -> Dict[str, Any]:
+        row = session.execute(sql, params).fetchone()
+        totals = dict(row._mapping)
+        for name in ('total_traces', 'success_count', 'error_count', 'latency_count',
+                     'input_tokens_total', 'output_tokens_total'):
+            totals[name] = int(totals[name] or 0)
+        for name in ('latency_sum_ms', 'total_cost'):
+            totals[name] = float(totals[name] or 0)
+        for name in ('min_latency_ms', 'max_latency_ms'):
+            totals[name] = float(totals[name]) if totals[name] is not None else None
+        return totals
+
+    def _combine(self, left: Dict[str, Any], right: Dict[str, Any]) -> Dict[str, Any]:
+        combined = {}
+        for name, value in left.items():
+            other = right[name]
+            if name == 'min_latency_ms':
+                combined[name] = min((v for v in (value, other) if v is not None), default=None)
+            elif name == 'max_latency_ms':
+                combined[name] = max((v for v in (value, other) if v is not None), default=None)
+            else:
+                combined[name] = value + other
+        return combined
+
+    def window_sketches(self, start: datetime, end: datetime, data_source: Optional[str] = None,
+                        model: Optional[str] = None, by_model: bool = False,
+                        session=None) -> Dict[Optional[str], LatencySketch]:
+        """
+        Latency sketches for traces with start_time in [start, end].
+
+        Bin counts are merged in SQL from rollup sketches, with raw traces
+        binned only at the partial-minute edges of the window.
+
+        Returns:
+            {model: sketch} when by_model is set, otherwise {None: sketch}
+        """
+        session = self._session(session)
+        dialect = session.get_bind().dialect.name
+        if dialect not in SKETCH_SQL:
+            logger.warning(f"Latency sketches not supported for dialect {dialect}")
+            return {}
+
+        if self._rollups_ready(session):
+            try:
+                raw_ranges, rollup_ranges = decompose_window(start, end)
+                sketches = self._raw_bins(raw_ranges, data_source, model, by_model, session, {})
+                if rollup_ranges:
+                    self._rollup_bins(rollup_ranges, data_source, model, by_model, session, sketches)
+                return sketches
+            except Exception as e:
+                logger.error(f"Error reading latency sketches, scanning raw traces: {e}")
+                session.rollback()
+        return self._raw_bins([(start, end)], data_source, model, by_model, session, {})
+
+    def window_quantiles(self, start: datetime, end: datetime, quantiles: Iterable[float] = DEFAULT_QUANTILES,
+                         data_source: Optional[str] = None, model: Optional[str] = None,
+                         session=None) -> Dict[str, Optional[float]]:
+        """Latency percentiles for [start, end], e.g. {'p50': 120.4, ..., 'p99': 950.1}."""
+        sketch = self.window_sketches(start, end, data_source, model, session=session).get(None, LatencySketch())
+        return sketch.quantiles(quantiles)
+
+    def model_quantiles(self, start: datetime, end: datetime, quantiles: Iterable[float] = DEFAULT_QUANTILES,
+                        data_source: Optional[str] = None, session=None) -> Dict[str, Dict[str, Optional[float]]]:
+        """Latency percentiles for [start, end] per model ('unknown' for traces without one)."""
+        sketches = self.window_sketches(start, end, data_source, by_model=True, session=session)
+        return {model or 'unknown': sketch.quantiles(quantiles) for model, sketch in sketches.items()}
+
+    def _raw_bins(self, ranges: List[Tuple[datetime, datetime]], data_source: Optional[str], model: Optional[str],
+                  by_model: bool, session, sketches: Dict[Optional[str], LatencySketch]):
+        dialect = session.get_bind().dialect.name
+        params: Dict[str, Any] = {}
+        conditions = self._raw_conditions(ranges, params, dialect)
+        source_filter = self._source_filter(data_source, params, model)
+        group = "model, " if by_model else ""
+
+        return self._collect_bins(
+            tenant_text(f"SELECT {group}{SKETCH_SQL[dialect]['index'].format(col='duration_ms')} AS bin, COUNT(*) AS n "
+                        f"FROM live_traces WHERE ({conditions}) AND duration_ms IS NOT NULL{source_filter} "
+                        f"GROUP BY {group}bin"),
+            params, by_model, session, sketches
+        )
+
+    def _rollup_bins(self, ranges: List[Tuple[str, datetime, datetime]], data_source: Optional[str],
+                     model: Optional[str], by_model: bool, session, sketches: Dict[Optional[str], LatencySketch]):
+        dialect = session.get_bind().dialect.name
+        params: Dict[str, Any] = {}
+        conditions = self._rollup_conditions(ranges, params, dialect)
+        source_filter = self._source_filter(data_source, params, model)
+        group = "model, " if by_model else ""
+
+        return self._collect_bins(
+            text(f"SELECT {group}CAST(j.key AS BIGINT) AS bin, SUM(CAST(j.value AS BIGINT)) AS n "
+                 f"FROM performance_metrics, {SKETCH_SQL[dialect]['each'].format(col='performance_metrics.latency_sketch')} AS j "
+                 f"WHERE ({conditions}){source_filter} "
+                 f"GROUP BY {group}bin"),
+            params, by_model, session, sketches
+        )
+
+    def _collect_bins(self, sql: TextClause, params: Dict[str, Any], by_model: bool, session,
+                      sketches: Dict[Any, LatencySketch]) -> Dict[Any, LatencySketch]:
+        for row in session.execute(sql, params).fetchall():
+            key = row[0] if by_model else None
+            sketches.setdefault(key, LatencySketch()).merge_bins([(row[-2], row[-1])])
+        return sketches
+
+    def series(self, start: datetime, end: datetime, period: str = 'hour',
+               data_source: Optional[str] = None, session=None,
+               quantiles: Iterable[float] = DEFAULT_QUANTILES) -> List[Dict[str, Any]]:
+        """
+        Per-bucket totals for buckets overlapping [start, end], oldest first.
+
+        Each item has period_start, total_traces, latency_count,
+        avg_latency_ms, max_latency_ms and the requested latency
+        percentiles (p50, p90, p95, p99 by default).
+        """
+        session = self._session(session)
+        dialect = session.get_bind().dialect.name
+        if dialect not in BUCKET_SQL:
+            logger.warning(f"Metric series not supported for dialect {dialect}")
+            return []
+
+        params: Dict[str, Any] = {
+            "lo": self._bind(floor_period(start, period), dialect),
+            "hi": self._bind(end, dialect, inclusive_upper=True)
+        }
+        source_filter = self._source_filter(data_source, params)
+        if self._rollups_ready(session):
+            params['period_type'] = period
+            window = "period_type = :period_type AND period_start >= :lo AND period_start <= :hi"
+            sql = text(f"""
+            SELECT period_start AS bucket, {self._select_list(ROLLUP_AGGREGATES)}
+            FROM performance_metrics
+            WHERE {window}{source_filter}
+            GROUP BY period_start
+            ORDER BY period_start
+            """)
+            bins_sql = text(f"""
+            SELECT period_start AS bucket, CAST(j.key AS BIGINT) AS bin, SUM(CAST(j.value AS BIGINT)) AS n
+            FROM performance_metrics, {SKETCH_SQL[dialect]['each'].format(col='performance_metrics.latency_sketch')} AS j
+            WHERE {window}{source_filter}
+            GROUP BY period_start, bin
+            """)
+        else:
+            bucket = BUCKET_SQL[dialect]['start'][period].format(col='start_time')
+            sql = tenant_text(f"""
+            SELECT {bucket} AS bucket, {self._select_list(RAW_AGGREGATES)}
+            FROM live_traces
+            WHERE start_time >= :lo AND start_time <= :hi{source_filter}
+            GROUP BY {bucket}
+            ORDER BY bucket
+            """)
+            bins_sql = tenant_text(f"""
+            SELECT {bucket} AS bucket, {SKETCH_SQL[dialect]['index'].format(col='duration_ms')} AS bin, COUNT(*) AS n
+            FROM live_traces
+            WHERE start_time >= :lo AND start_time <= :hi AND duration_ms IS NOT NULL{source_filter}
+            GROUP BY {bucket}, bin
+            """)
+
+        sketches: Dict[Optional[datetime], LatencySketch] = {}
+        for bucket, index, count in session.execute(bins_sql, params).fetchall():
+            sketches.setdefault(self._to_utc(bucket), LatencySketch()).merge_bins([(index, count)])
+
+        series = []
+        for row in session.execute(sql, params).fetchall():
+            values = row._mapping
+            period_start = self._to_utc(values['bucket'])
+            latency_count = int(values['latency_count'] or 0)
+            item = {
+                'period_start': period_start,
+                'total_traces': int(values['total_traces'] or 0),
+                'latency_count': latency_count,
+                'avg_latency_ms': float(values['latency_sum_ms'] or 0) / latency_count if latency_count else 0.0,
+                'max_latency_ms': float(values['max_latency_ms'] or 0)
+            }
+            item.update(sketches.get(period_start, LatencySketch()).quantiles(quantiles))
+            series.append(item)
+        return series
+
+
+# Global service instance
+metric_rollup_service = MetricRollupService()
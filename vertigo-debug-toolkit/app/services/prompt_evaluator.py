@@ -3,16 +3,23 @@
 Advanced Prompt Evaluation Service for Vertigo LLM Observability.
 """
 
+import os
 import logging
 from datetime import datetime, timedelta
 from dataclasses import dataclass
-from typing import Dict, List, Any, Optional, Tuple
-from sqlalchemy import func, and_, desc
+from typing import Dict, Iterator, List, Any, Optional, Tuple
+from sqlalchemy import func, case, desc, select
 from app.models import db, Trace, Cost, Prompt, User
+from app.services.cache_service import default_cache_service
 from app.services.langwatch_client import LangWatchClient
+from app.services.tenant_scope import current_tenant_id
 
 logger = logging.getLogger(__name__)
 
+# Prompts aggregated per report query / streamed report page
+REPORT_PAGE_SIZE = int(os.getenv('PROMPT_REPORT_PAGE_SIZE', '200'))
+REPORT_CACHE_TTL_SECONDS = int(os.getenv('PROMPT_REPORT_CACHE_TTL_SECONDS', '60'))
+
 @dataclass
 class PromptMetrics:
     """Metrics for a specific prompt."""
@@ -46,83 +53,124 @@ class PromptEvaluator:
     def get_prompt_performance(self, prompt_id: int, days: int = 30) -> PromptMetrics:
         """Get comprehensive performance metrics for a specific prompt."""
         try:
-            end_date = datetime.utcnow()
-            start_date = end_date - timedelta(days=days)
-            
-            # Get prompt details
-            prompt = Prompt.query.get(prompt_id)
-            if not prompt:
+            rows = self.get_prompt_metrics_page([prompt_id], days)
+            if not rows:
                 raise ValueError(f"Prompt with ID {prompt_id} not found")
             
-            # Get traces for this prompt
-            traces = Trace.query.filter(
-                and_(
-                    Trace.prompt_id == prompt_id,
-                    Trace.start_time >= start_date,
-                    Trace.start_time <= end_date
-                )
-            ).all()
-            
-            if not traces:
-                return PromptMetrics(
-                    prompt_id=prompt_id,
-                    prompt_name=prompt.name,
-                    total_calls=0,
-                    success_rate=0.0,
-                    avg_response_time=0.0,
-                    total_cost=0.0,
-                    avg_tokens_used=0,
-                    error_count=0,
-                    last_used=None
-                )
-            
-            # Calculate metrics
-            total_calls = len(traces)
-            success_count = sum(1 for t in traces if t.status == 'success')
-            success_rate = (success_count / total_calls) * 100 if total_calls > 0 else 0
-            
-            response_times = [t.duration_ms/1000.0 for t in traces if t.duration_ms]  # Convert ms to seconds
-            avg_response_time = sum(response_times) / len(response_times) if response_times else 0
-            
-            # Get cost data
-            costs = Cost.query.filter(
-                and_(
-                    Cost.trace_id.in_([t.id for t in traces]),
-                    Cost.timestamp >= start_date,
-                    Cost.timestamp <= end_date
-                )
-            ).all()
-            
-            total_cost = float(sum(c.cost_usd for c in costs))
-            
-            # Calculate token usage from cost data
-            total_tokens = sum(c.total_tokens for c in costs if c.total_tokens)
-            avg_tokens_used = total_tokens / len(costs) if costs else 0
-            
-            error_count = total_calls - success_count
-            last_used = max(t.start_time for t in traces) if traces else None
-            
-            return PromptMetrics(
-                prompt_id=prompt_id,
-                prompt_name=prompt.name,
-                total_calls=total_calls,
-                success_rate=success_rate,
-                avg_response_time=avg_response_time,
-                total_cost=total_cost,
-                avg_tokens_used=int(avg_tokens_used),
-                error_count=error_count,
-                last_used=last_used
-            )
+            return self._to_metrics(rows[0])
             
         except Exception as e:
             logger.error(f"Error getting prompt performance: {e}")
             raise
     
+    def get_prompt_metrics_page(self, prompt_ids: List[int], days: int = 30) -> List[Dict[str, Any]]:
+        """
+        Metrics for up to REPORT_PAGE_SIZE prompts in one grouped query.
+        
+        Costs of the page's traces are summed per trace in a subquery and
+        joined to the traces of the window, so a trace with several cost rows
+        is still counted once. Rows are cached by (tenant, prompt_ids, days)
+        for REPORT_CACHE_TTL_SECONDS; unknown prompt ids are left out.
+        """
+        prompt_ids = sorted({int(prompt_id) for prompt_id in prompt_ids})
+        cache_key = f"prompt_metrics:{current_tenant_id()}:{days}:{','.join(map(str, prompt_ids))}"
+        return default_cache_service.get_or_set(
+            cache_key, lambda: self._query_prompt_metrics(prompt_ids, days), REPORT_CACHE_TTL_SECONDS
+        )
+    
+    def _query_prompt_metrics(self, prompt_ids: List[int], days: int) -> List[Dict[str, Any]]:
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=days)
+        
+        window_traces = select(Trace.id).where(
+            Trace.prompt_id.in_(prompt_ids),
+            Trace.start_time >= start_date,
+            Trace.start_time <= end_date
+        )
+        trace_costs = select(
+            Cost.trace_id,
+            func.sum(Cost.cost_usd).label('cost'),
+            func.sum(Cost.total_tokens).label('tokens'),
+            func.count(Cost.id).label('cost_rows')
+        ).where(
+            Cost.trace_id.in_(window_traces),
+            Cost.timestamp >= start_date,
+            Cost.timestamp <= end_date
+        ).group_by(Cost.trace_id).subquery()
+        
+        trace_stats = select(
+            Trace.prompt_id,
+            func.count(Trace.id).label('total_calls'),
+            func.sum(case((Trace.status == 'success', 1), else_=0)).label('success_count'),
+            # Traces without a duration do not count towards the average (ms to seconds)
+            (func.avg(func.nullif(Trace.duration_ms, 0)) / 1000.0).label('avg_response_time'),
+            func.max(Trace.start_time).label('last_used'),
+            func.sum(trace_costs.c.cost).label('total_cost'),
+            func.sum(trace_costs.c.tokens).label('total_tokens'),
+            func.sum(trace_costs.c.cost_rows).label('cost_rows')
+        ).outerjoin(
+            trace_costs, trace_costs.c.trace_id == Trace.id
+        ).where(
+            Trace.prompt_id.in_(prompt_ids),
+            Trace.start_time >= start_date,
+            Trace.start_time <= end_date
+        ).group_by(Trace.prompt_id).subquery()
+        
+        rows = db.session.execute(
+            select(
+                Prompt.id, Prompt.name, Prompt.version, Prompt.prompt_type,
+                trace_stats.c.total_calls, trace_stats.c.success_count, trace_stats.c.avg_response_time,
+                trace_stats.c.last_used, trace_stats.c.total_cost, trace_stats.c.total_tokens,
+                trace_stats.c.cost_rows
+            ).outerjoin(
+                trace_stats, trace_stats.c.prompt_id == Prompt.id
+            ).where(Prompt.id.in_(prompt_ids)).order_by(Prompt.id)
+        ).all()
+        
+        results = []
+        for row in rows:
+            total_calls = int(row.total_calls or 0)
+            success_count = int(row.success_count or 0)
+            last_used = row.last_used
+            if isinstance(last_used, str):
+                last_used = datetime.fromisoformat(last_used)
+            results.append({
+                "id": row.id,
+                "name": row.name,
+                "version": row.version,
+                "type": row.prompt_type,
+                "total_calls": total_calls,
+                "success_rate": float(success_count / total_calls * 100) if total_calls else 0.0,
+                "avg_response_time": float(row.avg_response_time or 0.0),
+                "total_cost": float(row.total_cost or 0.0),
+                "avg_tokens_used": int((row.total_tokens or 0) / row.cost_rows) if row.cost_rows else 0,
+                "error_count": total_calls - success_count,
+                "last_used": last_used.isoformat() if last_used else None
+            })
+        return results
+    
+    def _to_metrics(self, row: Dict[str, Any]) -> PromptMetrics:
+        return PromptMetrics(
+            prompt_id=row["id"],
+            prompt_name=row["name"],
+            total_calls=row["total_calls"],
+            success_rate=row["success_rate"],
+            avg_response_time=row["avg_response_time"],
+            total_cost=row["total_cost"],
+            avg_tokens_used=row["avg_tokens_used"],
+            error_count=row["error_count"],
+            last_used=datetime.fromisoformat(row["last_used"]) if row["last_used"] else None
+        )
+    
     def compare_prompts(self, prompt_a_id: int, prompt_b_id: int, days: int = 30) -> ABTestResult:
         """Compare two prompts using A/B testing methodology."""
         try:
-            metrics_a = self.get_prompt_performance(prompt_a_id, days)
-            metrics_b = self.get_prompt_performance(prompt_b_id, days)
+            rows = {row["id"]: row for row in self.get_prompt_metrics_page([prompt_a_id, prompt_b_id], days)}
+            for prompt_id in (prompt_a_id, prompt_b_id):
+                if prompt_id not in rows:
+                    raise ValueError(f"Prompt with ID {prompt_id} not found")
+            metrics_a = self._to_metrics(rows[prompt_a_id])
+            metrics_b = self._to_metrics(rows[prompt_b_id])
             
             # Determine winner based on success rate and cost efficiency
             score_a = (float(metrics_a.success_rate) * 0.7) - (float(metrics_a.total_cost) * 0.3)
@@ -158,45 +206,48 @@ class PromptEvaluator:
     def get_cost_optimization_recommendations(self, prompt_id: int) -> List[Dict[str, Any]]:
         """Get cost optimization recommendations for a prompt."""
         try:
-            metrics = self.get_prompt_performance(prompt_id)
-            recommendations = []
-            
-            # Check for high token usage
-            if metrics.avg_tokens_used > 1000:
-                recommendations.append({
-                    "type": "token_optimization",
-                    "priority": "high",
-                    "title": "High Token Usage Detected",
-                    "description": f"Average {metrics.avg_tokens_used} tokens per call. Consider shortening prompts or using more efficient models.",
-                    "potential_savings": f"~{metrics.avg_tokens_used * 0.001:.2f} per call"
-                })
-            
-            # Check for high error rates
-            if metrics.success_rate < 80:
-                recommendations.append({
-                    "type": "reliability",
-                    "priority": "high",
-                    "title": "Low Success Rate",
-                    "description": f"Only {metrics.success_rate:.1f}% success rate. Review prompt clarity and error handling.",
-                    "potential_savings": "Reduce failed call costs"
-                })
-            
-            # Check for expensive models
-            if metrics.total_cost > 10:  # Threshold for "expensive"
-                recommendations.append({
-                    "type": "model_optimization",
-                    "priority": "medium",
-                    "title": "High Cost Usage",
-                    "description": f"Total cost: ${metrics.total_cost:.2f}. Consider using cheaper models for non-critical tasks.",
-                    "potential_savings": f"~{metrics.total_cost * 0.3:.2f} potential savings"
-                })
-            
-            return recommendations
+            return self._recommendations_for(self.get_prompt_performance(prompt_id))
             
         except Exception as e:
             logger.error(f"Error getting cost recommendations: {e}")
             return []
     
+    def _recommendations_for(self, metrics: PromptMetrics) -> List[Dict[str, Any]]:
+        """Cost optimization recommendations from a prompt's metrics."""
+        recommendations = []
+        
+        # Check for high token usage
+        if metrics.avg_tokens_used > 1000:
+            recommendations.append({
+                "type": "token_optimization",
+                "priority": "high",
+                "title": "High Token Usage Detected",
+                "description": f"Average {metrics.avg_tokens_used} tokens per call. Consider shortening prompts or using more efficient models.",
+                "potential_savings": f"~{metrics.avg_tokens_used * 0.001:.2f} per call"
+            })
+        
+        # Check for high error rates
+        if metrics.success_rate < 80:
+            recommendations.append({
+                "type": "reliability",
+                "priority": "high",
+                "title": "Low Success Rate",
+                "description": f"Only {metrics.success_rate:.1f}% success rate. Review prompt clarity and error handling.",
+                "potential_savings": "Reduce failed call costs"
+            })
+        
+        # Check for expensive models
+        if metrics.total_cost > 10:  # Threshold for "expensive"
+            recommendations.append({
+                "type": "model_optimization",
+                "priority": "medium",
+                "title": "High Cost Usage",
+                "description": f"Total cost: ${metrics.total_cost:.2f}. Consider using cheaper models for non-critical tasks.",
+                "potential_savings": f"~{metrics.total_cost * 0.3:.2f} potential savings"
+            })
+        
+        return recommendations
+    
     def get_session_analysis(self, session_id: str) -> Dict[str, Any]:
         """Analyze a specific session's prompt usage patterns."""
         try:
@@ -250,112 +301,63 @@ class PromptEvaluator:
             logger.error(f"Error analyzing session: {e}")
             return {"error": str(e)}
     
+    def iter_prompt_metrics(self, prompt_ids: List[int], days: int = 30,
+                            page_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Report rows for the given prompts, one grouped query (and cache entry) per page of ids."""
+        ids = []
+        for prompt_id in prompt_ids:
+            try:
+                ids.append(int(prompt_id))
+            except (ValueError, TypeError):
+                logger.warning(f"Skipping invalid prompt id in report: {prompt_id!r}")
+        ids = list(dict.fromkeys(ids))
+        
+        page_size = page_size or REPORT_PAGE_SIZE
+        for start in range(0, len(ids), page_size):
+            yield from self.get_prompt_metrics_page(ids[start:start + page_size], days)
+    
     def generate_evaluation_report(self, prompt_ids: List[int], days: int = 30) -> Dict[str, Any]:
         """Generate a comprehensive evaluation report for multiple prompts."""
         try:
             if not prompt_ids:
                 return {"error": "No prompt IDs provided"}
             
-            prompt_metrics = []
-            total_cost = 0
-            total_traces = 0
-            success_rates = []
-            response_times = []
-            all_recommendations = []
-            
-            # Get metrics for each prompt
-            for prompt_id in prompt_ids:
-                try:
-                    metrics = self.get_prompt_performance(prompt_id, days)
-                    prompt = Prompt.query.get(prompt_id)
-                    
-                    if prompt and metrics:
-                        prompt_detail = {
-                            "id": prompt_id,
-                            "name": metrics.prompt_name,
-                            "version": prompt.version,
-                            "type": prompt.prompt_type,
-                            "total_calls": int(metrics.total_calls),
-                            "success_rate": float(metrics.success_rate),
-                            "avg_response_time": float(metrics.avg_response_time),
-                            "total_cost": float(metrics.total_cost),
-                            "avg_tokens_used": int(metrics.avg_tokens_used),
-                            "error_count": int(metrics.error_count),
-                            "last_used": metrics.last_used.isoformat() if metrics.last_used else None
-                        }
-                        
-                        prompt_metrics.append(prompt_detail)
-                        total_cost += metrics.total_cost
-                        total_traces += metrics.total_calls
-                        
-                        if metrics.total_calls > 0:
-                            success_rates.append(metrics.success_rate)
-                            response_times.append(metrics.avg_response_time)
-                        
-                        # Get recommendations for this prompt
-                        recommendations = self.get_cost_optimization_recommendations(prompt_id)
-                        for rec in recommendations:
-                            all_recommendations.append(f"{rec.get('title', 'Optimization')}: {rec.get('description', 'No details')}")
-                        
-                except Exception as e:
-                    logger.warning(f"Failed to get metrics for prompt {prompt_id}: {e}")
-                    continue
-            
-            # Calculate overall metrics
-            avg_success_rate = float(sum(success_rates) / len(success_rates)) if success_rates else 0.0
-            avg_response_time = float(sum(response_times) / len(response_times)) if response_times else 0.0
-            
-            # Find top performing prompt
-            top_performing_prompt = None
-            if prompt_metrics:
-                # Ensure success_rate is numeric for comparison
-                for metric in prompt_metrics:
-                    if isinstance(metric['success_rate'], str):
-                        try:
-                            metric['success_rate'] = float(metric['success_rate'])
-                        except (ValueError, TypeError):
-                            metric['success_rate'] = 0.0
-                top_performing_prompt = max(prompt_metrics, key=lambda p: float(p['success_rate']))
-            
-            # Build comprehensive report
-            report = {
-                "generated_at": datetime.utcnow().isoformat(),
-                "evaluation_period_days": int(days),
-                "prompts_analyzed": len(prompt_metrics),
-                "total_traces": int(total_traces),
-                "total_cost": float(total_cost),
-                "avg_success_rate": float(avg_success_rate),
-                "avg_response_time": float(avg_response_time),
-                "top_performing_prompt": top_performing_prompt,
-                "prompt_details": prompt_metrics,
-                "recommendations": all_recommendations[:10],  # Limit to top 10
-                "cost_breakdown": {
-                    "daily_average": float(total_cost / days) if days > 0 else 0.0,
-                    "cost_per_trace": float(total_cost / total_traces) if total_traces > 0 else 0.0,
-                    "optimization_potential": float(total_cost * 0.285),  # 28.5% estimated savings
-                },
-                "performance_summary": {
-                    "excellent_prompts": len([p for p in prompt_metrics if float(p['success_rate']) >= 90]),
-                    "good_prompts": len([p for p in prompt_metrics if 70 <= float(p['success_rate']) < 90]),
-                    "needs_improvement": len([p for p in prompt_metrics if float(p['success_rate']) < 70]),
-                    "high_cost_prompts": len([p for p in prompt_metrics if float(p['total_cost']) > 10]),
-                }
-            }
-            
-            return report
+            report = EvaluationReport(self, days)
+            for prompt_detail in self.iter_prompt_metrics(prompt_ids, days):
+                report.add(prompt_detail)
+            return report.summary(include_details=True)
             
         except Exception as e:
             logger.error(f"Error generating evaluation report: {e}")
             return {"error": str(e)}
     
+    def stream_evaluation_report(self, prompt_ids: List[int], days: int = 30) -> Iterator[Dict[str, Any]]:
+        """
+        The evaluation report as a sequence of records for large prompt catalogs.
+        
+        Yields ``{"prompt": {...}}`` per prompt, page by page, then one
+        ``{"summary": {...}}`` record (the report without prompt_details).
+        """
+        report = EvaluationReport(self, days)
+        for prompt_detail in self.iter_prompt_metrics(prompt_ids, days):
+            report.add(prompt_detail)
+            yield {"prompt": prompt_detail}
+        yield {"summary": report.summary(include_details=False)}
+    
     def get_prompt_version_history(self, prompt_name: str) -> List[Dict[str, Any]]:
         """Get version history for a specific prompt."""
         try:
             prompts = Prompt.query.filter(Prompt.name == prompt_name).order_by(desc(Prompt.created_at)).all()
             
+            # Last 7 days, all versions in one query
+            metrics_by_id = {
+                row["id"]: self._to_metrics(row)
+                for row in self.iter_prompt_metrics([prompt.id for prompt in prompts], days=7)
+            }
+            
             history = []
             for prompt in prompts:
-                metrics = self.get_prompt_performance(prompt.id, days=7)  # Last 7 days
+                metrics = metrics_by_id[prompt.id]
                 history.append({
                     "version": prompt.version,
                     "created_at": prompt.created_at.isoformat(),
@@ -372,4 +374,83 @@ class PromptEvaluator:
             
         except Exception as e:
             logger.error(f"Error getting prompt version history: {e}")
-            return [] 
\ No newline at end of file
+            return []
+
+
+class EvaluationReport:
+    """Accumulates report totals from prompt rows, so details can be streamed."""
+    
+    def __init__(self, evaluator: PromptEvaluator, days: int):
+        self.evaluator = evaluator
+        self.days = days
+        self.prompt_details: List[Dict[str, Any]] = []
+        self.prompts_analyzed = 0
+        self.total_cost = 0.0
+        self.total_traces = 0
+        self.success_rates: List[float] = []
+        self.response_times: List[float] = []
+        self.recommendations: List[str] = []
+        self.top_performing_prompt: Optional[Dict[str, Any]] = None
+        self.performance_counts = {
+            "excellent_prompts": 0,
+            "good_prompts": 0,
+            "needs_improvement": 0,
+            "high_cost_prompts": 0,
+        }
+    
+    def add(self, prompt_detail: Dict[str, Any]):
+        self.prompt_details.append(prompt_detail)
+        self.prompts_analyzed += 1
+        self.total_cost += prompt_detail["total_cost"]
+        self.total_traces += prompt_detail["total_calls"]
+        
+        success_rate = prompt_detail["success_rate"]
+        if prompt_detail["total_calls"] > 0:
+            self.success_rates.append(success_rate)
+            self.response_times.append(prompt_detail["avg_response_time"])
+        
+        if self.top_performing_prompt is None or success_rate > self.top_performing_prompt["success_rate"]:
+            self.top_performing_prompt = prompt_detail
+        
+        if success_rate >= 90:
+            self.performance_counts["excellent_prompts"] += 1
+        elif success_rate >= 70:
+            self.performance_counts["good_prompts"] += 1
+        else:
+            self.performance_counts["needs_improvement"] += 1
+        if prompt_detail["total_cost"] > 10:
+            self.performance_counts["high_cost_prompts"] += 1
+        
+        # Limit to top 10
+        if len(self.recommendations) < 10:
+            metrics = self.evaluator._to_metrics(prompt_detail)
+            for rec in self.evaluator._recommendations_for(metrics):
+                self.recommendations.append(f"{rec.get('title', 'Optimization')}: {rec.get('description', 'No details')}")
+            self.recommendations = self.recommendations[:10]
+    
+    def summary(self, include_details: bool = True) -> Dict[str, Any]:
+        days = self.days
+        total_cost = self.total_cost
+        total_traces = self.total_traces
+        
+        report = {
+            "generated_at": datetime.utcnow().isoformat(),
+            "evaluation_period_days": int(days),
+            "prompts_analyzed": self.prompts_analyzed,
+            "total_traces": int(total_traces),
+            "total_cost": float(total_cost),
+            "avg_success_rate": float(sum(self.success_rates) / len(self.success_rates)) if self.success_rates else 0.0,
+            "avg_response_time": float(sum(self.response_times) / len(self.response_times)) if self.response_times else 0.0,
+            "top_performing_prompt": self.top_performing_prompt,
+            "prompt_details": self.prompt_details,
+            "recommendations": self.recommendations,
+            "cost_breakdown": {
+                "daily_average": float(total_cost / days) if days > 0 else 0.0,
+                "cost_per_trace": float(total_cost / total_traces) if total_traces > 0 else 0.0,
+                "optimization_potential": float(total_cost * 0.285),  # 28.5% estimated savings
+            },
+            "performance_summary": dict(self.performance_counts)
+        }
+        if not include_details:
+            del report["prompt_details"]
+        return report
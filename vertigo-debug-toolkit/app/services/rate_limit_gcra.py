@@ -0,0 +1,112 @@
+"""
+GCRA Rate Limit Engine
+Generic cell rate algorithm shared by the Redis script and the in-process fallback.
+
+Each rule keeps one value per identifier: the theoretical arrival time (TAT)
+in epoch milliseconds. A rule allowing ``limit`` requests per ``window`` has
+an emission interval of ``window / limit``; a request is admitted while the
+TAT it would produce is no more than one window ahead of now. This gives the
+same steady-state rate as a fixed window counter without the double burst at
+window boundaries, and needs no separate expiry bookkeeping.
+
+All rules for a request are evaluated together: the request is only counted
+against any rule when every rule admits it. A single call can also lease a
+block of tokens for a worker to hand out locally.
+"""
+
+import math
+from typing import List, Optional, Sequence, Tuple
+
+# KEYS: one TAT key per rule
+# ARGV: max tokens to grant, lease fraction, tokens to refund, then emission
+#       interval (ms) and limit for each rule
+# Returns: tokens granted (0 when rejected), then remaining, reset-after (ms)
+#          and retry-after (ms) per rule
+GCRA_LUA = """
+if redis.replicate_commands then redis.replicate_commands() end
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local max_tokens = tonumber(ARGV[1])
+local fraction = tonumber(ARGV[2])
+local refund = tonumber(ARGV[3])
+local tats, available = {}, {}
+local min_available = nil
+for i = 1, #KEYS do
+    local interval = tonumber(ARGV[2 * i + 2])
+    local limit = tonumber(ARGV[2 * i + 3])
+    local tat = tonumber(redis.call('GET', KEYS[i])) or now
+    tat = math.max(tat - refund * interval, now)
+    tats[i] = tat
+    available[i] = math.floor((now + limit * interval - tat) / interval + 1e-9)
+    if min_available == nil or available[i] < min_available then min_available = available[i] end
+end
+local granted = 0
+if min_available >= 1 then
+    granted = math.min(max_tokens, math.max(1, math.floor(min_available * fraction)), min_available)
+end
+local result = {granted}
+for i = 1, #KEYS do
+    local interval = tonumber(ARGV[2 * i + 2])
+    local limit = tonumber(ARGV[2 * i + 3])
+    local new_tat = tats[i] + granted * interval
+    if granted > 0 or refund > 0 then
+        redis.call('SET', KEYS[i], string.format('%.3f', new_tat), 'PX', math.max(math.ceil(new_tat - now), 1))
+    end
+    local retry = 0
+    if available[i] < 1 then retry = math.ceil(tats[i] + interval - limit * interval - now) end
+    table.insert(result, math.max(available[i] - granted, 0))
+    table.insert(result, math.ceil(new_tat - now))
+    table.insert(result, retry)
+end
+return result
+"""
+
+# (emission interval in ms, limit) for one rule
+RuleSpec = Tuple[float, int]
+# (remaining, reset after ms, retry after ms) for one rule
+RuleDecision = Tuple[int, int, int]
+
+
+def rule_spec(limit: int, window_seconds: int) -> RuleSpec:
+    return window_seconds * 1000.0 / limit, limit
+
+
+def gcra_lease(tats: Sequence[Optional[float]], specs: Sequence[RuleSpec], now_ms: float,
+               max_tokens: int = 1, fraction: float = 0.0,
+               refund: int = 0) -> Tuple[int, List[Optional[float]], List[RuleDecision]]:
+    """
+    Grant up to max_tokens requests against all rules at once; mirrors GCRA_LUA.
+
+    The grant is ``fraction`` of the tightest rule's remaining quota (at least
+    one, at most what is left), so leases shrink as a limit is approached.
+    ``refund`` returns unused tokens from an earlier lease first.
+
+    Returns (tokens granted, new TATs, per-rule decisions). Zero tokens means
+    the request is rejected; new TATs are None when nothing needs writing.
+    """
+    adjusted, available = [], []
+    for tat, (interval, limit) in zip(tats, specs):
+        tat = max((now_ms if tat is None else tat) - refund * interval, now_ms)
+        adjusted.append(tat)
+        available.append(math.floor((now_ms + limit * interval - tat) / interval + 1e-9))
+
+    min_available = min(available)
+    granted = 0
+    if min_available >= 1:
+        granted = min(max_tokens, max(1, math.floor(min_available * fraction)), min_available)
+
+    new_tats: List[Optional[float]] = []
+    decisions: List[RuleDecision] = []
+    for tat, (interval, limit), free in zip(adjusted, specs, available):
+        new_tat = tat + granted * interval
+        new_tats.append(new_tat if granted or refund else None)
+        retry = math.ceil(tat + interval - limit * interval - now_ms) if free < 1 else 0
+        decisions.append((max(free - granted, 0), math.ceil(new_tat - now_ms), retry))
+    return granted, new_tats, decisions
+
+
+def gcra_used(tat: Optional[float], spec: RuleSpec, now_ms: float) -> int:
+    """Requests currently counted against a rule, from its stored TAT."""
+    if tat is None or tat <= now_ms:
+        return 0
+    return min(math.ceil((tat - now_ms) / spec[0]), spec[1])
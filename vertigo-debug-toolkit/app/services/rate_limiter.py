@@ -6,7 +6,10 @@ user tiers, and sophisticated rate limiting rules for the Vertigo Debug Toolkit.
 """
 
 import os
+import re
 import json
+import threading
+import time
 import redis
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple, Any
@@ -16,6 +19,8 @@ from dataclasses import dataclass
 from enum import Enum
 import logging
 
+from app.services.rate_limit_gcra import GCRA_LUA, gcra_lease, gcra_used, rule_spec
+
 logger = logging.getLogger(__name__)
 
 
@@ -48,6 +53,14 @@ class RateLimitRule:
     burst_limit: Optional[int] = None  # Short-term burst allowance
 
 
+@dataclass
+class TokenLease:
+    """Tokens leased from Redis for one request's rule keys, spent locally."""
+    tokens: int
+    expires_at: float  # time.monotonic()
+    decisions: List[Tuple[int, float, float]]  # per rule: remaining after the grant, reset at, retry at (monotonic ms)
+
+
 @dataclass 
 class RateLimitResult:
     """Result of rate limit check."""
@@ -67,8 +80,20 @@ class RateLimiterService:
         """Initialize rate limiter service."""
         self.redis_url = redis_url or os.getenv('REDIS_URL', 'redis://localhost:6379/0')
         self._redis_client = None
+        self._gcra_script = None
         self._initialized = False
         
+        # 'atomic': one Redis call per request; 'leased': workers lease blocks
+        # of tokens from Redis and decide locally until the lease runs out
+        self.mode = os.getenv('RATE_LIMIT_MODE', 'atomic')
+        self.lease_fraction = float(os.getenv('RATE_LIMIT_LEASE_FRACTION', '0.1'))
+        self.max_lease = int(os.getenv('RATE_LIMIT_MAX_LEASE', '50'))
+        self.lease_ttl_seconds = int(os.getenv('RATE_LIMIT_LEASE_TTL_MS', '1000')) / 1000
+        self.max_leases = 10000
+        self._leases: Dict[Tuple[str, ...], TokenLease] = {}
+        self._lease_lock = threading.Lock()
+        self.lease_stats = {'local_decisions': 0, 'redis_calls': 0, 'tokens_leased': 0, 'tokens_refunded': 0}
+        
         # Default rate limit rules by tier and strategy
         self.default_rules = {
             # API Rate Limits
@@ -114,6 +139,23 @@ class RateLimiterService:
             r'/static/.*',
             r'/favicon.ico$',
         ]
+        self._compile_rules()
+    
+    def _compile_rules(self):
+        """Precompile bypass and endpoint patterns into per-tier rule-match tables."""
+        self._bypass_regex = re.compile('|'.join(f"(?:{pattern})" for pattern in self.bypass_patterns))
+        
+        # tier -> [(rule, compiled endpoint pattern or None)]
+        self._rule_table: Dict[RateLimitTier, List[Tuple[RateLimitRule, Optional[re.Pattern]]]] = {}
+        for tier in RateLimitTier:
+            entries = []
+            for strategy in [RateLimitStrategy.PER_USER, RateLimitStrategy.PER_IP, RateLimitStrategy.PER_ENDPOINT]:
+                for rule in self.default_rules.get((tier, strategy), []):
+                    pattern = None
+                    if rule.strategy == RateLimitStrategy.PER_ENDPOINT and rule.endpoint_pattern:
+                        pattern = re.compile(rule.endpoint_pattern)
+                    entries.append((rule, pattern))
+            self._rule_table[tier] = entries
     
     @property
     def redis_client(self) -> redis.Redis:
@@ -123,6 +165,7 @@ class RateLimiterService:
                 self._redis_client = redis.from_url(self.redis_url, decode_responses=True)
                 # Test connection
                 self._redis_client.ping()
+                self._gcra_script = self._redis_client.register_script(GCRA_LUA)
                 self._initialized = True
                 logger.info("Redis connection established for rate limiting")
             except Exception as e:
@@ -150,30 +193,36 @@ class RateLimiterService:
         
         return RateLimitTier.FREE
     
-    def get_identifier(self, strategy: RateLimitStrategy, endpoint: str = None) -> str:
+    def get_identifier(self, strategy: RateLimitStrategy, endpoint: str = None, user=None,
+                       remote_addr: str = None) -> str:
         """Get rate limit identifier based on strategy."""
+        if user is None:
+            user = current_user._get_current_object()
+        if remote_addr is None:
+            remote_addr = request.remote_addr
+        
         if strategy == RateLimitStrategy.PER_USER:
-            if current_user.is_authenticated:
-                return f"user:{current_user.id}"
+            if user.is_authenticated:
+                return f"user:{user.id}"
             else:
-                return f"ip:{request.remote_addr}"
+                return f"ip:{remote_addr}"
         
         elif strategy == RateLimitStrategy.PER_IP:
-            return f"ip:{request.remote_addr}"
+            return f"ip:{remote_addr}"
         
         elif strategy == RateLimitStrategy.PER_ENDPOINT:
             identifier = f"endpoint:{endpoint}"
-            if current_user.is_authenticated:
-                identifier += f":user:{current_user.id}"
+            if user.is_authenticated:
+                identifier += f":user:{user.id}"
             else:
-                identifier += f":ip:{request.remote_addr}"
+                identifier += f":ip:{remote_addr}"
             return identifier
         
         elif strategy == RateLimitStrategy.GLOBAL:
             return "global"
         
         else:
-            return f"unknown:{request.remote_addr}"
+            return f"unknown:{remote_addr}"
     
     def check_rate_limit(self, endpoint: str = None) -> RateLimitResult:
         """Check rate limit for current request."""
@@ -181,64 +230,39 @@ class RateLimiterService:
             endpoint = request.endpoint or request.path
         
         # Check bypass patterns
-        import re
-        for pattern in self.bypass_patterns:
-            if re.match(pattern, request.path):
-                return RateLimitResult(
-                    allowed=True,
-                    limit=999999,
-                    remaining=999999,
-                    reset_time=int((datetime.now() + timedelta(hours=1)).timestamp())
-                )
-        
-        user_tier = self.get_user_tier()
+        if self._bypass_regex.match(request.path):
+            return RateLimitResult(
+                allowed=True,
+                limit=999999,
+                remaining=999999,
+                reset_time=int((datetime.now() + timedelta(hours=1)).timestamp())
+            )
         
-        # Get applicable rules for user tier
-        applicable_rules = self._get_applicable_rules(user_tier, endpoint)
+        user_tier = self.get_user_tier(current_user._get_current_object())
         
-        # Check each rule and return the most restrictive result
-        most_restrictive = None
+        # Get applicable rules for user tier, skipping those admins bypass
+        applicable_rules = [
+            rule for rule in self._get_applicable_rules(user_tier, endpoint)
+            if not (rule.bypass_admin and user_tier == RateLimitTier.ADMIN)
+        ]
         
-        for rule in applicable_rules:
-            # Check if admin should bypass this rule
-            if rule.bypass_admin and user_tier == RateLimitTier.ADMIN:
-                continue
-            
-            result = self._check_single_rule(rule, endpoint)
-            
-            if not result.allowed:
-                return result
-            
-            # Track most restrictive allowed rule for headers
-            if most_restrictive is None or result.remaining < most_restrictive.remaining:
-                most_restrictive = result
+        if not applicable_rules:
+            return RateLimitResult(
+                allowed=True,
+                limit=1000,
+                remaining=1000,
+                reset_time=int((datetime.now() + timedelta(hours=1)).timestamp()),
+                tier=user_tier
+            )
         
-        return most_restrictive or RateLimitResult(
-            allowed=True,
-            limit=1000,
-            remaining=1000,
-            reset_time=int((datetime.now() + timedelta(hours=1)).timestamp()),
-            tier=user_tier
-        )
+        return self._check_rules(applicable_rules, endpoint)
     
     def _get_applicable_rules(self, tier: RateLimitTier, endpoint: str) -> List[RateLimitRule]:
         """Get applicable rate limit rules for tier and endpoint."""
-        rules = []
-        
-        # Add default rules for tier
-        for strategy in [RateLimitStrategy.PER_USER, RateLimitStrategy.PER_IP, RateLimitStrategy.PER_ENDPOINT]:
-            tier_rules = self.default_rules.get((tier, strategy), [])
-            for rule in tier_rules:
-                if rule.strategy == RateLimitStrategy.PER_ENDPOINT:
-                    # Check if endpoint matches pattern
-                    if rule.endpoint_pattern:
-                        import re
-                        if re.search(rule.endpoint_pattern, endpoint):
-                            rules.append(rule)
-                    else:
-                        rules.append(rule)
-                else:
-                    rules.append(rule)
+        rules = [
+            rule for rule, pattern in self._rule_table.get(tier, [])
+            if pattern is None or pattern.search(endpoint)
+        ]
         
         # Add custom rules
         custom_rules = self.custom_rules.get(endpoint, [])
@@ -246,63 +270,34 @@ class RateLimiterService:
         
         return rules
     
-    def _check_single_rule(self, rule: RateLimitRule, endpoint: str) -> RateLimitResult:
-        """Check a single rate limit rule."""
-        identifier = self.get_identifier(rule.strategy, endpoint)
-        key = f"rate_limit:{identifier}:{rule.window_seconds}"
+    def _rule_key(self, rule: RateLimitRule, endpoint: str, user=None, remote_addr: str = None) -> str:
+        # Rules can share an identifier (per-user falls back to the IP for
+        # anonymous requests), so each (window, limit) gets its own TAT
+        identifier = self.get_identifier(rule.strategy, endpoint, user, remote_addr)
+        return f"rate_limit:{identifier}:{rule.window_seconds}:{rule.limit}"
+    
+    def _check_rules(self, rules: List[RateLimitRule], endpoint: str) -> RateLimitResult:
+        """
+        Check all rules for a request in one atomic step.
+        
+        With Redis this is a single script call (one round trip) regardless of
+        the number of rules, or none while a leased block of tokens lasts.
+        Returns the rejecting rule's result, or the most restrictive allowed
+        one for headers.
+        """
+        user, remote_addr = current_user._get_current_object(), request.remote_addr
+        keys = [self._rule_key(rule, endpoint, user, remote_addr) for rule in rules]
+        specs = [rule_spec(rule.limit, rule.window_seconds) for rule in rules]
         
         try:
-            # Get current count and window info
-            pipe = self.redis_client.pipeline()
-            pipe.get(key)
-            pipe.ttl(key)
-            current_count, ttl = pipe.execute()
-            
-            current_count = int(current_count or 0)
-            
-            # Check if limit exceeded
-            if current_count >= rule.limit:
-                reset_time = int(datetime.now().timestamp()) + max(ttl, 0)
-                return RateLimitResult(
-                    allowed=False,
-                    limit=rule.limit,
-                    remaining=0,
-                    reset_time=reset_time,
-                    retry_after=max(ttl, 1),
-                    tier=rule.tier
-                )
-            
-            # Increment counter
-            pipe = self.redis_client.pipeline()
-            pipe.incr(key)
-            pipe.expire(key, rule.window_seconds)
-            new_count, _ = pipe.execute()
-            new_count = int(new_count)
-            
-            # Calculate reset time
-            if ttl <= 0:
-                reset_time = int((datetime.now() + timedelta(seconds=rule.window_seconds)).timestamp())
+            if self.mode == 'leased' and not isinstance(self.redis_client, FallbackMemoryStorage):
+                allowed, decisions = self._leased_decision(keys, specs)
             else:
-                reset_time = int(datetime.now().timestamp()) + ttl
-            
-            # Check soft limit warning
-            warning = False
-            if rule.soft_limit and new_count >= rule.soft_limit:
-                warning = True
-                logger.warning(f"Rate limit soft threshold reached for {identifier}: {new_count}/{rule.limit}")
-            
-            return RateLimitResult(
-                allowed=True,
-                limit=rule.limit,
-                remaining=max(0, rule.limit - new_count),
-                reset_time=reset_time,
-                tier=rule.tier,
-                warning=warning
-            )
-        
+                allowed, decisions = self._evaluate(keys, specs)
         except Exception as e:
-            logger.error(f"Error checking rate limit for {identifier}: {e}")
+            logger.error(f"Error checking rate limit for {keys}: {e}")
             # Fail open - allow request if Redis is down
+            rule = min(rules, key=lambda r: r.limit)
             return RateLimitResult(
                 allowed=True,
                 limit=rule.limit,
@@ -310,6 +305,128 @@ class RateLimiterService:
                 reset_time=int((datetime.now() + timedelta(seconds=rule.window_seconds)).timestamp()),
                 tier=rule.tier
             )
+        
+        now = time.time()
+        if not allowed:
+            # Report the rule that frees up last; a wait that has just lapsed still reads as one second
+            rule, (remaining, reset_after_ms, retry_after_ms) = max(zip(rules, decisions), key=lambda pair: pair[1][2])
+            return RateLimitResult(
+                allowed=False,
+                limit=rule.limit,
+                remaining=0,
+                reset_time=int(now + reset_after_ms / 1000),
+                retry_after=max(int(-(-retry_after_ms // 1000)), 1),
+                tier=rule.tier
+            )
+        
+        most_restrictive = None
+        for rule, key, (remaining, reset_after_ms, retry_after_ms) in zip(rules, keys, decisions):
+            # Check soft limit warning
+            used = rule.limit - remaining
+            warning = bool(rule.soft_limit and used >= rule.soft_limit)
+            if warning:
+                logger.warning(f"Rate limit soft threshold reached for {key}: {used}/{rule.limit}")
+            
+            result = RateLimitResult(
+                allowed=True,
+                limit=rule.limit,
+                remaining=remaining,
+                reset_time=int(now + reset_after_ms / 1000),
+                tier=rule.tier,
+                warning=warning
+            )
+            
+            # Track most restrictive allowed rule for headers
+            if most_restrictive is None or result.remaining < most_restrictive.remaining:
+                most_restrictive = result
+        
+        return most_restrictive
+    
+    def _evaluate(self, keys: List[str], specs: List[Tuple[float, int]], max_tokens: int = 1,
+                  refund: int = 0) -> Tuple[int, List[Tuple[int, int, int]]]:
+        """
+        Run GCRA for all keys atomically: Redis script, or the in-process fallback.
+        
+        Returns (tokens granted, per-rule decisions); more than one token is
+        only granted when leasing.
+        """
+        client = self.redis_client
+        fraction = self.lease_fraction if max_tokens > 1 else 0.0
+        if isinstance(client, FallbackMemoryStorage):
+            return client.gcra(keys, specs, max_tokens, fraction, refund)
+        
+        args = [max_tokens, fraction, refund]
+        for interval, limit in specs:
+            args.extend((interval, limit))
+        reply = self._gcra_script(keys=keys, args=args, client=client)
+        decisions = [tuple(int(value) for value in reply[i:i + 3]) for i in range(1, len(reply), 3)]
+        return int(reply[0]), decisions
+    
+    def _leased_decision(self, keys: List[str], specs: List[Tuple[float, int]]):
+        """
+        Decide from a local token lease, leasing a new block from Redis when
+        the current one is spent or expired.
+        
+        Leased tokens are already counted in Redis, so workers never admit more
+        than the limit. Each lease is at most ``lease_fraction`` of the tightest
+        rule's remaining quota (one token near the limit) and lives for
+        ``lease_ttl_seconds``; unused tokens are refunded on the next lease. A
+        worker that dies holds back at most its outstanding lease, which GCRA
+        returns to everyone at the rule's normal rate. Rejections are also
+        kept locally until their retry-after (or the lease TTL).
+        """
+        lease_key = tuple(keys)
+        refund = 0
+        with self._lease_lock:
+            lease = self._leases.pop(lease_key, None)
+            if lease is not None:
+                now = time.monotonic()
+                if now < lease.expires_at:
+                    now_ms = now * 1000
+                    self.lease_stats['local_decisions'] += 1
+                    if not lease.tokens:
+                        # Rejected by Redis until retry-after; reject locally too
+                        self._leases[lease_key] = lease
+                        return 0, [(0, reset_at - now_ms, max(retry_at - now_ms, 0))
+                                   for remaining, reset_at, retry_at in lease.decisions]
+                    lease.tokens -= 1
+                    if lease.tokens:
+                        self._leases[lease_key] = lease
+                    return 1, [(remaining + lease.tokens, reset_at - now_ms, 0)
+                               for remaining, reset_at, _ in lease.decisions]
+                refund = lease.tokens
+        
+        granted, decisions = self._evaluate(keys, specs, self.max_lease, refund)
+        now = time.monotonic()
+        now_ms = now * 1000
+        with self._lease_lock:
+            self.lease_stats['redis_calls'] += 1
+            self.lease_stats['tokens_leased'] += granted
+            self.lease_stats['tokens_refunded'] += refund
+            if granted != 1:
+                if len(self._leases) >= self.max_leases:
+                    self._prune_leases()
+                lifetime = self.lease_ttl_seconds
+                if not granted:
+                    lifetime = min(lifetime, max(retry for _, _, retry in decisions) / 1000)
+                self._leases[lease_key] = TokenLease(
+                    tokens=max(granted - 1, 0),
+                    expires_at=now + lifetime,
+                    decisions=[(remaining, now_ms + reset_after, now_ms + retry)
+                               for remaining, reset_after, retry in decisions]
+                )
+        
+        # This request uses one granted token; the rest stay in the lease
+        return granted, [(remaining + max(granted - 1, 0), reset_after, retry)
+                         for remaining, reset_after, retry in decisions]
+    
+    def _prune_leases(self):
+        """Drop expired leases (caller holds the lease lock); their tokens lapse."""
+        now = time.monotonic()
+        for lease_key in [k for k, lease in self._leases.items() if lease.expires_at <= now]:
+            del self._leases[lease_key]
+        if len(self._leases) >= self.max_leases:
+            self._leases.clear()
     
     def add_custom_rule(self, endpoint: str, rule: RateLimitRule):
         """Add custom rate limit rule for specific endpoint."""
@@ -331,16 +448,21 @@ class RateLimiterService:
         
         # Get status for each strategy
         for strategy in RateLimitStrategy:
-            identifier = self.get_identifier(strategy, endpoint or "/api/test")
-            key = f"rate_limit:{identifier}:3600"  # Check hourly limit
+            # Check hourly limit
+            hourly_rule = next((rule for rule in self.default_rules.get((tier, strategy), [])
+                                if rule.window_seconds == 3600 and not rule.endpoint_pattern), None)
             
             try:
-                current_count = int(self.redis_client.get(key) or 0)
-                ttl = self.redis_client.ttl(key)
+                current_count, tat, now_ms = 0, None, time.time() * 1000
+                if hourly_rule:
+                    # Keys hold the GCRA theoretical arrival time (epoch ms)
+                    tat = self.redis_client.get(self._rule_key(hourly_rule, endpoint or "/api/test"))
+                    tat = float(tat) if tat is not None else None
+                    current_count = gcra_used(tat, rule_spec(hourly_rule.limit, hourly_rule.window_seconds), now_ms)
                 
                 status['limits'][strategy.value] = {
                     'current_count': current_count,
-                    'reset_in_seconds': max(ttl, 0)
+                    'reset_in_seconds': max(int((tat - now_ms) / 1000), 0) if tat else 0
                 }
             except Exception as e:
                 status['limits'][strategy.value] = {
@@ -392,6 +514,9 @@ class RateLimiterService:
             
             metrics['by_strategy'] = strategy_counts
             
+            with self._lease_lock:
+                metrics['leasing'] = dict(self.lease_stats, mode=self.mode, active_leases=len(self._leases))
+            
             return metrics
         
         except Exception as e:
@@ -404,43 +529,49 @@ class FallbackMemoryStorage:
     
     def __init__(self):
         self._storage = {}
-        self._expiry = {}
+        self._expiry = {}  # key -> epoch seconds
+        self._lock = threading.Lock()
+    
+    def gcra(self, keys: List[str], specs: List[Tuple[float, int]], max_tokens: int = 1,
+             fraction: float = 0.0, refund: int = 0):
+        """
+        In-process equivalent of the GCRA script: all keys are checked and
+        updated together. The lock only covers a few dictionary reads and
+        writes, with no I/O.
+        """
+        now = time.time()
+        now_ms = now * 1000
+        with self._lock:
+            tats = []
+            for key in keys:
+                expires_at = self._expiry.get(key)
+                tats.append(None if expires_at is not None and expires_at <= now else self._storage.get(key))
+            granted, new_tats, decisions = gcra_lease(tats, specs, now_ms, max_tokens, fraction, refund)
+            for key, new_tat in zip(keys, new_tats):
+                if new_tat is not None:
+                    self._storage[key] = new_tat
+                    self._expiry[key] = new_tat / 1000
+        return granted, decisions
     
     def get(self, key):
         """Get value with expiry check."""
-        if key in self._expiry:
-            if datetime.now() > self._expiry[key]:
-                del self._storage[key]
-                del self._expiry[key]
-                return None
+        expires_at = self._expiry.get(key)
+        if expires_at is not None and time.time() > expires_at:
+            self._storage.pop(key, None)
+            self._expiry.pop(key, None)
+            return None
         return self._storage.get(key)
     
-    def incr(self, key):
-        """Increment value."""
-        current = int(self.get(key) or 0)
-        self._storage[key] = current + 1
-        return self._storage[key]
-    
-    def expire(self, key, seconds):
-        """Set expiration."""
-        self._expiry[key] = datetime.now() + timedelta(seconds=seconds)
-    
     def ttl(self, key):
         """Get time to live."""
         if key in self._expiry:
-            remaining = (self._expiry[key] - datetime.now()).total_seconds()
-            return max(0, int(remaining))
+            return max(0, int(self._expiry[key] - time.time()))
         return -1
     
-    def pipeline(self):
-        """Mock pipeline."""
-        return MockPipeline(self)
-    
     def keys(self, pattern):
         """Mock keys."""
-        import re
         pattern_regex = pattern.replace('*', '.*')
-        return [k for k in self._storage.keys() if re.match(pattern_regex, k)]
+        return [k for k in list(self._storage.keys()) if re.match(pattern_regex, k)]
     
     def delete(self, *keys):
         """Delete keys."""
@@ -449,43 +580,5 @@ class FallbackMemoryStorage:
             self._expiry.pop(key, None)
 
 
-class MockPipeline:
-    """Mock Redis pipeline for fallback storage."""
-    
-    def __init__(self, storage):
-        self.storage = storage
-        self.commands = []
-    
-    def get(self, key):
-        self.commands.append(('get', key))
-        return self
-    
-    def incr(self, key):
-        self.commands.append(('incr', key))
-        return self
-    
-    def expire(self, key, seconds):
-        self.commands.append(('expire', key, seconds))
-        return self
-    
-    def ttl(self, key):
-        self.commands.append(('ttl', key))
-        return self
-    
-    def execute(self):
-        results = []
-        for cmd in self.commands:
-            if cmd[0] == 'get':
-                results.append(self.storage.get(cmd[1]))
-            elif cmd[0] == 'incr':
-                results.append(self.storage.incr(cmd[1]))
-            elif cmd[0] == 'expire':
-                results.append(self.storage.expire(cmd[1], cmd[2]))
-            elif cmd[0] == 'ttl':
-                results.append(self.storage.ttl(cmd[1]))
-        self.commands = []
-        return results
-
-
 # Global rate limiter instance
 rate_limiter = RateLimiterService()
\ No newline at end of file
@@ -0,0 +1,341 @@
+"""
+Rolling metric statistics for real-time anomaly detection.
+Keeps each metric's recent samples in a NumPy ring buffer with O(1) online statistics,
+and sliding-window trace totals for detection straight from the ingest stream.
+"""
+
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _sign(value: float) -> int:
+    return (value > 0) - (value < 0)
+
+
+class RollingSeries:
+    """
+    Fixed-capacity ring buffer of (timestamp, value) samples for one metric.
+
+    Timestamps (epoch seconds) and values live in separate float64 arrays.
+    Each append updates, in O(1):
+    - windowed mean and variance over the buffered samples (Welford, with
+      the evicted sample removed when the buffer is full)
+    - exponentially weighted mean and variance
+    - streaming median and MAD estimates (stochastic approximation steps
+      scaled by the current MAD, so they track level shifts robustly)
+
+    Windowed moments are recomputed from the arrays once per ``capacity``
+    appends to bound floating-point drift, which stays O(1) amortized.
+    """
+
+    def __init__(self, capacity: int = 1000, ewma_alpha: float = 0.1, robust_rate: float = 0.05):
+        """
+        Initialize an empty series.
+
+        Args:
+            capacity: Number of samples kept
+            ewma_alpha: Weight of the newest sample in the EWMA statistics
+            robust_rate: Step size of the streaming median/MAD estimates
+        """
+        if capacity < 2:
+            raise ValueError("capacity must be at least 2")
+        self.capacity = capacity
+        self.ewma_alpha = ewma_alpha
+        self.robust_rate = robust_rate
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self._next = 0  # slot written by the next append
+        self._size = 0
+        self._since_resync = 0
+
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.ewma_mean: Optional[float] = None
+        self.ewma_var = 0.0
+        self.median: Optional[float] = None
+        self.mad = 0.0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, value: float, timestamp: Optional[float] = None):
+        """Add a sample, evicting the oldest one when the buffer is full."""
+        value = float(value)
+        if self._size == self.capacity:
+            self._remove(self.values[self._next])
+        else:
+            self._size += 1
+        self.timestamps[self._next] = time.time() if timestamp is None else timestamp
+        self.values[self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        self._add(value)
+        self._update_ewma(value)
+        self._update_robust(value)
+
+        self._since_resync += 1
+        if self._since_resync >= self.capacity:
+            self._resync()
+
+    def _add(self, value: float):
+        n = self._size
+        delta = value - self._mean
+        self._mean += delta / n
+        self._m2 += delta * (value - self._mean)
+
+    def _remove(self, value: float):
+        n = self._size - 1
+        if n == 0:
+            self._mean, self._m2 = 0.0, 0.0
+            return
+        delta = value - self._mean
+        self._mean -= delta / n
+        self._m2 -= delta * (value - self._mean)
+
+    def _update_ewma(self, value: float):
+        if self.ewma_mean is None:
+            self.ewma_mean = value
+            return
+        delta = value - self.ewma_mean
+        increment = self.ewma_alpha * delta
+        self.ewma_mean += increment
+        self.ewma_var = (1 - self.ewma_alpha) * (self.ewma_var + delta * increment)
+
+    def _update_robust(self, value: float):
+        if self.median is None:
+            self.median = value
+            return
+        # Step proportional to the spread (or to the level while the spread
+        # is still zero) so the estimates move at the data's scale
+        scale = self.mad or abs(self.median) * 0.01 or 1.0
+        step = self.robust_rate * scale
+        self.median += step * _sign(value - self.median)
+        self.mad = max(self.mad + step * _sign(abs(value - self.median) - self.mad), 0.0)
+
+    def _resync(self):
+        window = self.window_values()
+        self._mean = float(window.mean())
+        self._m2 = float(((window - self._mean) ** 2).sum())
+        self._since_resync = 0
+
+    @property
+    def mean(self) -> float:
+        """Mean of the buffered samples."""
+        return self._mean
+
+    @property
+    def variance(self) -> float:
+        """Sample variance of the buffered samples (0 with fewer than two)."""
+        if self._size < 2:
+            return 0.0
+        return max(self._m2 / (self._size - 1), 0.0)
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.variance))
+
+    @property
+    def ewma_std(self) -> float:
+        return float(np.sqrt(self.ewma_var))
+
+    def robust_z(self, value: float) -> Optional[float]:
+        """Deviation from the streaming median in MAD units (scaled to sigma), if the MAD is non-zero."""
+        if self.median is None or not self.mad:
+            return None
+        return abs(value - self.median) / (1.4826 * self.mad)
+
+    def last(self) -> Optional[float]:
+        if not self._size:
+            return None
+        return float(self.values[self._next - 1])
+
+    def tail(self, count: int) -> np.ndarray:
+        """Most recent ``count`` values, oldest first (a copy)."""
+        count = min(count, self._size)
+        start = self._next - count
+        if start >= 0:
+            return self.values[start:self._next].copy()
+        return np.concatenate((self.values[start:], self.values[:self._next]))
+
+    def tail_timestamps(self, count: int) -> np.ndarray:
+        """Timestamps matching ``tail(count)``."""
+        count = min(count, self._size)
+        start = self._next - count
+        if start >= 0:
+            return self.timestamps[start:self._next].copy()
+        return np.concatenate((self.timestamps[start:], self.timestamps[:self._next]))
+
+    def window_values(self) -> np.ndarray:
+        """All buffered values, oldest first."""
+        return self.tail(self._size)
+
+    def snapshot(self) -> Dict[str, Optional[float]]:
+        """Current statistics as plain floats."""
+        return {
+            'count': self._size,
+            'mean': self.mean,
+            'std': self.std,
+            'ewma_mean': self.ewma_mean,
+            'ewma_std': self.ewma_std,
+            'median': float(self.median) if self.median is not None else None,
+            'mad': float(self.mad)
+        }
+
+
+class RollingMetricStore:
+    """
+    Thread-safe collection of RollingSeries keyed by metric name.
+
+    Series are created on first append with the store's capacity and
+    smoothing settings.
+    """
+
+    def __init__(self, capacity: int = 1000, ewma_alpha: float = 0.1, robust_rate: float = 0.05):
+        """Initialize an empty store."""
+        self.capacity = capacity
+        self.ewma_alpha = ewma_alpha
+        self.robust_rate = robust_rate
+        self._series: Dict[str, RollingSeries] = {}
+        self._lock = threading.Lock()
+
+    def append(self, metric_name: str, value: float, timestamp: Optional[float] = None):
+        with self._lock:
+            series = self._series.get(metric_name)
+            if series is None:
+                series = RollingSeries(self.capacity, self.ewma_alpha, self.robust_rate)
+                self._series[metric_name] = series
+            series.append(value, timestamp)
+
+    def get(self, metric_name: str) -> Optional[RollingSeries]:
+        return self._series.get(metric_name)
+
+    def size(self, metric_name: str) -> int:
+        series = self._series.get(metric_name)
+        return len(series) if series is not None else 0
+
+    def aligned_tail(self, first: str, second: str, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Last ``count`` values of two metrics appended together (one poll per sample)."""
+        a, b = self._series.get(first), self._series.get(second)
+        if a is None or b is None:
+            return np.empty(0), np.empty(0)
+        count = min(count, len(a), len(b))
+        return a.tail(count), b.tail(count)
+
+    def items(self) -> Iterator[Tuple[str, RollingSeries]]:
+        return iter(list(self._series.items()))
+
+    def sizes(self) -> Dict[str, int]:
+        return {name: len(series) for name, series in self.items()}
+
+
+def _epoch_seconds(value: Any) -> Optional[float]:
+    """Epoch seconds for a datetime (naive values are UTC), ISO string or number."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return None
+
+
+class TraceWindow:
+    """
+    Sliding-window trace totals for the last ``window_seconds``.
+
+    Traces are counted in one-second buckets by start time (arrival time when
+    missing). Re-delivered or updated traces replace their earlier
+    contribution instead of being counted twice, and traces older than the
+    window (e.g. a historical backfill) are ignored. Adds and evictions are
+    O(log buckets); reading the totals is O(1).
+    """
+
+    # Contribution vector layout
+    FIELDS = ('total_traces', 'success_count', 'error_count', 'latency_sum_ms', 'latency_count', 'total_cost')
+
+    def __init__(self, window_seconds: float = 30):
+        """Initialize an empty window."""
+        self.window_seconds = window_seconds
+        self._totals = [0.0] * len(self.FIELDS)
+        self._buckets: Dict[int, Dict[str, Tuple[float, ...]]] = {}
+        self._heap: list = []
+        self._bucket_of: Dict[str, int] = {}
+
+    def add(self, trace: Dict[str, Any], now: Optional[float] = None):
+        """Count one trace event (a trace_stream event or live_traces-shaped dict)."""
+        now = time.time() if now is None else now
+        self._evict(now)
+
+        timestamp = _epoch_seconds(trace.get('start_time'))
+        if timestamp is None:
+            timestamp = trace.get('received_at') or now
+        if timestamp < now - self.window_seconds:
+            return
+        second = int(min(timestamp, now))
+
+        trace_id = trace.get('external_trace_id') or f"anonymous-{id(trace)}-{now}"
+        previous = self._bucket_of.pop(trace_id, None)
+        if previous is not None:
+            self._apply(self._buckets[previous].pop(trace_id), -1)
+
+        status = trace.get('status')
+        duration = trace.get('duration_ms')
+        contribution = (
+            1.0,
+            1.0 if status == 'success' else 0.0,
+            1.0 if status in ('error', 'failed') else 0.0,
+            float(duration) if duration is not None else 0.0,
+            1.0 if duration is not None else 0.0,
+            float(trace.get('cost_usd') or 0.0)
+        )
+        bucket = self._buckets.get(second)
+        if bucket is None:
+            bucket = self._buckets[second] = {}
+            heapq.heappush(self._heap, second)
+        bucket[trace_id] = contribution
+        self._bucket_of[trace_id] = second
+        self._apply(contribution, 1)
+
+    def _apply(self, contribution: Tuple[float, ...], sign: int):
+        for i, value in enumerate(contribution):
+            self._totals[i] += sign * value
+
+    def _evict(self, now: float):
+        cutoff = now - self.window_seconds
+        while self._heap and self._heap[0] < cutoff:
+            second = heapq.heappop(self._heap)
+            for trace_id, contribution in self._buckets.pop(second).items():
+                self._apply(contribution, -1)
+                del self._bucket_of[trace_id]
+        if not self._buckets:
+            self._totals = [0.0] * len(self.FIELDS)  # drop accumulated rounding
+
+    def totals(self, now: Optional[float] = None) -> Dict[str, float]:
+        self._evict(time.time() if now is None else now)
+        return dict(zip(self.FIELDS, self._totals))
+
+    def metrics(self, now: Optional[float] = None) -> Dict[str, float]:
+        """Window metrics named like AnomalyMonitoringEngine._collect_metrics."""
+        totals = self.totals(now)
+        traces = round(totals['total_traces'])
+        return {
+            'error_rate': totals['error_count'] / traces * 100 if traces else 0,
+            'avg_latency_ms': totals['latency_sum_ms'] / totals['latency_count'] if totals['latency_count'] >= 1 else 0,
+            'total_cost': totals['total_cost'],
+            'total_traces': traces,
+            'success_rate': totals['success_count'] / traces * 100 if traces else 100
+        }
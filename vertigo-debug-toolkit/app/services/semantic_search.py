@@ -3,38 +3,67 @@ Semantic search service for intelligent prompt discovery.
 """
 
 import logging
+import os
+import threading
 import numpy as np
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 import json
 import re
 
 from app.models import Prompt, Trace, Cost, db
-from sqlalchemy import func, and_
+from app.services.cache_service import MemoryCache
+from app.services.tenant_scope import current_tenant_id
+from app.services.vector_index import PromptVectorIndex
+from sqlalchemy import func, and_, case, event
 
 logger = logging.getLogger(__name__)
 
+# Bumped by ORM events whenever a prompt is written in this process
+_prompt_change_counter = 0
+
+
+@event.listens_for(Prompt, 'after_insert')
+@event.listens_for(Prompt, 'after_update')
+@event.listens_for(Prompt, 'after_delete')
+def _mark_prompts_changed(mapper, connection, target):
+    """Flag the vector index for an incremental sync on the next search."""
+    global _prompt_change_counter
+    _prompt_change_counter += 1
+
 class SemanticPromptSearch:
     """
     Semantic search service for finding relevant prompts based on query similarity.
     Uses sentence-transformers for embedding generation and cosine similarity for matching.
     """
     
-    def __init__(self, model_name: str = 'all-MiniLM-L6-v2'):
+    # Similarity below which prompts are not considered matches
+    MIN_SIMILARITY = 0.3
+    
+    # How long per-prompt performance metrics are reused between searches, and how many are kept
+    METRICS_TTL_SECONDS = 60
+    METRICS_CACHE_ITEMS = 5000
+    
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', index_dir: Optional[str] = None,
+                 index_mode: Optional[str] = None):
         """
         Initialize the semantic search service.
         
         Args:
             model_name: Name of the sentence transformer model to use
+            index_dir: Directory for the persistent vector index (SEMANTIC_INDEX_DIR)
+            index_mode: 'flat' (exact) or 'ivf' (approximate) search (SEMANTIC_INDEX_MODE)
         """
         self.model_name = model_name
         self.model = None
-        self.prompt_embeddings = {}
-        self.prompt_cache = {}
+        self.index = None
         self.last_cache_update = None
+        self._seen_prompt_changes = -1
+        self._metrics_cache = MemoryCache(max_items=self.METRICS_CACHE_ITEMS)
+        self._refresh_lock = threading.Lock()
         self._initialize_model()
+        self._initialize_index(index_dir, index_mode)
     
     def _initialize_model(self):
         """Initialize the sentence transformer model."""
@@ -46,9 +75,24 @@ class SemanticPromptSearch:
             logger.error(f"Failed to load semantic search model: {e}")
             raise
     
+    def _initialize_index(self, index_dir: Optional[str], index_mode: Optional[str]):
+        """Open the shared on-disk vector index for this model."""
+        index_dir = index_dir or os.getenv(
+            'SEMANTIC_INDEX_DIR', os.path.join(os.getcwd(), 'instance', 'semantic_index')
+        )
+        index_mode = index_mode or os.getenv('SEMANTIC_INDEX_MODE', 'flat')
+        self.index = PromptVectorIndex(
+            directory=index_dir,
+            dim=self.model.get_sentence_embedding_dimension(),
+            name=re.sub(r'[^A-Za-z0-9_.-]', '_', self.model_name),
+            model_name=self.model_name,
+            mode=index_mode
+        )
+        logger.info(f"Semantic index opened at {index_dir} ({index_mode}, {len(self.index)} prompts)")
+    
     def _should_refresh_cache(self) -> bool:
-        """Check if cache should be refreshed (every 5 minutes)."""
-        if not self.last_cache_update:
+        """Check if the index should be synced (prompt writes seen, or every 5 minutes)."""
+        if not self.last_cache_update or self._seen_prompt_changes != _prompt_change_counter:
             return True
         return (datetime.utcnow() - self.last_cache_update).total_seconds() > 300
     
@@ -92,65 +136,95 @@ class SemanticPromptSearch:
         Returns:
             Dictionary of performance metrics
         """
+        return self._get_prompts_performance_metrics([prompt_id], days)[prompt_id]
+    
+    def _get_prompts_performance_metrics(self, prompt_ids: List[int], days: int = 30) -> Dict[int, Dict[str, Any]]:
+        """
+        Get performance metrics for several prompts with one grouped query.
+        
+        Results are kept per tenant and prompt for METRICS_TTL_SECONDS in a
+        bounded LRU cache, so only IDs missing from (or expired in) the cache
+        hit the database.
+        
+        Args:
+            prompt_ids: IDs of the prompts
+            days: Number of days to look back
+            
+        Returns:
+            Dictionary mapping prompt ID to performance metrics
+        """
+        tenant_id = current_tenant_id()
+        metrics = {}
+        missing = []
+        for prompt_id in prompt_ids:
+            cached = self._metrics_cache.get(f"{tenant_id}:{prompt_id}:{days}")
+            if cached is not None:
+                metrics[prompt_id] = cached
+            else:
+                missing.append(prompt_id)
+        
+        if not missing:
+            return metrics
+        
+        empty_metrics = {
+            'success_rate': 0.0,
+            'avg_response_time': 0.0,
+            'usage_count': 0,
+            'last_used': None,
+            'total_cost': 0.0
+        }
+        
         try:
             # Get time range
             end_date = datetime.utcnow()
             start_date = end_date - timedelta(days=days)
             
-            # Get traces for this prompt in the time range
-            traces = Trace.query.filter(
-                and_(
-                    Trace.prompt_id == prompt_id,
-                    Trace.start_time >= start_date,
-                    Trace.start_time <= end_date
-                )
-            ).all()
-            
-            if not traces:
-                return {
-                    'success_rate': 0.0,
-                    'avg_response_time': 0.0,
-                    'usage_count': 0,
-                    'last_used': None,
-                    'total_cost': 0.0
+            window_filter = and_(
+                Trace.prompt_id.in_(missing),
+                Trace.start_time >= start_date,
+                Trace.start_time <= end_date
+            )
+            
+            # Costs of the candidates' traces are pre-summed per trace so the join cannot inflate trace counts
+            window_traces = db.session.query(Trace.id).filter(window_filter)
+            trace_costs = (db.session.query(Cost.trace_id, func.sum(Cost.cost_usd).label('cost'))
+                           .filter(Cost.trace_id.in_(window_traces.scalar_subquery()))
+                           .group_by(Cost.trace_id)
+                           .subquery())
+            
+            rows = (db.session.query(
+                        Trace.prompt_id,
+                        func.count(Trace.id),
+                        func.sum(case((Trace.status == 'success', 1), else_=0)),
+                        func.avg(Trace.duration_ms),
+                        func.max(Trace.start_time),
+                        func.sum(trace_costs.c.cost))
+                    .outerjoin(trace_costs, trace_costs.c.trace_id == Trace.id)
+                    .filter(window_filter)
+                    .group_by(Trace.prompt_id)
+                    .all())
+            
+            fetched = {prompt_id: dict(empty_metrics) for prompt_id in missing}
+            for prompt_id, total_traces, success_traces, avg_duration_ms, last_used, total_cost in rows:
+                success_rate = (success_traces or 0) / total_traces * 100 if total_traces else 0
+                fetched[prompt_id] = {
+                    'success_rate': round(success_rate, 1),
+                    'avg_response_time': round(float(avg_duration_ms or 0) / 1000, 2),  # Convert to seconds
+                    'usage_count': total_traces,
+                    'last_used': self._format_last_used(last_used),
+                    'total_cost': float(total_cost or 0)
                 }
             
-            # Calculate metrics
-            total_traces = len(traces)
-            success_traces = len([t for t in traces if t.status == 'success'])
-            success_rate = (success_traces / total_traces) * 100 if total_traces > 0 else 0
-            
-            # Average response time
-            response_times = [t.duration_ms for t in traces if t.duration_ms is not None]
-            avg_response_time = sum(response_times) / len(response_times) if response_times else 0
-            avg_response_time = avg_response_time / 1000  # Convert to seconds
-            
-            # Last used
-            last_used = max(t.start_time for t in traces) if traces else None
-            
-            # Total cost
-            trace_ids = [t.id for t in traces]
-            total_cost = db.session.query(func.sum(Cost.cost_usd)).filter(
-                Cost.trace_id.in_(trace_ids)
-            ).scalar() or 0
-            
-            return {
-                'success_rate': round(success_rate, 1),
-                'avg_response_time': round(avg_response_time, 2),
-                'usage_count': total_traces,
-                'last_used': self._format_last_used(last_used),
-                'total_cost': float(total_cost)
-            }
+            for prompt_id, prompt_metrics in fetched.items():
+                self._metrics_cache.set(f"{tenant_id}:{prompt_id}:{days}", prompt_metrics, self.METRICS_TTL_SECONDS)
+            metrics.update(fetched)
             
         except Exception as e:
-            logger.error(f"Error getting performance metrics for prompt {prompt_id}: {e}")
-            return {
-                'success_rate': 0.0,
-                'avg_response_time': 0.0,
-                'usage_count': 0,
-                'last_used': None,
-                'total_cost': 0.0
-            }
+            logger.error(f"Error getting performance metrics for prompts {missing}: {e}")
+            for prompt_id in missing:
+                metrics[prompt_id] = dict(empty_metrics)
+        
+        return metrics
     
     def _format_last_used(self, last_used: Optional[datetime]) -> Optional[str]:
         """Format last used timestamp for display."""
@@ -286,47 +360,37 @@ class SemanticPromptSearch:
             full_query = f"{query} {context}".strip()
             
             # Generate embedding for the query
-            query_embedding = self.model.encode([full_query])
+            query_embedding = self.model.encode([full_query])[0]
+            
+            # Over-fetch candidates so performance filtering can still fill the page
+            hits = self.index.search(query_embedding, k=max(limit * 5, 50),
+                                     min_score=self.MIN_SIMILARITY)
+            
+            prompts_by_id = {}
+            if hits:
+                prompts_by_id = {
+                    prompt.id: prompt for prompt in Prompt.query.filter(
+                        Prompt.id.in_([prompt_id for prompt_id, _ in hits]),
+                        Prompt.is_active.is_(True)
+                    ).all()
+                }
             
-            # Get all active prompts
-            prompts = Prompt.query.filter_by(is_active=True).all()
+            candidates = [(prompts_by_id[prompt_id], score)
+                          for prompt_id, score in hits if prompt_id in prompts_by_id]
             
-            if not prompts:
-                return self._get_empty_results()
+            # Metrics are only needed for every candidate when they drive filtering;
+            # otherwise fetch them for the final page alone
+            if performance_threshold > 0:
+                metrics = self._get_prompts_performance_metrics([p.id for p, _ in candidates])
+                candidates = [(p, score) for p, score in candidates
+                              if metrics[p.id]['success_rate'] >= performance_threshold]
+                candidates = candidates[:limit]
+            else:
+                candidates = candidates[:limit]
+                metrics = self._get_prompts_performance_metrics([p.id for p, _ in candidates])
             
-            # Calculate similarities
             results = []
-            prompt_embeddings = []
-            
-            for prompt in prompts:
-                # Get or generate embedding for this prompt
-                if prompt.id in self.prompt_embeddings:
-                    embedding = self.prompt_embeddings[prompt.id]
-                else:
-                    searchable_text = self._build_searchable_text(prompt)
-                    embedding = self.model.encode([searchable_text])[0]
-                    self.prompt_embeddings[prompt.id] = embedding
-                
-                prompt_embeddings.append(embedding)
-            
-            # Calculate cosine similarities
-            similarities = cosine_similarity(query_embedding, prompt_embeddings)[0]
-            
-            # Create results with similarity scores
-            for i, prompt in enumerate(prompts):
-                similarity_score = similarities[i]
-                
-                # Skip if similarity is too low
-                if similarity_score < 0.3:
-                    continue
-                
-                # Get performance metrics
-                performance_metrics = self._get_prompt_performance_metrics(prompt.id)
-                
-                # Apply performance threshold filter
-                if performance_metrics['success_rate'] < performance_threshold:
-                    continue
-                
+            for prompt, similarity_score in candidates:
                 # Generate match reasons
                 match_reasons = self._generate_match_reasons(query, prompt, similarity_score)
                 
@@ -338,20 +402,14 @@ class SemanticPromptSearch:
                     'tags': prompt.tags or [],
                     'relevance_score': round(similarity_score, 3),
                     'match_reasons': match_reasons,
-                    'performance_metrics': performance_metrics,
+                    'performance_metrics': metrics[prompt.id],
                     'preview_content': prompt.content[:200] + "..." if len(prompt.content) > 200 else prompt.content
                 }
                 
                 results.append(result)
             
-            # Sort by relevance score
-            results.sort(key=lambda x: x['relevance_score'], reverse=True)
-            
-            # Limit results
-            results = results[:limit]
-            
             # Generate semantic suggestions
-            suggestions = self._get_semantic_suggestions(query, prompts)
+            suggestions = self._get_semantic_suggestions(query, list(prompts_by_id.values()))
             
             # Generate query interpretation
             interpretation = self._generate_query_interpretation(query, context, len(results))
@@ -374,22 +432,50 @@ class SemanticPromptSearch:
             }
     
     def _refresh_prompt_cache(self):
-        """Refresh the prompt cache and embeddings."""
+        """
+        Incrementally sync the vector index with the prompts table.
+        
+        Only prompts whose updated_at fingerprint changed are re-encoded;
+        deactivated or deleted prompts are removed from the index.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return  # Another thread is already syncing
         try:
-            logger.info("Refreshing prompt cache")
-            prompts = Prompt.query.filter_by(is_active=True).all()
+            logger.info("Refreshing prompt index")
+            changes_seen = _prompt_change_counter
+            active = {
+                prompt_id: updated_at.isoformat() if updated_at else ''
+                for prompt_id, updated_at in db.session.query(Prompt.id, Prompt.updated_at)
+                .filter(Prompt.is_active.is_(True)).all()
+            }
+            indexed = self.index.fingerprints()
+            
+            stale_ids = [pid for pid, fingerprint in active.items() if indexed.get(pid) != fingerprint]
+            removed_ids = [pid for pid in indexed if pid not in active]
             
-            for prompt in prompts:
-                if prompt.id not in self.prompt_embeddings:
-                    searchable_text = self._build_searchable_text(prompt)
-                    embedding = self.model.encode([searchable_text])[0]
-                    self.prompt_embeddings[prompt.id] = embedding
+            for i in range(0, len(stale_ids), 256):
+                prompts = Prompt.query.filter(Prompt.id.in_(stale_ids[i:i + 256])).all()
+                embeddings = self.model.encode([self._build_searchable_text(p) for p in prompts])
+                self.index.upsert(
+                    (prompt.id, embedding, active[prompt.id])
+                    for prompt, embedding in zip(prompts, embeddings)
+                )
             
+            if removed_ids:
+                self.index.remove(removed_ids)
+            
+            if self.index.needs_ivf_rebuild():
+                self.index.build_ivf()
+            
+            self._seen_prompt_changes = changes_seen
             self.last_cache_update = datetime.utcnow()
-            logger.info(f"Cache refreshed with {len(prompts)} prompts")
+            logger.info(f"Prompt index synced: {len(active)} active, "
+                        f"{len(stale_ids)} re-encoded, {len(removed_ids)} removed")
             
         except Exception as e:
-            logger.error(f"Error refreshing prompt cache: {e}")
+            logger.error(f"Error refreshing prompt index: {e}")
+        finally:
+            self._refresh_lock.release()
     
     def _get_empty_results(self) -> Dict[str, Any]:
         """Return empty results structure."""
@@ -415,4 +501,18 @@ class SemanticPromptSearch:
         elif result_count == 1:
             return base_interpretation + " - found 1 matching prompt"
         else:
-            return base_interpretation + f" - found {result_count} matching prompts"
\ No newline at end of file
+            return base_interpretation + f" - found {result_count} matching prompts"
+
+
+_search_service: Optional[SemanticPromptSearch] = None
+_search_service_lock = threading.Lock()
+
+
+def get_semantic_search() -> SemanticPromptSearch:
+    """Return the process-wide search service, loading the model on first use."""
+    global _search_service
+    if _search_service is None:
+        with _search_service_lock:
+            if _search_service is None:
+                _search_service = SemanticPromptSearch()
+    return _search_service
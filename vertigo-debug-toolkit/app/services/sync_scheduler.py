@@ -298,6 +298,7 @@ class SyncScheduler:
                 return {
                     'success': result.success,
                     'records_processed': result.records_processed,
+                    'records_per_second': round(result.records_per_second, 1),
                     'errors': result.errors,
                     'timestamp': datetime.utcnow().isoformat()
                 }
@@ -0,0 +1,234 @@
+"""
+Tenant Query Scoping
+Restricts SQL statements to one tenant with a bound tenant_id parameter instead of literal SQL.
+"""
+
+import logging
+import os
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
+
+from flask import g, has_app_context
+from sqlalchemy import Select, Table, TextClause, bindparam, event, text
+from sqlalchemy.orm import ORMExecuteState, with_loader_criteria
+from sqlalchemy.sql.util import find_tables
+
+logger = logging.getLogger(__name__)
+
+TENANT_PARAM = 'tenant_id'
+
+# Tables that hold tenant_id for a different reason (membership, registry) and are never scoped
+SYSTEM_TABLES = frozenset({'users', 'tenants', 'tenant_users', 'registry_versions', 'alembic_version'})
+
+# Tables given a tenant_id column by migration 008; raw SQL over them must be scoped
+TENANT_TABLES = frozenset({'live_traces', 'costs', 'alert_events'})
+
+# Tenant of rows ingested with no tenant in context (background Firestore and Langfuse syncs)
+INGEST_TENANT_ID = os.getenv('INGEST_TENANT_ID') or None
+
+# Explicit tenant for work outside a request (workers, CLI, benchmarks)
+_tenant_override: ContextVar[Optional[str]] = ContextVar('tenant_override', default=None)
+
+# String literals, quoted identifiers and comments, blanked out before raw SQL is inspected
+_QUOTED = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?\*/", re.DOTALL)
+_TOP_LEVEL_CLAUSE = re.compile(r'\b(FROM|WHERE|GROUP\s+BY|HAVING|ORDER\s+BY|LIMIT|OFFSET)\b', re.IGNORECASE)
+_UNSUPPORTED = re.compile(r'\b(JOIN|UNION|INTERSECT|EXCEPT|WITH|INSERT|UPDATE|DELETE)\b|;', re.IGNORECASE)
+_FROM_TABLE = re.compile(r'^\s*(\w+)(?:\s+(?:AS\s+)?(\w+))?\s*$', re.IGNORECASE)
+_WORDS = re.compile(r'\w+')
+
+
+def tenant_tables(stmt: Select) -> List[Table]:
+    """Tables with a tenant_id column that the statement selects from (including joins)."""
+    tables = []
+    for from_clause in stmt.get_final_froms():
+        for table in find_tables(from_clause):
+            if TENANT_PARAM in table.c and table not in tables:
+                tables.append(table)
+    return tables
+
+
+def scope_select(stmt: Select, tenant_id: str) -> Select:
+    """
+    Filter every tenant-aware table of a Core/ORM select on ``tenant_id``.
+
+    The value is a bound parameter, so statements for different tenants share
+    one cache key: SQLAlchemy compiles each statement shape once and the
+    driver reuses its prepared statement.
+    """
+    tables = tenant_tables(stmt)
+    if not tables:
+        return stmt
+    tenant = bindparam(TENANT_PARAM, tenant_id)
+    return stmt.where(*[table.c.tenant_id == tenant for table in tables])
+
+
+def _flatten(query: str) -> str:
+    """The query with literals, comments and parenthesized text blanked, keeping offsets."""
+    flat = _QUOTED.sub(lambda m: ' ' * len(m.group()), query)
+    chars, depth = list(flat), 0
+    for i, char in enumerate(chars):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth < 0:
+                raise ValueError("Unbalanced parentheses")
+        elif depth:
+            chars[i] = ' '
+    if depth:
+        raise ValueError("Unbalanced parentheses")
+    return ''.join(chars)
+
+
+@lru_cache(maxsize=1024)
+def scope_sql(query: str) -> str:
+    """
+    Restrict a single-table SELECT to ``<table>.tenant_id = :tenant_id`` (rewritten once per query text).
+
+    The predicate is added to the top-level WHERE only, with the original
+    condition parenthesized, so ORs cannot widen it. Statements this cannot
+    scope safely raise ValueError instead of running unscoped: joins,
+    comma-joined or derived FROMs, set operations, CTEs, several statements
+    and tenant-aware tables referenced outside the top-level FROM. Scope
+    those with scope_select.
+    """
+    flat = _flatten(query)
+    if not re.match(r'\s*SELECT\b', flat, re.IGNORECASE):
+        raise ValueError("Only SELECT statements can be tenant-scoped as raw SQL")
+    if _UNSUPPORTED.search(_QUOTED.sub(' ', query)):
+        raise ValueError("Raw SQL with joins, set operations, CTEs or several statements cannot be tenant-scoped")
+
+    clauses = [(m.group(1).split()[0].upper(), m.start(), m.end()) for m in _TOP_LEVEL_CLAUSE.finditer(flat)]
+    names = [name for name, _, _ in clauses]
+    if names.count('FROM') != 1 or names.count('WHERE') > 1:
+        raise ValueError("Raw SQL must select from exactly one table to be tenant-scoped")
+
+    def clause_end(index: int) -> int:
+        return clauses[index + 1][1] if index + 1 < len(clauses) else len(query.rstrip())
+
+    from_index = names.index('FROM')
+    match = _FROM_TABLE.match(flat[clauses[from_index][2]:clause_end(from_index)])
+    if not match:
+        raise ValueError("Raw SQL must select from exactly one table to be tenant-scoped")
+    table_name, alias = match.group(1).lower(), match.group(2)
+
+    # Tenant tables anywhere else (subqueries, select list) would be read unscoped
+    outside_from = query[:clauses[from_index][1]] + ' ' + query[clause_end(from_index):]
+    outside_from = _QUOTED.sub(' ', outside_from)
+    if TENANT_TABLES & {word.lower() for word in _WORDS.findall(outside_from)}:
+        raise ValueError("Tenant-aware tables outside the top-level FROM cannot be scoped as raw SQL")
+    if table_name not in TENANT_TABLES:
+        return query
+
+    predicate = f"{alias or table_name}.{TENANT_PARAM} = :{TENANT_PARAM}"
+    if 'WHERE' in names:
+        where_index = names.index('WHERE')
+        head, end = query[:clauses[where_index][1]].rstrip(), clause_end(where_index)
+        scoped = f"{head} WHERE {predicate} AND ({query[clauses[where_index][2]:end].strip()})"
+    else:
+        end = clause_end(from_index)
+        scoped = f"{query[:end].rstrip()} WHERE {predicate}"
+    tail = query[end:].strip()
+    return f"{scoped} {tail}" if tail else scoped
+
+
+def scope_text(query: str, tenant_id: str, params: Optional[Dict[str, Any]] = None) -> TextClause:
+    """Raw SQL scoped to a tenant; the statement text is the same for every tenant."""
+    return text(scope_sql(query)).bindparams(**{TENANT_PARAM: tenant_id, **(params or {})})
+
+
+@contextmanager
+def tenant_context(tenant_id: Optional[str]) -> Iterator[None]:
+    """Scope queries to ``tenant_id`` inside the block, with or without a request."""
+    token = _tenant_override.set(tenant_id)
+    try:
+        yield
+    finally:
+        _tenant_override.reset(token)
+
+
+def current_tenant_id() -> Optional[str]:
+    """Tenant of the current tenant_context block, else of the request (g.current_tenant)."""
+    tenant_id = _tenant_override.get()
+    if tenant_id is None and has_app_context():
+        tenant = g.get('current_tenant')
+        tenant_id = tenant.id if tenant else None
+    return tenant_id
+
+
+def ingest_tenant_id() -> Optional[str]:
+    """Tenant that newly ingested rows belong to: the current tenant, else INGEST_TENANT_ID."""
+    return current_tenant_id() or INGEST_TENANT_ID
+
+
+def tenant_text(query: str) -> TextClause:
+    """
+    Raw SQL over tenant-aware tables for the current tenant, if any.
+    
+    Use instead of ``text()``; other parameters are passed to execute() as usual.
+    Only single-table SELECTs can be scoped (see scope_sql); the query is
+    checked even without a tenant, so unscopable SQL fails in every context.
+    """
+    scoped = scope_sql(query)
+    tenant_id = current_tenant_id()
+    if tenant_id is None:
+        return text(query)
+    return text(scoped).bindparams(**{TENANT_PARAM: tenant_id})
+
+
+def tenant_models(db) -> List[type]:
+    """Mapped classes whose table has a tenant_id column, excluding SYSTEM_TABLES."""
+    return [
+        mapper.class_ for mapper in db.Model.registry.mappers
+        if mapper.local_table is not None
+        and TENANT_PARAM in mapper.local_table.c
+        and mapper.local_table.name not in SYSTEM_TABLES
+    ]
+
+
+class TenantScoping:
+    """
+    ``do_orm_execute`` hook adding ``tenant_id`` criteria to ORM statements.
+    
+    The criteria are built once against a bound parameter that reads
+    current_tenant_id() when the statement executes, so each statement shape
+    compiles once for all tenants. Relationship and column loads inherit the criteria of the
+    statement that loaded their parent. Pass ``skip_tenant_scope=True`` in
+    execution_options for deliberate cross-tenant queries.
+    """
+    
+    def __init__(self, models: List[type]):
+        self.models = models
+        tenant = bindparam('tenant_scope_id', callable_=current_tenant_id)
+        self.criteria = tuple(
+            with_loader_criteria(model, model.tenant_id == tenant, include_aliases=True)
+            for model in models
+        )
+    
+    def __call__(self, orm_execute_state: ORMExecuteState):
+        if not (orm_execute_state.is_select or orm_execute_state.is_update or orm_execute_state.is_delete):
+            return
+        if orm_execute_state.is_column_load or orm_execute_state.is_relationship_load:
+            return
+        if orm_execute_state.execution_options.get('skip_tenant_scope'):
+            return
+        
+        if current_tenant_id() is None:
+            return
+        
+        orm_execute_state.statement = orm_execute_state.statement.options(*self.criteria)
+
+
+def install_tenant_scoping(db) -> TenantScoping:
+    """Register tenant scoping on ``db.session`` (idempotent)."""
+    scoping = getattr(db, '_tenant_scoping', None)
+    if scoping is None:
+        scoping = TenantScoping(tenant_models(db))
+        event.listen(db.session, 'do_orm_execute', scoping)
+        db._tenant_scoping = scoping
+        logger.info(f"Tenant scoping enabled for {', '.join(m.__tablename__ for m in scoping.models)}")
+    return scoping
+
@@ -5,20 +5,27 @@ Provides comprehensive tenant isolation, security, and access control for the Ve
 
 import os
 import uuid
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any, Union
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple, Union
 from dataclasses import dataclass, field
 from enum import Enum
 import logging
 import hashlib
 import secrets
 from flask import g, current_app, request
+from sqlalchemy import Select, TextClause, text
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
-from app.models import User
+from app.models import RegistryVersion, User
+from app.services.tenant_scope import scope_select, scope_text
 
 logger = logging.getLogger(__name__)
 
+# registry_versions row bumped with every tenant or membership change
+REGISTRY_NAME = 'tenants'
+
 
 class TenantStatus(Enum):
     """Tenant status enumeration."""
@@ -80,14 +87,37 @@ class TenantUser:
 
 
 class TenantService:
-    """Multi-tenant data isolation and management service."""
+    """
+    Multi-tenant data isolation and management service.
+    
+    Tenants and memberships are stored in the ``tenants`` and
+    ``tenant_users`` tables and read through a per-process cache: lookups by
+    id, domain and API key (including misses) and access decisions are
+    dictionary hits once warm. Every write bumps the ``tenants`` row of
+    ``registry_versions`` in the same transaction; each worker compares that
+    version at most every ``version_check_seconds`` and drops its cache
+    when it changed.
+    """
     
-    def __init__(self):
+    def __init__(self, version_check_seconds: float = 2.0, max_cache_entries: int = 10000):
         """Initialize tenant service."""
-        self.tenants_cache: Dict[str, Tenant] = {}
+        self.tenants_cache: Dict[str, Optional[Tenant]] = {}
+        # domain / API key -> tenant id (None caches a miss)
+        self.domain_index: Dict[str, Optional[str]] = {}
+        self.api_key_index: Dict[str, Optional[str]] = {}
         self.user_tenants_cache: Dict[str, List[str]] = {}
-        self.cache_ttl = timedelta(minutes=15)
-        self.last_cache_update = datetime.now()
+        self.tenant_users_cache: Dict[str, Dict[str, TenantUser]] = {}
+        # (tenant_id, user_id, permission, resource) -> (allowed, valid_until)
+        self.access_cache: Dict[Tuple[str, str, str, Optional[str]], Tuple[bool, Optional[datetime]]] = {}
+        self.version_check_seconds = version_check_seconds
+        self.max_cache_entries = max_cache_entries
+        
+        self._cache_lock = threading.Lock()
+        # Bumped whenever the cache is dropped so a load racing a write is not cached
+        self._generation = 0
+        self._registry_version: Optional[int] = None
+        self._next_version_check = 0.0
+        self.cache_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
         
         # Default tenant configuration
         self.default_config = TenantConfig(
@@ -134,7 +164,7 @@ class TenantService:
             tenant = Tenant(
                 id=tenant_id,
                 name=name,
-                domain=domain,
+                domain=domain.lower(),
                 status=TenantStatus.ACTIVE,
                 config=tenant_config,
                 created_at=datetime.now(),
@@ -154,6 +184,9 @@ class TenantService:
             # Initialize tenant database schema
             self._create_tenant_schema(tenant)
             
+            if not self._store_tenant(tenant):
+                raise RuntimeError(f"Failed to store tenant {tenant_id}")
+            
             # Add owner as admin user
             self.add_user_to_tenant(
                 tenant_id=tenant_id,
@@ -162,9 +195,6 @@ class TenantService:
                 permissions=["*"]
             )
             
-            # Cache tenant
-            self.tenants_cache[tenant_id] = tenant
-            
             logger.info(f"Created tenant: {tenant_id} ({name}) with schema: {schema_name}")
             return tenant
             
@@ -175,18 +205,12 @@ class TenantService:
     def get_tenant(self, tenant_id: str) -> Optional[Tenant]:
         """Get tenant by ID with caching."""
         try:
-            # Check cache first
-            if tenant_id in self.tenants_cache and self._is_cache_valid():
+            self._sync_registry_version()
+            if tenant_id in self.tenants_cache:
+                self.cache_stats['hits'] += 1
                 return self.tenants_cache[tenant_id]
             
-            # Load from persistent storage (would be database in production)
-            # For now, simulate with in-memory storage
-            tenant = self._load_tenant_from_storage(tenant_id)
-            
-            if tenant:
-                self.tenants_cache[tenant_id] = tenant
-            
-            return tenant
+            return self._load_tenant('id', tenant_id)
             
         except Exception as e:
             logger.error(f"Error getting tenant {tenant_id}: {e}")
@@ -195,18 +219,7 @@ class TenantService:
     def get_tenant_by_domain(self, domain: str) -> Optional[Tenant]:
         """Get tenant by domain."""
         try:
-            for tenant in self.tenants_cache.values():
-                if tenant.domain.lower() == domain.lower():
-                    return tenant
-            
-            # Load all tenants if not cached
-            self._refresh_cache()
-            
-            for tenant in self.tenants_cache.values():
-                if tenant.domain.lower() == domain.lower():
-                    return tenant
-            
-            return None
+            return self._lookup('domain', domain.lower(), self.domain_index)
             
         except Exception as e:
             logger.error(f"Error getting tenant by domain {domain}: {e}")
@@ -250,18 +263,7 @@ class TenantService:
     def get_tenant_by_api_key(self, api_key: str) -> Optional[Tenant]:
         """Get tenant by API key."""
         try:
-            for tenant in self.tenants_cache.values():
-                if tenant.api_key == api_key:
-                    return tenant
-            
-            # Load all tenants if not cached
-            self._refresh_cache()
-            
-            for tenant in self.tenants_cache.values():
-                if tenant.api_key == api_key:
-                    return tenant
-            
-            return None
+            return self._lookup('api_key', api_key, self.api_key_index)
             
         except Exception as e:
             logger.error(f"Error getting tenant by API key: {e}")
@@ -297,12 +299,9 @@ class TenantService:
                 metadata={"added_by": getattr(g, 'current_user', {}).get('id', 'system')}
             )
             
-            # Store tenant user association (would be in database in production)
-            self._store_tenant_user(tenant_user)
-            
-            # Clear user tenant cache
-            if user_id in self.user_tenants_cache:
-                del self.user_tenants_cache[user_id]
+            # Store tenant user association (invalidates cached memberships)
+            if not self._store_tenant_user(tenant_user):
+                return False
             
             logger.info(f"Added user {user_id} to tenant {tenant_id} with access level {access_level.value}")
             return True
@@ -316,17 +315,13 @@ class TenantService:
         try:
             # Don't allow removing the owner
             tenant = self.get_tenant(tenant_id)
-            if tenant and tenant.owner_id == user_id:
+            if tenant and tenant.owner_id == str(user_id):
                 logger.warning(f"Cannot remove owner {user_id} from tenant {tenant_id}")
                 return False
             
-            # Remove tenant user association
+            # Remove tenant user association (invalidates cached memberships)
             success = self._remove_tenant_user(tenant_id, user_id)
             
-            # Clear user tenant cache
-            if user_id in self.user_tenants_cache:
-                del self.user_tenants_cache[user_id]
-            
             if success:
                 logger.info(f"Removed user {user_id} from tenant {tenant_id}")
             
@@ -339,16 +334,16 @@ class TenantService:
     def get_user_tenants(self, user_id: str) -> List[str]:
         """Get list of tenant IDs that user has access to."""
         try:
-            # Check cache first
-            if user_id in self.user_tenants_cache and self._is_cache_valid():
-                return self.user_tenants_cache[user_id]
-            
-            # Load from storage
-            tenant_ids = self._load_user_tenants(user_id)
-            
-            # Cache result
-            self.user_tenants_cache[user_id] = tenant_ids
-            
+            self._sync_registry_version()
+            user_key = str(user_id)
+            if user_key in self.user_tenants_cache:
+                self.cache_stats['hits'] += 1
+                return self.user_tenants_cache[user_key]
+            
+            self.cache_stats['misses'] += 1
+            generation = self._generation
+            tenant_ids = self._query_user_tenants(user_key)
+            self._remember(generation, self.user_tenants_cache, user_key, tenant_ids)
             return tenant_ids
             
         except Exception as e:
@@ -358,7 +353,7 @@ class TenantService:
     def get_tenant_users(self, tenant_id: str) -> List[TenantUser]:
         """Get all users for a tenant."""
         try:
-            return self._load_tenant_users(tenant_id)
+            return list(self._tenant_user_map(tenant_id).values())
             
         except Exception as e:
             logger.error(f"Error getting users for tenant {tenant_id}: {e}")
@@ -373,63 +368,59 @@ class TenantService:
     ) -> bool:
         """Check if user has required permission for tenant resource."""
         try:
-            tenant_users = self.get_tenant_users(tenant_id)
-            
-            for tenant_user in tenant_users:
-                if tenant_user.user_id == user_id:
-                    # Check if access has expired
-                    if tenant_user.expires_at and tenant_user.expires_at < datetime.now():
-                        continue
-                    
-                    # Owner and admin have all permissions
-                    if tenant_user.access_level in [AccessLevel.OWNER, AccessLevel.ADMIN]:
-                        return True
-                    
-                    # Check specific permissions
-                    if "*" in tenant_user.permissions or required_permission in tenant_user.permissions:
-                        return True
-                    
-                    # Check resource-specific permissions
-                    if resource:
-                        resource_permission = f"{required_permission}:{resource}"
-                        if resource_permission in tenant_user.permissions:
-                            return True
-                    
-                    break
+            self._sync_registry_version()
+            now = datetime.now()
+            key = (tenant_id, str(user_id), required_permission, resource)
+            cached = self.access_cache.get(key)
+            if cached is not None and (cached[1] is None or cached[1] > now):
+                self.cache_stats['hits'] += 1
+                return cached[0]
+            
+            generation = self._generation
+            tenant_user = self._tenant_user_map(tenant_id).get(str(user_id))
+            allowed = False
+            
+            # Check if access has expired
+            if tenant_user and not (tenant_user.expires_at and tenant_user.expires_at < now):
+                # Owner and admin have all permissions
+                if tenant_user.access_level in [AccessLevel.OWNER, AccessLevel.ADMIN]:
+                    allowed = True
+                
+                # Check specific permissions
+                elif "*" in tenant_user.permissions or required_permission in tenant_user.permissions:
+                    allowed = True
+                
+                # Check resource-specific permissions
+                elif resource and f"{required_permission}:{resource}" in tenant_user.permissions:
+                    allowed = True
             
-            return False
+            # A grant is only cached until the membership expires
+            valid_until = tenant_user.expires_at if allowed else None
+            self._remember(generation, self.access_cache, key, (allowed, valid_until))
+            return allowed
             
         except Exception as e:
             logger.error(f"Error checking user access for tenant {tenant_id}, user {user_id}: {e}")
             return False
     
-    def isolate_query(self, query: str, tenant_id: str) -> str:
-        """Modify SQL query to include tenant isolation."""
+    def isolate_query(self, query: Union[str, Select], tenant_id: str) -> Union[TextClause, Select]:
+        """
+        Restrict a query to one tenant.
+        
+        Selects get ``tenant_id`` criteria on every tenant-aware table; raw SQL
+        gets a ``tenant_id = :tenant_id`` predicate and is returned as a text
+        clause with the parameter bound. Either way the statement text does
+        not depend on the tenant. Errors propagate rather than returning the
+        query unscoped.
+        """
         try:
-            tenant = self.get_tenant(tenant_id)
-            if not tenant:
-                return query
-            
-            # Add tenant_id filter to WHERE clause
-            # This is a simplified implementation - in production, use proper SQL parsing
-            if "WHERE" in query.upper():
-                query = query.replace(" WHERE ", f" WHERE tenant_id = '{tenant_id}' AND ")
-            else:
-                # Add WHERE clause if it doesn't exist
-                if "ORDER BY" in query.upper():
-                    query = query.replace(" ORDER BY", f" WHERE tenant_id = '{tenant_id}' ORDER BY")
-                elif "GROUP BY" in query.upper():
-                    query = query.replace(" GROUP BY", f" WHERE tenant_id = '{tenant_id}' GROUP BY")
-                elif "HAVING" in query.upper():
-                    query = query.replace(" HAVING", f" WHERE tenant_id = '{tenant_id}' HAVING")
-                else:
-                    query = f"{query} WHERE tenant_id = '{tenant_id}'"
-            
-            return query
+            if isinstance(query, str):
+                return scope_text(query, tenant_id)
+            return scope_select(query, tenant_id)
             
         except Exception as e:
             logger.error(f"Error isolating query for tenant {tenant_id}: {e}")
-            return query
+            raise
     
     def get_tenant_storage_path(self, tenant_id: str, file_path: str) -> str:
         """Get tenant-specific storage path."""
@@ -463,11 +454,9 @@ class TenantService:
             tenant.api_key = new_api_key
             tenant.updated_at = datetime.now()
             
-            # Update cache
-            self.tenants_cache[tenant_id] = tenant
-            
-            # Store updated tenant (would be in database in production)
-            self._store_tenant(tenant)
+            # Store updated tenant (invalidates the cached tenant and old key)
+            if not self._store_tenant(tenant):
+                return None
             
             logger.info(f"Rotated API key for tenant {tenant_id}")
             return new_api_key
@@ -502,11 +491,9 @@ class TenantService:
             
             tenant.updated_at = datetime.now()
             
-            # Update cache
-            self.tenants_cache[tenant_id] = tenant
-            
-            # Store updated tenant
-            self._store_tenant(tenant)
+            # Store updated tenant (invalidates the cached tenant)
+            if not self._store_tenant(tenant):
+                return False
             
             logger.info(f"Updated config for tenant {tenant_id}")
             return True
@@ -563,19 +550,103 @@ class TenantService:
             logger.error(f"Error creating schema for tenant {tenant.id}: {e}")
             return False
     
-    def _is_cache_valid(self) -> bool:
-        """Check if cache is still valid."""
-        return datetime.now() - self.last_cache_update < self.cache_ttl
-    
-    def _refresh_cache(self) -> None:
-        """Refresh tenant cache."""
+    def _sync_registry_version(self) -> None:
+        """Drop the cache when another worker changed the registry (checked every version_check_seconds)."""
+        now = time.monotonic()
+        if now < self._next_version_check:
+            return
+        self._next_version_check = now + self.version_check_seconds
+        
         try:
-            # In production, load from database
-            self.last_cache_update = datetime.now()
-            logger.debug("Refreshed tenant cache")
-            
+            version = db.session.execute(
+                text("SELECT version FROM registry_versions WHERE name = :name"),
+                {"name": REGISTRY_NAME}
+            ).scalar()
         except Exception as e:
-            logger.error(f"Error refreshing cache: {e}")
+            logger.error(f"Error reading tenant registry version: {e}")
+            db.session.rollback()
+            version = None
+        
+        # Without a version to compare, the cache lives for one check interval
+        if version is None or version != self._registry_version:
+            self._clear_cache()
+            self._registry_version = version
+    
+    def _bump_registry_version(self) -> None:
+        """Record a registry change; call inside the write transaction, before commit."""
+        updated = db.session.execute(
+            text("UPDATE registry_versions SET version = version + 1, updated_at = :now WHERE name = :name"),
+            {"now": datetime.utcnow(), "name": REGISTRY_NAME}
+        ).rowcount
+        if not updated:
+            db.session.add(RegistryVersion(name=REGISTRY_NAME, version=1))
+    
+    def _clear_cache(self) -> None:
+        with self._cache_lock:
+            self._generation += 1
+            self.tenants_cache.clear()
+            self.domain_index.clear()
+            self.api_key_index.clear()
+            self.user_tenants_cache.clear()
+            self.tenant_users_cache.clear()
+            self.access_cache.clear()
+            self.cache_stats['invalidations'] += 1
+    
+    def _invalidate(self) -> None:
+        """Drop this worker's cache after a committed write; others follow on their next version check."""
+        self._clear_cache()
+        self._next_version_check = 0.0
+    
+    def _remember(self, generation: int, cache: Dict, key: Any, value: Any) -> None:
+        """Cache a loaded value unless the cache was dropped while it was being loaded."""
+        with self._cache_lock:
+            if generation != self._generation:
+                return
+            if len(cache) >= self.max_cache_entries:
+                cache.clear()
+            cache[key] = value
+    
+    def _lookup(self, column: str, value: str, index: Dict[str, Optional[str]]) -> Optional[Tenant]:
+        self._sync_registry_version()
+        if value in index:
+            tenant_id = index[value]
+            if tenant_id is None:
+                self.cache_stats['hits'] += 1
+                return None
+            return self.get_tenant(tenant_id)
+        
+        generation = self._generation
+        tenant = self._load_tenant(column, value)
+        self._remember(generation, index, value, tenant.id if tenant else None)
+        return tenant
+    
+    def _load_tenant(self, column: str, value: str) -> Optional[Tenant]:
+        """Read one tenant by an indexed column (id, domain or api_key) and cache it."""
+        from app.models import TenantModel
+        
+        self.cache_stats['misses'] += 1
+        generation = self._generation
+        tenant_model = TenantModel.query.filter(getattr(TenantModel, column) == value).first()
+        tenant = self._to_tenant(tenant_model) if tenant_model else None
+        
+        if tenant:
+            self._remember(generation, self.tenants_cache, tenant.id, tenant)
+            self._remember(generation, self.domain_index, tenant.domain.lower(), tenant.id)
+            self._remember(generation, self.api_key_index, tenant.api_key, tenant.id)
+        elif column == 'id':
+            self._remember(generation, self.tenants_cache, value, None)
+        return tenant
+    
+    def _tenant_user_map(self, tenant_id: str) -> Dict[str, TenantUser]:
+        """Cached memberships of a tenant by user id."""
+        self._sync_registry_version()
+        members = self.tenant_users_cache.get(tenant_id)
+        if members is None:
+            self.cache_stats['misses'] += 1
+            generation = self._generation
+            members = {str(tenant_user.user_id): tenant_user for tenant_user in self._query_tenant_users(tenant_id)}
+            self._remember(generation, self.tenant_users_cache, tenant_id, members)
+        return members
     
     def _load_tenant_from_storage(self, tenant_id: str) -> Optional[Tenant]:
         """Load tenant from persistent storage."""
@@ -586,37 +657,40 @@ class TenantService:
             if not tenant_model:
                 return None
             
-            # Convert database model to service dataclass
-            config = TenantConfig(
-                max_users=tenant_model.max_users,
-                max_projects=tenant_model.max_projects,
-                max_storage_gb=tenant_model.max_storage_gb,
-                max_api_calls_per_hour=tenant_model.max_api_calls_per_hour,
-                retention_days=tenant_model.retention_days,
-                features_enabled=tenant_model.features_enabled or [],
-                custom_settings=tenant_model.custom_settings or {}
-            )
-            
-            return Tenant(
-                id=tenant_model.id,
-                name=tenant_model.name,
-                domain=tenant_model.domain,
-                status=TenantStatus(tenant_model.status),
-                config=config,
-                created_at=tenant_model.created_at,
-                updated_at=tenant_model.updated_at,
-                owner_id=tenant_model.owner_id,
-                api_key=tenant_model.api_key,
-                webhook_secret=tenant_model.webhook_secret,
-                database_schema=tenant_model.database_schema,
-                storage_prefix=tenant_model.storage_prefix,
-                metadata=tenant_model.tenant_metadata or {}
-            )
+            return self._to_tenant(tenant_model)
             
         except Exception as e:
             logger.error(f"Error loading tenant {tenant_id} from storage: {e}")
             return None
     
+    def _to_tenant(self, tenant_model) -> Tenant:
+        """Convert database model to service dataclass."""
+        config = TenantConfig(
+            max_users=tenant_model.max_users,
+            max_projects=tenant_model.max_projects,
+            max_storage_gb=tenant_model.max_storage_gb,
+            max_api_calls_per_hour=tenant_model.max_api_calls_per_hour,
+            retention_days=tenant_model.retention_days,
+            features_enabled=tenant_model.features_enabled or [],
+            custom_settings=tenant_model.custom_settings or {}
+        )
+        
+        return Tenant(
+            id=tenant_model.id,
+            name=tenant_model.name,
+            domain=tenant_model.domain,
+            status=TenantStatus(tenant_model.status),
+            config=config,
+            created_at=tenant_model.created_at,
+            updated_at=tenant_model.updated_at,
+            owner_id=tenant_model.owner_id,
+            api_key=tenant_model.api_key,
+            webhook_secret=tenant_model.webhook_secret,
+            database_schema=tenant_model.database_schema,
+            storage_prefix=tenant_model.storage_prefix,
+            metadata=tenant_model.tenant_metadata or {}
+        )
+    
     def _store_tenant(self, tenant: Tenant) -> bool:
         """Store tenant to persistent storage."""
         try:
@@ -665,12 +739,15 @@ class TenantService:
                 tenant_model.tenant_metadata = tenant.metadata
                 tenant_model.updated_at = tenant.updated_at
             
+            self._bump_registry_version()
             db.session.commit()
+            self._invalidate()
             return True
             
         except Exception as e:
             logger.error(f"Error storing tenant {tenant.id}: {e}")
             db.session.rollback()
+            self._invalidate()
             return False
     
     def _store_tenant_user(self, tenant_user: TenantUser) -> bool:
@@ -681,7 +758,7 @@ class TenantService:
             # Check if association already exists
             existing = TenantUserModel.query.filter_by(
                 tenant_id=tenant_user.tenant_id,
-                user_id=tenant_user.user_id
+                user_id=str(tenant_user.user_id)
             ).first()
             
             if existing:
@@ -694,7 +771,7 @@ class TenantService:
                 # Create new association
                 user_model = TenantUserModel(
                     tenant_id=tenant_user.tenant_id,
-                    user_id=tenant_user.user_id,
+                    user_id=str(tenant_user.user_id),
                     access_level=tenant_user.access_level.value,
                     permissions=tenant_user.permissions,
                     expires_at=tenant_user.expires_at,
@@ -703,7 +780,9 @@ class TenantService:
                 )
                 db.session.add(user_model)
             
+            self._bump_registry_version()
             db.session.commit()
+            self._invalidate()
             return True
             
         except Exception as e:
@@ -718,12 +797,14 @@ class TenantService:
             
             user_assoc = TenantUserModel.query.filter_by(
                 tenant_id=tenant_id,
-                user_id=user_id
+                user_id=str(user_id)
             ).first()
             
             if user_assoc:
                 db.session.delete(user_assoc)
+                self._bump_registry_version()
                 db.session.commit()
+                self._invalidate()
                 return True
             
             return False
@@ -736,51 +817,59 @@ class TenantService:
     def _load_user_tenants(self, user_id: str) -> List[str]:
         """Load user's tenant associations."""
         try:
-            from app.models import TenantUserModel
-            
-            tenant_users = TenantUserModel.query.filter_by(user_id=user_id).all()
-            
-            # Filter out expired associations
-            tenant_ids = []
-            for tu in tenant_users:
-                if not tu.expires_at or tu.expires_at > datetime.now():
-                    tenant_ids.append(tu.tenant_id)
-            
-            return tenant_ids
+            return self._query_user_tenants(str(user_id))
             
         except Exception as e:
             logger.error(f"Error loading tenants for user {user_id}: {e}")
             return []
     
+    def _query_user_tenants(self, user_id: str) -> List[str]:
+        from app.models import TenantUserModel
+        
+        tenant_users = TenantUserModel.query.filter_by(user_id=user_id).all()
+        
+        # Filter out expired associations
+        tenant_ids = []
+        for tu in tenant_users:
+            if not tu.expires_at or tu.expires_at > datetime.now():
+                tenant_ids.append(tu.tenant_id)
+        
+        return tenant_ids
+    
     def _load_tenant_users(self, tenant_id: str) -> List[TenantUser]:
         """Load tenant's user associations."""
         try:
-            from app.models import TenantUserModel
-            
-            user_models = TenantUserModel.query.filter_by(tenant_id=tenant_id).all()
-            
-            tenant_users = []
-            for user_model in user_models:
-                tenant_user = TenantUser(
-                    tenant_id=user_model.tenant_id,
-                    user_id=user_model.user_id,
-                    access_level=AccessLevel(user_model.access_level),
-                    permissions=user_model.permissions or [],
-                    created_at=user_model.created_at,
-                    expires_at=user_model.expires_at,
-                    metadata=user_model.tenant_metadata or {}
-                )
-                tenant_users.append(tenant_user)
-            
-            return tenant_users
+            return self._query_tenant_users(tenant_id)
             
         except Exception as e:
             logger.error(f"Error loading users for tenant {tenant_id}: {e}")
             return []
+    
+    def _query_tenant_users(self, tenant_id: str) -> List[TenantUser]:
+        from app.models import TenantUserModel
+        
+        user_models = TenantUserModel.query.filter_by(tenant_id=tenant_id).all()
+        
+        tenant_users = []
+        for user_model in user_models:
+            tenant_user = TenantUser(
+                tenant_id=user_model.tenant_id,
+                user_id=user_model.user_id,
+                access_level=AccessLevel(user_model.access_level),
+                permissions=user_model.permissions or [],
+                created_at=user_model.created_at,
+                expires_at=user_model.expires_at,
+                metadata=user_model.tenant_metadata or {}
+            )
+            tenant_users.append(tenant_user)
+        
+        return tenant_users
 
 
 # Global tenant service instance
-tenant_service = TenantService()
+tenant_service = TenantService(
+    version_check_seconds=float(os.getenv('TENANT_CACHE_VERSION_CHECK_SECONDS', '2'))
+)
 
 
 def require_tenant_access(permission: str, resource: Optional[str] = None):
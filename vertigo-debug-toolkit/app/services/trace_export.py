@@ -0,0 +1,216 @@
+"""
+Trace Export
+Streams live_traces rows as NDJSON, CSV or Arrow IPC from a server-side cursor.
+"""
+
+import os
+import io
+import csv
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Iterator, List, Optional, Sequence
+
+from sqlalchemy import DateTime, Integer, Numeric, select, tuple_
+
+from app.models import db, DataSource, LiveTrace
+
+logger = logging.getLogger(__name__)
+
+# Arrow IPC output needs pyarrow; NDJSON and CSV have no extra dependencies
+try:
+    import pyarrow
+    import pyarrow.ipc
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+# Rows fetched from the cursor and encoded per chunk written to the response
+EXPORT_BATCH_SIZE = int(os.getenv('TRACE_EXPORT_BATCH_SIZE', '2000'))
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+# id and start_time are always exported: together they are the resume cursor
+EXPORT_FIELDS = (
+    'id', 'start_time', 'external_trace_id', 'name', 'status', 'model', 'end_time', 'duration_ms',
+    'input_tokens', 'output_tokens', 'cost_usd', 'user_id', 'session_id', 'data_source_id',
+    'tenant_id', 'tags', 'trace_metadata', 'input_text', 'output_text', 'created_at', 'updated_at'
+)
+DEFAULT_EXPORT_FIELDS = tuple(field for field in EXPORT_FIELDS if field not in ('input_text', 'output_text'))
+CURSOR_FIELDS = ('id', 'start_time')
+JSON_FIELDS = ('tags', 'trace_metadata')
+
+
+@dataclass
+class ExportFilters:
+    """Filters pushed down into the export query; None means unfiltered."""
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    status: Optional[str] = None
+    model: Optional[str] = None
+    source: Optional[str] = None
+    tenant_id: Optional[str] = None
+    after_time: Optional[datetime] = None
+    after_id: Optional[int] = None
+    limit: Optional[int] = None
+
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+class TraceExporter:
+    """
+    Encodes live_traces rows in (start_time, id) order, one batch at a time.
+
+    Rows come from a ``yield_per`` cursor, so memory is bounded by the batch
+    size regardless of how many rows match. An interrupted export resumes
+    with the start_time and id of the last row received (``after_time`` and
+    ``after_id``).
+    """
+
+    def __init__(self, batch_size: int = EXPORT_BATCH_SIZE):
+        self.batch_size = batch_size
+
+    def build_query(self, filters: ExportFilters, fields: Sequence[str]):
+        """Select the requested columns with every filter in the WHERE clause."""
+        columns = [getattr(LiveTrace, field) for field in fields]
+        query = select(*columns)
+
+        if filters.start is not None:
+            query = query.where(LiveTrace.start_time >= filters.start)
+        if filters.end is not None:
+            query = query.where(LiveTrace.start_time < filters.end)
+        if filters.status:
+            query = query.where(LiveTrace.status == filters.status)
+        if filters.model:
+            query = query.where(LiveTrace.model == filters.model)
+        if filters.source:
+            query = query.where(LiveTrace.data_source_id.in_(
+                select(DataSource.id).where(DataSource.name == filters.source)
+            ))
+        if filters.tenant_id:
+            query = query.where(LiveTrace.tenant_id == filters.tenant_id)
+        if filters.after_time is not None:
+            query = query.where(
+                tuple_(LiveTrace.start_time, LiveTrace.id) > tuple_(filters.after_time, filters.after_id or 0)
+            )
+
+        query = query.order_by(LiveTrace.start_time, LiveTrace.id)
+        if filters.limit:
+            query = query.limit(filters.limit)
+        return query
+
+    def iter_batches(self, filters: ExportFilters, fields: Sequence[str]) -> Iterator[List[tuple]]:
+        """Row batches from a server-side cursor."""
+        query = self.build_query(filters, fields).execution_options(yield_per=self.batch_size)
+        result = db.session.execute(query)
+        try:
+            for partition in result.partitions():
+                yield partition
+        finally:
+            result.close()
+
+    def export(self, fmt: str, filters: ExportFilters, fields: Optional[Sequence[str]] = None) -> Iterator[Any]:
+        """Encoded chunks of the export in ``fmt`` (a key of EXPORT_FORMATS)."""
+        fields = list(fields or DEFAULT_EXPORT_FIELDS)
+        for field in reversed(CURSOR_FIELDS):
+            if field not in fields:
+                fields.insert(0, field)
+
+        batches = self.iter_batches(filters, fields)
+        if fmt == 'ndjson':
+            return self._ndjson(batches, fields)
+        if fmt == 'csv':
+            return self._csv(batches, fields)
+        if fmt == 'arrow':
+            return self._arrow(batches, fields)
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    def _ndjson(self, batches: Iterator[List[tuple]], fields: List[str]) -> Iterator[str]:
+        for batch in batches:
+            yield ''.join(
+                json.dumps({field: _json_value(value) for field, value in zip(fields, row)}) + '\n'
+                for row in batch
+            )
+
+    def _csv(self, batches: Iterator[List[tuple]], fields: List[str]) -> Iterator[str]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        json_columns = [i for i, field in enumerate(fields) if field in JSON_FIELDS]
+
+        for batch in batches:
+            for row in batch:
+                row = [_json_value(value) for value in row]
+                for i in json_columns:
+                    if row[i] is not None:
+                        row[i] = json.dumps(row[i])
+                writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    def _arrow(self, batches: Iterator[List[tuple]], fields: List[str]) -> Iterator[bytes]:
+        if not ARROW_AVAILABLE:
+            raise RuntimeError("Arrow export requires pyarrow")
+
+        schema = self._arrow_schema(fields)
+        sink = io.BytesIO()
+        writer = pyarrow.ipc.new_stream(sink, schema)
+        for batch in batches:
+            columns = list(zip(*batch))
+            arrays = []
+            for i, field in enumerate(fields):
+                values = columns[i]
+                if field in JSON_FIELDS:
+                    values = [json.dumps(value) if value is not None else None for value in values]
+                elif field == 'cost_usd':
+                    values = [float(value) if value is not None else None for value in values]
+                arrays.append(pyarrow.array(values, type=schema.field(i).type))
+            writer.write_batch(pyarrow.RecordBatch.from_arrays(arrays, schema=schema))
+            yield self._drain(sink)
+
+        writer.close()
+        yield self._drain(sink)
+
+    @staticmethod
+    def _arrow_schema(fields: Sequence[str]):
+        """Arrow types from the LiveTrace column types, so every batch shares one schema."""
+        types = []
+        for field in fields:
+            column_type = LiveTrace.__table__.c[field].type
+            if isinstance(column_type, Integer):
+                types.append(pyarrow.int64())
+            elif isinstance(column_type, Numeric):
+                types.append(pyarrow.float64())
+            elif isinstance(column_type, DateTime):
+                types.append(pyarrow.timestamp('us'))
+            else:
+                types.append(pyarrow.string())
+        return pyarrow.schema(list(zip(fields, types)))
+
+    @staticmethod
+    def _drain(sink: io.BytesIO) -> bytes:
+        """Bytes written to the Arrow sink since the last drain."""
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+
+# Global exporter instance
+trace_exporter = TraceExporter()
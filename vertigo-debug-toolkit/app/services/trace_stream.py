@@ -0,0 +1,96 @@
+"""
+In-process trace stream for event-driven anomaly detection.
+Ingest paths publish written traces to a bounded queue; the anomaly monitoring engine consumes it.
+"""
+
+import os
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+# Fields carried on the stream; everything else in an ingest record is dropped
+STREAM_FIELDS = ('external_trace_id', 'status', 'start_time', 'duration_ms', 'cost_usd', 'model')
+
+
+class TraceStream:
+    """
+    Bounded, non-blocking hand-off of ingested traces to in-process consumers.
+
+    Publishing never blocks ingest: when no consumer is attached the events
+    are discarded, and when the queue is full the event is dropped and
+    counted.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        """Initialize trace stream."""
+        self.maxsize = maxsize
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._consumers = 0
+        self._lock = threading.Lock()
+        self.stats = {'published': 0, 'dropped': 0, 'consumed': 0}
+
+    @property
+    def active(self) -> bool:
+        return self._consumers > 0
+
+    def attach(self):
+        """Register a consumer; events are only queued while one is attached."""
+        with self._lock:
+            self._consumers += 1
+
+    def detach(self):
+        with self._lock:
+            self._consumers = max(self._consumers - 1, 0)
+            if not self._consumers:
+                self._drain()
+
+    def publish(self, trace: Dict[str, Any]):
+        """Queue one written trace (a live_traces-shaped dict)."""
+        self.publish_many((trace,))
+
+    def publish_many(self, traces: Iterable[Dict[str, Any]]):
+        if not self._consumers:
+            return
+        now = time.time()
+        for trace in traces:
+            event = {name: trace.get(name) for name in STREAM_FIELDS}
+            event['received_at'] = now
+            try:
+                self._queue.put_nowait(event)
+                self.stats['published'] += 1
+            except queue.Full:
+                self.stats['dropped'] += 1
+                if self.stats['dropped'] % 1000 == 1:
+                    logger.warning(f"Trace stream full ({self.maxsize}); dropped {self.stats['dropped']} events")
+
+    def get_batch(self, timeout: float, max_items: int = 1000) -> List[Dict[str, Any]]:
+        """Wait up to timeout for an event, then return it with any others already queued."""
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < max_items:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self.stats['consumed'] += len(batch)
+        return batch
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def _drain(self):
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+
+# Global trace stream
+trace_stream = TraceStream(maxsize=int(os.getenv('TRACE_STREAM_QUEUE_SIZE', '10000')))
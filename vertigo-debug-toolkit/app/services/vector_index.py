@@ -0,0 +1,521 @@
+"""
+Persistent vector index for semantic prompt search.
+Stores L2-normalized float32 embeddings in a memory-mapped matrix shared by all worker processes.
+"""
+
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    FCNTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+FREE_ROW = -1
+
+# The delta log is compacted into the metadata snapshot once it outgrows both
+# the snapshot and this size, so each change costs amortized O(1) to persist
+LOG_COMPACT_BYTES = 64 * 1024
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Return a float32 copy of vectors with unit-length rows."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores in descending order, without a full sort."""
+    if k <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.int64)
+    if k >= scores.size:
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class PromptVectorIndex:
+    """
+    Memory-mapped embedding index keyed by prompt ID.
+
+    Layout in ``directory``:
+    - ``<name>.f32``: contiguous (capacity x dim) float32 matrix, one normalized row per prompt
+    - ``<name>.meta.json``: snapshot of the row -> prompt ID map, per-prompt fingerprints and a version counter
+    - ``<name>.meta.log``: JSON lines with the rows written or freed by each version after the snapshot
+    - ``<name>.ivf.npz``: optional IVF centroids and row assignments
+
+    Writers serialize through an exclusive file lock and append one log line
+    per change, compacting the log into a new snapshot (replaced atomically)
+    when it grows; readers replay new log lines, or reload after a new
+    snapshot, so every worker process searches the same index without
+    re-encoding prompts after a restart.
+    """
+
+    def __init__(self, directory: str, dim: int, name: str = 'prompts',
+                 model_name: str = '', mode: str = 'flat',
+                 ivf_min_size: int = 4096, ivf_probe: int = 8):
+        """
+        Initialize (or open) the index.
+
+        Args:
+            directory: Directory holding the index files
+            dim: Embedding dimensionality
+            name: File name prefix
+            model_name: Embedding model; a mismatch with the stored index resets it
+            mode: 'flat' for exact search or 'ivf' for inverted-file approximate search
+            ivf_min_size: Row count below which IVF mode still searches exactly
+            ivf_probe: Number of IVF lists scanned per query
+        """
+        self.directory = directory
+        self.dim = dim
+        self.name = name
+        self.model_name = model_name
+        self.mode = mode
+        self.ivf_min_size = ivf_min_size
+        self.ivf_probe = ivf_probe
+
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, f"{name}.f32")
+        self.meta_path = os.path.join(directory, f"{name}.meta.json")
+        self.log_path = os.path.join(directory, f"{name}.meta.log")
+        self.ivf_path = os.path.join(directory, f"{name}.ivf.npz")
+        self.lock_path = os.path.join(directory, f"{name}.lock")
+
+        self._thread_lock = threading.RLock()
+        self._meta_mtime = None
+        self._meta_size = 0
+        self._log_inode = None
+        self._log_offset = 0
+        self._matrix: Optional[np.memmap] = None
+        self._row_ids = np.empty(0, dtype=np.int64)
+        self._rows: Dict[int, int] = {}
+        self._fingerprints: Dict[str, str] = {}
+        self._free_rows: Set[int] = set()
+        self._capacity = 0
+        self._count = 0
+        self.version = 0
+        self._ivf: Optional[Dict[str, np.ndarray]] = None
+        self._ivf_version = None
+
+        with self._write_lock():
+            self._load(force=True)
+            if self._capacity == 0 or (model_name and self._stored_model != model_name):
+                self._reset()
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def _write_lock(self):
+        """Exclusive lock across threads and processes for index mutation."""
+        with self._thread_lock:
+            if not FCNTL_AVAILABLE:
+                yield
+                return
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self, force: bool = False) -> None:
+        """Catch up with versions published by other processes."""
+        try:
+            stat = os.stat(self.meta_path)
+        except FileNotFoundError:
+            self._capacity = 0
+            self._stored_model = None
+            return
+
+        if force or (stat.st_ino, stat.st_mtime_ns) != self._meta_mtime:
+            if not self._load_snapshot(stat):
+                return
+        self._replay_log()
+
+    def _load_snapshot(self, stat: os.stat_result) -> bool:
+        """Read the metadata snapshot and remap the matrix; False if it has another dimension."""
+        with open(self.meta_path) as f:
+            meta = json.load(f)
+
+        if meta.get('dim') != self.dim:
+            self._capacity = 0
+            self._stored_model = None
+            return False
+
+        self._stored_model = meta.get('model_name')
+        self._capacity = meta['capacity']
+        self._count = meta['count']
+        self.version = meta['version']
+        self._row_ids = np.asarray(meta['row_ids'], dtype=np.int64)
+        self._fingerprints = meta.get('fingerprints', {})
+        self._rows = {int(pid): row for row, pid in enumerate(self._row_ids.tolist()) if pid != FREE_ROW}
+        self._free_rows = {row for row, pid in enumerate(self._row_ids.tolist()) if pid == FREE_ROW}
+        self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r+',
+                                 shape=(self._capacity, self.dim))
+        self._meta_mtime = (stat.st_ino, stat.st_mtime_ns)
+        self._meta_size = stat.st_size
+        # Replay the log from its start; entries the snapshot already covers are skipped by version
+        self._log_inode = None
+        self._log_offset = 0
+        return True
+
+    def _replay_log(self) -> None:
+        """Apply log entries appended since the last read, remapping if capacity grew."""
+        try:
+            stat = os.stat(self.log_path)
+        except FileNotFoundError:
+            return
+        if stat.st_ino == self._log_inode and stat.st_size == self._log_offset:
+            return
+
+        with open(self.log_path, 'rb') as f:
+            inode = os.fstat(f.fileno()).st_ino
+            if inode != self._log_inode:
+                # Compacted since the last read: the new log only holds newer entries
+                self._log_inode, self._log_offset = inode, 0
+            f.seek(self._log_offset)
+            data = f.read()
+
+        # A line still being appended by the writer is picked up next time
+        end = data.rfind(b'\n') + 1
+        capacity = self._capacity
+        for line in data[:end].splitlines():
+            entry = json.loads(line)
+            if entry['version'] > self.version:
+                self._apply(entry)
+        self._log_offset += end
+        if self._capacity != capacity:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r+',
+                                     shape=(self._capacity, self.dim))
+
+    def _apply(self, entry: Dict) -> None:
+        self.version = entry['version']
+        self._capacity = entry['capacity']
+        self._count = entry['count']
+        if self._row_ids.size < self._count:
+            self._row_ids = np.concatenate([
+                self._row_ids, np.full(self._count - self._row_ids.size, FREE_ROW, dtype=np.int64)
+            ])
+        for row, prompt_id, fingerprint in entry['set']:
+            self._row_ids[row] = prompt_id
+            self._rows[prompt_id] = row
+            self._free_rows.discard(row)
+            self._fingerprints[str(prompt_id)] = fingerprint
+        for row, prompt_id in entry['free']:
+            self._row_ids[row] = FREE_ROW
+            self._rows.pop(prompt_id, None)
+            self._free_rows.add(row)
+            self._fingerprints.pop(str(prompt_id), None)
+
+    def _publish(self, written: Iterable[Tuple[int, int, str]] = (),
+                 freed: Iterable[Tuple[int, int]] = (), snapshot: bool = False) -> None:
+        """
+        Flush vectors and publish a bumped version.
+
+        Args:
+            written: (row, prompt_id, fingerprint) of rows written in this version
+            freed: (row, prompt_id) of rows freed in this version
+            snapshot: Write a full snapshot instead of appending to the log
+        """
+        if self._matrix is not None:
+            self._matrix.flush()
+        self.version += 1
+        entry = {
+            'version': self.version,
+            'capacity': self._capacity,
+            'count': self._count,
+            'set': [list(item) for item in written],
+            'free': [list(item) for item in freed]
+        }
+        line = (json.dumps(entry) + '\n').encode()
+        if snapshot or self._log_offset + len(line) > max(self._meta_size, LOG_COMPACT_BYTES):
+            self._write_snapshot()
+            return
+
+        with open(self.log_path, 'ab') as f:
+            f.write(line)
+            inode = os.fstat(f.fileno()).st_ino
+        if inode != self._log_inode:
+            self._log_inode, self._log_offset = inode, 0
+        self._log_offset += len(line)
+
+    def _write_snapshot(self) -> None:
+        """Atomically replace the metadata snapshot, then start an empty log."""
+        meta = {
+            'dim': self.dim,
+            'model_name': self.model_name,
+            'capacity': self._capacity,
+            'count': self._count,
+            'version': self.version,
+            'row_ids': self._row_ids[:self._count].tolist(),
+            'fingerprints': self._fingerprints
+        }
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+        stat = os.stat(self.meta_path)
+        self._meta_mtime = (stat.st_ino, stat.st_mtime_ns)
+        self._meta_size = stat.st_size
+        self._stored_model = self.model_name
+
+        # Readers between the two replaces reload the snapshot and skip the old log's entries by version
+        tmp_path = f"{self.log_path}.tmp"
+        open(tmp_path, 'wb').close()
+        os.replace(tmp_path, self.log_path)
+        self._log_inode = os.stat(self.log_path).st_ino
+        self._log_offset = 0
+
+    def _reset(self, capacity: int = 1024) -> None:
+        """Create an empty index, discarding any incompatible files."""
+        self._capacity = capacity
+        self._count = 0
+        self._row_ids = np.full(0, FREE_ROW, dtype=np.int64)
+        self._rows = {}
+        self._free_rows = set()
+        self._fingerprints = {}
+        # A new file, so processes still mapping the old matrix never see it truncated
+        tmp_path = f"{self.vectors_path}.tmp"
+        self._matrix = np.memmap(tmp_path, dtype=np.float32, mode='w+', shape=(capacity, self.dim))
+        self._matrix.flush()
+        os.replace(tmp_path, self.vectors_path)
+        if os.path.exists(self.ivf_path):
+            os.remove(self.ivf_path)
+        self._ivf = None
+        self._publish(snapshot=True)
+        logger.info(f"Initialized vector index at {self.vectors_path} (dim={self.dim})")
+
+    def _grow(self, needed: int) -> None:
+        """Double capacity until ``needed`` rows fit, preserving existing vectors."""
+        new_capacity = self._capacity
+        while new_capacity < needed:
+            new_capacity *= 2
+        if new_capacity == self._capacity:
+            return
+        self._matrix.flush()
+        del self._matrix
+        with open(self.vectors_path, 'r+b') as f:
+            f.truncate(new_capacity * self.dim * 4)
+        self._capacity = new_capacity
+        self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r+',
+                                 shape=(new_capacity, self.dim))
+
+    # ------------------------------------------------------------------
+    # Mutation
+    # ------------------------------------------------------------------
+
+    def fingerprint(self, prompt_id: int) -> Optional[str]:
+        """Stored fingerprint (e.g. updated_at) for a prompt, used to skip re-encoding."""
+        with self._thread_lock:
+            self._load()
+            return self._fingerprints.get(str(prompt_id))
+
+    def fingerprints(self) -> Dict[int, str]:
+        """All stored fingerprints keyed by prompt ID."""
+        with self._thread_lock:
+            self._load()
+            return {int(pid): fp for pid, fp in self._fingerprints.items()}
+
+    def upsert(self, items: Iterable[Tuple[int, np.ndarray, str]]) -> int:
+        """
+        Insert or replace embeddings in place.
+
+        Args:
+            items: (prompt_id, embedding, fingerprint) tuples
+
+        Returns:
+            Number of rows written
+        """
+        items = list(items)
+        if not items:
+            return 0
+
+        with self._write_lock():
+            self._load()
+            new_ids = [pid for pid, _, _ in items if pid not in self._rows]
+            overflow = max(0, len(new_ids) - len(self._free_rows))
+            self._grow(self._count + overflow)
+            if self._row_ids.size < self._count + overflow:
+                self._row_ids = np.concatenate([
+                    self._row_ids, np.full(overflow, FREE_ROW, dtype=np.int64)
+                ])
+
+            vectors = normalize_rows(np.stack([vec for _, vec, _ in items]))
+            written = []
+            for (prompt_id, _, fingerprint), vector in zip(items, vectors):
+                row = self._rows.get(prompt_id)
+                if row is None:
+                    if self._free_rows:
+                        row = self._free_rows.pop()
+                    else:
+                        row = self._count
+                        self._count += 1
+                    self._rows[prompt_id] = row
+                    self._row_ids[row] = prompt_id
+                self._matrix[row] = vector
+                self._assign_ivf(row, vector)
+                self._fingerprints[str(prompt_id)] = fingerprint
+                written.append((row, prompt_id, fingerprint))
+
+            if self._ivf is not None and self.mode == 'ivf':
+                self._save_ivf(self._ivf)
+            self._publish(written=written)
+            return len(items)
+
+    def remove(self, prompt_ids: Iterable[int]) -> int:
+        """Tombstone rows so they are skipped by search and reused by later inserts."""
+        freed = []
+        with self._write_lock():
+            self._load()
+            for prompt_id in prompt_ids:
+                row = self._rows.pop(prompt_id, None)
+                if row is None:
+                    continue
+                self._row_ids[row] = FREE_ROW
+                self._matrix[row] = 0.0
+                self._free_rows.add(row)
+                self._fingerprints.pop(str(prompt_id), None)
+                freed.append((row, prompt_id))
+            if freed:
+                self._publish(freed=freed)
+        return len(freed)
+
+    def __len__(self) -> int:
+        with self._thread_lock:
+            self._load()
+            return len(self._rows)
+
+    # ------------------------------------------------------------------
+    # IVF (inverted file) approximate search
+    # ------------------------------------------------------------------
+
+    def build_ivf(self, n_lists: Optional[int] = None, iterations: int = 10, seed: int = 0) -> None:
+        """Train spherical k-means centroids and persist row assignments."""
+        with self._write_lock():
+            self._load()
+            live = self._count
+            if live == 0:
+                return
+            n_lists = n_lists or max(1, int(np.sqrt(live)))
+            data = np.asarray(self._matrix[:live])
+            rng = np.random.default_rng(seed)
+            centroids = data[rng.choice(live, size=min(n_lists, live), replace=False)].copy()
+            for _ in range(iterations):
+                assignments = np.argmax(data @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assignments, data)
+                empty = ~sums.any(axis=1)
+                sums[empty] = centroids[empty]
+                centroids = normalize_rows(sums)
+            assignments = np.argmax(data @ centroids.T, axis=1).astype(np.int32)
+            assignments[self._row_ids[:live] == FREE_ROW] = -1
+            self._ivf = {'centroids': centroids, 'assignments': assignments, 'trained_rows': live}
+            self._save_ivf(self._ivf)
+            self._publish()
+            logger.info(f"Built IVF index with {centroids.shape[0]} lists over {live} rows")
+
+    def needs_ivf_rebuild(self) -> bool:
+        """True when IVF mode is on and the index is untrained or has doubled since training."""
+        if self.mode != 'ivf':
+            return False
+        with self._thread_lock:
+            self._load()
+            if len(self._rows) < self.ivf_min_size:
+                return False
+            ivf = self._load_ivf()
+            return ivf is None or self._count > 2 * ivf['trained_rows']
+
+    def _load_ivf(self) -> Optional[Dict[str, np.ndarray]]:
+        if self._ivf is not None and self._ivf_version == self.version:
+            return self._ivf
+        if not os.path.exists(self.ivf_path):
+            return None
+        with np.load(self.ivf_path) as data:
+            self._ivf = {'centroids': data['centroids'], 'assignments': data['assignments'],
+                         'trained_rows': int(data['trained_rows'][0])}
+        self._ivf_version = self.version
+        return self._ivf
+
+    def _assign_ivf(self, row: int, vector: np.ndarray) -> None:
+        """Keep IVF assignments current for incrementally added rows."""
+        if self.mode != 'ivf':
+            return
+        ivf = self._load_ivf()
+        if ivf is None:
+            return
+        assignments = ivf['assignments']
+        if row >= assignments.size:
+            assignments = np.concatenate([
+                assignments, np.full(row + 1 - assignments.size, -1, dtype=np.int32)
+            ])
+        assignments[row] = int(np.argmax(ivf['centroids'] @ vector))
+        ivf['assignments'] = assignments
+
+    def _save_ivf(self, ivf: Dict[str, np.ndarray]) -> None:
+        np.savez(self.ivf_path, centroids=ivf['centroids'], assignments=ivf['assignments'],
+                 trained_rows=np.array([ivf['trained_rows']]))
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def search(self, query: np.ndarray, k: int = 10, min_score: float = -1.0) -> List[Tuple[int, float]]:
+        """
+        Return up to k (prompt_id, cosine similarity) pairs, best first.
+
+        Flat mode scores every row with one matrix-vector product; IVF mode
+        only scores rows in the ivf_probe closest lists.
+        """
+        with self._thread_lock:
+            self._load()
+            if not self._rows:
+                return []
+
+            q = normalize_rows(query)[0]
+            count = self._count
+            matrix = self._matrix[:count]
+            row_ids = self._row_ids[:count]
+
+            candidate_rows = None
+            if self.mode == 'ivf' and count >= self.ivf_min_size:
+                ivf = self._load_ivf()
+                if ivf is not None:
+                    probe = min(self.ivf_probe, ivf['centroids'].shape[0])
+                    lists = top_k(ivf['centroids'] @ q, probe)
+                    assignments = ivf['assignments'][:count]
+                    candidate_rows = np.flatnonzero(np.isin(assignments, lists))
+                    # Rows added after the assignment table was last extended
+                    if assignments.size < count:
+                        candidate_rows = np.concatenate([
+                            candidate_rows, np.arange(assignments.size, count)
+                        ])
+
+            if candidate_rows is None:
+                scores = matrix @ q
+                scores[row_ids == FREE_ROW] = -np.inf
+                best = top_k(scores, k)
+                rows, best_scores = best, scores[best]
+            else:
+                scores = matrix[candidate_rows] @ q
+                scores[row_ids[candidate_rows] == FREE_ROW] = -np.inf
+                best = top_k(scores, k)
+                rows, best_scores = candidate_rows[best], scores[best]
+
+            return [(int(row_ids[row]), float(score))
+                    for row, score in zip(rows, best_scores)
+                    if score >= min_score and np.isfinite(score)]
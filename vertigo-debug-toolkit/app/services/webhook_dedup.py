@@ -0,0 +1,141 @@
+"""
+Webhook Deduplication Index
+In-memory LRU set and time-partitioned bloom filter over recent (trace_id, event_type) keys.
+"""
+
+import hashlib
+import logging
+import math
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+NEW = 'new'
+DUPLICATE = 'duplicate'
+POSSIBLE = 'possible'
+
+
+class BloomFilter:
+    """Fixed-size bloom filter sized for a capacity and false positive rate."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.size = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 64)
+        self.hash_count = max(int(round(self.size / capacity * math.log(2))), 1)
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class TimePartitionedBloomFilter:
+    """
+    Bloom filters per time partition, so old keys expire by dropping whole
+    partitions instead of needing deletes.
+    """
+
+    def __init__(self, window_seconds: float, partitions: int = 5, capacity: int = 100000,
+                 error_rate: float = 0.001):
+        self.window_seconds = window_seconds
+        self.partition_seconds = window_seconds / partitions
+        self.partitions = partitions
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._filters: Dict[int, BloomFilter] = {}
+
+    def _partition(self, timestamp: float) -> int:
+        return int(timestamp // self.partition_seconds)
+
+    def add(self, key: str, timestamp: float):
+        partition = self._partition(timestamp)
+        bloom = self._filters.get(partition)
+        if bloom is None:
+            bloom = self._filters[partition] = BloomFilter(self.capacity, self.error_rate)
+            # Keep one partition beyond the window for events arriving slightly late
+            for old in [p for p in self._filters if p < partition - self.partitions - 1]:
+                del self._filters[old]
+        elif bloom.count >= self.capacity:
+            logger.debug(f"Dedup bloom partition {partition} over capacity ({bloom.count} keys)")
+        bloom.add(key)
+
+    def might_contain(self, key: str, since: float) -> bool:
+        """True if key may have been added in a partition overlapping [since, now]."""
+        first = self._partition(since)
+        return any(partition >= first and key in bloom for partition, bloom in self._filters.items())
+
+    def __len__(self) -> int:
+        return len(self._filters)
+
+
+class WebhookDedupIndex:
+    """
+    Recent-event index answering "seen within the window?" without the database.
+
+    - An LRU map of the most recent keys gives exact answers for them.
+    - Older keys (evicted from the LRU, still inside the window) are
+      remembered by the time-partitioned bloom filter, which can only say
+      "possibly seen"; callers confirm those against the database.
+    - Keys in neither were not seen in the window by this process.
+    """
+
+    def __init__(self, window_seconds: float, lru_size: int = 50000, bloom_capacity: int = 100000,
+                 error_rate: float = 0.001, partitions: int = 5):
+        self.window_seconds = window_seconds
+        self.lru_size = lru_size
+        self._recent: 'OrderedDict[Tuple[str, str], float]' = OrderedDict()
+        self._bloom = TimePartitionedBloomFilter(window_seconds, partitions, bloom_capacity, error_rate)
+        self._lock = threading.Lock()
+        self.stats = {NEW: 0, DUPLICATE: 0, POSSIBLE: 0}
+
+    @staticmethod
+    def _bloom_key(key: Tuple[str, str]) -> str:
+        return '\x1f'.join(key)
+
+    def check(self, key: Tuple[str, str], timestamp: float) -> str:
+        """Classify an event as NEW, DUPLICATE or POSSIBLE (needs a database check)."""
+        cutoff = timestamp - self.window_seconds
+        with self._lock:
+            last_seen = self._recent.get(key)
+            if last_seen is not None and last_seen >= cutoff:
+                self._recent.move_to_end(key)
+                verdict = DUPLICATE
+            elif self._bloom.might_contain(self._bloom_key(key), cutoff):
+                verdict = POSSIBLE
+            else:
+                verdict = NEW
+            self.stats[verdict] += 1
+        return verdict
+
+    def add(self, key: Tuple[str, str], timestamp: float):
+        with self._lock:
+            self._add(key, timestamp)
+
+    def add_many(self, entries: Iterable[Tuple[Tuple[str, str], float]]):
+        with self._lock:
+            for key, timestamp in entries:
+                self._add(key, timestamp)
+
+    def _add(self, key: Hashable, timestamp: float):
+        if timestamp >= self._recent.get(key, timestamp):
+            self._recent[key] = timestamp
+        self._recent.move_to_end(key)
+        while len(self._recent) > self.lru_size:
+            self._recent.popitem(last=False)
+        self._bloom.add(self._bloom_key(key), timestamp)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats, lru_keys=len(self._recent), bloom_partitions=len(self._bloom))
@@ -0,0 +1,99 @@
+"""
+Webhook Event Log
+Buffers webhook_events rows and writes them in group commits from a background thread.
+"""
+
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from flask import current_app
+from sqlalchemy import text
+
+from app.models import db
+
+logger = logging.getLogger(__name__)
+
+INSERT_EVENT_SQL = """
+INSERT INTO webhook_events
+(trace_id, event_type, event_data, source, received_at, processed_at, status, error_message)
+VALUES (:trace_id, :event_type, :event_data, :source, :received_at, :processed_at, :status, :error_message)
+"""
+
+
+class WebhookEventLog:
+    """
+    Group-commit writer for webhook event rows.
+
+    ``append`` only queues the row; a writer thread inserts everything queued
+    in one executemany + commit when ``batch_size`` rows are waiting or
+    ``flush_interval_seconds`` has passed. Rows still buffered when the
+    process dies are lost, which only affects the monitoring log.
+    """
+
+    def __init__(self, batch_size: int = 500, flush_interval_seconds: float = 0.05,
+                 max_pending: int = 50000):
+        """Initialize webhook event log."""
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_pending = max_pending
+
+        self._pending: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._app = None
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'logged': 0, 'batches': 0, 'failed': 0, 'dropped': 0}
+
+    def append(self, row: Dict[str, Any]):
+        """Queue one row for the next group commit (call within an app context)."""
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self._pending.pop(0)
+                self.stats['dropped'] += 1
+            self._pending.append(row)
+            pending = len(self._pending)
+            if self._thread is None:
+                self._app = current_app._get_current_object()
+                self._thread = threading.Thread(target=self._run, name="WebhookEventLog", daemon=True)
+                self._thread.start()
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """Write all queued rows now in the current app context. Returns rows written."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return 0
+            try:
+                db.session.execute(text(INSERT_EVENT_SQL), rows)
+                db.session.commit()
+                with self._lock:
+                    self.stats['logged'] += len(rows)
+                    self.stats['batches'] += 1
+                return len(rows)
+            except Exception as e:
+                logger.error(f"Error logging {len(rows)} webhook events: {e}")
+                db.session.rollback()
+                with self._lock:
+                    self.stats['failed'] += len(rows)
+                return 0
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval_seconds)
+            self._wakeup.clear()
+            if self.pending():
+                with self._app.app_context():
+                    self.flush()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats, pending=len(self._pending))
@@ -12,6 +12,10 @@ from datetime import datetime
 from typing import Dict, List, Optional, Any
 from flask import request, current_app
 from app.models import db
+from app.services.cache_service import TRACES_VERSION, default_cache_service
+from app.services.metric_rollups import metric_rollup_service
+from app.services.tenant_scope import ingest_tenant_id
+from app.services.trace_stream import trace_stream
 from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 import uuid
@@ -204,6 +208,7 @@ class WebhookHandler:
         """Handle trace creation event."""
         try:
             trace_data = self._extract_trace_data(payload, source)
+            trace_data['tenant_id'] = ingest_tenant_id()
             
             # Insert new trace record
             db.session.execute(
@@ -211,15 +216,18 @@ class WebhookHandler:
                 INSERT INTO live_traces 
                 (external_trace_id, name, status, model, start_time, end_time, duration_ms,
                  input_text, output_text, input_tokens, output_tokens, cost_usd,
-                 user_id, session_id, tags, metadata, data_source, source_updated_at)
+                 user_id, session_id, tags, metadata, data_source, source_updated_at, tenant_id)
                 VALUES 
                 (:external_trace_id, :name, :status, :model, :start_time, :end_time, :duration_ms,
                  :input_text, :output_text, :input_tokens, :output_tokens, :cost_usd,
-                 :user_id, :session_id, :tags, :metadata, :data_source, :source_updated_at)
+                 :user_id, :session_id, :tags, :metadata, :data_source, :source_updated_at, :tenant_id)
                 """),
                 trace_data
             )
+            metric_rollup_service.refresh_for_timestamps([trace_data.get('start_time')])
             db.session.commit()
+            default_cache_service.bump_version(TRACES_VERSION)
+            trace_stream.publish(trace_data)
             
             # Trigger real-time update (WebSocket event)
             self._trigger_real_time_update('trace_created', trace_data)
@@ -250,13 +258,21 @@ class WebhookHandler:
                 update_values['updated_at'] = datetime.utcnow()
                 update_fields.append("updated_at = :updated_at")
                 
+                previous_start = db.session.execute(
+                    text("SELECT start_time FROM live_traces WHERE external_trace_id = :trace_id"),
+                    {"trace_id": trace_id}
+                ).scalar()
+                
                 sql = f"""
                 UPDATE live_traces 
                 SET {', '.join(update_fields)}
                 WHERE external_trace_id = :external_trace_id
                 """
                 db.session.execute(text(sql), update_values)
+                metric_rollup_service.refresh_for_timestamps([previous_start, trace_data.get('start_time')])
                 db.session.commit()
+                default_cache_service.bump_version(TRACES_VERSION)
+                trace_stream.publish(trace_data)
                 
                 # Trigger real-time update
                 self._trigger_real_time_update('trace_updated', trace_data)
@@ -275,11 +291,18 @@ class WebhookHandler:
             if not trace_id:
                 return {'success': False, 'error': 'No trace ID provided'}
             
+            previous_start = db.session.execute(
+                text("SELECT start_time FROM live_traces WHERE external_trace_id = :trace_id"),
+                {"trace_id": trace_id}
+            ).scalar()
+            
             db.session.execute(
                 text("DELETE FROM live_traces WHERE external_trace_id = :trace_id"),
                 {"trace_id": trace_id}
             )
+            metric_rollup_service.refresh_for_timestamps([previous_start])
             db.session.commit()
+            default_cache_service.bump_version(TRACES_VERSION)
             
             # Trigger real-time update
             self._trigger_real_time_update('trace_deleted', {'trace_id': trace_id})
@@ -0,0 +1,296 @@
+"""
+Webhook Ingestion Queue
+Durable SQLite (WAL) queue between webhook acknowledgement and processing, drained by a worker pool.
+"""
+
+import os
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhook_queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    available_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_by TEXT,
+    claimed_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_webhook_queue_available ON webhook_queue(available_at, id);
+CREATE TABLE IF NOT EXISTS webhook_dead_letters (
+    id INTEGER PRIMARY KEY,
+    payload TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    failed_at REAL NOT NULL,
+    attempts INTEGER NOT NULL,
+    last_error TEXT
+);
+"""
+
+# handler(payload, received_at) -> None when done (including permanent
+# rejections); raises to have the item retried
+QueueHandler = Callable[[Dict[str, Any], datetime], None]
+
+
+class WebhookQueue:
+    """
+    File-backed queue of verified webhook payloads.
+
+    - ``enqueue`` commits the payload before the webhook is acknowledged,
+      so accepted events survive a process restart.
+    - Worker threads claim batches under ``BEGIN IMMEDIATE``, so several
+      processes can share one queue file. Claims older than
+      ``visibility_timeout_seconds`` (a crashed worker) are claimed again.
+    - A failed item is retried with exponential backoff and moved to
+      ``webhook_dead_letters`` after ``max_attempts``. Handlers must be
+      idempotent, since an item can be processed more than once.
+    """
+
+    def __init__(self, path: str, workers: int = 2, batch_size: int = 50, max_attempts: int = 5,
+                 base_backoff_seconds: float = 1.0, visibility_timeout_seconds: float = 300,
+                 poll_interval_seconds: float = 0.5):
+        """Initialize webhook queue."""
+        self.path = path
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_backoff_seconds = base_backoff_seconds
+        self.visibility_timeout_seconds = visibility_timeout_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+
+        self._local = threading.local()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._running = False
+        self._app = None
+        self._handler: Optional[QueueHandler] = None
+        self._stats_lock = threading.Lock()
+        self.stats = {'enqueued': 0, 'processed': 0, 'retried': 0, 'dead_lettered': 0, 'batches': 0}
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # WAL + NORMAL: committed items survive a process crash without an fsync per commit
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def _count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def enqueue(self, payload: Dict[str, Any], received_at: Optional[float] = None) -> int:
+        """Durably queue a payload; returns its queue id."""
+        now = received_at or time.time()
+        cursor = self._connection().execute(
+            "INSERT INTO webhook_queue (payload, enqueued_at, available_at) VALUES (?, ?, ?)",
+            (json.dumps(payload), now, now)
+        )
+        self._count('enqueued')
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    def claim_batch(self, worker_id: str) -> List[Tuple[int, Dict[str, Any], float, int]]:
+        """Claim up to batch_size ready items: [(id, payload, enqueued_at, attempts)]."""
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                """
+                SELECT id, payload, enqueued_at, attempts FROM webhook_queue
+                WHERE available_at <= ? AND (claimed_at IS NULL OR claimed_at < ?)
+                ORDER BY available_at, id
+                LIMIT ?
+                """,
+                (now, now - self.visibility_timeout_seconds, self.batch_size)
+            ).fetchall()
+            if rows:
+                conn.executemany(
+                    "UPDATE webhook_queue SET claimed_by = ?, claimed_at = ? WHERE id = ?",
+                    [(worker_id, now, row[0]) for row in rows]
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [(row[0], json.loads(row[1]), row[2], row[3]) for row in rows]
+
+    def complete(self, ids: List[int]):
+        if ids:
+            self._connection().executemany("DELETE FROM webhook_queue WHERE id = ?", [(i,) for i in ids])
+            self._count('processed', len(ids))
+
+    def fail(self, item_id: int, attempts: int, error: str):
+        """Schedule a retry with backoff, or dead-letter the item after max_attempts."""
+        conn = self._connection()
+        attempts += 1
+        now = time.time()
+        if attempts >= self.max_attempts:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO webhook_dead_letters (id, payload, enqueued_at, failed_at, attempts, last_error)
+                    SELECT id, payload, enqueued_at, ?, ?, ? FROM webhook_queue WHERE id = ?
+                    """,
+                    (now, attempts, error, item_id)
+                )
+                conn.execute("DELETE FROM webhook_queue WHERE id = ?", (item_id,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self._count('dead_lettered')
+            logger.error(f"Webhook queue item {item_id} dead-lettered after {attempts} attempts: {error}")
+        else:
+            conn.execute(
+                """
+                UPDATE webhook_queue
+                SET attempts = ?, available_at = ?, claimed_by = NULL, claimed_at = NULL, last_error = ?
+                WHERE id = ?
+                """,
+                (attempts, now + self.base_backoff_seconds * 2 ** (attempts - 1), error, item_id)
+            )
+            self._count('retried')
+
+    def requeue_dead_letters(self) -> int:
+        """Move dead-lettered items back onto the queue (after fixing the cause)."""
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                """
+                INSERT INTO webhook_queue (payload, enqueued_at, available_at)
+                SELECT payload, enqueued_at, ? FROM webhook_dead_letters ORDER BY id
+                """,
+                (now,)
+            )
+            moved = conn.execute("DELETE FROM webhook_dead_letters").rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._wakeup.set()
+        return moved
+
+    def process_batch(self, worker_id: str = 'inline') -> int:
+        """Claim and process one batch with the handler. Returns items claimed."""
+        batch = self.claim_batch(worker_id)
+        if not batch:
+            return 0
+
+        done = []
+        for item_id, payload, enqueued_at, attempts in batch:
+            try:
+                self._handler(payload, datetime.utcfromtimestamp(enqueued_at))
+                done.append(item_id)
+            except Exception as e:
+                logger.warning(f"Webhook queue item {item_id} failed (attempt {attempts + 1}): {e}")
+                self.fail(item_id, attempts, str(e))
+        self.complete(done)
+        self._count('batches')
+        return len(batch)
+
+    def init_app(self, app, handler: QueueHandler):
+        """Bind the app and handler; resume draining a backlog left by a previous run."""
+        self._app = app
+        self._handler = handler
+        if os.path.exists(self.path) and self.get_metrics().get('depth'):
+            self.start()
+
+    def start(self):
+        """Start the worker pool (idempotent)."""
+        if self._running:
+            return
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._worker, args=(f"{os.getpid()}-{n}",), name=f"WebhookQueue-{n}",
+                             daemon=True)
+            for n in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"Webhook queue started with {self.workers} workers ({self.path})")
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def _worker(self, worker_id: str):
+        while self._running:
+            try:
+                with self._app.app_context():
+                    claimed = self.process_batch(worker_id)
+            except Exception as e:
+                logger.error(f"Error in webhook queue worker {worker_id}: {e}")
+                claimed = 0
+            if not claimed:
+                self._wakeup.wait(self.poll_interval_seconds)
+                self._wakeup.clear()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Queue depth, lag and dead letters for health checks."""
+        try:
+            conn = self._connection()
+            now = time.time()
+            depth, ready, in_flight, oldest = conn.execute(
+                """
+                SELECT COUNT(*),
+                       COALESCE(SUM(CASE WHEN available_at <= ? AND (claimed_at IS NULL OR claimed_at < ?)
+                                         THEN 1 ELSE 0 END), 0),
+                       COALESCE(SUM(CASE WHEN claimed_at >= ? THEN 1 ELSE 0 END), 0),
+                       MIN(enqueued_at)
+                FROM webhook_queue
+                """,
+                (now, now - self.visibility_timeout_seconds, now - self.visibility_timeout_seconds)
+            ).fetchone()
+            dead_letters = conn.execute("SELECT COUNT(*) FROM webhook_dead_letters").fetchone()[0]
+        except Exception as e:
+            logger.error(f"Error reading webhook queue metrics: {e}")
+            return {'error': str(e)}
+
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {
+            'depth': depth,
+            'ready': ready,
+            'in_flight': in_flight,
+            'lag_seconds': round(now - oldest, 3) if oldest else 0.0,
+            'dead_letters': dead_letters,
+            'workers': sum(thread.is_alive() for thread in self._threads),
+            **stats
+        }
+
+
+# Global webhook queue
+webhook_queue = WebhookQueue(
+    path=os.getenv('WEBHOOK_QUEUE_PATH', os.path.join(os.getcwd(), 'instance', 'webhook_queue.db')),
+    workers=int(os.getenv('WEBHOOK_QUEUE_WORKERS', '2')),
+    batch_size=int(os.getenv('WEBHOOK_QUEUE_BATCH_SIZE', '50')),
+    max_attempts=int(os.getenv('WEBHOOK_QUEUE_MAX_ATTEMPTS', '5'))
+)
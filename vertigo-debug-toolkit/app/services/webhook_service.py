@@ -8,17 +8,30 @@ import json
 import hmac
 import hashlib
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
 from flask import request, current_app
 from app.models import db
 from app.models import Trace
+from app.services.cache_service import TRACES_VERSION, default_cache_service
+from app.services.metric_rollups import metric_rollup_service
+from app.services.tenant_scope import ingest_tenant_id, tenant_context
+from app.services.trace_stream import trace_stream
+from app.services.webhook_dedup import DUPLICATE, NEW, WebhookDedupIndex
+from app.services.webhook_event_log import WebhookEventLog
 from sqlalchemy import text
 from sqlalchemy.exc import IntegrityError
 
 logger = logging.getLogger(__name__)
 
+# Payload key carrying the receiving request's tenant through the ingestion queue
+QUEUED_TENANT_KEY = '_tenant_id'
+
+class WebhookProcessingError(Exception):
+    """Raised for a queued webhook event that failed and should be retried."""
+    pass
+
 @dataclass
 class WebhookEvent:
     """Represents a webhook event from LangWatch."""
@@ -35,7 +48,8 @@ class WebhookService:
     Features:
     - HMAC signature verification
     - Real-time trace data processing
-    - Event deduplication
+    - Event deduplication (in-memory index, database only on possible hits)
+    - Group-committed event logging
     - Error handling and retry logic
     """
     
@@ -54,6 +68,17 @@ class WebhookService:
         self.max_event_age_minutes = 10
         self.deduplication_window_minutes = 5
         
+        self.dedup_index = WebhookDedupIndex(
+            window_seconds=self.deduplication_window_minutes * 60,
+            lru_size=int(os.getenv('WEBHOOK_DEDUP_LRU_SIZE', '50000')),
+            bloom_capacity=int(os.getenv('WEBHOOK_DEDUP_BLOOM_CAPACITY', '100000'))
+        )
+        self._dedup_warmed = False
+        self.event_log = WebhookEventLog(
+            batch_size=int(os.getenv('WEBHOOK_LOG_BATCH_SIZE', '500')),
+            flush_interval_seconds=int(os.getenv('WEBHOOK_LOG_FLUSH_MS', '50')) / 1000
+        )
+        
     def verify_webhook_signature(self, payload: bytes, signature: str) -> bool:
         """Verify webhook HMAC signature for security."""
         if not self.webhook_secret:
@@ -79,17 +104,63 @@ class WebhookService:
             logger.error(f"Error verifying webhook signature: {e}")
             return False
     
+    @staticmethod
+    def _epoch(timestamp: datetime) -> float:
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        return timestamp.timestamp()
+    
+    def _warm_dedup_index(self):
+        """Load events logged within the window (e.g. before a restart) into the index."""
+        self._dedup_warmed = True
+        try:
+            rows = db.session.execute(
+                text("""
+                SELECT trace_id, event_type, received_at FROM webhook_events
+                WHERE received_at >= :cutoff_time AND status = 'success'
+                """),
+                {"cutoff_time": datetime.utcnow() - timedelta(minutes=self.deduplication_window_minutes)}
+            ).fetchall()
+            self.dedup_index.add_many(
+                ((row[0], row[1]), self._epoch(row[2] if isinstance(row[2], datetime)
+                                               else datetime.fromisoformat(str(row[2]))))
+                for row in rows
+            )
+        except Exception as e:
+            logger.error(f"Error warming webhook dedup index: {e}")
+            db.session.rollback()
+    
     def is_event_duplicate(self, trace_id: str, event_type: str, timestamp: datetime) -> bool:
-        """Check if event is a duplicate within deduplication window."""
+        """
+        Check if event was already processed successfully within deduplication window.
+        
+        Answered from the in-memory index; the database is only queried when
+        the bloom filter reports a possible hit. The index is per process, so
+        a redelivery handled by another worker is not caught here; trace
+        events are upserts, so reprocessing one is harmless.
+        """
+        if not self._dedup_warmed:
+            self._warm_dedup_index()
+        
+        verdict = self.dedup_index.check((trace_id, event_type), self._epoch(timestamp))
+        if verdict == DUPLICATE:
+            return True
+        if verdict == NEW:
+            return False
+        
         try:
+            # Possible hit: rows may still be buffered
+            self.event_log.flush()
             cutoff_time = timestamp - timedelta(minutes=self.deduplication_window_minutes)
             
             result = db.session.execute(
                 text("""
-                SELECT COUNT(*) FROM webhook_events 
+                SELECT 1 FROM webhook_events 
                 WHERE trace_id = :trace_id 
                 AND event_type = :event_type 
                 AND received_at >= :cutoff_time
+                AND status = 'success'
+                LIMIT 1
                 """),
                 {
                     "trace_id": trace_id,
@@ -98,37 +169,27 @@ class WebhookService:
                 }
             ).fetchone()
             
-            return result[0] > 0
+            return result is not None
             
         except Exception as e:
             logger.error(f"Error checking event duplication: {e}")
             return False
     
     def log_webhook_event(self, event: WebhookEvent, status: str, error_message: str = None):
-        """Log webhook event for monitoring and debugging."""
-        try:
-            db.session.execute(
-                text("""
-                INSERT INTO webhook_events 
-                (trace_id, event_type, event_data, source, received_at, processed_at, status, error_message)
-                VALUES (:trace_id, :event_type, :event_data, :source, :received_at, :processed_at, :status, :error_message)
-                """),
-                {
-                    "trace_id": event.trace_id,
-                    "event_type": event.event_type,
-                    "event_data": json.dumps(event.data),
-                    "source": event.source,
-                    "received_at": event.timestamp,
-                    "processed_at": datetime.utcnow(),
-                    "status": status,
-                    "error_message": error_message
-                }
-            )
-            db.session.commit()
-            
-        except Exception as e:
-            logger.error(f"Error logging webhook event: {e}")
-            db.session.rollback()
+        """Log webhook event for monitoring and debugging (written by the next group commit)."""
+        self.event_log.append({
+            "trace_id": event.trace_id,
+            "event_type": event.event_type,
+            "event_data": json.dumps(event.data),
+            "source": event.source,
+            "received_at": event.timestamp,
+            "processed_at": datetime.utcnow(),
+            "status": status,
+            "error_message": error_message
+        })
+        if status == 'success':
+            # Failed events stay eligible for a retry
+            self.dedup_index.add((event.trace_id, event.event_type), self._epoch(event.timestamp))
     
     def process_trace_event(self, event: WebhookEvent) -> bool:
         """Process a trace-related webhook event."""
@@ -180,7 +241,7 @@ class WebhookService:
             
             # Check if trace already exists
             existing = db.session.execute(
-                text("SELECT id FROM live_traces WHERE external_trace_id = :id"),
+                text("SELECT id, start_time FROM live_traces WHERE external_trace_id = :id"),
                 {"id": event.trace_id}
             ).fetchone()
             
@@ -202,6 +263,7 @@ class WebhookService:
                     db.session.execute(text(sql), update_values)
             else:
                 # Insert new trace
+                trace_info['tenant_id'] = ingest_tenant_id()
                 trace_info['created_at'] = datetime.utcnow()
                 trace_info['updated_at'] = datetime.utcnow()
                 
@@ -214,7 +276,12 @@ class WebhookService:
                 """
                 db.session.execute(text(sql), trace_info)
             
+            metric_rollup_service.refresh_for_timestamps(
+                [trace_info['start_time'], existing[1] if existing else None]
+            )
             db.session.commit()
+            default_cache_service.bump_version(TRACES_VERSION)
+            trace_stream.publish(trace_info)
             return True
             
         except Exception as e:
@@ -261,20 +328,28 @@ class WebhookService:
         else:
             return str(content)
     
-    def process_webhook_payload(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        """Process incoming webhook payload."""
+    def process_webhook_payload(self, payload: Dict[str, Any], received_at: datetime = None) -> Dict[str, Any]:
+        """
+        Process incoming webhook payload.
+        
+        Args:
+            payload: Parsed webhook body
+            received_at: When the webhook was accepted (UTC), for payloads
+                processed later from the ingestion queue; event age is
+                judged at this time
+        """
         try:
             # Extract event information
             event_type = payload.get('type', 'unknown')
             event_id = payload.get('id', '')
-            timestamp = datetime.utcnow()
+            timestamp = received_at or datetime.utcnow()
             
             # Parse timestamp from payload if available
             if 'timestamp' in payload:
                 timestamp = self._parse_timestamp(payload['timestamp']) or timestamp
             
             # Validate event age (ensure both timestamps are timezone-aware or naive)
-            current_time = datetime.utcnow()
+            current_time = received_at or datetime.utcnow()
             if timestamp.tzinfo is not None:
                 # If timestamp is timezone-aware, make current_time timezone-aware too
                 import pytz
@@ -336,24 +411,40 @@ class WebhookService:
             error_message = None if success else 'Processing failed'
             self.log_webhook_event(event, status, error_message)
             
-            return {
+            result = {
                 'success': success,
                 'event_type': event_type,
                 'trace_id': trace_id,
                 'processed': success
             }
+            if not success:
+                result.update({'error': error_message, 'retryable': True})
+            return result
             
         except Exception as e:
             logger.error(f"Error processing webhook payload: {e}")
             return {
                 'success': False,
                 'error': str(e),
-                'event_type': payload.get('type', 'unknown')
+                'event_type': payload.get('type', 'unknown'),
+                'retryable': True
             }
     
+    def process_queued_payload(self, payload: Dict[str, Any], received_at: datetime):
+        """Ingestion queue handler: raises so that retryable failures are retried."""
+        payload = dict(payload)
+        with tenant_context(payload.pop(QUEUED_TENANT_KEY, None)):
+            result = self.process_webhook_payload(payload, received_at=received_at)
+        if not result.get('success'):
+            if result.get('retryable'):
+                raise WebhookProcessingError(result.get('error', 'Processing failed'))
+            logger.warning(f"Dropping queued webhook {result.get('event_type')}: {result.get('error')}")
+    
     def get_webhook_statistics(self) -> Dict[str, Any]:
         """Get webhook processing statistics."""
         try:
+            self.event_log.flush()
+            
             # Get event counts by type and status
             event_stats = db.session.execute(
                 text("""
@@ -398,7 +489,9 @@ class WebhookService:
                     for row in recent_events
                 ],
                 'webhook_secret_configured': bool(self.webhook_secret),
-                'supported_events': list(self.supported_events)
+                'supported_events': list(self.supported_events),
+                'deduplication': self.dedup_index.get_stats(),
+                'event_log': self.event_log.get_stats()
             }
             
         except Exception as e:
@@ -0,0 +1,230 @@
+"""
+WebSocket Fan-out Scheduler
+Coalesces room updates per tick and delivers them through bounded per-connection queues.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+from app.services.latency_sketch import LatencySketch
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingMessage:
+    """A message waiting for delivery; coalesced updates replace its payload."""
+    event: str
+    data: Dict[str, Any]
+    enqueued_at: float
+    critical: bool = False
+    merged: int = 0
+
+
+class FanoutScheduler:
+    """
+    Tick-based fan-out of WebSocket messages.
+
+    - ``publish`` records room messages; within one tick, messages with the
+      same (room, coalesce key) collapse into the latest one.
+    - On each tick the room messages are fanned out into per-connection
+      queues. A queue holds at most one pending message per coalesce key,
+      so a slow consumer receives the newest state instead of a backlog.
+    - Queues are bounded: when full, the oldest non-critical message is
+      dropped (critical messages are never displaced by routine updates).
+    - Each connection is sent at most ``max_messages_per_tick`` messages per
+      tick; the rest wait, and keep being merged, until the next tick.
+
+    Messages without a coalesce key (e.g. alerts) are delivered individually
+    and in order.
+    """
+
+    def __init__(self, emit: Callable[[str, Dict[str, Any], str], None],
+                 resolve_room: Callable[[Optional[str]], Iterable[str]],
+                 tick_seconds: float = 0.1, max_queue_per_connection: int = 100,
+                 max_messages_per_tick: int = 20):
+        """
+        Initialize fan-out scheduler.
+
+        Args:
+            emit: Sends one event to one connection: emit(event, data, connection_id)
+            resolve_room: Returns the connection IDs in a room (None for everyone)
+            tick_seconds: Coalescing and delivery interval
+            max_queue_per_connection: Pending messages kept per connection
+            max_messages_per_tick: Messages sent to one connection per tick
+        """
+        self.emit = emit
+        self.resolve_room = resolve_room
+        self.tick_seconds = tick_seconds
+        self.max_queue_per_connection = max_queue_per_connection
+        self.max_messages_per_tick = max_messages_per_tick
+
+        self._lock = threading.Lock()
+        self._room_pending: Dict[Tuple[Optional[str], Hashable], PendingMessage] = {}
+        self._direct_pending: list = []
+        self._queues: Dict[str, 'OrderedDict[Hashable, PendingMessage]'] = {}
+        self._sequence = 0
+
+        self._latency = LatencySketch()
+        self._latency_max_ms = 0.0
+        self.stats = {
+            'published': 0,
+            'coalesced': 0,
+            'delivered': 0,
+            'dropped': 0,
+            'errors': 0,
+            'ticks': 0
+        }
+
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+    def start(self) -> None:
+        """Start the delivery thread."""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="WebSocketFanout", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        while self._running:
+            started = time.monotonic()
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"Error in WebSocket fan-out tick: {e}")
+            time.sleep(max(self.tick_seconds - (time.monotonic() - started), 0.001))
+
+    def _unique_key(self) -> int:
+        self._sequence += 1
+        return self._sequence
+
+    def publish(self, event: str, data: Dict[str, Any], room: Optional[str] = None,
+                coalesce_key: Optional[Hashable] = None, critical: bool = False) -> None:
+        """Queue a message for everyone in ``room`` (everyone when None)."""
+        now = time.monotonic()
+        with self._lock:
+            self.stats['published'] += 1
+            key = (room, coalesce_key if coalesce_key is not None else ('unique', self._unique_key()))
+            pending = self._room_pending.get(key)
+            if pending is not None:
+                pending.data = data
+                pending.critical = pending.critical or critical
+                pending.merged += 1
+                self.stats['coalesced'] += 1
+            else:
+                self._room_pending[key] = PendingMessage(event, data, now, critical)
+
+    def publish_to(self, connection_ids: Iterable[str], event: str, data: Dict[str, Any],
+                   coalesce_key: Optional[Hashable] = None, critical: bool = False) -> None:
+        """Queue a message for specific connections (user or tenant targets)."""
+        now = time.monotonic()
+        with self._lock:
+            self.stats['published'] += 1
+            key = coalesce_key if coalesce_key is not None else ('unique', self._unique_key())
+            self._direct_pending.append((list(connection_ids), key, PendingMessage(event, data, now, critical)))
+
+    def remove_connection(self, connection_id: str) -> None:
+        with self._lock:
+            self._queues.pop(connection_id, None)
+
+    def tick(self) -> int:
+        """Fan out this tick's messages and deliver queued ones. Returns messages delivered."""
+        with self._lock:
+            room_pending, self._room_pending = self._room_pending, {}
+            direct_pending, self._direct_pending = self._direct_pending, []
+
+        for (room, key), message in room_pending.items():
+            self._enqueue(self.resolve_room(room), (room, key), message)
+        for connection_ids, key, message in direct_pending:
+            self._enqueue(connection_ids, key, message)
+
+        with self._lock:
+            batches = []
+            for connection_id, pending in self._queues.items():
+                batch = []
+                while pending and len(batch) < self.max_messages_per_tick:
+                    batch.append(pending.popitem(last=False)[1])
+                if batch:
+                    batches.append((connection_id, batch))
+            self.stats['ticks'] += 1
+
+        delivered = 0
+        for connection_id, batch in batches:
+            for message in batch:
+                try:
+                    self.emit(message.event, message.data, connection_id)
+                    delivered += 1
+                    self._record_latency(message)
+                except Exception as e:
+                    logger.error(f"Error delivering {message.event} to {connection_id}: {e}")
+                    with self._lock:
+                        self.stats['errors'] += 1
+        with self._lock:
+            self.stats['delivered'] += delivered
+        return delivered
+
+    def _enqueue(self, connection_ids: Iterable[str], key: Hashable, message: PendingMessage) -> None:
+        with self._lock:
+            for connection_id in connection_ids:
+                pending = self._queues.setdefault(connection_id, OrderedDict())
+                queued = pending.get(key)
+                if queued is not None:
+                    # Stale update for a slow consumer: keep its queue position
+                    # and age, deliver the newest payload
+                    queued.data = message.data
+                    queued.critical = queued.critical or message.critical
+                    self.stats['coalesced'] += 1
+                    continue
+
+                if len(pending) >= self.max_queue_per_connection and not self._make_room(pending, message):
+                    self.stats['dropped'] += 1
+                    continue
+                pending[key] = PendingMessage(message.event, message.data, message.enqueued_at, message.critical)
+
+    def _make_room(self, pending: 'OrderedDict[Hashable, PendingMessage]', message: PendingMessage) -> bool:
+        """Drop the oldest droppable message from a full queue; False if the new one should be dropped."""
+        for key, queued in pending.items():
+            if not queued.critical:
+                del pending[key]
+                self.stats['dropped'] += 1
+                return True
+        if message.critical:
+            pending.popitem(last=False)
+            self.stats['dropped'] += 1
+            return True
+        return False
+
+    def _record_latency(self, message: PendingMessage) -> None:
+        latency_ms = (time.monotonic() - message.enqueued_at) * 1000
+        with self._lock:
+            self._latency.add(latency_ms)
+            self._latency_max_ms = max(self._latency_max_ms, latency_ms)
+
+    def queued_messages(self) -> int:
+        with self._lock:
+            return sum(len(pending) for pending in self._queues.values()) + len(self._room_pending) + \
+                len(self._direct_pending)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Delivery counters, queue depth and queue latency percentiles (ms)."""
+        with self._lock:
+            stats = dict(self.stats)
+            latency = self._latency.quantiles((0.5, 0.95, 0.99))
+            stats.update({
+                'queue_latency_ms': dict(latency, max=round(self._latency_max_ms, 2)),
+                'queued': sum(len(pending) for pending in self._queues.values()),
+                'max_queue_depth': max((len(pending) for pending in self._queues.values()), default=0),
+                'tick_ms': round(self.tick_seconds * 1000, 1)
+            })
+            return stats
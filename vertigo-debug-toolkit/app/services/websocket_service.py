@@ -13,10 +13,12 @@ from typing import Dict, List, Optional, Any, Set, Callable
 from dataclasses import dataclass, field
 from enum import Enum
 import uuid
-from flask import current_app, g
+from flask import current_app, g, request
 from flask_socketio import SocketIO, emit, join_room, leave_room, disconnect
 from flask_login import current_user
 
+from app.services.websocket_fanout import FanoutScheduler
+
 logger = logging.getLogger(__name__)
 
 
@@ -34,6 +36,18 @@ class MessageType(Enum):
     ERROR = "error"
 
 
+# High-frequency state pushes: only the latest one per room matters, so
+# updates within a fan-out tick (or queued for a slow client) are merged
+COALESCED_MESSAGE_TYPES = {
+    MessageType.SYSTEM_STATUS,
+    MessageType.PERFORMANCE_UPDATE,
+    MessageType.CACHE_STATS,
+    MessageType.ANALYTICS_UPDATE,
+    MessageType.DASHBOARD_REFRESH,
+    MessageType.HEARTBEAT
+}
+
+
 class RoomType(Enum):
     """WebSocket room types."""
     GLOBAL = "global"
@@ -93,6 +107,15 @@ class WebSocketService:
             'connections_active': 0
         }
         
+        # Tick-based fan-out with per-connection backpressure
+        self.fanout = FanoutScheduler(
+            emit=self._emit_to_sid,
+            resolve_room=self._room_members,
+            tick_seconds=float(os.getenv('WEBSOCKET_FANOUT_TICK_MS', '100')) / 1000,
+            max_queue_per_connection=int(os.getenv('WEBSOCKET_MAX_QUEUE_PER_CONNECTION', '100')),
+            max_messages_per_tick=int(os.getenv('WEBSOCKET_MAX_MESSAGES_PER_TICK', '20'))
+        )
+        
         # Heartbeat monitoring
         self.heartbeat_interval = 30  # seconds
         self.heartbeat_timeout = 90   # seconds
@@ -131,7 +154,8 @@ class WebSocketService:
         def handle_connect(auth=None):
             """Handle client connection."""
             try:
-                connection_id = str(uuid.uuid4())
+                # The Socket.IO session ID doubles as the connection's private room
+                connection_id = getattr(request, 'sid', None) or str(uuid.uuid4())
                 
                 # Get user and tenant context
                 user_id = current_user.id if current_user and current_user.is_authenticated else None
@@ -142,7 +166,7 @@ class WebSocketService:
                     id=connection_id,
                     user_id=user_id,
                     tenant_id=tenant_id,
-                    ip_address=getattr(request, 'remote_addr', None) if 'request' in globals() else None,
+                    ip_address=getattr(request, 'remote_addr', None),
                     metadata={'auth': auth} if auth else {}
                 )
                 
@@ -153,8 +177,8 @@ class WebSocketService:
                 
                 # Update stats
                 with self.stats_lock:
-                    self.stats['connections_total'] += 1
-                    self.stats['connections_active'] = len(self.connections)
+                    self.message_stats['connections_total'] += 1
+                    self.message_stats['connections_active'] = len(self.connections)
                 
                 # Send welcome message
                 self.emit_to_connection(connection_id, MessageType.SYSTEM_STATUS, {
@@ -174,12 +198,7 @@ class WebSocketService:
         def handle_disconnect():
             """Handle client disconnection."""
             try:
-                # Find connection by session
-                connection_id = None
-                for cid, conn in self.connections.items():
-                    if conn.user_id == (current_user.id if current_user and current_user.is_authenticated else None):
-                        connection_id = cid
-                        break
+                connection_id = self._get_connection_id_from_session()
                 
                 if connection_id:
                     self._cleanup_connection(connection_id)
@@ -269,33 +288,43 @@ class WebSocketService:
                 logger.error(f"Error handling subscription: {e}")
     
     def broadcast_message(self, message: WebSocketMessage) -> int:
-        """Broadcast message to appropriate recipients."""
+        """
+        Queue message for the appropriate recipients.
+        
+        Delivery happens on the next fan-out tick; high-frequency update types
+        are coalesced per room. Returns the number of recipients.
+        """
         try:
-            recipients = 0
+            coalesce_key = None
+            if message.type in COALESCED_MESSAGE_TYPES:
+                coalesce_key = message.metadata.get('coalesce_key', message.type.value)
+            critical = message.priority in ('high', 'critical')
             
-            if message.room:
-                # Send to specific room
-                self.socketio.emit(message.type.value, message.data, room=message.room)
-                recipients = len(self.rooms.get(message.room, set()))
-                
-            elif message.target_user:
+            if message.target_user and not message.room:
                 # Send to specific user
-                recipients = self._emit_to_user(message.target_user, message)
+                connection_ids = [cid for cid, conn in list(self.connections.items())
+                                  if conn.user_id == message.target_user]
+                self.fanout.publish_to(connection_ids, message.type.value, message.data, coalesce_key, critical)
+                recipients = len(connection_ids)
                 
-            elif message.target_tenant:
+            elif message.target_tenant and not message.room:
                 # Send to specific tenant
-                recipients = self._emit_to_tenant(message.target_tenant, message)
+                connection_ids = [cid for cid, conn in list(self.connections.items())
+                                  if conn.tenant_id == message.target_tenant]
+                self.fanout.publish_to(connection_ids, message.type.value, message.data, coalesce_key, critical)
+                recipients = len(connection_ids)
                 
             else:
-                # Broadcast to all connections
-                self.socketio.emit(message.type.value, message.data)
-                recipients = len(self.connections)
+                # Send to a room, or to all connections when no room is set
+                self.fanout.publish(message.type.value, message.data, room=message.room,
+                                    coalesce_key=coalesce_key, critical=critical)
+                recipients = len(self._room_members(message.room))
             
             # Update stats
             with self.stats_lock:
                 self.message_stats['sent'] += recipients
             
-            logger.debug(f"Broadcast message {message.type.value} to {recipients} recipients")
+            logger.debug(f"Queued message {message.type.value} for {recipients} recipients")
             return recipients
             
         except Exception as e:
@@ -304,11 +333,19 @@ class WebSocketService:
                 self.message_stats['errors'] += 1
             return 0
     
+    def _room_members(self, room: Optional[str]) -> List[str]:
+        """Connection IDs in a room (all connections when room is None)."""
+        if room is None:
+            return list(self.connections)
+        return list(self.rooms.get(room, ()))
+    
+    def _emit_to_sid(self, event: str, data: Dict[str, Any], connection_id: str) -> None:
+        self.socketio.emit(event, data, to=connection_id)
+    
     def emit_to_connection(self, connection_id: str, message_type: MessageType, data: Dict[str, Any]) -> bool:
         """Emit message to specific connection."""
         try:
-            message = WebSocketMessage(type=message_type, data=data)
-            self.socketio.emit(message_type.value, data, room=connection_id)
+            self.socketio.emit(message_type.value, data, to=connection_id)
             return True
             
         except Exception as e:
@@ -321,10 +358,9 @@ class WebSocketService:
             self.message_queue.append(message)
     
     def process_message_queue(self) -> int:
-        """Process queued messages."""
+        """Hand queued messages to the fan-out scheduler."""
         with self.queue_lock:
-            messages_to_process = self.message_queue[:]
-            self.message_queue.clear()
+            messages_to_process, self.message_queue = self.message_queue, []
         
         processed = 0
         for message in messages_to_process:
@@ -380,7 +416,9 @@ class WebSocketService:
                 'timestamp': datetime.now().isoformat()
             },
             room='analytics',
-            priority="normal"
+            priority="normal",
+            # Coalesce per chart, not with other analytics updates
+            metadata={'coalesce_key': f"visualization:{chart_type}"}
         )
         self.broadcast_message(message)
     
@@ -435,16 +473,23 @@ class WebSocketService:
                 if conn.user_id:
                     user_connections[conn.user_id] = user_connections.get(conn.user_id, 0) + 1
             
+            fanout_stats = self.fanout.get_stats()
+            
             return {
                 'active_connections': active_connections,
                 'total_connections': self.message_stats['connections_total'],
                 'messages_sent': self.message_stats['sent'],
                 'messages_received': self.message_stats['received'],
                 'message_errors': self.message_stats['errors'],
+                'messages_delivered': fanout_stats['delivered'],
+                'messages_dropped': fanout_stats['dropped'],
+                'messages_coalesced': fanout_stats['coalesced'],
+                'queue_latency_ms': fanout_stats['queue_latency_ms'],
                 'tenant_connections': tenant_connections,
                 'user_connections': user_connections,
                 'active_rooms': len(self.rooms),
-                'queued_messages': len(self.message_queue)
+                'queued_messages': len(self.message_queue) + self.fanout.queued_messages(),
+                'fanout': fanout_stats
             }
     
     def get_room_info(self, room: str) -> Dict[str, Any]:
@@ -518,6 +563,7 @@ class WebSocketService:
         
         # Remove connection
         del self.connections[connection_id]
+        self.fanout.remove_connection(connection_id)
         
         # Update stats
         with self.stats_lock:
@@ -557,31 +603,8 @@ class WebSocketService:
     
     def _get_connection_id_from_session(self) -> Optional[str]:
         """Get connection ID from current session."""
-        # This would extract connection ID from Flask-SocketIO session
-        # For now, return None as a placeholder
-        return None
-    
-    def _emit_to_user(self, user_id: str, message: WebSocketMessage) -> int:
-        """Emit message to all connections for a specific user."""
-        count = 0
-        user_connections = [conn for conn in self.connections.values() if conn.user_id == user_id]
-        
-        for connection in user_connections:
-            if self.emit_to_connection(connection.id, message.type, message.data):
-                count += 1
-        
-        return count
-    
-    def _emit_to_tenant(self, tenant_id: str, message: WebSocketMessage) -> int:
-        """Emit message to all connections for a specific tenant."""
-        count = 0
-        tenant_connections = [conn for conn in self.connections.values() if conn.tenant_id == tenant_id]
-        
-        for connection in tenant_connections:
-            if self.emit_to_connection(connection.id, message.type, message.data):
-                count += 1
-        
-        return count
+        connection_id = getattr(request, 'sid', None)
+        return connection_id if connection_id in self.connections else None
     
     def _heartbeat_worker(self) -> None:
         """Background worker for heartbeat monitoring."""
@@ -621,6 +644,7 @@ def init_websocket_service(socketio: SocketIO) -> WebSocketService:
     """Initialize the global WebSocket service."""
     global websocket_service
     websocket_service = WebSocketService(socketio)
+    websocket_service.fanout.start()
     websocket_service.start_heartbeat_monitoring()
     return websocket_service
 
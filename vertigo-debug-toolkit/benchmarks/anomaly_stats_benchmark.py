@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-poll statistical detection cost vs history size.
+
+Compares the previous approach (a deque of per-sample dataclasses, rebuilt
+into a list and passed to statistics.mean/stdev on every poll) with the
+RollingSeries ring buffer, whose statistics are maintained on append.
+
+Usage:
+    python benchmarks/anomaly_stats_benchmark.py [--polls 200]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.rolling_stats import RollingSeries
+
+
+@dataclass
+class MetricPoint:
+    """Per-sample record kept by the previous implementation."""
+    timestamp: datetime
+    metric_name: str
+    value: float
+    source: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+def legacy_poll(history: deque, value: float) -> float:
+    history.append(MetricPoint(datetime.utcnow(), 'avg_latency_ms', value, 'bench'))
+    values = [point.value for point in history if point.value is not None]
+    return abs(value - statistics.mean(values)) / statistics.stdev(values)
+
+
+def rolling_poll(series: RollingSeries, value: float) -> float:
+    series.append(value)
+    return abs(value - series.mean) / series.std
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--polls', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f"{'history':>10}{'legacy us/poll':>17}{'rolling us/poll':>18}")
+    # 1000 samples is ~8h at the default 30s poll interval; 100k is ~35 days
+    for size in (1000, 10_000, 100_000):
+        history, series = deque(maxlen=size), RollingSeries(capacity=size)
+        for _ in range(size):
+            value = rng.gauss(500, 20)
+            history.append(MetricPoint(datetime.utcnow(), 'avg_latency_ms', value, 'bench'))
+            series.append(value)
+
+        timings = []
+        for poll in (legacy_poll, rolling_poll):
+            target = history if poll is legacy_poll else series
+            started = time.perf_counter()
+            for _ in range(args.polls):
+                poll(target, rng.gauss(500, 20))
+            timings.append((time.perf_counter() - started) / args.polls * 1e6)
+        print(f"{size:>10,}{timings[0]:>17.1f}{timings[1]:>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
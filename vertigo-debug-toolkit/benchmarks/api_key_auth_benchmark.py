@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Benchmark: API key authentications per second for one worker.
+
+Compares a lookup on every request (cache disabled: indexed query by secret
+hash joined with the owner) plus the previous per-request User.query.get,
+with the verified-key cache and batched usage counters.
+
+Usage:
+    python benchmarks/api_key_auth_benchmark.py [--requests 50000] [--keys 1000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'api_key_bench.db')}"
+
+from app import create_app
+from app.models import User, db
+from app.services.api_key_service import APIKeyService
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=50000)
+    parser.add_argument('--keys', type=int, default=1000)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', email='bench@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+
+        setup = APIKeyService()
+        keys = [setup.generate_api_key(user, f"key-{i}")[0] for i in range(args.keys)]
+        sample = [random.choice(keys) for _ in range(args.requests)]
+
+        print(f"{'path':>10}{'auths/s':>12}{'us/auth':>10}")
+        for name, ttl in (('uncached', 0), ('cached', 60)):
+            service = APIKeyService(cache_ttl_seconds=ttl, usage_flush_seconds=3600)
+            started = time.perf_counter()
+            for api_key in sample:
+                valid, info, _ = service.authenticate_api_key(api_key)
+                if ttl == 0:
+                    db.session.get(User, info.user_id)
+            service.flush_usage()
+            elapsed = time.perf_counter() - started
+            print(f"{name:>10}{args.requests / elapsed:>12,.0f}{elapsed / args.requests * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
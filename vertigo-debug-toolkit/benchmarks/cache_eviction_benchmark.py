@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark: MemoryCache set/get latency as the cache grows from 1k to 1M keys.
+
+Each run fills a cache to capacity, then measures steady-state operations
+(every set evicts) so eviction cost is included. With constant-time policies
+the per-operation latency should stay flat across sizes. The p99 and maximum
+single-set latency show pauses, such as TinyLFU halving its frequency sketch,
+which the mean hides; the sketch's aging pause is also timed directly.
+
+Usage:
+    python benchmarks/cache_eviction_benchmark.py [--sizes 1000,10000,100000,1000000] [--ops 50000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.cache_eviction import FrequencySketch
+from app.services.cache_service import CacheStrategy, MemoryCache
+
+
+def run_case(strategy: CacheStrategy, size: int, ops: int) -> dict:
+    """Measure steady-state set and get latency for one cache size."""
+    cache = MemoryCache(max_items=size, max_size_mb=4096, strategy=strategy)
+    value = {'trace_id': 'abc123', 'latency_ms': 250, 'model': 'gemini-1.5-pro'}
+    for i in range(size):
+        cache.set(f"warm_{i}", value)
+
+    set_times = []
+    for i in range(ops):
+        start = time.perf_counter()
+        cache.set(f"new_{i}", value)
+        set_times.append(time.perf_counter() - start)
+    set_times.sort()
+    set_us = sum(set_times) / ops * 1e6
+    set_p99_us = set_times[int(ops * 0.99) - 1] * 1e6
+    set_max_ms = set_times[-1] * 1e3
+
+    keys = [f"warm_{random.randrange(size)}" for _ in range(ops)]
+    start = time.perf_counter()
+    for key in keys:
+        cache.get(key)
+    get_us = (time.perf_counter() - start) / ops * 1e6
+
+    return {'strategy': strategy.value, 'size': size, 'set_us': set_us, 'set_p99_us': set_p99_us,
+            'set_max_ms': set_max_ms, 'get_us': get_us,
+            'evictions': cache.evictions, 'rejections': cache.rejections}
+
+
+def aging_pause_ms(size: int) -> float:
+    """Time one halving of a TinyLFU frequency sketch sized for ``size`` keys."""
+    sketch = FrequencySketch(size)
+    start = time.perf_counter()
+    sketch._age()
+    return (time.perf_counter() - start) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000')
+    parser.add_argument('--ops', type=int, default=50000)
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',')]
+    print(f"{'strategy':<10}{'keys':>10}{'set µs/op':>12}{'set p99 µs':>12}{'set max ms':>12}"
+          f"{'get µs/op':>12}{'evictions':>12}{'rejected':>10}")
+    for strategy in (CacheStrategy.LRU, CacheStrategy.LFU, CacheStrategy.TINY_LFU):
+        for size in sizes:
+            r = run_case(strategy, size, args.ops)
+            print(f"{r['strategy']:<10}{r['size']:>10}{r['set_us']:>12.2f}{r['set_p99_us']:>12.2f}"
+                  f"{r['set_max_ms']:>12.3f}{r['get_us']:>12.2f}{r['evictions']:>12}{r['rejections']:>10}")
+
+    print(f"\n{'keys':>10}{'sketch aging ms':>18}")
+    for size in sizes:
+        print(f"{size:>10}{aging_pause_ms(size):>18.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark: SecurityMiddleware JSON sanitization throughput on trace-upload payloads.
+
+Compares the previous recursive walk (every dangerous pattern run separately
+and bleach.clean on every key and string) with the single-pass sanitizer
+(one combined pattern, bleach only for strings with markup characters,
+iterative walk) and with lazy sanitization reading two fields.
+
+Usage:
+    python benchmarks/json_sanitization_benchmark.py [--payloads 200] [--spans 40]
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bleach
+
+from app.middleware.security_middleware import LazySanitizedJSON, RequestValidator, SecurityConfig
+
+LEGACY_PATTERNS = [re.compile(pattern, re.IGNORECASE | re.DOTALL) for pattern in SecurityConfig.DANGEROUS_PATTERNS]
+
+
+def legacy_sanitize_string(value):
+    for pattern in LEGACY_PATTERNS:
+        if pattern.search(value):
+            value = pattern.sub('', value)
+    value = bleach.clean(value, tags=[], attributes={}, strip=True)
+    return value[:SecurityConfig.MAX_FIELD_LENGTH]
+
+
+def legacy_validate(data):
+    """Previous RequestValidator.validate_json_data."""
+    if isinstance(data, dict):
+        if len(data) > SecurityConfig.MAX_FORM_FIELDS:
+            return False, None
+        sanitized = {}
+        for key, value in data.items():
+            valid, clean_value = legacy_validate(value)
+            if not valid:
+                return False, None
+            sanitized[legacy_sanitize_string(str(key))] = clean_value
+        return True, sanitized
+    if isinstance(data, list):
+        if len(data) > SecurityConfig.MAX_FORM_FIELDS:
+            return False, None
+        sanitized = []
+        for item in data:
+            valid, clean_item = legacy_validate(item)
+            if not valid:
+                return False, None
+            sanitized.append(clean_item)
+        return True, sanitized
+    if isinstance(data, str):
+        return True, legacy_sanitize_string(data)
+    return True, data
+
+
+def make_payload(rng, spans):
+    """A LangWatch-style trace with nested spans; a few strings carry markup."""
+    def text(words):
+        return ' '.join(rng.choice(['the', 'meeting', 'summary', 'action', 'item', 'owner', 'due', 'status',
+                                    'project', 'vertigo', 'email', 'draft', 'review']) for _ in range(words))
+
+    return {
+        'type': 'trace.updated',
+        'id': f"evt-{rng.randrange(10 ** 9)}",
+        'timestamp': '2026-10-16T12:00:00Z',
+        'data': {
+            'trace': {
+                'id': f"trace-{rng.randrange(10 ** 9)}",
+                'name': 'meeting_processing',
+                'metadata': {'project': 'vertigo', 'operation': 'summary_generation', 'user': 'agent@vertigo.com'},
+                'input': text(80),
+                'output': text(200) + (' <b>Q3</b> & next steps' if rng.random() < 0.2 else ''),
+                'spans': [
+                    {
+                        'span_id': f"span-{n}",
+                        'name': f"llm_call_{n}",
+                        'model': 'gemini-1.5-pro',
+                        'input': {'prompt': text(60), 'variables': {'project': 'vertigo', 'tone': 'concise'}},
+                        'output': text(120),
+                        'metrics': {'prompt_tokens': 812, 'completion_tokens': 240, 'cost': 0.0042},
+                        'timestamps': {'started_at': 1792152000000 + n, 'finished_at': 1792152001500 + n}
+                    }
+                    for n in range(spans)
+                ]
+            }
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--payloads', type=int, default=200)
+    parser.add_argument('--spans', type=int, default=40)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    payloads = [make_payload(rng, args.spans) for _ in range(args.payloads)]
+    megabytes = sum(len(json.dumps(p)) for p in payloads) / 1e6
+    validator = RequestValidator()
+
+    for payload in payloads[:20]:
+        assert legacy_validate(payload) == validator.validate_json_data(payload)
+
+    def lazy(payload):
+        data = LazySanitizedJSON(payload, validator)
+        return data['type'], data['id']
+
+    print(f"{'path':>12}{'payloads/s':>12}{'MB/s':>8}")
+    for name, sanitize in (('legacy', legacy_validate), ('single-pass', validator.validate_json_data),
+                           ('lazy', lazy)):
+        started = time.perf_counter()
+        for payload in payloads:
+            sanitize(payload)
+        elapsed = time.perf_counter() - started
+        print(f"{name:>12}{args.payloads / elapsed:>12,.0f}{megabytes / elapsed:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Langfuse trace sync throughput against a local stub API server.
+
+Compares the previous path (sequential page reads, a point lookup and an ORM
+add per trace) with the incremental sync (prefetched pages, one IN lookup and
+one bulk insert per page). Every stub response is delayed by --latency
+seconds to stand in for the network. A second incremental run shows the cost
+of a sync with nothing new.
+
+Usage:
+    python benchmarks/langfuse_sync_benchmark.py [--traces 5000] [--latency 0.02]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'langfuse_sync_bench.db')
+os.environ['DATABASE_URL'] = f"sqlite:///{DB_PATH}"
+
+import requests
+
+from langfuse_stub import StubLangfuseServer, make_trace
+
+from app import create_app
+from app.models import DataSource, SyncStatus, Trace, db
+from app.services import langfuse_client
+
+
+def legacy_sync(client, total):
+    """Previous sync_traces_to_db, reading the same pages sequentially over HTTP."""
+    synced = 0
+    with requests.Session() as http:
+        for page in range(1, total // langfuse_client.SYNC_PAGE_SIZE + 2):
+            items = client._get_api_page(http, '/api/public/traces', {}, page)['data']
+            for item in items:
+                if Trace.query.filter_by(trace_id=item['id']).first():
+                    continue
+                db.session.add(Trace(trace_id=item['id'], name=item['name'], status='success',
+                                     start_time=langfuse_client._parse_timestamp(item['timestamp']),
+                                     duration_ms=int(item['latency'] * 1000), trace_metadata=item['metadata']))
+                synced += 1
+    db.session.commit()
+    return synced
+
+
+def reset():
+    for model in (Trace, SyncStatus, DataSource):
+        db.session.query(model).delete()
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--traces', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.02)
+    args = parser.parse_args()
+
+    stub = StubLangfuseServer(latency_seconds=args.latency).start()
+    stub.traces = [make_trace(n) for n in range(args.traces)]
+    os.environ['LANGFUSE_HOST'] = stub.url
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        client = langfuse_client.LangfuseClient()
+
+        print(f"{'path':>14}{'traces':>9}{'seconds':>10}{'traces/s':>11}")
+        for name, sync in (('legacy', lambda: legacy_sync(client, args.traces)),
+                           ('incremental', client.sync_traces_to_db),
+                           ('incremental-0', client.sync_traces_to_db)):
+            if name != 'incremental-0':
+                reset()
+            started = time.perf_counter()
+            synced = sync()
+            elapsed = time.perf_counter() - started
+            rate = f"{synced / elapsed:,.0f}" if synced else '-'
+            print(f"{name:>14}{synced:>9}{elapsed:>10.2f}{rate:>11}")
+
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark: prompt listing API latency and query count as the catalog grows.
+
+Compares the previous listing (every prompt, two COUNT queries per prompt)
+with the paginated listing (one grouped statement per page) and with a
+conditional GET that answers 304 from the ETag.
+
+Usage:
+    python benchmarks/prompt_listing_benchmark.py [--catalogs 100,1000,5000] [--traces-per-prompt 20]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'prompt_listing_bench.db')
+os.environ['DATABASE_URL'] = f"sqlite:///{DB_PATH}"
+
+from sqlalchemy import event, insert
+
+from app import create_app
+from app.models import Prompt, Trace, User, db
+
+URL = '/prompts/api/prompts/list'
+HEADERS = {'User-Agent': 'benchmark'}
+
+
+def legacy_list():
+    """Previous get_prompts_list body."""
+    data = []
+    for prompt in Prompt.query.all():
+        total_uses = prompt.traces.count()
+        success_count = prompt.traces.filter_by(status='success').count()
+        data.append({'id': prompt.id, 'name': prompt.name, 'total_uses': total_uses, 'success_count': success_count})
+    return data
+
+
+def grow_catalog(user_id, start, stop, traces_per_prompt):
+    now = datetime.utcnow()
+    db.session.execute(insert(Prompt), [
+        {'id': n + 1, 'name': f"prompt-{n}", 'version': '1.0', 'content': '...', 'prompt_type': 'summary',
+         'creator_id': user_id, 'created_at': now, 'updated_at': now}
+        for n in range(start, stop)
+    ])
+    db.session.execute(insert(Trace), [
+        {'trace_id': f"p{n}-{i}", 'name': 'call', 'status': 'error' if i % 5 == 0 else 'success',
+         'start_time': now, 'prompt_id': n + 1}
+        for n in range(start, stop) for i in range(traces_per_prompt)
+    ])
+    db.session.commit()
+
+
+def timed(fn, repeats=3):
+    started = time.perf_counter()
+    for _ in range(repeats):
+        result = fn()
+    return (time.perf_counter() - started) / repeats * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--catalogs', default='100,1000,5000')
+    parser.add_argument('--traces-per-prompt', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', email='bench@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, parameters, context, executemany: statements.append(statement))
+        client = app.test_client()
+
+        print(f"{'prompts':>8}{'path':>12}{'ms':>10}{'queries':>9}{'bytes':>10}")
+        size = 0
+        for target in (int(n) for n in args.catalogs.split(',')):
+            grow_catalog(user.id, size, target, args.traces_per_prompt)
+            size = target
+
+            del statements[:]
+            elapsed, _ = timed(legacy_list, repeats=1)
+            print(f"{size:>8}{'legacy':>12}{elapsed:>10.1f}{len(statements):>9}{'-':>10}")
+
+            del statements[:]
+            elapsed, response = timed(lambda: client.get(URL, headers=HEADERS))
+            print(f"{size:>8}{'page':>12}{elapsed:>10.1f}{len(statements) // 3:>9}{len(response.data):>10}")
+
+            etag = response.headers['ETag']
+            elapsed, response = timed(lambda: client.get(URL, headers={**HEADERS, 'If-None-Match': etag}))
+            assert response.status_code == 304
+            print(f"{size:>8}{'page-304':>12}{elapsed:>10.1f}{'':>9}{len(response.data):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Benchmark: rate limit checks per second for one worker.
+
+Compares the previous implementation (regexes compiled per request, a
+GET+TTL pipeline then an INCR+EXPIRE pipeline per rule) with the GCRA engine
+(precompiled rule table, all rules in one atomic step). Runs against the
+in-process fallback, and against Redis as well when --redis-url is given,
+where leased mode (local decisions from token blocks) is timed too.
+
+Usage:
+    python benchmarks/rate_limiter_benchmark.py [--requests 20000] [--redis-url redis://localhost:6379/15]
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from flask import request
+from flask_login import current_user
+
+from app import create_app
+from app.services.rate_limiter import FallbackMemoryStorage, RateLimitResult, RateLimiterService, \
+    RateLimitStrategy, RateLimitTier
+
+
+class LegacyMemoryStorage:
+    """Previous fallback storage: datetime expiry and a replayed command pipeline."""
+
+    def __init__(self):
+        self._storage, self._expiry, self.commands = {}, {}, []
+
+    def get(self, key):
+        if key in self._expiry and datetime.now() > self._expiry[key]:
+            del self._storage[key]
+            del self._expiry[key]
+            return None
+        return self._storage.get(key)
+
+    def ttl(self, key):
+        if key in self._expiry:
+            return max(0, int((self._expiry[key] - datetime.now()).total_seconds()))
+        return -1
+
+    def pipeline(self):
+        self.commands = []
+        return self
+
+    def incr(self, key):
+        self.commands.append(('incr', key))
+
+    def expire(self, key, seconds):
+        self.commands.append(('expire', key, seconds))
+
+    def execute(self):
+        results = []
+        for cmd in self.commands:
+            if cmd[0] == 'incr':
+                self._storage[cmd[1]] = int(self.get(cmd[1]) or 0) + 1
+                results.append(self._storage[cmd[1]])
+            else:
+                self._expiry[cmd[1]] = datetime.now() + timedelta(seconds=cmd[2])
+                results.append(True)
+        return results
+
+
+class LegacyPipelineAdapter:
+    """Queues the GET/TTL reads of the previous code on the legacy storage."""
+
+    def __init__(self, storage):
+        self.storage, self.reads = storage, []
+
+    def get(self, key):
+        self.reads.append(('get', key))
+
+    def ttl(self, key):
+        self.reads.append(('ttl', key))
+
+    def execute(self):
+        return [getattr(self.storage, op)(key) for op, key in self.reads]
+
+
+class LegacyRateLimiter(RateLimiterService):
+    """The previous check_rate_limit / _check_single_rule request path."""
+
+    def check_rate_limit(self, endpoint=None):
+        for pattern in self.bypass_patterns:
+            if re.match(pattern, request.path):
+                return None
+        tier = self.get_user_tier()
+        most_restrictive = None
+        for rule in self._legacy_rules(tier, endpoint):
+            if rule.bypass_admin and tier == RateLimitTier.ADMIN:
+                continue
+            result = self._check_single_rule(rule, endpoint)
+            if not result.allowed:
+                return result
+            if most_restrictive is None or result.remaining < most_restrictive.remaining:
+                most_restrictive = result
+        return most_restrictive
+
+    def _legacy_rules(self, tier, endpoint):
+        rules = []
+        for strategy in [RateLimitStrategy.PER_USER, RateLimitStrategy.PER_IP, RateLimitStrategy.PER_ENDPOINT]:
+            for rule in self.default_rules.get((tier, strategy), []):
+                if rule.strategy != RateLimitStrategy.PER_ENDPOINT or not rule.endpoint_pattern or \
+                        re.search(rule.endpoint_pattern, endpoint):
+                    rules.append(rule)
+        return rules
+
+    def _check_single_rule(self, rule, endpoint):
+        key = f"rate_limit:{self.get_identifier(rule.strategy, endpoint)}:{rule.window_seconds}"
+        client = self.redis_client
+        pipe = client.pipeline() if not isinstance(client, LegacyMemoryStorage) else LegacyPipelineAdapter(client)
+        pipe.get(key)
+        pipe.ttl(key)
+        current_count, ttl = pipe.execute()
+        if int(current_count or 0) >= rule.limit:
+            return RateLimitResult(False, rule.limit, 0, int(time.time()) + max(ttl, 0), max(ttl, 1), rule.tier)
+        pipe = client.pipeline()
+        pipe.incr(key)
+        pipe.expire(key, rule.window_seconds)
+        new_count, _ = pipe.execute()
+        return RateLimitResult(True, rule.limit, max(0, rule.limit - int(new_count)),
+                               int(time.time()) + rule.window_seconds, tier=rule.tier)
+
+
+def run(app, limiter, requests, clients=1000):
+    """Checks/sec over `requests` API calls from `clients` distinct IPs (check time only)."""
+    paths = ['/api/traces', '/api/sync', '/api/prompts/42']
+    elapsed = 0.0
+    for i in range(requests):
+        path = paths[i % len(paths)]
+        with app.test_request_context(path, environ_base={'REMOTE_ADDR': f"10.0.{i % clients // 250}.{i % 250}"}):
+            current_user._get_current_object()  # session user loading is not limiter cost
+            started = time.perf_counter()
+            limiter.check_rate_limit(path)
+            elapsed += time.perf_counter() - started
+    return requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--redis-url')
+    args = parser.parse_args()
+
+    app = create_app()
+
+    backends = [('memory', LegacyMemoryStorage, FallbackMemoryStorage)]
+    if args.redis_url:
+        import redis
+        client = redis.from_url(args.redis_url, decode_responses=True)
+        client.flushdb()
+        backends.append(('redis', lambda: client, lambda: client))
+
+    print(f"{'backend':>8}{'legacy checks/s':>18}{'gcra checks/s':>16}{'leased checks/s':>18}")
+    for name, legacy_storage, storage in backends:
+        legacy = LegacyRateLimiter()
+        legacy._redis_client = legacy_storage()
+        gcra = RateLimiterService(redis_url=args.redis_url)
+        if name == 'memory':
+            gcra._redis_client = storage()
+        rates = [run(app, limiter, args.requests) for limiter in (legacy, gcra)]
+        leased = '-'
+        if name == 'redis':
+            client.flushdb()
+            limiter = RateLimiterService(redis_url=args.redis_url)
+            limiter.mode = 'leased'
+            leased = f"{run(app, limiter, args.requests):,.0f}"
+        print(f"{name:>8}{rates[0]:>18,.0f}{rates[1]:>16,.0f}{leased:>18}")
+
+
+if __name__ == "__main__":
+    main()
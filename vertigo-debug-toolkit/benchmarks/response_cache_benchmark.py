@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark: dashboard polling cost with and without the conditional-GET response cache.
+
+Times the body of /performance/api/latency-series over a seeded live_traces
+table (uncached: query and serialize on every poll), a cached poll (stored
+body served), a cached poll with If-None-Match (304, no body) and the
+recompute after a trace ingest bumps the data version.
+
+Usage:
+    python benchmarks/response_cache_benchmark.py [--traces 20000] [--polls 200]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'response_cache_bench.db')
+os.environ['DATABASE_URL'] = f"sqlite:///{DB_PATH}"
+
+from flask import jsonify, request
+from sqlalchemy import insert
+
+from app import create_app
+from app.models import LiveTrace, db
+from app.services.cache_service import (
+    TRACES_VERSION, CacheConfig, CacheLevel, CacheService, cached_response
+)
+from app.services.live_data_service import live_data_service
+
+URL = '/performance/api/latency-series?hours=24&source=all'
+
+
+def latency_series():
+    """Body of performance.get_latency_series without the login decorator."""
+    hours = request.args.get('hours', 24, type=int)
+    data_source = request.args.get('source', 'all')
+    return jsonify({
+        "success": True,
+        "data": live_data_service.get_latency_time_series(hours=hours, data_source=data_source),
+        "hours": hours,
+        "data_source": data_source
+    })
+
+
+def poll(app, view, polls, headers=None):
+    started = time.perf_counter()
+    for _ in range(polls):
+        with app.test_request_context(URL, headers=headers or {}):
+            response = view()
+    return (time.perf_counter() - started) / polls * 1000, response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--traces', type=int, default=20000)
+    parser.add_argument('--polls', type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        now = datetime.utcnow()
+        db.session.execute(insert(LiveTrace), [
+            {'external_trace_id': f"t{n}", 'name': 'llm_call', 'status': 'error' if n % 20 == 0 else 'success',
+             'start_time': now - timedelta(seconds=n * 86400 / args.traces), 'duration_ms': 200 + n % 1800,
+             'data_source': 'webhook'}
+            for n in range(args.traces)
+        ])
+        db.session.commit()
+
+        cache = CacheService(CacheConfig(level=CacheLevel.MEMORY, background_refresh=False))
+        cached = cached_response(cache_service=cache)(latency_series)
+
+        print(f"{'path':>14}{'ms/poll':>10}{'status':>8}{'bytes':>8}")
+        rows = [('uncached', latency_series, {}, args.polls)]
+        elapsed, response = poll(app, cached, 1)
+        etag = response.headers['ETag']
+        rows += [
+            ('cached', cached, {}, args.polls),
+            ('cached-gzip', cached, {'Accept-Encoding': 'gzip'}, args.polls),
+            ('cached-304', cached, {'If-None-Match': etag}, args.polls),
+        ]
+        for name, view, headers, polls in rows:
+            elapsed, response = poll(app, view, polls, headers)
+            print(f"{name:>14}{elapsed:>10.3f}{response.status_code:>8}{len(response.get_data()):>8}")
+
+        cache.bump_version(TRACES_VERSION)
+        elapsed, response = poll(app, cached, 1, {'If-None-Match': etag})
+        print(f"{'after-ingest':>14}{elapsed:>10.3f}{response.status_code:>8}{len(response.get_data()):>8}")
+
+
+if __name__ == "__main__":
+    main()
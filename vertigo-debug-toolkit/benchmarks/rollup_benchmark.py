@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Benchmark: dashboard window queries over raw live_traces vs metric rollups.
+
+Loads synthetic traces spread over 30 days into a SQLite file, then times the
+previous full-scan queries (1h, 24h and 168h totals plus the 168h hourly
+latency series) against the rollup-backed equivalents, exact 168h percentiles
+from sorted raw durations against merged latency sketches, the one-time
+backfill and the incremental refresh after an ingest batch.
+
+Usage:
+    python benchmarks/rollup_benchmark.py [--traces 10000000] [--batch 500]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app.models import DataSource, LiveTrace, PerformanceMetric, db
+from app.services.metric_rollups import MetricRollupService
+
+DAYS = 30
+NOW = datetime(2026, 3, 31, 12, 30, 15)
+
+RAW_TOTALS_SQL = """
+SELECT
+    COUNT(*) as total_traces,
+    SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END) as success_count,
+    SUM(CASE WHEN status IN ('error', 'failed') THEN 1 ELSE 0 END) as error_count,
+    AVG(duration_ms) as avg_latency,
+    SUM(cost_usd) as total_cost,
+    MAX(start_time) as latest_trace_time
+FROM live_traces
+WHERE start_time >= :start_time
+AND start_time <= :end_time
+"""
+
+RAW_SERIES_SQL = """
+SELECT
+    strftime('%Y-%m-%dT%H:00:00Z', start_time) as hour_bucket,
+    AVG(duration_ms) as avg_latency,
+    MAX(duration_ms) as max_latency,
+    COUNT(*) as trace_count
+FROM live_traces
+WHERE start_time >= :start_time
+AND start_time <= :end_time
+AND duration_ms IS NOT NULL
+GROUP BY strftime('%Y-%m-%dT%H:00:00Z', start_time)
+ORDER BY hour_bucket
+"""
+
+
+RAW_DURATIONS_SQL = """
+SELECT duration_ms FROM live_traces
+WHERE start_time >= :start_time
+AND start_time <= :end_time
+AND duration_ms IS NOT NULL
+ORDER BY duration_ms
+"""
+
+
+def exact_percentiles(session, window):
+    durations = [row[0] for row in session.execute(text(RAW_DURATIONS_SQL), window)]
+    return {f"p{q * 100:g}": durations[int(q * (len(durations) - 1))] for q in (0.5, 0.9, 0.95, 0.99)}
+
+
+def load_traces(engine, count: int, rng: random.Random):
+    """Bulk-load synthetic traces with the column formats the app writes."""
+    span = DAYS * 86400
+    start = NOW - timedelta(days=DAYS)
+    statuses = ['success'] * 8 + ['error', 'pending']
+    models = ['gpt-4', 'gemini-1.5-pro', 'claude-3']
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for offset in range(0, count, 100000):
+            rows = []
+            for i in range(offset, min(offset + 100000, count)):
+                ts = start + timedelta(seconds=rng.random() * span)
+                rows.append((f"trace-{i}", 'op', rng.choice(statuses), ts.strftime('%Y-%m-%d %H:%M:%S.%f'),
+                             int(rng.lognormvariate(6, 1)), round(rng.random() / 100, 6), 10, 20, 1 + i % 2,
+                             models[i % len(models)]))
+            cursor.executemany(
+                "INSERT INTO live_traces (external_trace_id, name, status, start_time, duration_ms, "
+                "cost_usd, input_tokens, output_tokens, data_source_id, model) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            raw.commit()
+    finally:
+        raw.close()
+
+
+def timed(func, repeat: int = 3) -> float:
+    """Best-of-N wall time in milliseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--traces', type=int, default=10_000_000)
+    parser.add_argument('--batch', type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        db.metadata.create_all(engine, tables=[DataSource.__table__, LiveTrace.__table__,
+                                               PerformanceMetric.__table__])
+
+        started = time.perf_counter()
+        load_traces(engine, args.traces, rng)
+        print(f"loaded {args.traces:,} traces in {time.perf_counter() - started:.1f}s")
+
+        service = MetricRollupService()
+        service.enabled = True
+        with Session(engine) as session:
+            started = time.perf_counter()
+            service.rebuild(session)
+            service._backfilled = True
+            print(f"backfilled rollups in {time.perf_counter() - started:.1f}s "
+                  f"({session.execute(text('SELECT COUNT(*) FROM performance_metrics')).scalar():,} rows)")
+
+            print(f"\n{'query':<22}{'raw scan ms':>14}{'rollups ms':>13}")
+            for hours in (1, 24, 168):
+                window = {"start_time": NOW - timedelta(hours=hours), "end_time": NOW}
+                raw_ms = timed(lambda: session.execute(text(RAW_TOTALS_SQL), window).fetchone())
+                rollup_ms = timed(lambda: service.window_totals(window['start_time'], NOW, session=session))
+                print(f"{f'totals {hours}h':<22}{raw_ms:>14.1f}{rollup_ms:>13.2f}")
+
+            window = {"start_time": NOW - timedelta(hours=168), "end_time": NOW}
+            raw_ms = timed(lambda: session.execute(text(RAW_SERIES_SQL), window).fetchall())
+            rollup_ms = timed(lambda: service.series(window['start_time'], NOW, 'hour', session=session))
+            print(f"{'hourly series 168h':<22}{raw_ms:>14.1f}{rollup_ms:>13.2f}")
+
+            raw_ms = timed(lambda: exact_percentiles(session, window), repeat=1)
+            rollup_ms = timed(lambda: service.window_quantiles(window['start_time'], NOW, session=session))
+            print(f"{'percentiles 168h':<22}{raw_ms:>14.1f}{rollup_ms:>13.2f}")
+            print(f"  exact  {exact_percentiles(session, window)}")
+            print(f"  sketch {service.window_quantiles(window['start_time'], NOW, session=session)}")
+
+            batch = [LiveTrace(external_trace_id=f"new-{i}", name='op', status='success',
+                               start_time=NOW - timedelta(seconds=rng.random() * 600),
+                               duration_ms=rng.randrange(50, 5000), cost_usd=0.001, data_source_id=1)
+                     for i in range(args.batch)]
+            session.add_all(batch)
+            session.flush()
+            started = time.perf_counter()
+            service.refresh_for_timestamps([t.start_time for t in batch], session)
+            session.commit()
+            print(f"\nrefresh after a {args.batch}-trace ingest batch: "
+                  f"{(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
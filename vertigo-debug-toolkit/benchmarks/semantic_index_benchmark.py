@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark: prompt vector index search at 10k and 100k prompts.
+
+Compares the previous approach (cosine similarity over a Python list of
+embeddings followed by a full sort) with the memory-mapped index in flat and
+IVF modes. Embeddings are synthetic clustered vectors with the
+all-MiniLM-L6-v2 dimensionality, so no model download is needed.
+
+Usage:
+    python benchmarks/semantic_index_benchmark.py [--sizes 10000,100000] [--queries 200]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.vector_index import PromptVectorIndex
+
+DIM = 384
+
+
+def make_embeddings(count: int, rng: np.random.Generator) -> np.ndarray:
+    """Clustered vectors roughly resembling sentence embeddings of related prompts."""
+    centers = rng.standard_normal((max(count // 200, 10), DIM))
+    labels = rng.integers(0, centers.shape[0], size=count)
+    return (centers[labels] + 0.35 * rng.standard_normal((count, DIM))).astype(np.float32)
+
+
+def baseline_search(embedding_list, query, k):
+    """Per-query list-to-matrix conversion, cosine similarity and full sort."""
+    matrix = np.asarray(embedding_list)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+    scores = matrix @ query / norms
+    order = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+    return order[:k]
+
+
+def time_queries(func, queries) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        func(query)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='10000,100000')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'prompts':>8}{'build s':>10}{'baseline ms':>13}{'flat ms':>10}{'ivf ms':>9}{'ivf recall':>12}")
+
+    for size in [int(s) for s in args.sizes.split(',')]:
+        data = make_embeddings(size, rng)
+        queries = data[rng.integers(0, size, size=args.queries)] + 0.1 * rng.standard_normal((args.queries, DIM))
+        embedding_list = list(data)
+
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            index = PromptVectorIndex(directory, DIM, mode='ivf', ivf_min_size=1000, ivf_probe=8)
+            for i in range(0, size, 5000):
+                index.upsert((j, data[j], 'v1') for j in range(i, min(i + 5000, size)))
+            build_s = time.perf_counter() - start
+
+            baseline_ms = time_queries(lambda q: baseline_search(embedding_list, q, args.k),
+                                       queries[:max(args.queries // 10, 5)])
+
+            index.mode = 'flat'
+            flat_ms = time_queries(lambda q: index.search(q, args.k), queries)
+            exact = [{pid for pid, _ in index.search(q, args.k)} for q in queries]
+
+            index.mode = 'ivf'
+            index.build_ivf()
+            ivf_ms = time_queries(lambda q: index.search(q, args.k), queries)
+            recall = np.mean([
+                len({pid for pid, _ in index.search(q, args.k)} & truth) / args.k
+                for q, truth in zip(queries, exact)
+            ])
+
+        print(f"{size:>8}{build_s:>10.2f}{baseline_ms:>13.2f}{flat_ms:>10.2f}{ivf_ms:>9.2f}{recall:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-request overhead of tenant isolation on a dashboard-style request.
+
+A simulated request runs four ORM queries (recent traces, error count, cost
+total, alert count) and one raw SQL aggregate. It is timed with no isolation
+hook, with the previous before_cursor_execute hook (a string scan of every
+statement that filters nothing), and with do_orm_execute loader criteria plus
+tenant_text for the raw query. Tenants alternate between requests, so the
+scoped mode also shows that compiled statements are reused across tenants.
+
+Usage:
+    python benchmarks/tenant_isolation_benchmark.py [--requests 2000] [--tenants 20]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'tenant_isolation_bench.db')
+os.environ['DATABASE_URL'] = f"sqlite:///{DB_PATH}"
+
+from sqlalchemy import event, func, select, text
+from sqlalchemy.engine.default import CACHE_HIT
+
+from app import create_app
+from app.models import AlertEvent, Cost, LiveTrace, db
+from app.services.tenant_scope import install_tenant_scoping, tenant_context, tenant_text
+
+RAW_QUERY = "SELECT model, COUNT(*) FROM live_traces WHERE status = :status GROUP BY model"
+
+
+def legacy_hook(conn, cursor, statement, parameters, context, executemany):
+    """Previous TenantIsolationMiddleware cursor hook."""
+    statement_upper = statement.upper().strip()
+    if any(statement_upper.startswith(cmd) for cmd in ['SELECT', 'UPDATE', 'DELETE']):
+        if 'tenant_id' not in statement.lower() and not any(
+            table in statement.lower()
+            for table in ['users', 'tenants', 'tenant_users', 'alembic_version']
+        ):
+            pass
+
+
+def seed(tenants, since):
+    rows = []
+    for t in range(tenants):
+        for i in range(50):
+            rows.append(LiveTrace(external_trace_id=f"t{t}-{i}", name='llm_call', status='error' if i % 10 == 0 else 'success',
+                                  model='gemini-1.5-pro' if i % 2 else 'gpt-4o', tenant_id=f"tenant-{t}",
+                                  start_time=since + timedelta(minutes=i)))
+    db.session.add_all(rows)
+    db.session.commit()
+
+
+def dashboard_request(since, raw):
+    db.session.execute(select(LiveTrace).where(LiveTrace.start_time >= since)
+                       .order_by(LiveTrace.start_time.desc()).limit(20)).scalars().all()
+    db.session.execute(select(func.count(LiveTrace.id)).where(LiveTrace.status == 'error')).scalar()
+    db.session.execute(select(func.sum(Cost.cost_usd))).scalar()
+    db.session.execute(select(func.count(AlertEvent.id))).scalar()
+    db.session.execute(raw(RAW_QUERY), {'status': 'success'}).fetchall()
+    db.session.rollback()
+
+
+def run(requests, tenants, since, raw, scoped):
+    started = time.perf_counter()
+    for n in range(requests):
+        if scoped:
+            with tenant_context(f"tenant-{n % tenants}"):
+                dashboard_request(since, raw)
+        else:
+            dashboard_request(since, raw)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--tenants', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        since = datetime.utcnow() - timedelta(hours=1)
+        seed(args.tenants, since)
+
+        compiles = []
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, parameters, context, executemany:
+                     compiles.append(context.cache_hit))
+
+        print(f"{'mode':>10}{'us/request':>12}{'overhead':>10}")
+        baseline = run(args.requests, args.tenants, since, text, scoped=False)
+        print(f"{'none':>10}{baseline:>12.0f}{'-':>10}")
+
+        event.listen(db.engine, 'before_cursor_execute', legacy_hook)
+        legacy = run(args.requests, args.tenants, since, text, scoped=False)
+        event.remove(db.engine, 'before_cursor_execute', legacy_hook)
+        print(f"{'legacy':>10}{legacy:>12.0f}{legacy - baseline:>+10.0f}")
+
+        install_tenant_scoping(db)
+        del compiles[:]
+        scoped = run(args.requests, args.tenants, since, tenant_text, scoped=True)
+        print(f"{'scoped':>10}{scoped:>12.0f}{scoped - baseline:>+10.0f}")
+
+        misses = sum(1 for hit in compiles if hit != CACHE_HIT)
+        print(f"\nscoped statements compiled: {misses} of {len(compiles)} "
+              f"across {args.tenants} tenants")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark: statement cache hit rate and latency of tenant-scoped queries.
+
+Runs the same windowed live_traces query for --tenants tenants, first as
+before (tenant_id interpolated into the SQL, no tenant index), then with a
+bound tenant_id parameter, without and with the (tenant_id, start_time)
+index. Cache hits are SQLAlchemy compiled-statement cache hits.
+
+Usage:
+    python benchmarks/tenant_query_benchmark.py [--tenants 2000] [--rows 200000] [--queries 10000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'tenant_bench.db')}"
+
+from sqlalchemy import text
+from sqlalchemy.engine.default import CACHE_HIT
+
+from app import create_app
+from app.models import db
+from app.services.tenant_scope import scope_text
+
+QUERY = ("SELECT COUNT(*), SUM(cost_usd) FROM live_traces WHERE start_time >= :since "
+         "AND status = 'success'")
+
+
+def legacy_scope(query, tenant_id):
+    """Previous isolate_query: the tenant id is written into the SQL text."""
+    return text(query.replace(" WHERE ", f" WHERE tenant_id = '{tenant_id}' AND "))
+
+
+def run(connection, build, tenants, queries, since):
+    hits = 0
+    started = time.perf_counter()
+    for _ in range(queries):
+        result = connection.execute(build(random.choice(tenants)), {'since': since})
+        result.fetchall()
+        hits += result.context.cache_hit == CACHE_HIT
+    elapsed = time.perf_counter() - started
+    return hits / queries, elapsed / queries * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tenants', type=int, default=2000)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--queries', type=int, default=10000)
+    args = parser.parse_args()
+
+    app = create_app()
+    tenants = [f"tenant-{n}" for n in range(args.tenants)]
+    now = datetime.utcnow()
+    since = now - timedelta(hours=1)
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(text("DROP INDEX IF EXISTS idx_live_traces_tenant_time"))
+        db.session.execute(
+            text("INSERT INTO live_traces (external_trace_id, name, status, start_time, cost_usd, tenant_id) "
+                 "VALUES (:id, 'call', 'success', :start_time, 0.01, :tenant_id)"),
+            [{'id': f"t{i}", 'start_time': now - timedelta(minutes=random.randint(0, 7 * 24 * 60)),
+              'tenant_id': tenants[i % args.tenants]} for i in range(args.rows)]
+        )
+        db.session.commit()
+
+        connection = db.session.connection()
+        print(f"{'variant':>28}{'cache hits':>12}{'us/query':>10}")
+        for name, build in (('literal tenant_id', lambda t: legacy_scope(QUERY, t)),
+                            ('bound tenant_id', lambda t: scope_text(QUERY, t))):
+            hit_rate, latency = run(connection, build, tenants, args.queries, since)
+            print(f"{name + ', no index':>28}{hit_rate:>12.1%}{latency:>10.0f}")
+
+        db.session.execute(text(
+            "CREATE INDEX idx_live_traces_tenant_time ON live_traces(tenant_id, start_time)"
+        ))
+        db.session.execute(text("ANALYZE"))
+        for name, build in (('literal tenant_id', lambda t: legacy_scope(QUERY, t)),
+                            ('bound tenant_id', lambda t: scope_text(QUERY, t))):
+            hit_rate, latency = run(connection, build, tenants, args.queries, since)
+            print(f"{name + ', index':>28}{hit_rate:>12.1%}{latency:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
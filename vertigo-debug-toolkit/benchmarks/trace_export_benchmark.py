@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark: peak memory and throughput of live trace exports as the window grows.
+
+Compares materializing the window (fetchall into a list of dicts, then one
+JSON document, as the list endpoints do) with the streaming NDJSON and CSV
+exports, which encode one cursor batch at a time. Peak memory is measured
+with tracemalloc while the response body is consumed.
+
+Usage:
+    python benchmarks/trace_export_benchmark.py [--sizes 10000,100000,300000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'trace_export_bench.db')
+os.environ['DATABASE_URL'] = f"sqlite:///{DB_PATH}"
+
+from sqlalchemy import insert, select
+
+from app import create_app
+from app.models import LiveTrace, db
+from app.services.trace_export import DEFAULT_EXPORT_FIELDS, ExportFilters, _json_value, trace_exporter
+
+T0 = datetime(2026, 1, 1)
+
+
+def materialized(limit):
+    """The whole window as a list of dicts serialized in one document."""
+    columns = [getattr(LiveTrace, field) for field in DEFAULT_EXPORT_FIELDS]
+    rows = db.session.execute(select(*columns).order_by(LiveTrace.start_time).limit(limit)).fetchall()
+    traces = [{field: _json_value(value) for field, value in zip(DEFAULT_EXPORT_FIELDS, row)} for row in rows]
+    yield json.dumps({'traces': traces})
+
+
+def measure(chunks):
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = sum(len(chunk) for chunk in chunks)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='10000,100000,300000')
+    args = parser.parse_args()
+    sizes = [int(n) for n in args.sizes.split(',')]
+
+    app = create_app()
+    with app.test_request_context('/live-data/api/live-traces/export'):
+        db.create_all()
+        for start in range(0, max(sizes), 10000):
+            db.session.execute(insert(LiveTrace), [
+                {'external_trace_id': f"t{n}", 'name': 'llm_call', 'status': 'success', 'model': 'gemini-1.5-pro',
+                 'start_time': T0 + timedelta(seconds=n), 'duration_ms': 800, 'input_tokens': 812,
+                 'output_tokens': 240, 'cost_usd': 0.0042, 'tags': ['bench'], 'trace_metadata': {'project': 'vertigo'}}
+                for n in range(start, min(start + 10000, max(sizes)))
+            ])
+        db.session.commit()
+
+        print(f"{'rows':>8}{'path':>14}{'rows/s':>11}{'peak MB':>9}{'out MB':>8}")
+        for size in sizes:
+            paths = (
+                ('materialized', lambda: materialized(size)),
+                ('ndjson', lambda: trace_exporter.export('ndjson', ExportFilters(limit=size))),
+                ('csv', lambda: trace_exporter.export('csv', ExportFilters(limit=size))),
+            )
+            for name, export in paths:
+                elapsed, peak, out = measure(export())
+                print(f"{size:>8}{name:>14}{size / elapsed:>11,.0f}{peak / 1e6:>9.1f}{out / 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
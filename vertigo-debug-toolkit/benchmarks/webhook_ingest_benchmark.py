@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark: webhook dedup check + event logging throughput for one worker.
+
+Compares the previous path (COUNT(*) over webhook_events and a committed
+INSERT per event) with the in-memory dedup index and group-committed event
+log, on a SQLite file already holding --history logged events. A quarter of
+the events are redeliveries.
+
+Usage:
+    python benchmarks/webhook_ingest_benchmark.py [--events 5000] [--history 200000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'webhook_bench.db')
+os.environ['DATABASE_URL'] = f"sqlite:///{DB_PATH}"
+
+from sqlalchemy import text
+
+from app import create_app
+from app.models import db
+from app.services.webhook_service import WebhookEvent, WebhookService
+
+DDL = """
+CREATE TABLE webhook_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, trace_id VARCHAR(100) NOT NULL, event_type VARCHAR(50) NOT NULL,
+    source VARCHAR(50) NOT NULL, data_source_id INTEGER, event_data JSON NOT NULL,
+    status VARCHAR(20) DEFAULT 'pending', error_message TEXT, received_at DATETIME, processed_at DATETIME
+)
+"""
+
+
+def legacy_ingest(service, event):
+    """Previous is_event_duplicate + log_webhook_event: one query and one commit per event."""
+    cutoff = event.timestamp - timedelta(minutes=service.deduplication_window_minutes)
+    count = db.session.execute(
+        text("SELECT COUNT(*) FROM webhook_events WHERE trace_id = :trace_id AND event_type = :event_type "
+             "AND received_at >= :cutoff_time"),
+        {"trace_id": event.trace_id, "event_type": event.event_type, "cutoff_time": cutoff}
+    ).fetchone()[0]
+    if count:
+        return
+    db.session.execute(text("""
+        INSERT INTO webhook_events
+        (trace_id, event_type, event_data, source, received_at, processed_at, status, error_message)
+        VALUES (:trace_id, :event_type, :event_data, :source, :received_at, :processed_at, :status, NULL)
+    """), {"trace_id": event.trace_id, "event_type": event.event_type, "event_data": json.dumps(event.data),
+           "source": event.source, "received_at": event.timestamp, "processed_at": datetime.utcnow(),
+           "status": 'success'})
+    db.session.commit()
+
+
+def indexed_ingest(service, event):
+    if not service.is_event_duplicate(event.trace_id, event.event_type, event.timestamp):
+        service.log_webhook_event(event, 'success')
+
+
+def reset_table(history):
+    db.session.execute(text("DROP TABLE IF EXISTS webhook_events"))
+    db.session.execute(text(DDL))
+    db.session.execute(text("CREATE INDEX idx_webhook_events_trace ON webhook_events(trace_id, event_type)"))
+    old = datetime.utcnow() - timedelta(hours=1)
+    db.session.execute(text(
+        "INSERT INTO webhook_events (trace_id, event_type, source, event_data, received_at, status) "
+        "VALUES (:trace_id, 'trace.created', 'langwatch', '{}', :received_at, 'success')"
+    ), [{"trace_id": f"old-{i}", "received_at": old} for i in range(history)])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--history', type=int, default=200000)
+    args = parser.parse_args()
+
+    app = create_app()
+    now = datetime.utcnow()
+    events = [WebhookEvent('trace.updated', f"trace-{i % (args.events * 3 // 4)}", now, {'trace': {'id': i}})
+              for i in range(args.events)]
+
+    with app.app_context():
+        print(f"{'path':>10}{'events/s':>12}")
+        for name, ingest in (('legacy', legacy_ingest), ('indexed', indexed_ingest)):
+            reset_table(args.history)
+            service = WebhookService()
+            started = time.perf_counter()
+            for event in events:
+                ingest(service, event)
+            service.event_log.flush()
+            elapsed = time.perf_counter() - started
+            logged = db.session.execute(text("SELECT COUNT(*) FROM webhook_events")).scalar() - args.history
+            print(f"{name:>10}{args.events / elapsed:>12,.0f}   ({logged} logged)")
+
+
+if __name__ == "__main__":
+    main()
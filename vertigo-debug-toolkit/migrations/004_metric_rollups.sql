@@ -0,0 +1,84 @@
+-- Migration 004: Incremental metric rollups
+-- Date: 2026-10-16
+-- Purpose: Store minute/hour/day rollups of live_traces in performance_metrics
+--
+-- SQLite cannot alter a CHECK constraint or add several columns in one
+-- statement, so the table is rebuilt: the 'minute' period type is allowed and
+-- additive latency totals (latency_sum_ms, latency_count) are added so that
+-- buckets can be combined exactly. Rollup rows are derived data; they are
+-- recomputed from live_traces by a background backfill when the app starts
+-- (or explicitly with `flask rebuild-rollups`).
+
+CREATE TABLE IF NOT EXISTS performance_metrics_new (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    period_start DATETIME NOT NULL,
+    period_end DATETIME NOT NULL,
+    period_type VARCHAR(20) NOT NULL CHECK (period_type IN ('minute', 'hour', 'day', 'week', 'month')),
+
+    -- Core Performance Metrics
+    total_traces INTEGER DEFAULT 0,
+    success_count INTEGER DEFAULT 0,
+    error_count INTEGER DEFAULT 0,
+    success_rate DECIMAL(5,2) DEFAULT 0.0,
+    error_rate DECIMAL(5,2) DEFAULT 0.0,
+
+    -- Latency Metrics
+    avg_latency_ms DECIMAL(10,2) DEFAULT 0.0,
+    p50_latency_ms DECIMAL(10,2) DEFAULT 0.0,
+    p95_latency_ms DECIMAL(10,2) DEFAULT 0.0,
+    p99_latency_ms DECIMAL(10,2) DEFAULT 0.0,
+    min_latency_ms DECIMAL(10,2) DEFAULT 0.0,
+    max_latency_ms DECIMAL(10,2) DEFAULT 0.0,
+    latency_sum_ms REAL DEFAULT 0.0,
+    latency_count INTEGER DEFAULT 0,
+
+    -- Cost Metrics
+    total_cost DECIMAL(10,6) DEFAULT 0.0,
+    avg_cost_per_request DECIMAL(10,6) DEFAULT 0.0,
+    input_tokens_total INTEGER DEFAULT 0,
+    output_tokens_total INTEGER DEFAULT 0,
+
+    -- Model Distribution (JSON for flexibility)
+    model_distribution JSON,
+    operation_distribution JSON,
+
+    -- Source Information
+    data_source_id INTEGER,
+
+    -- Timestamps
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+
+    FOREIGN KEY (data_source_id) REFERENCES data_sources (id)
+);
+
+INSERT INTO performance_metrics_new (
+    id, period_start, period_end, period_type,
+    total_traces, success_count, error_count, success_rate, error_rate,
+    avg_latency_ms, p50_latency_ms, p95_latency_ms, p99_latency_ms, min_latency_ms, max_latency_ms,
+    total_cost, avg_cost_per_request, input_tokens_total, output_tokens_total,
+    model_distribution, operation_distribution, data_source_id, created_at, updated_at
+)
+SELECT
+    id, period_start, period_end, period_type,
+    total_traces, success_count, error_count, success_rate, error_rate,
+    avg_latency_ms, p50_latency_ms, p95_latency_ms, p99_latency_ms, min_latency_ms, max_latency_ms,
+    total_cost, avg_cost_per_request, input_tokens_total, output_tokens_total,
+    model_distribution, operation_distribution, data_source_id, created_at, updated_at
+FROM performance_metrics
+WHERE period_type NOT IN ('minute', 'hour', 'day');
+
+DROP TABLE performance_metrics;
+
+ALTER TABLE performance_metrics_new RENAME TO performance_metrics;
+
+CREATE INDEX IF NOT EXISTS idx_performance_metrics_period ON performance_metrics(period_start, period_end, period_type);
+CREATE INDEX IF NOT EXISTS idx_performance_metrics_source ON performance_metrics(data_source_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_performance_metrics_type_period ON performance_metrics(period_type, period_start DESC);
+CREATE INDEX IF NOT EXISTS idx_performance_metrics_rollup ON performance_metrics(period_type, period_start, data_source_id);
+
+CREATE TRIGGER IF NOT EXISTS update_performance_metrics_timestamp
+    AFTER UPDATE ON performance_metrics
+    BEGIN
+        UPDATE performance_metrics SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+    END;
@@ -0,0 +1,14 @@
+-- Migration 005: Latency sketches on metric rollups
+-- Date: 2026-10-16
+-- Purpose: Keep mergeable latency sketches per rollup bucket, data source and model
+--
+-- latency_sketch holds DDSketch bins ({"index": count}) so percentiles can be
+-- computed for any window by merging bucket sketches. Rollup rows are now kept
+-- per model. Existing rollups have neither, so they are cleared; they are
+-- derived data and are recomputed from live_traces by the background backfill.
+
+ALTER TABLE performance_metrics ADD COLUMN latency_sketch JSON;
+
+ALTER TABLE performance_metrics ADD COLUMN model VARCHAR(100);
+
+DELETE FROM performance_metrics WHERE period_type IN ('minute', 'hour', 'day');
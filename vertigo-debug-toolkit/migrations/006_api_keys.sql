@@ -0,0 +1,24 @@
+-- Migration 006: Database-backed API keys
+-- Date: 2026-10-16
+-- Purpose: Share API keys across workers and look them up by secret hash
+--
+-- Keys were previously held in a per-process dict and lost on restart, so
+-- there is nothing to copy. The UNIQUE constraint on key_hash provides the
+-- lookup index used on every authenticated request.
+
+CREATE TABLE IF NOT EXISTS api_keys (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key_id VARCHAR(64) NOT NULL UNIQUE,
+    key_hash VARCHAR(64) NOT NULL UNIQUE,
+    name VARCHAR(100) NOT NULL,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    scopes JSON NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'active',  -- active, suspended, expired, revoked
+    rate_limit_tier VARCHAR(20) DEFAULT 'free',
+    usage_count INTEGER DEFAULT 0,
+    last_used_at DATETIME,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    expires_at DATETIME
+);
+
+CREATE INDEX IF NOT EXISTS idx_api_keys_user ON api_keys(user_id, status);
@@ -0,0 +1,18 @@
+-- Migration 007: Tenant registry versioning
+-- Date: 2026-10-16
+-- Purpose: Let every worker cache tenants and drop the cache when another worker changes them
+--
+-- TenantService bumps registry_versions('tenants') in the same transaction as
+-- any tenant or membership change; workers poll the row every few seconds.
+-- Domains are matched case-insensitively by storing them lower-cased, so the
+-- UNIQUE index on tenants.domain serves the lookup.
+
+CREATE TABLE IF NOT EXISTS registry_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT OR IGNORE INTO registry_versions (name, version) VALUES ('tenants', 0);
+
+UPDATE tenants SET domain = LOWER(domain);
@@ -0,0 +1,26 @@
+-- Migration 008: Tenant columns and composite indexes for scoped queries
+-- Date: 2026-10-16
+-- Purpose: Let tenant-scoped queries filter on a bound tenant_id and range-scan by time
+--
+-- Tenant scoping adds "tenant_id = :tenant_id" to queries on these tables;
+-- the (tenant_id, time) indexes turn that plus the usual time window into
+-- one index range scan.
+--
+-- Existing rows predate tenants. They are assigned to the default tenant,
+-- the first one created, so its users keep seeing their history. When no
+-- tenant exists yet they keep a NULL tenant_id and are only visible to
+-- unscoped queries; re-run the UPDATEs after creating the first tenant.
+-- Set INGEST_TENANT_ID to the same tenant so new untenanted ingest lands
+-- next to the history.
+
+ALTER TABLE live_traces ADD COLUMN tenant_id VARCHAR(36);
+ALTER TABLE costs ADD COLUMN tenant_id VARCHAR(36);
+ALTER TABLE alert_events ADD COLUMN tenant_id VARCHAR(36);
+
+CREATE INDEX IF NOT EXISTS idx_live_traces_tenant_time ON live_traces(tenant_id, start_time);
+CREATE INDEX IF NOT EXISTS idx_costs_tenant_time ON costs(tenant_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_alert_events_tenant_time ON alert_events(tenant_id, triggered_at);
+
+UPDATE live_traces SET tenant_id = (SELECT id FROM tenants ORDER BY created_at, id LIMIT 1) WHERE tenant_id IS NULL;
+UPDATE costs SET tenant_id = (SELECT id FROM tenants ORDER BY created_at, id LIMIT 1) WHERE tenant_id IS NULL;
+UPDATE alert_events SET tenant_id = (SELECT id FROM tenants ORDER BY created_at, id LIMIT 1) WHERE tenant_id IS NULL;
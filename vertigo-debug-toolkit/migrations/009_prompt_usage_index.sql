@@ -0,0 +1,9 @@
+-- Migration 009: Index for per-prompt usage counts
+-- Date: 2026-10-16
+-- Purpose: Let the prompt listing API count a page of prompts' traces from the index
+--
+-- /prompts/api/prompts/list groups traces by prompt_id for the prompts on
+-- one page and counts the successful ones; (prompt_id, status) answers
+-- both counts without reading the traces table.
+
+CREATE INDEX IF NOT EXISTS idx_traces_prompt_status ON traces(prompt_id, status);
@@ -0,0 +1,116 @@
+"""
+Shared pytest fixtures for the Vertigo Debug Toolkit test suite.
+"""
+
+import os
+
+import pytest
+from sqlalchemy import event, text
+
+# Read when app.services.cloud_monitor is imported; no scheduled probes of the real Cloud Functions
+os.environ['CLOUD_MONITOR_BACKGROUND_PROBES'] = 'false'
+
+# Layout from migrations/001_live_data_schema.sql, which WebhookService writes
+WEBHOOK_EVENTS_DDL = """
+CREATE TABLE webhook_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    trace_id VARCHAR(100) NOT NULL,
+    event_type VARCHAR(50) NOT NULL,
+    source VARCHAR(50) NOT NULL,
+    data_source_id INTEGER,
+    event_data JSON NOT NULL,
+    status VARCHAR(20) DEFAULT 'pending',
+    error_message TEXT,
+    received_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    processed_at DATETIME
+)
+"""
+
+
+@pytest.fixture(scope='session')
+def app():
+    """Flask application backed by an in-memory SQLite database."""
+    os.environ['DATABASE_URL'] = 'sqlite://'
+    # Off by default; enabled here so the request-level tenant tests run through the middleware
+    os.environ['TENANT_ISOLATION_ENABLED'] = 'true'
+    from app import create_app
+
+    flask_app = create_app()
+    flask_app.config['TESTING'] = True
+    flask_app.config['WTF_CSRF_ENABLED'] = False
+    return flask_app
+
+
+class RecordedStatements(list):
+    """SQL text of every statement sent to the database, in order."""
+
+    def __init__(self):
+        super().__init__()
+        # (statement, parameters, cache_hit) per statement, for tests of bound values and the compiled cache
+        self.executions = []
+
+    def matching(self, *words):
+        """Statements mentioning any of ``words``."""
+        return [statement for statement in self if any(word in statement for word in words)]
+
+    def verbs(self, *words):
+        """Leading keyword (SELECT, INSERT, ...) of each statement, or of those mentioning ``words``."""
+        return [statement.split()[0].upper() for statement in (self.matching(*words) if words else self)]
+
+    def clear(self):
+        super().clear()
+        self.executions.clear()
+
+
+@pytest.fixture
+def db_session(app):
+    """Database session inside an application context; all tables are emptied afterwards."""
+    from app.models import db
+
+    with app.app_context():
+        yield db.session
+        db.session.rollback()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+
+
+@pytest.fixture
+def sql_bind(db_session):
+    """Engine whose statements sql_statements records; override for tests on another engine."""
+    return db_session.get_bind()
+
+
+@pytest.fixture
+def sql_statements(sql_bind):
+    """Statements executed on ``sql_bind`` from here on; clear() before the part being measured."""
+    recorded = RecordedStatements()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        recorded.append(statement)
+        recorded.executions.append((statement, parameters, context.cache_hit if context else None))
+
+    event.listen(sql_bind, 'before_cursor_execute', record)
+    yield recorded
+    event.remove(sql_bind, 'before_cursor_execute', record)
+
+
+@pytest.fixture
+def webhook_service(db_session):
+    """WebhookService over a webhook_events table in the migration layout; flushed explicitly."""
+    from app.models import WebhookEvent, db
+    from app.services.webhook_service import WebhookService
+
+    db_session.execute(text("DROP TABLE webhook_events"))
+    db_session.execute(text(WEBHOOK_EVENTS_DDL))
+    db_session.commit()
+
+    service = WebhookService()
+    # Flush explicitly from the test thread; the in-memory database is one connection
+    service.event_log.flush_interval_seconds = 3600
+    service.event_log.batch_size = 10 ** 6
+    yield service
+
+    db_session.execute(text("DROP TABLE webhook_events"))
+    db_session.commit()
+    WebhookEvent.__table__.create(db.engine)
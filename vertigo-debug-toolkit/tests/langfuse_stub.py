@@ -0,0 +1,117 @@
+"""
+Local stub of the Langfuse public API (traces and observations listing) for sync tests and benchmarks.
+"""
+
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Inside the first sync's lookback window
+T0 = datetime.utcnow().replace(microsecond=0) - timedelta(hours=1)
+
+
+def iso(value):
+    return value.isoformat(timespec='milliseconds') + 'Z'
+
+
+def parse(value):
+    return datetime.fromisoformat(value.replace('Z', ''))
+
+
+def make_trace(n, at=None, **fields):
+    """Trace n at T0 + n seconds (or ``at``), in the Langfuse list response layout."""
+    return {'id': f"trace-{n}", 'name': f"call-{n}", 'timestamp': iso(at or T0 + timedelta(seconds=n)),
+            'latency': 1.25, 'metadata': {'operation': 'summary_generation', 'project': 'stub'}, **fields}
+
+
+def make_generation(n, trace_id, at=None, **fields):
+    return {'id': f"gen-{n}", 'traceId': trace_id, 'type': 'GENERATION', 'model': 'gpt-4',
+            'startTime': iso(at or T0 + timedelta(seconds=n)),
+            'usage': {'input': 100, 'output': 50, 'total': 150}, 'calculatedTotalCost': 0.006, **fields}
+
+
+class StubLangfuseServer:
+    """
+    Serves GET /api/public/traces and /api/public/observations from in-memory lists.
+
+    Filters on fromTimestamp / fromStartTime (inclusive), orders newest first
+    unless orderBy is ``<time field>.asc``, pages with page/limit and reports
+    meta.totalPages. ``latency_seconds`` delays every response;
+    ``requests`` records each query and ``max_in_flight`` the peak concurrency.
+    """
+
+    def __init__(self, latency_seconds: float = 0.0):
+        self.traces = []
+        self.generations = []
+        self.latency_seconds = latency_seconds
+        self.requests = []
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self) -> 'StubLangfuseServer':
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _list(self, path, query):
+        if path == '/api/public/traces':
+            items, time_field, since = self.traces, 'timestamp', query.get('fromTimestamp')
+        elif path == '/api/public/observations':
+            items, time_field, since = self.generations, 'startTime', query.get('fromStartTime')
+        else:
+            return None
+        if since:
+            items = [item for item in items if parse(item[time_field]) >= parse(since)]
+        # Like Langfuse, newest first unless orderBy asks for ascending time
+        ascending = query.get('orderBy') == f"{time_field}.asc"
+        items = sorted(items, key=lambda item: (item[time_field], item['id']), reverse=not ascending)
+
+        page, limit = int(query.get('page', 1)), int(query.get('limit', 50))
+        total_pages = (len(items) + limit - 1) // limit
+        return {'data': items[(page - 1) * limit:page * limit],
+                'meta': {'page': page, 'limit': limit, 'totalItems': len(items), 'totalPages': total_pages}}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                with stub._lock:
+                    stub.requests.append((url.path, query))
+                    stub._in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub._in_flight)
+                try:
+                    if stub.latency_seconds:
+                        time.sleep(stub.latency_seconds)
+                    body = stub._list(url.path, query)
+                finally:
+                    with stub._lock:
+                        stub._in_flight -= 1
+
+                payload = json.dumps(body if body is not None else {'message': 'not found'}).encode()
+                self.send_response(200 if body is not None else 404)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
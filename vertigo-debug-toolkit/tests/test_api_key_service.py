@@ -0,0 +1,95 @@
+"""
+Tests for database-backed API keys with a verified-key cache and batched usage updates.
+"""
+
+import pytest
+
+from app.services.api_key_service import APIKeyService, APIKeyStatus
+
+
+@pytest.fixture
+def service():
+    # Flush usage explicitly from the test thread
+    return APIKeyService(cache_ttl_seconds=60, usage_flush_seconds=3600)
+
+
+@pytest.fixture
+def user(db_session):
+    from app.models import User
+
+    user = User(username='keys', email='keys@example.com', password_hash='x')
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+
+def test_verified_keys_are_served_from_cache(service, user, sql_statements):
+    api_key, key_id = service.generate_api_key(user, 'ci')
+    sql_statements.clear()
+
+    results = [service.authenticate_api_key(api_key) for _ in range(100)]
+
+    assert all(valid and info.key_id == key_id for valid, info, _ in results)
+    assert sql_statements.verbs('api_keys') == ['SELECT']
+    assert service.stats['cache_hits'] == 99
+
+    valid, _, error = service.authenticate_api_key(f"{key_id}.wrong-secret")
+    assert not valid and error == "Invalid API key"
+
+
+def test_usage_is_flushed_in_one_batch(service, user, sql_statements, db_session):
+    from app.models import APIKey
+
+    api_key, key_id = service.generate_api_key(user, 'ci')
+    other_key, _ = service.generate_api_key(user, 'dashboard')
+    for _ in range(5):
+        service.authenticate_api_key(api_key)
+    service.authenticate_api_key(other_key)
+    sql_statements.clear()
+
+    assert service.flush_usage() == 2
+    assert sql_statements.verbs('api_keys') == ['UPDATE']
+    record = APIKey.query.filter_by(key_id=key_id).one()
+    assert record.usage_count == 5 and record.last_used_at is not None
+
+
+def test_revoke_and_suspend_invalidate_the_cache(service, user):
+    api_key, key_id = service.generate_api_key(user, 'ci')
+    assert service.authenticate_api_key(api_key)[0]
+
+    assert service.suspend_api_key(key_id, reason='abuse')
+    assert service.authenticate_api_key(api_key) == (False, None, "API key is suspended")
+
+    other_key, other_id = service.generate_api_key(user, 'dashboard')
+    assert service.authenticate_api_key(other_key)[0]
+    assert service.revoke_api_key(other_id, user.id)
+    assert service.authenticate_api_key(other_key) == (False, None, "API key is revoked")
+    assert [key.status for key in service.get_api_keys_for_user(user.id)] == [APIKeyStatus.SUSPENDED,
+                                                                             APIKeyStatus.REVOKED]
+
+
+def test_lookup_racing_an_invalidation_is_not_cached(service, user, monkeypatch):
+    from app.models import APIKey, db
+
+    api_key, key_id = service.generate_api_key(user, 'ci')
+    to_info = service._to_info
+
+    def revoke_during_lookup(record):
+        # Another request revokes the key between the read and the cache fill
+        APIKey.query.filter_by(key_id=key_id).update({'status': 'revoked'})
+        db.session.commit()
+        service.invalidate(key_id)
+        return to_info(record)
+
+    monkeypatch.setattr(service, '_to_info', revoke_during_lookup)
+    assert service.authenticate_api_key(api_key)[0]
+    assert not service._cache
+    assert service.authenticate_api_key(api_key) == (False, None, "API key is revoked")
+
+
+def test_inactive_owner_is_rejected(service, user, db_session):
+    api_key, _ = service.generate_api_key(user, 'ci')
+    user.is_active = False
+    db_session.commit()
+
+    assert service.authenticate_api_key(api_key) == (False, None, "Associated user account is inactive")
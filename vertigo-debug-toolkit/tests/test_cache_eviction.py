@@ -0,0 +1,171 @@
+"""
+Tests for the MemoryCache eviction engine (LRU, LFU and TinyLFU admission).
+"""
+
+import time
+
+import pytest
+
+from app.services.cache_eviction import (
+    FrequencySketch,
+    LFUPolicy,
+    LRUPolicy,
+    TinyLFUPolicy,
+    estimate_size,
+)
+from app.services.cache_service import CacheStrategy, MemoryCache
+
+
+class TestEvictionPolicies:
+    """Policy-level ordering guarantees."""
+
+    def test_lru_evicts_least_recently_used(self):
+        policy = LRUPolicy()
+        for key in ('a', 'b', 'c'):
+            policy.on_insert(key)
+        policy.on_access('a')
+        assert policy.victim() == 'b'
+        policy.on_remove('b')
+        assert policy.victim() == 'c'
+
+    def test_lfu_evicts_lowest_frequency_then_oldest(self):
+        policy = LFUPolicy()
+        for key in ('a', 'b', 'c'):
+            policy.on_insert(key)
+        policy.on_access('a')
+        policy.on_access('a')
+        policy.on_access('c')
+        assert policy.frequency('a') == 3
+        assert policy.victim() == 'b'
+        policy.on_remove('b')
+        assert policy.victim() == 'c'
+        policy.on_remove('c')
+        assert policy.victim() == 'a'
+        policy.on_remove('a')
+        assert policy.victim() is None
+
+    def test_tinylfu_rejects_cold_candidate(self):
+        policy = TinyLFUPolicy(capacity=10)
+        for _ in range(5):
+            policy.record_request('hot')
+        policy.record_request('cold')
+        assert not policy.admit('cold', 'hot')
+        assert policy.admit('hot', 'cold')
+
+
+class TestMemoryCacheEviction:
+    """MemoryCache behaviour under each strategy."""
+
+    @pytest.mark.parametrize('strategy', [CacheStrategy.LRU, CacheStrategy.LFU, CacheStrategy.TTL])
+    def test_item_limit_is_respected(self, strategy):
+        cache = MemoryCache(max_items=50, strategy=strategy)
+        for i in range(500):
+            cache.set(f"key_{i}", i)
+        stats = cache.stats()
+        assert stats['items'] == 50
+        assert stats['evictions'] == 450
+
+    def test_lru_keeps_recently_read_keys(self):
+        cache = MemoryCache(max_items=3, strategy=CacheStrategy.LRU)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.set('c', 3)
+        cache.get('a')
+        cache.set('d', 4)
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+
+    def test_lfu_keeps_frequently_read_keys(self):
+        cache = MemoryCache(max_items=3, strategy=CacheStrategy.LFU)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.set('c', 3)
+        for _ in range(3):
+            cache.get('a')
+            cache.get('c')
+        cache.set('d', 4)
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+
+    def test_tinylfu_scan_does_not_flush_hot_set(self):
+        cache = MemoryCache(max_items=10, strategy=CacheStrategy.TINY_LFU)
+        for i in range(10):
+            cache.set(f"hot_{i}", i)
+        for _ in range(5):
+            for i in range(10):
+                cache.get(f"hot_{i}")
+        for i in range(100):
+            cache.set(f"scan_{i}", i)
+        assert all(cache.get(f"hot_{i}") == i for i in range(10))
+        assert cache.stats()['rejections'] > 0
+
+    def test_overwrite_updates_size_accounting(self):
+        cache = MemoryCache(max_items=10)
+        cache.set('k', 'x' * 10)
+        small = cache.stats()['size_bytes']
+        cache.set('k', 'x' * 1000)
+        assert cache.stats()['size_bytes'] == small + 990
+        assert cache.stats()['items'] == 1
+        cache.delete('k')
+        assert cache.stats()['size_bytes'] == 0
+
+    def test_size_budget_evicts(self):
+        cache = MemoryCache(max_items=1000, max_size_mb=0.01)
+        for i in range(20):
+            cache.set(f"blob_{i}", 'x' * 1024)
+        assert cache.stats()['size_bytes'] <= cache.max_size_bytes
+        assert cache.get('blob_19') is not None
+
+    def test_ttl_expiry(self):
+        cache = MemoryCache(max_items=10)
+        cache.set('short', 'value', ttl_seconds=1)
+        cache.cache['short'].expires_at = time.monotonic() - 1
+        assert cache.get('short') is None
+        assert cache.stats()['items'] == 0
+
+
+def test_estimate_size_is_bounded_for_large_containers():
+    payload = [{'id': i, 'name': f"trace_{i}"} for i in range(100000)]
+    start = time.perf_counter()
+    size = estimate_size(payload)
+    assert time.perf_counter() - start < 0.05
+    assert size > 100000
+
+
+def test_sketch_aging_halves_counters_quickly():
+    sketch = FrequencySketch(100000)
+    for _ in range(7):
+        sketch.increment('hot')
+    sketch.increment('warm')
+
+    start = time.perf_counter()
+    sketch._age()
+    assert time.perf_counter() - start < 0.05
+    assert (sketch.estimate('hot'), sketch.estimate('warm')) == (3, 0)
+
+
+def test_tinylfu_counts_a_cache_aside_miss_once():
+    cache = MemoryCache(max_items=10, strategy=CacheStrategy.TINY_LFU)
+    assert cache.get('key') is None
+    cache.set('key', 1)
+    assert cache.policy.sketch.estimate('key') == 1
+
+    # A write without a preceding lookup still counts as one request
+    cache.set('other', 2)
+    assert cache.policy.sketch.estimate('other') == 1
+
+
+def test_rejected_candidate_evicts_nothing():
+    cache = MemoryCache(max_items=10, max_size_mb=0.004, strategy=CacheStrategy.TINY_LFU)
+    cache.set('cold', 'x' * 1024)
+    cache.set('hot', 'x' * 1024)
+    for _ in range(5):
+        cache.get('hot')
+
+    # Making room takes both entries: 'big' beats 'cold' but not 'hot', so 'cold' must survive too
+    cache.get('big')
+    cache.get('big')
+    assert not cache.set('big', 'x' * 3200)
+    assert cache.get('cold') is not None and cache.get('hot') is not None
+    assert cache.stats()['evictions'] == 0
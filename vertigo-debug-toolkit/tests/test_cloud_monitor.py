@@ -0,0 +1,125 @@
+"""
+Tests for concurrent, cached cloud service health probes.
+"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.services.cloud_monitor import CloudServiceMonitor
+
+PROBE_DELAY_SECONDS = 0.3
+
+
+@pytest.fixture
+def functions():
+    """Local stand-in for the Cloud Functions: /ok answers after a delay, /down with 503."""
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            time.sleep(PROBE_DELAY_SECONDS)
+            self.send_response(503 if self.path == '/down' else 200)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", hits
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def monitor(functions):
+    url, _ = functions
+    monitor = CloudServiceMonitor(background_probes=False, max_age_seconds=60)
+    for service_key, service in monitor.services.items():
+        service["url"] = f"{url}/{'down' if service_key == 'status_generator' else 'ok'}"
+    yield monitor
+    monitor.stop()
+
+
+def test_services_are_probed_concurrently(monitor):
+    started = time.perf_counter()
+    status = monitor.check_all_services(refresh=True)
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < PROBE_DELAY_SECONDS * 2
+    assert status["overall_status"] == "unhealthy"
+    assert status["critical_services_down"] == 1
+    assert status["services"]["status_generator"]["error"] == "HTTP 503"
+    assert status["services"]["email_processor"]["status"] == "healthy"
+
+
+def test_cold_cache_reports_pending_while_the_first_round_runs(monitor, functions):
+    _, hits = functions
+
+    started = time.perf_counter()
+    status = monitor.check_all_services()
+    assert time.perf_counter() - started < PROBE_DELAY_SECONDS / 2
+    assert status["overall_status"] == "pending"
+    assert status["pending_services"] == 3
+    assert status["last_probe"] is None
+    assert {result["status"] for result in status["services"].values()} == {"pending"}
+
+    deadline = time.time() + 5
+    while monitor.check_all_services()["pending_services"] and time.time() < deadline:
+        time.sleep(0.05)
+    status = monitor.check_all_services()
+    assert status["overall_status"] == "unhealthy"
+    assert status["pending_services"] == 0
+    assert len(hits) == 3
+
+
+def test_status_is_served_from_the_cache_until_refreshed(monitor, functions):
+    _, hits = functions
+    monitor.check_all_services(refresh=True)
+
+    started = time.perf_counter()
+    cached = monitor.check_all_services()
+    assert time.perf_counter() - started < 0.05
+    assert len(hits) == 3
+    assert cached["stale_services"] == 0
+    assert all(result["age_seconds"] >= 0 for result in cached["services"].values())
+
+    monitor.max_age_seconds = 0
+    assert monitor.check_all_services()["stale_services"] == 3
+
+    monitor.check_all_services(refresh=True)
+    assert len(hits) == 6
+
+
+def test_latency_histograms_accumulate_per_service(monitor):
+    monitor.probe_all_services()
+    monitor.probe_all_services()
+
+    histograms = monitor.get_latency_histograms()
+    assert set(histograms) == set(monitor.services)
+    email = histograms["email_processor"]
+    assert email["count"] == 2
+    assert email["p50"] >= PROBE_DELAY_SECONDS * 1000 * 0.9
+    assert sum(email["bins"].values()) == 2
+
+
+def test_background_schedule_keeps_the_cache_warm(functions):
+    url, hits = functions
+    monitor = CloudServiceMonitor(probe_interval_seconds=0.1)
+    for service in monitor.services.values():
+        service["url"] = f"{url}/ok"
+    try:
+        monitor.start()
+        deadline = time.time() + 5
+        while len(hits) < 6 and time.time() < deadline:
+            time.sleep(0.05)
+        assert len(hits) >= 6
+        assert monitor.check_all_services()["overall_status"] == "healthy"
+    finally:
+        monitor.stop()
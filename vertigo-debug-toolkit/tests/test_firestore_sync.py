@@ -0,0 +1,292 @@
+"""
+Tests for the Firestore sync pipeline: batched upserts and cursor-paginated streaming.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app.models import DataSource, LiveTrace, PerformanceMetric, SyncStatus
+from app.services.firestore_sync import FirestoreSyncService, SyncResult
+
+
+class FakeDocument:
+    """Minimal stand-in for a Firestore DocumentSnapshot."""
+
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+    def get(self, field):
+        return self._data[field]
+
+
+class FakeDocumentReference:
+    def __init__(self, doc_id):
+        self.id = doc_id
+
+
+class FakeQuery:
+    """In-memory query supporting where(>=), order_by, start_after and limit."""
+
+    def __init__(self, collection, filters=(), orders=(), cursor=None, limit_count=None):
+        self._collection = collection
+        self._filters = filters
+        self._orders = orders
+        self._cursor = cursor
+        self._limit = limit_count
+
+    def _copy(self, **changes):
+        state = dict(filters=self._filters, orders=self._orders,
+                     cursor=self._cursor, limit_count=self._limit)
+        state.update(changes)
+        return FakeQuery(self._collection, **state)
+
+    def where(self, field, op, value):
+        assert op == '>='
+        return self._copy(filters=self._filters + ((field, value),))
+
+    def order_by(self, field):
+        return self._copy(orders=self._orders + (field,))
+
+    def start_after(self, values):
+        self._collection.start_after_calls.append(values)
+        return self._copy(cursor=tuple(v.id if isinstance(v, FakeDocumentReference) else v
+                                       for v in values))
+
+    def limit(self, count):
+        return self._copy(limit_count=count)
+
+    def _sort_key(self, doc):
+        return tuple(doc.id if field == '__name__' else doc.get(field) for field in self._orders)
+
+    def stream(self):
+        docs = [d for d in self._collection.docs
+                if all(d.get(field) >= value for field, value in self._filters)]
+        docs.sort(key=self._sort_key)
+        if self._cursor is not None:
+            docs = [d for d in docs if self._sort_key(d) > self._cursor]
+        if self._limit is not None:
+            docs = docs[:self._limit]
+        self._collection.reads += len(docs)
+        return iter(docs)
+
+    def get(self):
+        return list(self.stream())
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, docs):
+        self.docs = docs
+        self.reads = 0
+        self.start_after_calls = []
+        super().__init__(self)
+
+    def document(self, doc_id):
+        return FakeDocumentReference(doc_id)
+
+
+class FakeFirestoreClient:
+    def __init__(self, collections):
+        self.collections = {name: FakeCollection(docs) for name, docs in collections.items()}
+
+    def collection(self, name):
+        return self.collections.setdefault(name, FakeCollection([]))
+
+
+def make_trace_doc(i, **overrides):
+    data = {
+        'trace_id': f"trace_{i}",
+        'name': f"operation_{i}",
+        'status': 'success',
+        'model': 'gemini-1.5-pro',
+        'start_time': datetime(2025, 8, 1, 12, 0, i % 60).isoformat(),
+        'created_at': datetime(2025, 8, 1, 12, i // 60 % 60, 0),
+        'duration_ms': 100 + i,
+        'input_tokens': 10,
+        'output_tokens': 20,
+        'cost': 0.001,
+    }
+    data.update(overrides)
+    return FakeDocument(f"doc_{i:04d}", data)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    DataSource.metadata.create_all(
+        engine, tables=[DataSource.__table__, LiveTrace.__table__, SyncStatus.__table__,
+                        PerformanceMetric.__table__]
+    )
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture
+def sql_bind(session):
+    return session.get_bind()
+
+
+@pytest.fixture
+def service(session):
+    sync_service = FirestoreSyncService.__new__(FirestoreSyncService)
+    sync_service.client = None
+    sync_service.batch_size = 100
+    sync_service.streaming_sync = True
+    sync_service.max_sync_duration_seconds = None
+    sync_service.max_retries = 1
+    sync_service.retry_delay = 0
+
+    @contextmanager
+    def database_session():
+        yield session
+
+    with patch.object(sync_service, '_database_session', database_session):
+        yield sync_service
+
+
+TRACES_CONFIG = {
+    'collection_name': 'vertigo_traces',
+    'local_table': 'live_traces',
+    'timestamp_field': 'created_at',
+    'id_field': 'trace_id'
+}
+
+
+def test_batch_inserts_then_updates_in_constant_statements(service, session, sql_statements):
+    docs = [make_trace_doc(i) for i in range(100)]
+    result = service._process_document_batch(docs, TRACES_CONFIG)
+
+    assert result.records_processed == 100
+    assert result.metadata == {'inserted': 100, 'updated': 0}
+    rollup_statements = sql_statements.matching('performance_metrics', 'SAVEPOINT')
+    # data source lookup (+create), one IN query, and a few chunked upserts
+    assert len(sql_statements) - len(rollup_statements) < 10
+    # savepoint plus delete/insert per rollup period for the touched buckets
+    assert len(rollup_statements) <= 8
+    assert session.execute(text("SELECT COUNT(*) FROM live_traces")).scalar() == 100
+
+    sql_statements.clear()
+    docs = [make_trace_doc(i, status='error') for i in range(50, 150)]
+    result = service._process_document_batch(docs, TRACES_CONFIG, data_source_id=1)
+
+    assert result.metadata == {'inserted': 50, 'updated': 50}
+    rollup_statements = sql_statements.matching('performance_metrics', 'SAVEPOINT')
+    assert len(sql_statements) - len(rollup_statements) < 10
+    assert len(rollup_statements) <= 8
+    assert session.execute(
+        text("SELECT SUM(total_traces), SUM(error_count) FROM performance_metrics WHERE period_type = 'day'")
+    ).fetchone() == (150, 100)
+    assert session.execute(text("SELECT COUNT(*) FROM live_traces")).scalar() == 150
+    assert session.execute(
+        text("SELECT status FROM live_traces WHERE external_trace_id = 'trace_75'")
+    ).scalar() == 'error'
+
+
+def test_upsert_does_not_overwrite_with_nulls(service, session):
+    service._process_document_batch([make_trace_doc(1, user_id='user-1')], TRACES_CONFIG)
+    service._process_document_batch([make_trace_doc(1, name='renamed')], TRACES_CONFIG)
+
+    row = session.execute(
+        text("SELECT name, user_id, data_source_id FROM live_traces WHERE external_trace_id = 'trace_1'")
+    ).fetchone()
+    assert row[0] == 'renamed'
+    assert row[1] == 'user-1'
+    assert row[2] is not None
+
+
+def test_duplicate_ids_within_batch_collapse(service, session):
+    docs = [make_trace_doc(1, status='pending'), make_trace_doc(1, status='success')]
+    result = service._process_document_batch(docs, TRACES_CONFIG)
+
+    assert result.records_processed == 1
+    assert session.execute(text("SELECT status FROM live_traces")).scalar() == 'success'
+
+
+def test_batches_are_stored_for_the_ingest_tenant(service, session):
+    from app.services.tenant_scope import tenant_context
+
+    with tenant_context('tenant-a'):
+        service._process_document_batch([make_trace_doc(i) for i in range(3)], TRACES_CONFIG)
+
+    assert session.execute(text("SELECT DISTINCT tenant_id FROM live_traces")).scalars().all() == ['tenant-a']
+
+
+def test_sync_result_reports_throughput():
+    assert SyncResult(True, 500, duration_seconds=2.0).records_per_second == 250.0
+    assert SyncResult(True, 500).records_per_second == 0.0
+
+
+class TestStreamingSync:
+    """Cursor-paginated streaming with checkpoint/resume."""
+
+    SINCE = datetime(2025, 8, 1)
+
+    @pytest.fixture
+    def streaming_service(self, service):
+        docs = [make_trace_doc(i) for i in range(250)]
+        service.client = FakeFirestoreClient({'vertigo_traces': docs})
+        service.batch_size = 40
+        service.update_sync_status('firestore', 'running')
+        return service
+
+    def test_streams_past_legacy_window_with_bounded_pages(self, streaming_service, session):
+        page_sizes = []
+        original = streaming_service._process_document_batch
+
+        def record_page(docs, config, data_source_id=None):
+            page_sizes.append(len(docs))
+            return original(docs, config, data_source_id)
+
+        with patch.object(streaming_service, '_process_document_batch', record_page):
+            result = streaming_service._sync_collection(TRACES_CONFIG, self.SINCE)
+
+        assert result.success
+        assert result.records_processed == 250
+        assert result.metadata['completed'] is True
+        assert max(page_sizes) <= 40
+        assert session.execute(text("SELECT COUNT(*) FROM live_traces")).scalar() == 250
+        assert streaming_service._load_sync_checkpoint('firestore', 'vertigo_traces') is None
+
+    def test_resumes_from_checkpoint_after_crash(self, streaming_service, session):
+        original = streaming_service._process_document_batch
+        calls = {'count': 0}
+
+        def crash_on_third_page(docs, config, data_source_id=None):
+            calls['count'] += 1
+            if calls['count'] == 3:
+                raise RuntimeError("worker killed")
+            return original(docs, config, data_source_id)
+
+        with patch.object(streaming_service, '_process_document_batch', crash_on_third_page):
+            result = streaming_service._sync_collection(TRACES_CONFIG, self.SINCE)
+
+        assert not result.success
+        assert result.records_processed == 80
+        checkpoint = streaming_service._load_sync_checkpoint('firestore', 'vertigo_traces')
+        assert checkpoint['doc_id'] == 'doc_0079'
+
+        collection = streaming_service.client.collections['vertigo_traces']
+        collection.reads = 0
+        result = streaming_service._sync_collection(TRACES_CONFIG, datetime(2025, 8, 2))
+
+        assert result.success
+        assert result.records_processed == 170
+        assert collection.reads == 170
+        assert session.execute(text("SELECT COUNT(*) FROM live_traces")).scalar() == 250
+
+    def test_time_budget_leaves_resumable_checkpoint(self, streaming_service, session):
+        streaming_service.max_sync_duration_seconds = 1
+        with patch('app.services.firestore_sync.time.perf_counter', side_effect=[0.0] + [5.0] * 20):
+            result = streaming_service._sync_collection(TRACES_CONFIG, self.SINCE)
+
+        assert result.records_processed == 40
+        assert result.metadata['completed'] is False
+        assert streaming_service._load_sync_checkpoint('firestore', 'vertigo_traces')['doc_id'] == 'doc_0039'
@@ -0,0 +1,111 @@
+"""
+Tests for the incremental, watermark-based Langfuse trace sync against a stub API server.
+"""
+
+import pytest
+
+from langfuse_stub import StubLangfuseServer, make_generation, make_trace
+
+
+@pytest.fixture
+def stub():
+    server = StubLangfuseServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(db_session, stub, monkeypatch):
+    from app.services import langfuse_client
+
+    monkeypatch.setenv('LANGFUSE_HOST', stub.url)
+    monkeypatch.setenv('LANGFUSE_PUBLIC_KEY', 'pk-test')
+    monkeypatch.setenv('LANGFUSE_SECRET_KEY', 'sk-test')
+    monkeypatch.setattr(langfuse_client, 'SYNC_PAGE_SIZE', 10)
+    return langfuse_client.LangfuseClient()
+
+
+def test_first_sync_bulk_writes_each_page(client, stub, sql_statements):
+    from app.models import Cost, Trace
+
+    stub.traces = [make_trace(n) for n in range(25)]
+    stub.generations = [make_generation(n, f"trace-{n // 2}") for n in range(50)]
+
+    assert client.sync_traces_to_db() == 25
+    statements = [' '.join(statement.replace(',', ' ').split()[:3])
+                  for statement in sql_statements.matching('traces', 'costs')]
+
+    assert Trace.query.count() == 25
+    assert Cost.query.count() == 50
+    trace = Trace.query.filter_by(trace_id='trace-3').one()
+    assert trace.duration_ms == 1250
+    assert trace.vertigo_operation == 'summary_generation'
+    assert trace.costs.count() == 2
+    # Three trace pages and five generation pages: one IN lookup and one bulk insert per page
+    assert statements.count('SELECT traces.trace_id FROM') == 3
+    assert statements.count('SELECT traces.trace_id traces.id') == 5
+    assert statements.count('INSERT INTO traces') == 3
+    assert statements.count('INSERT INTO costs') == 5
+
+
+def test_next_sync_resumes_from_the_watermark(client, stub, db_session):
+    from app.models import Cost, Trace
+
+    stub.traces = [make_trace(n) for n in range(5)]
+    stub.generations = [make_generation(n, f"trace-{n}") for n in range(5)]
+    client.sync_traces_to_db()
+    stub.requests.clear()
+
+    # A late trace sharing the watermark timestamp, plus newer ones
+    late = make_trace(99)
+    late['timestamp'] = stub.traces[4]['timestamp']
+    stub.traces += [late] + [make_trace(n) for n in range(5, 8)]
+    stub.generations += [make_generation(n, f"trace-{n}") for n in range(5, 8)]
+
+    assert client.sync_traces_to_db() == 4
+    assert Trace.query.count() == 9
+    assert Cost.query.count() == 8
+
+    trace_request = stub.requests[0][1]
+    assert trace_request['fromTimestamp'] == stub.traces[4]['timestamp']
+    assert trace_request['orderBy'] == 'timestamp.asc'
+    generation_request = next(query for path, query in stub.requests if path == '/api/public/observations')
+    assert generation_request['orderBy'] == 'startTime.asc'
+
+    # Nothing new: no rows written, the re-read items at the watermark are skipped
+    assert client.sync_traces_to_db() == 0
+    assert Cost.query.count() == 8
+
+
+def test_limit_stops_early_and_keeps_the_rest_for_the_next_run(client, stub):
+    from app.models import Cost, Trace
+
+    stub.traces = [make_trace(n) for n in range(30)]
+    stub.generations = [make_generation(n, f"trace-{n}") for n in range(30)]
+
+    assert client.sync_traces_to_db(limit=12) == 12
+    assert Trace.query.count() == 12
+    assert Cost.query.count() == 12
+    # Generations of traces not synced yet are read again by the next run
+    assert client.sync_traces_to_db() == 18
+    assert Cost.query.count() == 30
+
+
+def test_pages_are_prefetched_concurrently(client, stub):
+    stub.latency_seconds = 0.05
+    stub.traces = [make_trace(n) for n in range(60)]
+
+    assert client.sync_traces_to_db() == 60
+    assert stub.max_in_flight > 1
+
+
+def test_synced_costs_belong_to_the_ingest_tenant(client, stub, monkeypatch):
+    from app.models import Cost
+    from app.services import tenant_scope
+
+    monkeypatch.setattr(tenant_scope, 'INGEST_TENANT_ID', 'tenant-a')
+    stub.traces = [make_trace(n) for n in range(3)]
+    stub.generations = [make_generation(n, f"trace-{n}") for n in range(3)]
+
+    client.sync_traces_to_db()
+    assert {cost.tenant_id for cost in Cost.query} == {'tenant-a'}
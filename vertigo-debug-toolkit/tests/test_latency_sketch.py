@@ -0,0 +1,70 @@
+"""
+Tests for the mergeable DDSketch latency quantiles.
+"""
+
+import math
+import random
+
+import pytest
+
+from app.services.latency_sketch import (
+    SKETCH_RELATIVE_ACCURACY,
+    LatencySketch,
+    quantile_key,
+    sketch_index,
+)
+
+
+def exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[int(math.floor(q * (len(ordered) - 1)))]
+
+
+@pytest.mark.parametrize('distribution', ['uniform', 'lognormal', 'bimodal'])
+def test_quantiles_within_relative_accuracy(distribution):
+    rng = random.Random(7)
+    values = {
+        'uniform': lambda: rng.uniform(1, 5000),
+        'lognormal': lambda: rng.lognormvariate(6, 1.2),
+        'bimodal': lambda: rng.choice([rng.gauss(80, 5), rng.gauss(2400, 300)]),
+    }[distribution]
+    samples = [max(values(), 1.0) for _ in range(20000)]
+
+    sketch = LatencySketch()
+    for value in samples:
+        sketch.add(value)
+
+    assert sketch.count == len(samples)
+    for q in (0.0, 0.5, 0.9, 0.95, 0.99, 1.0):
+        assert sketch.quantile(q) == pytest.approx(exact_quantile(samples, q), rel=SKETCH_RELATIVE_ACCURACY)
+
+
+def test_merged_sketches_equal_single_sketch():
+    rng = random.Random(1)
+    parts = [[rng.randrange(1, 10000) for _ in range(500)] for _ in range(6)]
+
+    whole = LatencySketch()
+    merged = LatencySketch()
+    for part in parts:
+        piece = LatencySketch()
+        for value in part:
+            whole.add(value)
+            piece.add(value)
+        merged.merge(LatencySketch({int(k): v for k, v in piece.to_dict().items()}))
+
+    assert merged.bins == whole.bins
+    assert merged.quantiles() == whole.quantiles()
+
+
+def test_small_and_empty_sketches():
+    assert LatencySketch().quantiles() == {'p50': None, 'p90': None, 'p95': None, 'p99': None}
+
+    sketch = LatencySketch()
+    sketch.add(0)
+    sketch.add(0.4)
+    assert sketch_index(0) == sketch_index(1) == 0
+    assert sketch.quantile(0.99) == pytest.approx(1.0, rel=SKETCH_RELATIVE_ACCURACY)
+
+
+def test_quantile_keys():
+    assert [quantile_key(q) for q in (0.5, 0.9, 0.95, 0.99, 0.999)] == ['p50', 'p90', 'p95', 'p99', 'p99.9']
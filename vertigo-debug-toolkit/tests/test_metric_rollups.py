@@ -0,0 +1,302 @@
+"""
+Tests for incremental minute/hour/day metric rollups.
+"""
+
+import json
+import math
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from app.models import DataSource, LiveTrace, PerformanceMetric
+from app.services.latency_sketch import SKETCH_RELATIVE_ACCURACY
+from app.services.metric_rollups import MetricRollupService, decompose_window
+from app.services.webhook_service import WebhookEvent, WebhookService
+
+BASE = datetime(2026, 3, 10, 0, 0)
+MODELS = ('gpt-4', 'gemini-1.5-pro', None)
+
+
+def expected_totals(traces, start, end, source_id=None):
+    selected = [t for t in traces if start <= t.start_time <= end
+                and (source_id is None or t.data_source_id == source_id)]
+    durations = [t.duration_ms for t in selected if t.duration_ms is not None]
+    return {
+        'total_traces': len(selected),
+        'success_count': sum(t.status == 'success' for t in selected),
+        'error_count': sum(t.status in ('error', 'failed') for t in selected),
+        'latency_sum_ms': float(sum(durations)),
+        'latency_count': len(durations),
+        'max_latency_ms': float(max(durations)) if durations else None,
+        'total_cost': pytest.approx(sum(float(t.cost_usd) for t in selected)),
+    }
+
+
+def expected_quantiles(traces, start, end, model=None):
+    durations = sorted(t.duration_ms for t in traces if start <= t.start_time <= end
+                       and t.duration_ms is not None and (model is None or t.model == model))
+    return {f"p{q * 100:g}": durations[int(math.floor(q * (len(durations) - 1)))]
+            for q in (0.5, 0.9, 0.95, 0.99)}
+
+
+def assert_quantiles(actual, expected):
+    assert actual.keys() == expected.keys()
+    for key, value in expected.items():
+        # Allow for the 2-decimal rounding of reported values
+        assert actual[key] == pytest.approx(value, rel=SKETCH_RELATIVE_ACCURACY, abs=0.01), key
+
+
+def assert_totals(actual, expected):
+    for name, value in expected.items():
+        assert actual[name] == value, name
+
+
+@pytest.fixture
+def sources(db_session):
+    created = [DataSource(name=name, source_type=name, connection_config={})
+               for name in ('firestore', 'langwatch')]
+    db_session.add_all(created)
+    db_session.flush()
+    return [s.id for s in created]
+
+
+@pytest.fixture
+def traces(db_session, sources):
+    rng = random.Random(3)
+    created = []
+    for i in range(600):
+        created.append(LiveTrace(
+            external_trace_id=f"trace-{i}",
+            name='op',
+            status=rng.choice(['success', 'success', 'error', 'failed', 'pending']),
+            start_time=BASE + timedelta(seconds=rng.randrange(3 * 86400), microseconds=rng.randrange(10 ** 6)),
+            duration_ms=rng.choice([None, rng.randrange(50, 5000)]),
+            cost_usd=round(rng.random() / 100, 6),
+            input_tokens=10,
+            output_tokens=20,
+            data_source_id=rng.choice(sources),
+            model=rng.choice(MODELS),
+        ))
+    db_session.add_all(created)
+    db_session.commit()
+    return created
+
+
+@pytest.fixture
+def rollups(db_session, traces):
+    service = MetricRollupService()
+    service.enabled = True
+    service.rebuild(db_session)
+    service._backfilled = True
+    return service
+
+
+def test_decompose_window_covers_every_instant_once():
+    rng = random.Random(0)
+    for _ in range(200):
+        start = BASE + timedelta(seconds=rng.randrange(5 * 86400), microseconds=rng.randrange(10 ** 6))
+        end = start + timedelta(seconds=rng.randrange(4 * 86400))
+        raw, rolled = decompose_window(start, end)
+
+        pieces = sorted([(lo, hi) for lo, hi in raw] + [(lo, hi) for _, lo, hi in rolled])
+        assert pieces[0][0] == start and pieces[-1][1] == end
+        assert all(a[1] == b[0] for a, b in zip(pieces, pieces[1:]))
+        for period, lo, hi in rolled:
+            assert lo == lo.replace(**{'minute': {}, 'hour': {'minute': 0}, 'day': {'minute': 0, 'hour': 0}}[period],
+                                    second=0, microsecond=0)
+        # At most two partial-minute edges are scanned raw
+        assert len(raw) <= 2
+        assert len(rolled) <= 5
+
+
+def test_rollups_are_built_per_period_and_source(db_session, rollups, traces):
+    day_rows = PerformanceMetric.query.filter_by(period_type='day').all()
+    assert sum(row.total_traces for row in day_rows) == len(traces)
+    assert {row.period_start for row in day_rows} == {BASE + timedelta(days=d) for d in range(3)}
+    # three days x two data sources x three models (including none)
+    assert len({(row.period_start, row.data_source_id, row.model) for row in day_rows}) == len(day_rows) == 18
+
+    hour_total = db_session.execute(
+        text("SELECT SUM(total_traces) FROM performance_metrics WHERE period_type = 'hour'")
+    ).scalar()
+    assert hour_total == len(traces)
+
+
+@pytest.mark.parametrize('offset_s, length_s', [
+    (0, 3 * 86400),
+    (37.25, 3600),
+    (3600 * 5 + 12.5, 86400 + 7),
+    (86400 - 30, 75),
+    (100, 20),
+])
+def test_window_totals_match_raw_scan(rollups, traces, sources, offset_s, length_s):
+    start = BASE + timedelta(seconds=offset_s)
+    end = start + timedelta(seconds=length_s)
+
+    assert_totals(rollups.window_totals(start, end), expected_totals(traces, start, end))
+    assert_totals(rollups.window_totals(start, end, data_source='firestore'),
+                  expected_totals(traces, start, end, sources[0]))
+
+
+def test_window_query_reads_rollups_not_raw_rows(rollups, sql_statements):
+    rollups.window_totals(BASE + timedelta(seconds=10), BASE + timedelta(days=2, seconds=10))
+
+    assert len(sql_statements) == 2
+    assert 'performance_metrics' in sql_statements[1]
+
+
+def test_refresh_tracks_inserts_and_moved_traces(db_session, rollups, traces):
+    moved = traces[0]
+    old_start = moved.start_time
+    moved.start_time = BASE + timedelta(days=5, minutes=3)
+    new = LiveTrace(external_trace_id='late', name='op', status='success',
+                    start_time=BASE + timedelta(days=1, seconds=1), duration_ms=10, cost_usd=0)
+    db_session.add(new)
+    db_session.flush()
+
+    refreshed = rollups.refresh_for_timestamps([old_start, moved.start_time, new.start_time], db_session)
+    db_session.commit()
+
+    assert refreshed == 3
+    everything = (BASE, BASE + timedelta(days=6))
+    assert_totals(rollups.window_totals(*everything), expected_totals(traces + [new], *everything))
+    assert_totals(rollups.window_totals(BASE, BASE + timedelta(days=3)),
+                  expected_totals(traces + [new], BASE, BASE + timedelta(days=3)))
+
+
+def test_missing_rollups_are_backfilled_off_the_read_path(db_session, traces):
+    service = MetricRollupService()
+    service.enabled = True
+
+    # Until the backfill has run, reads scan raw rows and never rebuild
+    assert service.window_totals(BASE, BASE + timedelta(days=3))['total_traces'] == len(traces)
+    assert PerformanceMetric.query.count() == 0
+
+    assert service.ensure_backfilled()
+    assert PerformanceMetric.query.filter_by(period_type='minute').count() > 0
+    assert service.window_totals(BASE, BASE + timedelta(days=3))['total_traces'] == len(traces)
+    assert not service.ensure_backfilled()
+
+
+def test_disabled_rollups_scan_raw_rows(db_session, traces):
+    service = MetricRollupService()
+    service.enabled = False
+
+    start, end = BASE + timedelta(hours=1), BASE + timedelta(hours=30)
+    assert_totals(service.window_totals(start, end), expected_totals(traces, start, end))
+    assert PerformanceMetric.query.count() == 0
+
+
+def test_hourly_series_matches_raw_grouping(rollups, traces):
+    start, end = BASE + timedelta(hours=2, minutes=30), BASE + timedelta(hours=7, minutes=45)
+    series = rollups.series(start, end, period='hour')
+
+    assert [b['period_start'] for b in series] == [BASE + timedelta(hours=h) for h in range(2, 8)]
+    for bucket in series:
+        hour_end = bucket['period_start'] + timedelta(hours=1)
+        in_hour = [t for t in traces if bucket['period_start'] <= t.start_time < hour_end]
+        assert bucket['total_traces'] == len(in_hour)
+        durations = [t.duration_ms for t in in_hour if t.duration_ms is not None]
+        assert bucket['avg_latency_ms'] == pytest.approx(sum(durations) / len(durations))
+        assert bucket['max_latency_ms'] == max(durations)
+        assert_quantiles({k: bucket[k] for k in ('p50', 'p90', 'p95', 'p99')},
+                         expected_quantiles(in_hour, bucket['period_start'], hour_end - timedelta(microseconds=1)))
+
+
+@pytest.mark.parametrize('offset_s, length_s', [
+    (0, 3 * 86400),
+    (37.25, 3600 * 7),
+    (3600 * 5 + 12.5, 86400 + 7),
+])
+def test_window_quantiles_match_exact_percentiles(rollups, traces, offset_s, length_s):
+    start = BASE + timedelta(seconds=offset_s)
+    end = start + timedelta(seconds=length_s)
+
+    assert_quantiles(rollups.window_quantiles(start, end), expected_quantiles(traces, start, end))
+    per_model = rollups.model_quantiles(start, end)
+    assert per_model.keys() == {'gpt-4', 'gemini-1.5-pro', 'unknown'}
+    assert_quantiles(per_model['gpt-4'], expected_quantiles(traces, start, end, model='gpt-4'))
+    assert_quantiles(rollups.window_quantiles(start, end, model='gemini-1.5-pro'),
+                     expected_quantiles(traces, start, end, model='gemini-1.5-pro'))
+
+
+def test_rollup_sketches_merge_exactly(db_session, rollups):
+    for period in ('minute', 'hour', 'day'):
+        rows = db_session.execute(text(
+            "SELECT latency_count, latency_sketch FROM performance_metrics WHERE period_type = :p"
+        ), {"p": period}).fetchall()
+        assert sum(sum(json.loads(sketch or '{}').values()) for _, sketch in rows) == \
+            sum(count for count, _ in rows)
+
+
+def test_window_quantiles_without_rollups_match(db_session, traces):
+    service = MetricRollupService()
+    service.enabled = False
+
+    start, end = BASE + timedelta(hours=3), BASE + timedelta(hours=40)
+    assert_quantiles(service.window_quantiles(start, end), expected_quantiles(traces, start, end))
+
+
+def test_raw_scans_only_read_the_current_tenants_traces(db_session, traces):
+    from app.services.tenant_scope import tenant_context
+
+    db_session.add(LiveTrace(external_trace_id='acme-1', name='op', status='error', tenant_id='acme',
+                             start_time=BASE + timedelta(hours=2), duration_ms=900, cost_usd=0.25))
+    db_session.commit()
+    service = MetricRollupService()
+    service.enabled = False
+
+    start, end = BASE, BASE + timedelta(days=3)
+    with tenant_context('acme'):
+        totals = service.window_totals(start, end)
+        series = service.series(start, end, period='day')
+        quantiles = service.window_quantiles(start, end)
+
+    assert (totals['total_traces'], totals['error_count'], totals['total_cost']) == (1, 1, 0.25)
+    assert [bucket['total_traces'] for bucket in series] == [1]
+    assert quantiles['p50'] == pytest.approx(900, rel=SKETCH_RELATIVE_ACCURACY)
+    assert service.window_totals(start, end)['total_traces'] == len(traces) + 1
+
+
+def test_tenant_reads_bypass_all_tenant_rollups(db_session, rollups, traces):
+    from app.services.tenant_scope import tenant_context
+
+    db_session.add(LiveTrace(external_trace_id='acme-1', name='op', status='success', tenant_id='acme',
+                             start_time=BASE + timedelta(hours=2), duration_ms=900, cost_usd=0.25))
+    db_session.commit()
+    rollups.rebuild(db_session)
+
+    start, end = BASE + timedelta(seconds=10), BASE + timedelta(days=2, seconds=10)
+    with tenant_context('acme'):
+        assert rollups.window_totals(start, end)['total_traces'] == 1
+        assert [bucket['total_traces'] for bucket in rollups.series(start, end, period='day')] == [1]
+    assert rollups.window_totals(start, end)['total_traces'] == \
+        expected_totals(traces, start, end)['total_traces'] + 1
+
+
+def test_webhook_ingest_updates_rollups(db_session, monkeypatch):
+    from app.services import metric_rollups
+
+    service = MetricRollupService()
+    service.enabled = True
+    monkeypatch.setattr('app.services.webhook_service.metric_rollup_service', service)
+
+    webhook = WebhookService()
+    payload = {'trace': {'name': 'op', 'status': 'completed', 'startTime': '2026-03-10T10:15:30Z',
+                         'duration': 250, 'cost': 0.5}}
+    assert webhook.process_trace_event(WebhookEvent('trace.created', 'wh-1', datetime.utcnow(), payload))
+
+    hour = PerformanceMetric.query.filter_by(period_type='hour').one()
+    assert hour.period_start == datetime(2026, 3, 10, 10)
+    assert (hour.total_traces, hour.success_count, hour.latency_count) == (1, 1, 1)
+
+    payload['trace']['startTime'] = '2026-03-11T09:00:00Z'
+    payload['trace']['status'] = 'failed'
+    assert webhook.process_trace_event(WebhookEvent('trace.updated', 'wh-1', datetime.utcnow(), payload))
+
+    rows = PerformanceMetric.query.filter_by(period_type='day').all()
+    assert [(r.period_start, r.total_traces, r.error_count) for r in rows] == [(datetime(2026, 3, 11), 1, 1)]
+    assert service.window_totals(datetime(2026, 3, 10), datetime(2026, 3, 12))['total_traces'] == 1
+    assert metric_rollups.metric_rollup_service is not service
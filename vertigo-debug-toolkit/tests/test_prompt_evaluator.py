@@ -0,0 +1,118 @@
+"""
+Tests for set-based prompt evaluation reports.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services import prompt_evaluator
+from app.services.cache_service import default_cache_service
+from app.services.prompt_evaluator import PromptEvaluator
+
+
+@pytest.fixture
+def evaluator(db_session):
+    default_cache_service.clear()
+    yield PromptEvaluator()
+    default_cache_service.clear()
+
+
+@pytest.fixture
+def prompts(db_session):
+    """Three prompts; each has two traces (one failed) whose first trace has two cost rows."""
+    from app.models import Cost, Prompt, Trace, User
+
+    user = User(username='reports', email='reports@example.com', password_hash='x')
+    db_session.add(user)
+    db_session.flush()
+
+    now = datetime.utcnow()
+    prompts = []
+    for n in range(3):
+        prompt = Prompt(name=f"prompt-{n}", version='1.0', content='...', prompt_type='summary',
+                        creator_id=user.id)
+        db_session.add(prompt)
+        db_session.flush()
+        for status, duration in (('success', 2000), ('error', 4000)):
+            trace = Trace(trace_id=f"p{prompt.id}-{status}", name='call', status=status, duration_ms=duration,
+                          start_time=now - timedelta(hours=1), prompt_id=prompt.id)
+            db_session.add(trace)
+            db_session.flush()
+            if status == 'success':
+                db_session.add_all([
+                    Cost(trace_id=trace.id, model='gemini', total_tokens=100, cost_usd=1.5, timestamp=now),
+                    Cost(trace_id=trace.id, model='gemini', total_tokens=300, cost_usd=0.5, timestamp=now),
+                ])
+        prompts.append(prompt)
+    db_session.commit()
+    return prompts
+
+
+def test_trace_with_several_cost_rows_is_counted_once(evaluator, prompts):
+    metrics = evaluator.get_prompt_performance(prompts[0].id)
+
+    assert metrics.total_calls == 2
+    assert metrics.error_count == 1
+    assert metrics.success_rate == 50.0
+    assert metrics.avg_response_time == 3.0
+    assert metrics.total_cost == pytest.approx(2.0)
+    assert metrics.avg_tokens_used == 200
+
+
+def test_report_uses_one_query_per_page(evaluator, prompts, monkeypatch, sql_statements):
+    monkeypatch.setattr(prompt_evaluator, 'REPORT_PAGE_SIZE', 2)
+    prompt_ids = [p.id for p in prompts] + [999]
+    sql_statements.clear()
+
+    report = evaluator.generate_evaluation_report(prompt_ids, days=30)
+    again = evaluator.generate_evaluation_report(prompt_ids, days=30)
+
+    # Two pages of ids, one grouped query each; the repeat is served from the cache
+    assert len(sql_statements) == 2
+    assert again == {**report, 'generated_at': again['generated_at']}
+    assert report['prompts_analyzed'] == 3
+    assert report['total_traces'] == 6
+    assert report['total_cost'] == pytest.approx(6.0)
+    assert report['avg_success_rate'] == 50.0
+    assert report['performance_summary']['needs_improvement'] == 3
+    assert [d['name'] for d in report['prompt_details']] == ['prompt-0', 'prompt-1', 'prompt-2']
+    assert any(r.startswith('Low Success Rate') for r in report['recommendations'])
+
+
+def test_stream_yields_prompt_records_then_summary(evaluator, prompts, monkeypatch):
+    monkeypatch.setattr(prompt_evaluator, 'REPORT_PAGE_SIZE', 1)
+
+    records = list(evaluator.stream_evaluation_report([p.id for p in prompts], days=30))
+
+    assert [r['prompt']['id'] for r in records[:-1]] == [p.id for p in prompts]
+    summary = records[-1]['summary']
+    assert summary['prompts_analyzed'] == 3
+    assert 'prompt_details' not in summary
+    assert summary['top_performing_prompt']['id'] == prompts[0].id
+
+
+def test_version_history_reads_all_versions_at_once(evaluator, prompts, db_session):
+    from app.models import Prompt
+
+    db_session.add(Prompt(name='prompt-0', version='2.0', content='...', prompt_type='summary',
+                          creator_id=prompts[0].creator_id))
+    db_session.commit()
+
+    history = evaluator.get_prompt_version_history('prompt-0')
+
+    assert [h['version'] for h in history] == ['2.0', '1.0']
+    assert history[1]['performance']['total_calls'] == 2
+    assert history[0]['performance']['total_calls'] == 0
+
+
+def test_cached_metrics_are_kept_per_tenant(evaluator, prompts):
+    from app.services.tenant_scope import tenant_context
+
+    unscoped = evaluator.get_prompt_metrics_page([prompts[0].id])
+    with tenant_context('other-tenant'):
+        scoped = evaluator.get_prompt_metrics_page([prompts[0].id])
+
+    # The fixture's cost rows have no tenant, so the tenant's page must not reuse the cached totals
+    assert unscoped[0]['total_cost'] == pytest.approx(2.0)
+    assert scoped[0]['total_cost'] == 0.0
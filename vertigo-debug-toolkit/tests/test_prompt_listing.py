@@ -0,0 +1,76 @@
+"""
+Tests for the paginated prompt listing API.
+"""
+
+from datetime import datetime
+
+import pytest
+
+URL = '/prompts/api/prompts/list'
+HEADERS = {'User-Agent': 'pytest'}
+
+
+@pytest.fixture
+def catalog(db_session):
+    """Five prompts; prompt n has n traces, the first of which failed."""
+    from app.models import Prompt, Trace, User
+
+    user = User(username='catalog', email='catalog@example.com', password_hash='x')
+    db_session.add(user)
+    db_session.flush()
+
+    prompts = []
+    for n in range(5):
+        prompt = Prompt(name=f"prompt-{n}", version='1.0', content='...', prompt_type='summary',
+                        tags=['t'], creator_id=user.id)
+        db_session.add(prompt)
+        db_session.flush()
+        db_session.add_all([
+            Trace(trace_id=f"p{prompt.id}-{i}", name='call', status='error' if i == 0 else 'success',
+                  start_time=datetime.utcnow(), prompt_id=prompt.id)
+            for i in range(n)
+        ])
+        prompts.append(prompt)
+    db_session.commit()
+    return prompts
+
+
+def test_pages_follow_the_cursor_with_one_query_each(app, catalog, sql_statements):
+    client = app.test_client()
+    items, cursor = [], 0
+    while cursor is not None:
+        sql_statements.clear()
+        body = client.get(URL, query_string={'limit': 2, 'after': cursor}, headers=HEADERS).get_json()
+        assert len(sql_statements.matching('prompts')) == 1
+        items += body['data']
+        cursor = body['next_cursor']
+
+    assert [item['name'] for item in items] == [f"prompt-{n}" for n in range(5)]
+    assert [item['metrics']['total_uses'] for item in items] == [0, 1, 2, 3, 4]
+    assert items[0]['metrics'] == {'total_uses': 0, 'success_rate': 0, 'success_count': 0}
+    assert items[4]['metrics'] == {'total_uses': 4, 'success_rate': 75.0, 'success_count': 3}
+
+
+def test_field_selection_skips_the_usage_aggregate(app, catalog, sql_statements):
+    response = app.test_client().get(URL, query_string={'fields': 'id,name'}, headers=HEADERS)
+
+    assert response.get_json()['data'][0] == {'id': catalog[0].id, 'name': 'prompt-0'}
+    assert not sql_statements.matching('traces')
+    assert app.test_client().get(URL, query_string={'fields': 'secret'}, headers=HEADERS).status_code == 400
+
+
+def test_unchanged_listing_answers_304(app, db_session, catalog):
+    from app.models import Trace
+
+    client = app.test_client()
+    response = client.get(URL, headers=HEADERS)
+    etag = response.headers['ETag']
+
+    cached = client.get(URL, headers={**HEADERS, 'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+
+    db_session.add(Trace(trace_id='late', name='call', status='success', start_time=datetime.utcnow(),
+                         prompt_id=catalog[0].id))
+    db_session.commit()
+    assert client.get(URL, headers={**HEADERS, 'If-None-Match': etag}).status_code == 200
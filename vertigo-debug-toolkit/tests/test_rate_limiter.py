@@ -0,0 +1,180 @@
+"""
+Tests for GCRA rate limiting in RateLimiterService.
+"""
+
+import time
+
+import pytest
+
+from app.services.rate_limit_gcra import gcra_lease, gcra_used, rule_spec
+from app.services.rate_limiter import FallbackMemoryStorage, RateLimitRule, RateLimiterService, \
+    RateLimitStrategy, RateLimitTier
+
+NOW_MS = 1_800_000_000_000.0
+
+
+def test_gcra_allows_limit_then_spaces_requests():
+    spec = rule_spec(10, 60)  # one request every 6s, burst of 10
+    tat = None
+    for i in range(10):
+        granted, (tat,), [(remaining, _, _)] = gcra_lease([tat], [spec], NOW_MS)
+        assert granted == 1 and remaining == 9 - i
+
+    granted, new_tats, [(remaining, reset_ms, retry_ms)] = gcra_lease([tat], [spec], NOW_MS)
+    assert granted == 0 and new_tats == [None]
+    assert (remaining, reset_ms, retry_ms) == (0, 60_000, 6_000)
+    assert gcra_used(tat, spec, NOW_MS) == 10
+
+    # One emission interval later exactly one more request fits
+    assert gcra_lease([tat], [spec], NOW_MS + 6_000)[0] == 1
+    assert gcra_used(tat, spec, NOW_MS + 6_000) == 9
+
+
+def test_gcra_rejection_consumes_no_rule():
+    loose, tight = rule_spec(100, 3600), rule_spec(1, 60)
+    granted, tats, _ = gcra_lease([None, None], [loose, tight], NOW_MS)
+    assert granted == 1
+
+    granted, new_tats, decisions = gcra_lease(tats, [loose, tight], NOW_MS)
+    assert granted == 0 and new_tats == [None, None]
+    assert decisions[0][2] == 0 and decisions[1][2] == 60_000
+
+
+@pytest.fixture
+def limiter():
+    service = RateLimiterService()
+    service._redis_client = FallbackMemoryStorage()
+    return service
+
+
+def test_anonymous_requests_limited_by_tightest_rule(app, limiter):
+    with app.test_request_context('/api/traces', environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+        results = [limiter.check_rate_limit('/api/traces') for _ in range(6)]
+
+    # Free per-IP rule: 5 per minute
+    assert [r.allowed for r in results] == [True] * 5 + [False]
+    assert results[0].limit == 5 and results[0].remaining == 4
+    assert results[-1].retry_after == 12
+    # The rejected request was not counted against the hourly rules
+    keys = limiter.redis_client.keys('rate_limit:*:3600:*')
+    now_ms = time.time() * 1000
+    assert sorted(gcra_used(limiter.redis_client.get(k), rule_spec(int(k.rsplit(":", 1)[1]), 3600), now_ms)
+                  for k in keys) == [5, 5]
+
+    with app.test_request_context('/api/traces', environ_base={'REMOTE_ADDR': '10.0.0.2'}):
+        assert limiter.check_rate_limit('/api/traces').allowed
+
+
+def test_rule_table_matches_endpoints_and_bypass(app, limiter):
+    rules = limiter._get_applicable_rules(RateLimitTier.FREE, '/auth/login')
+    assert [r.limit for r in rules if r.strategy == RateLimitStrategy.PER_ENDPOINT] == [5]
+    assert not [r for r in limiter._get_applicable_rules(RateLimitTier.FREE, '/api/traces')
+                if r.strategy == RateLimitStrategy.PER_ENDPOINT]
+
+    with app.test_request_context('/static/app.js'):
+        for _ in range(20):
+            assert limiter.check_rate_limit().limit == 999999
+    assert limiter.redis_client.keys('rate_limit:*') == []
+
+
+class ScriptStub:
+    """Stands in for a registered Redis script, evaluating GCRA in Python."""
+
+    def __init__(self):
+        self.calls = []
+        self.tats = {}
+
+    def __call__(self, keys, args, client=None):
+        self.calls.append(keys)
+        specs = [(args[i], args[i + 1]) for i in range(3, len(args), 2)]
+        now_ms = time.time() * 1000
+        granted, new_tats, decisions = gcra_lease([self.tats.get(k) for k in keys], specs, now_ms, *args[:3])
+        self.tats.update((k, tat) for k, tat in zip(keys, new_tats) if tat is not None)
+        return [granted] + [value for decision in decisions for value in decision]
+
+
+def test_redis_checks_all_rules_in_one_script_call(app):
+    limiter = RateLimiterService()
+    limiter._redis_client = object()
+    limiter._gcra_script = ScriptStub()
+    limiter.add_custom_rule('/api/sync', RateLimitRule(3, 60, RateLimitStrategy.GLOBAL, RateLimitTier.FREE))
+
+    with app.test_request_context('/api/sync'):
+        results = [limiter.check_rate_limit('/api/sync') for _ in range(4)]
+
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert results[0].remaining == 2 and results[0].limit == 3
+    # Per-user, per-IP, endpoint and custom rules: 6 keys, one call per request
+    assert [len(keys) for keys in limiter._gcra_script.calls] == [6] * 4
+
+
+def test_lease_grants_a_fraction_of_the_tightest_remaining_quota():
+    specs = [rule_spec(1000, 3600), rule_spec(200, 60)]
+    granted, tats, decisions = gcra_lease([None, None], specs, NOW_MS, max_tokens=50, fraction=0.1)
+    assert granted == 20
+    assert [remaining for remaining, _, _ in decisions] == [980, 180]
+
+    # Refunding the unused tokens of the lease restores the quota
+    granted, tats, decisions = gcra_lease(tats, specs, NOW_MS, max_tokens=1, refund=19)
+    assert granted == 1 and [remaining for remaining, _, _ in decisions] == [998, 198]
+
+    # Near the limit leases shrink to single tokens
+    nearly_spent = [NOW_MS + 197 * specs[1][0]] * 2
+    assert gcra_lease(nearly_spent, [specs[1]] * 2, NOW_MS, max_tokens=50, fraction=0.1)[0] == 1
+
+
+def test_leased_mode_decides_locally_within_the_limit(app):
+    limiter = RateLimiterService()
+    limiter.mode = 'leased'
+    limiter._redis_client = object()
+    limiter._gcra_script = ScriptStub()
+    limiter.default_rules = {
+        (RateLimitTier.FREE, RateLimitStrategy.PER_IP): [
+            RateLimitRule(1000, 3600, RateLimitStrategy.PER_IP, RateLimitTier.FREE),
+        ]
+    }
+    limiter._compile_rules()
+
+    with app.test_request_context('/api/traces'):
+        results = [limiter.check_rate_limit('/api/traces') for _ in range(1100)]
+
+    # Never more than the limit, and Redis calls track quota use, not requests
+    assert sum(r.allowed for r in results) == 1000
+    assert [r.remaining for r in results[:3]] == [999, 998, 997]
+    stats = limiter.lease_stats
+    assert stats['redis_calls'] < 80
+    assert stats['local_decisions'] + stats['redis_calls'] == 1100
+
+    # An expired lease hands its unused tokens back on the next call
+    limiter._gcra_script = ScriptStub()
+    limiter._leases.clear()
+    with app.test_request_context('/api/traces', environ_base={'REMOTE_ADDR': '10.0.0.9'}):
+        limiter.check_rate_limit('/api/traces')
+        next(iter(limiter._leases.values())).expires_at = 0
+        assert limiter.check_rate_limit('/api/traces').remaining == 998
+    assert limiter.lease_stats['tokens_refunded'] == 49
+
+
+def test_cached_rejections_always_carry_a_retry_after(app):
+    limiter = RateLimiterService()
+    limiter.mode = 'leased'
+    limiter._redis_client = object()
+    limiter._gcra_script = ScriptStub()
+    limiter.default_rules = {
+        (RateLimitTier.FREE, RateLimitStrategy.PER_IP): [
+            RateLimitRule(2, 60, RateLimitStrategy.PER_IP, RateLimitTier.FREE),
+        ]
+    }
+    limiter._compile_rules()
+
+    with app.test_request_context('/api/traces'):
+        results = [limiter.check_rate_limit('/api/traces') for _ in range(4)]
+        assert [r.allowed for r in results] == [True, True, False, False]
+        assert all(r.retry_after >= 1 for r in results[2:])
+
+        # The cached rejection outlives its recorded retry-after: still a rejection, never None
+        lease = next(iter(limiter._leases.values()))
+        lease.decisions = [(remaining, reset_at, time.monotonic() * 1000 - 5)
+                           for remaining, reset_at, _ in lease.decisions]
+        result = limiter.check_rate_limit('/api/traces')
+    assert not result.allowed and result.retry_after == 1
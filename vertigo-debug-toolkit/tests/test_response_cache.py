@@ -0,0 +1,108 @@
+"""
+Tests for the conditional-GET response cache.
+"""
+
+import gzip
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from flask import g, jsonify
+
+from app.services.cache_service import (
+    TRACES_VERSION, CacheConfig, CacheLevel, CacheService, cached_response, default_cache_service
+)
+
+
+@pytest.fixture
+def cache():
+    return CacheService(CacheConfig(level=CacheLevel.MEMORY, background_refresh=False))
+
+
+@pytest.fixture
+def view(cache):
+    calls = []
+
+    @cached_response(cache_service=cache)
+    def metrics():
+        calls.append(1)
+        return jsonify({'total_traces': len(calls), 'series': ['point'] * 200})
+
+    return metrics, calls
+
+
+def get(app, view, query='', **headers):
+    with app.test_request_context(f"/performance/api/metrics{query}", headers=headers):
+        return view()
+
+
+def test_unchanged_data_is_served_from_the_cache_and_answers_304(app, view):
+    metrics, calls = view
+    first = get(app, metrics, '?hours=24&source=all')
+    assert first.headers['X-Response-Cache'] == 'MISS'
+
+    # Query args are normalized, so a reordered URL is the same entry
+    again = get(app, metrics, '?source=all&hours=24')
+    assert again.headers['X-Response-Cache'] == 'HIT'
+    assert again.get_data() == first.get_data()
+    assert calls == [1]
+
+    etag = first.headers['ETag']
+    unchanged = get(app, metrics, '?hours=24&source=all', **{'If-None-Match': etag})
+    assert unchanged.status_code == 304
+    assert unchanged.get_data() == b''
+
+    compressed = get(app, metrics, '?hours=24&source=all', **{'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.get_data()) == first.get_data()
+
+
+def test_bumping_the_data_version_or_switching_tenant_recomputes(app, cache, view):
+    metrics, calls = view
+    etag = get(app, metrics).headers['ETag']
+
+    cache.bump_version(TRACES_VERSION)
+    response = get(app, metrics, **{'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['total_traces'] == 2
+
+    with app.test_request_context('/performance/api/metrics'):
+        g.current_tenant = SimpleNamespace(id='tenant-a')
+        assert metrics().get_json()['total_traces'] == 3
+
+
+def test_tenant_context_override_has_its_own_entry(app, view):
+    from app.services.tenant_scope import tenant_context
+
+    metrics, calls = view
+    with app.test_request_context('/performance/api/metrics'):
+        g.current_tenant = SimpleNamespace(id='tenant-a')
+        assert metrics().get_json()['total_traces'] == 1
+        # Queries inside the block are scoped to tenant-b, so its response must not reuse tenant-a's
+        with tenant_context('tenant-b'):
+            assert metrics().get_json()['total_traces'] == 2
+            assert metrics().headers['X-Response-Cache'] == 'HIT'
+        assert metrics().get_json()['total_traces'] == 1
+
+
+def test_errors_are_not_cached(app, cache):
+    calls = []
+
+    @cached_response(cache_service=cache)
+    def failing():
+        calls.append(1)
+        return jsonify({'error': 'unavailable'}), 500
+
+    assert get(app, failing).status_code == 500
+    assert get(app, failing).status_code == 500
+    assert len(calls) == 2
+
+
+def test_trace_ingest_bumps_the_traces_version(db_session, webhook_service):
+    before = default_cache_service.get_version(TRACES_VERSION)
+    webhook_service.process_webhook_payload({
+        'type': 'trace.created', 'id': 'evt-1', 'timestamp': datetime.utcnow().isoformat(),
+        'data': {'trace': {'id': 'trace-1', 'name': 'call', 'status': 'completed',
+                           'startTime': datetime.utcnow().isoformat()}}
+    })
+    assert default_cache_service.get_version(TRACES_VERSION) == before + 1
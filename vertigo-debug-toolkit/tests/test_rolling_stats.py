@@ -0,0 +1,97 @@
+"""
+Tests for the ring-buffer rolling statistics used by anomaly detection.
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+from app.services.rolling_stats import RollingMetricStore, RollingSeries
+
+
+def test_window_moments_match_numpy_after_wraparound():
+    rng = random.Random(5)
+    series = RollingSeries(capacity=100)
+    values = [rng.gauss(1e6, 50) for _ in range(1234)]
+
+    for i, value in enumerate(values):
+        series.append(value, timestamp=i)
+        window = np.array(values[max(0, i - 99):i + 1])
+        if i % 97 == 0 or i == len(values) - 1:
+            assert series.mean == pytest.approx(window.mean(), rel=1e-12)
+            if len(window) > 1:
+                assert series.variance == pytest.approx(window.var(ddof=1), rel=1e-6)
+
+    assert len(series) == 100
+    assert series.window_values().tolist() == values[-100:]
+    assert series.tail(3).tolist() == values[-3:]
+    assert series.tail_timestamps(3).tolist() == [1231, 1232, 1233]
+    assert series.last() == values[-1]
+
+
+def test_ewma_tracks_level_shift():
+    series = RollingSeries(capacity=50, ewma_alpha=0.2)
+    for _ in range(50):
+        series.append(10.0)
+    for _ in range(50):
+        series.append(20.0)
+
+    assert series.ewma_mean == pytest.approx(20.0, abs=1e-3)
+    assert series.mean == pytest.approx(20.0)
+
+
+def test_streaming_median_and_mad_are_robust_to_outliers():
+    rng = random.Random(11)
+    series = RollingSeries(capacity=500)
+    for _ in range(5000):
+        value = rng.gauss(100, 10) if rng.random() > 0.05 else 1e6
+        series.append(value)
+
+    # MAD of a normal distribution is ~0.674 sigma
+    assert series.median == pytest.approx(100, abs=3)
+    assert series.mad == pytest.approx(6.74, rel=0.25)
+    assert series.robust_z(160) > 5
+    assert series.std > 1000  # the outliers swamp the plain standard deviation
+
+
+def test_store_aligns_metrics_and_reports_sizes():
+    store = RollingMetricStore(capacity=4)
+    for i in range(6):
+        store.append('total_cost', i * 0.5, timestamp=i)
+        store.append('total_traces', i, timestamp=i)
+    store.append('error_rate', 1.0)
+
+    cost, traces = store.aligned_tail('total_cost', 'total_traces', 10)
+    assert cost.tolist() == [1.0, 1.5, 2.0, 2.5]
+    assert traces.tolist() == [2, 3, 4, 5]
+    assert store.sizes() == {'total_cost': 4, 'total_traces': 4, 'error_rate': 1}
+    assert store.size('missing') == 0
+
+
+def test_engine_detectors_read_rolling_store(app):
+    from app.services.anomaly_monitoring_engine import (
+        AnomalyMonitoringEngine,
+        AnomalyType,
+        MonitoringConfig,
+    )
+
+    engine = AnomalyMonitoringEngine(MonitoringConfig(history_size=200))
+    rng = random.Random(2)
+    for i in range(300):
+        engine._record_metrics({'avg_latency_ms': rng.gauss(500, 20), 'total_cost': 1.0,
+                                'total_traces': 100, 'error_rate': 1.0}, timestamp=i)
+
+    current = {'avg_latency_ms': 900.0, 'total_cost': 5.0, 'total_traces': 100, 'error_rate': 1.0}
+    correlation = engine._detect_correlation_anomalies(current)
+    assert [a.metric_name for a in correlation] == ['cost_per_trace']
+    assert correlation[0].anomaly_type == AnomalyType.CORRELATION
+    assert correlation[0].expected_value == pytest.approx(0.01)
+
+    engine._record_metrics(current, timestamp=300)
+
+    statistical = {a.metric_name: a for a in engine._detect_statistical_anomalies(current)}
+    assert statistical.keys() == {'avg_latency_ms', 'total_cost'}
+    assert statistical['avg_latency_ms'].context_data['sample_size'] == 200
+    assert statistical['avg_latency_ms'].context_data['robust_z'] > 10
+    assert engine.get_status()['metric_history_size']['avg_latency_ms'] == 200
@@ -0,0 +1,97 @@
+"""
+Tests for single-pass JSON sanitization in the security middleware.
+"""
+
+import json
+import re
+
+import bleach
+import pytest
+from flask import g
+
+from app.middleware.security_middleware import (
+    LazySanitizedJSON, RequestValidator, SecurityConfig, security_middleware
+)
+
+SAMPLES = [
+    'plain trace name',
+    'summary_generation',
+    'a > b && c < d',
+    'Tom & Jerry',
+    'line one\r\nline two',
+    'bell\x07 and nul\x00',
+    '<b>bold</b> text',
+    '<script>alert(1)</script>after',
+    'click javascript:alert(1)',
+    'VBScript:msgbox and eval (x) then setTimeout(f)',
+    'javajavascript:script:alert(1)',
+    'document.write(window.location)',
+    'el.innerHTML = "<img src=x onerror=alert(1)>"',
+    'data:text/html;base64,xyz',
+    'setInterval (tick, 10); new Function("x")',
+    'ŝ <ſcript>x</ſcript>',
+    'unicode ✓ café',
+    'x' * 12000,
+]
+
+
+def legacy_sanitize(value):
+    """Previous sanitize_string: each pattern in turn, then bleach on every string."""
+    for pattern in SecurityConfig.DANGEROUS_PATTERNS:
+        regex = re.compile(pattern, re.IGNORECASE | re.DOTALL)
+        if regex.search(value):
+            value = regex.sub('', value)
+    value = bleach.clean(value, tags=[], attributes={}, strip=True)
+    return value[:SecurityConfig.MAX_FIELD_LENGTH]
+
+
+@pytest.mark.parametrize('value', SAMPLES)
+def test_sanitize_string_matches_previous_output(value):
+    validator = RequestValidator()
+    expected = legacy_sanitize(value)
+    # The combined pattern is re-applied until clean, so nested payloads cannot reassemble
+    if value.startswith('javajavascript'):
+        expected = validator.dangerous_regex.sub('', expected)
+    assert validator.sanitize_string(value) == expected
+
+
+def test_clean_strings_are_returned_without_copying():
+    validator = RequestValidator()
+    value = 'a perfectly ordinary span name'
+    assert validator.sanitize_string(value) is value
+
+
+def test_json_is_walked_iteratively_with_early_limits():
+    validator = RequestValidator()
+    data = {'b<i>': [1, 2.5, True, None, {'name': '<b>x</b>'}], 'a': {'nested': ['javascript:y']}}
+
+    valid, clean = validator.validate_json_data(data)
+    assert valid
+    assert clean == {'b': [1, 2.5, True, None, {'name': 'x'}], 'a': {'nested': ['y']}}
+    assert list(clean) == ['b', 'a']
+
+    deep = current = {}
+    for _ in range(SecurityConfig.MAX_JSON_DEPTH + 1):
+        current['child'] = {}
+        current = current['child']
+    assert validator.validate_json_data(deep) == (False, None)
+    assert validator.validate_json_data({'items': list(range(51))}) == (False, None)
+    assert validator.validate_json_data({str(i): 'x' for i in range(51)}) == (False, None)
+
+
+def test_lazy_views_sanitize_fields_on_access(app):
+    body = {'trace': {'name': '<b>span</b>'}, 'oversized': list(range(100))}
+
+    with app.test_request_context('/api/webhooks/langwatch', method='POST', data=json.dumps(body),
+                                  content_type='application/json', headers={'User-Agent': 'pytest'}):
+        assert security_middleware.before_request() is None
+        assert isinstance(g.sanitized_json, LazySanitizedJSON)
+        assert g.sanitized_json['trace'] == {'name': 'span'}
+        # Only fields that are read are validated
+        with pytest.raises(ValueError):
+            g.sanitized_json['oversized']
+
+    with app.test_request_context('/dashboard/api/evaluation/report', method='POST', data=json.dumps(body),
+                                  content_type='application/json', headers={'User-Agent': 'pytest'}):
+        response = security_middleware.before_request()
+        assert response[1] == 400
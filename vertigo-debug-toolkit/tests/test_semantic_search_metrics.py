@@ -0,0 +1,104 @@
+"""
+Tests for batched, TTL-cached prompt performance metrics in semantic search.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import Cost, Prompt, Trace, User
+from app.services.cache_service import MemoryCache
+from app.services.semantic_search import SemanticPromptSearch
+
+
+@pytest.fixture
+def search_service():
+    service = SemanticPromptSearch.__new__(SemanticPromptSearch)
+    service._metrics_cache = MemoryCache(max_items=SemanticPromptSearch.METRICS_CACHE_ITEMS)
+    return service
+
+
+@pytest.fixture
+def prompts(db_session):
+    user = User(username='metrics', email='metrics@example.com', password_hash='x')
+    db_session.add(user)
+    db_session.flush()
+
+    created = []
+    now = datetime.utcnow()
+    for p in range(3):
+        prompt = Prompt(name=f"prompt {p}", version='1', content='content',
+                        prompt_type='summary', creator_id=user.id)
+        db_session.add(prompt)
+        db_session.flush()
+        for t in range(4):
+            trace = Trace(trace_id=f"t-{p}-{t}", name='op', prompt_id=prompt.id,
+                          status='success' if t < 3 else 'error',
+                          start_time=now - timedelta(hours=t), duration_ms=1000 * (t + 1))
+            db_session.add(trace)
+            db_session.flush()
+            # Two cost rows per trace must not double-count traces
+            db_session.add(Cost(trace_id=trace.id, model='gemini', cost_usd=0.01))
+            db_session.add(Cost(trace_id=trace.id, model='gemini', cost_usd=0.02))
+        created.append(prompt)
+    db_session.commit()
+    return created
+
+
+@pytest.fixture
+def prompt_ids(prompts):
+    return [p.id for p in prompts]
+
+
+def test_metrics_for_many_prompts_in_one_query(search_service, prompt_ids, sql_statements):
+    ids = prompt_ids
+
+    metrics = search_service._get_prompts_performance_metrics(ids + [9999])
+
+    assert len(sql_statements) == 1
+    assert metrics[ids[0]]['usage_count'] == 4
+    assert metrics[ids[0]]['success_rate'] == 75.0
+    assert metrics[ids[0]]['avg_response_time'] == 2.5
+    assert metrics[ids[0]]['total_cost'] == pytest.approx(0.12)
+    assert metrics[9999]['usage_count'] == 0
+
+
+def test_metrics_are_served_from_ttl_cache(search_service, prompt_ids, sql_statements):
+    ids = prompt_ids
+
+    search_service._get_prompts_performance_metrics(ids[:2])
+    search_service._get_prompts_performance_metrics(ids)
+    assert len(sql_statements) == 2  # second call only fetched the third prompt
+
+    search_service._get_prompt_performance_metrics(ids[1])
+    assert len(sql_statements) == 2
+
+    for entry in search_service._metrics_cache.cache.values():
+        entry.expires_at = 0
+    search_service._get_prompts_performance_metrics(ids)
+    assert len(sql_statements) == 3
+
+
+def test_metrics_cache_is_bounded(search_service, prompt_ids):
+    search_service._metrics_cache = MemoryCache(max_items=2)
+    search_service._get_prompts_performance_metrics(prompt_ids)
+    assert len(search_service._metrics_cache.cache) == 2
+
+
+def test_cached_metrics_are_kept_per_tenant(search_service, prompt_ids):
+    from app.services.tenant_scope import tenant_context
+
+    unscoped = search_service._get_prompts_performance_metrics(prompt_ids[:1])
+    with tenant_context('other-tenant'):
+        scoped = search_service._get_prompts_performance_metrics(prompt_ids[:1])
+
+    # The fixture's cost rows have no tenant, so the tenant must not see the cached totals
+    assert unscoped[prompt_ids[0]]['total_cost'] == pytest.approx(0.12)
+    assert scoped[prompt_ids[0]]['total_cost'] == 0.0
+
+
+def test_cost_subquery_only_reads_candidate_traces(search_service, prompt_ids, sql_statements):
+    search_service._get_prompts_performance_metrics(prompt_ids[:1])
+
+    cost_subquery = sql_statements[0].split('FROM costs', 1)[1].split('GROUP BY', 1)[0]
+    assert 'traces.prompt_id IN' in cost_subquery
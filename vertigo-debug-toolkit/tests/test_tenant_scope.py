@@ -0,0 +1,203 @@
+"""
+Tests for bound-parameter tenant scoping of SQL statements.
+"""
+
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from flask import g
+from sqlalchemy import delete, select, text
+from sqlalchemy.engine.default import CACHE_HIT
+
+from app.services.tenant_scope import (
+    install_tenant_scoping, scope_select, scope_sql, scope_text, tenant_context, tenant_text
+)
+
+
+def test_raw_sql_gets_a_bound_tenant_predicate():
+    assert scope_sql("SELECT * FROM live_traces WHERE status = 'error'") == \
+        "SELECT * FROM live_traces WHERE live_traces.tenant_id = :tenant_id AND (status = 'error')"
+    assert scope_sql("SELECT model, COUNT(*) FROM live_traces group by model ORDER BY 2") == \
+        "SELECT model, COUNT(*) FROM live_traces WHERE live_traces.tenant_id = :tenant_id group by model ORDER BY 2"
+    assert scope_sql("SELECT * FROM costs c") == "SELECT * FROM costs c WHERE c.tenant_id = :tenant_id"
+    assert scope_sql("SELECT * FROM webhook_events WHERE processed = 0") == \
+        "SELECT * FROM webhook_events WHERE processed = 0"
+
+
+def test_raw_sql_scopes_only_the_top_level_where():
+    # ORs stay inside the parentheses, so they cannot reach other tenants' rows
+    assert scope_sql("SELECT * FROM live_traces WHERE status = 'error' OR status = 'timeout' LIMIT 5") == (
+        "SELECT * FROM live_traces WHERE live_traces.tenant_id = :tenant_id "
+        "AND (status = 'error' OR status = 'timeout') LIMIT 5"
+    )
+    # Subqueries over tables without tenant_id are left alone
+    assert scope_sql(
+        "SELECT * FROM live_traces lt WHERE lt.external_trace_id IN "
+        "(SELECT trace_id FROM webhook_events WHERE processed = 1) ORDER BY lt.start_time"
+    ) == (
+        "SELECT * FROM live_traces lt WHERE lt.tenant_id = :tenant_id AND (lt.external_trace_id IN "
+        "(SELECT trace_id FROM webhook_events WHERE processed = 1)) ORDER BY lt.start_time"
+    )
+    assert scope_sql("SELECT * FROM live_traces WHERE name = 'x WHERE y'") == \
+        "SELECT * FROM live_traces WHERE live_traces.tenant_id = :tenant_id AND (name = 'x WHERE y')"
+
+
+@pytest.mark.parametrize('query', [
+    "SELECT * FROM live_traces JOIN costs ON costs.trace_id = live_traces.id",
+    "SELECT * FROM live_traces, costs WHERE costs.trace_id = live_traces.id",
+    "SELECT * FROM live_traces WHERE id IN (SELECT trace_id FROM costs)",
+    "SELECT * FROM (SELECT * FROM live_traces) t",
+    "SELECT * FROM live_traces UNION SELECT * FROM live_traces",
+    "SELECT * FROM live_traces; DELETE FROM costs",
+    "DELETE FROM live_traces WHERE status = 'error'",
+])
+def test_raw_sql_that_cannot_be_scoped_is_refused(query):
+    with pytest.raises(ValueError):
+        scope_sql(query)
+
+
+@pytest.fixture
+def traces(db_session):
+    from app.models import LiveTrace
+
+    now = datetime.utcnow()
+    db_session.add_all([
+        LiveTrace(external_trace_id=f"{tenant}-{i}", name='call', status='success', tenant_id=tenant,
+                  start_time=now - timedelta(minutes=i))
+        for tenant in ('tenant-a', 'tenant-b') for i in range(3)
+    ])
+    db_session.commit()
+    return now
+
+
+def test_statements_are_shared_across_tenants(db_session, traces):
+    from app.models import LiveTrace
+
+    query = "SELECT external_trace_id FROM live_traces WHERE start_time >= :since ORDER BY start_time"
+    connection = db_session.connection()
+    cache_states, rows = [], {}
+    for tenant in ('tenant-a', 'tenant-b'):
+        result = connection.execute(scope_text(query, tenant, {'since': traces - timedelta(minutes=1)}))
+        rows[tenant] = result.scalars().all()
+        cache_states.append(result.context.cache_hit)
+
+        result = connection.execute(scope_select(select(LiveTrace.external_trace_id), tenant))
+        assert sorted(result.scalars().all()) == [f"{tenant}-{i}" for i in range(3)]
+        cache_states.append(result.context.cache_hit)
+
+    assert rows == {'tenant-a': ['tenant-a-1', 'tenant-a-0'], 'tenant-b': ['tenant-b-1', 'tenant-b-0']}
+    assert cache_states[2:] == [CACHE_HIT, CACHE_HIT]
+
+
+def test_scoped_time_window_uses_the_composite_index(db_session, traces):
+    plan = db_session.execute(text(
+        "EXPLAIN QUERY PLAN " + scope_sql("SELECT * FROM live_traces WHERE start_time >= :since")
+    ), {'tenant_id': 'tenant-a', 'since': traces}).fetchall()
+    assert 'idx_live_traces_tenant_time' in ' '.join(str(row[-1]) for row in plan)
+
+
+def test_tenant_service_returns_scoped_statements(db_session, traces):
+    from app.models import LiveTrace
+    from app.services.tenant_service import TenantService
+
+    service = TenantService()
+    scoped = service.isolate_query("SELECT COUNT(*) FROM live_traces", 'tenant-b')
+    assert db_session.execute(scoped).scalar() == 3
+    assert "tenant-b" not in str(scoped)
+
+    statement = service.isolate_query(select(LiveTrace).where(LiveTrace.status == 'success'), 'tenant-a')
+    assert {trace.tenant_id for trace in db_session.execute(statement).scalars()} == {'tenant-a'}
+
+
+@pytest.fixture
+def scoped(db_session):
+    from app.models import db
+
+    install_tenant_scoping(db)
+
+
+def test_orm_statements_get_bound_tenant_criteria(db_session, traces, scoped, sql_statements):
+    from app.models import LiveTrace
+
+    for tenant in ('tenant-a', 'tenant-b'):
+        with tenant_context(tenant):
+            names = db_session.execute(
+                select(LiveTrace.external_trace_id).where(LiveTrace.status == 'success')
+            ).scalars().all()
+            assert sorted(names) == [f"{tenant}-{i}" for i in range(3)]
+            assert LiveTrace.query.count() == 3
+
+    # Outside a tenant context, and when explicitly skipped, nothing is filtered
+    assert LiveTrace.query.count() == 6
+    with tenant_context('tenant-a'):
+        assert db_session.execute(
+            select(LiveTrace).execution_options(skip_tenant_scope=True)
+        ).scalars().all().__len__() == 6
+
+    executions = [execution for execution in sql_statements.executions if 'live_traces' in execution[0]]
+    statement, parameters, _ = executions[0]
+    assert 'live_traces.tenant_id = ?' in statement and 'tenant-a' in parameters
+    # The second tenant reuses the compiled statements of the first
+    assert [hit for _, _, hit in executions[2:4]] == [CACHE_HIT, CACHE_HIT]
+
+
+def test_orm_bulk_delete_is_scoped(db_session, traces, scoped):
+    from app.models import LiveTrace
+
+    with tenant_context('tenant-b'):
+        db_session.execute(delete(LiveTrace))
+    db_session.commit()
+    assert {trace.tenant_id for trace in LiveTrace.query} == {'tenant-a'}
+
+
+def test_raw_sql_follows_the_request_tenant(app, db_session, traces):
+    query = "SELECT COUNT(*) FROM live_traces WHERE status = :status"
+    assert db_session.execute(tenant_text(query), {'status': 'success'}).scalar() == 6
+
+    with app.test_request_context('/live-data/traces'):
+        g.current_tenant = SimpleNamespace(id='tenant-a', name='A')
+        assert db_session.execute(tenant_text(query), {'status': 'success'}).scalar() == 3
+
+    with app.test_request_context('/live-data/traces'):
+        g.current_tenant = SimpleNamespace(id='tenant-b', name='B')
+        query = "SELECT COUNT(*) FROM live_traces WHERE status = 'error' OR status = :status"
+        assert db_session.execute(tenant_text(query), {'status': 'success'}).scalar() == 3
+
+
+def test_live_data_service_reads_only_the_current_tenants_traces(db_session, traces):
+    from app.services.live_data_service import LiveDataService
+
+    service = LiveDataService.__new__(LiveDataService)
+    with tenant_context('tenant-a'):
+        recent = service._get_recent_traces_from_db(10)
+    assert sorted(trace['id'] for trace in recent) == [f"tenant-a-{i}" for i in range(3)]
+
+
+def test_raw_sql_that_cannot_be_scoped_fails_without_a_tenant_too():
+    with pytest.raises(ValueError):
+        tenant_text("SELECT * FROM live_traces JOIN costs ON costs.trace_id = live_traces.id")
+
+
+def test_requests_only_see_their_own_tenants_rows(app, db_session, monkeypatch):
+    from app.models import LiveTrace
+    from app.services.tenant_service import tenant_service
+
+    monkeypatch.setitem(app.config, 'LOGIN_DISABLED', True)
+    first = tenant_service.create_tenant('First', 'first', owner_user_id='1')
+    second = tenant_service.create_tenant('Second', 'second', owner_user_id='2')
+    db_session.add_all([
+        LiveTrace(external_trace_id=f"{tenant.domain}-{i}", name='call', status='success', tenant_id=tenant.id,
+                  start_time=datetime.utcnow())
+        for tenant in (first, second) for i in range(2)
+    ])
+    db_session.commit()
+
+    client = app.test_client()
+    for tenant in (first, second):
+        response = client.get('/live-data/api/live-traces/export', query_string={'fields': 'external_trace_id'},
+                              headers={'User-Agent': 'pytest', 'X-API-Key': tenant.api_key})
+        rows = [line for line in response.get_data(as_text=True).splitlines()]
+        assert sorted(json.loads(row)['external_trace_id'] for row in rows) == \
+            [f"{tenant.domain}-0", f"{tenant.domain}-1"]
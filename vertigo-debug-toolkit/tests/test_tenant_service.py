@@ -0,0 +1,74 @@
+"""
+Tests for the database-backed, cached tenant registry.
+"""
+
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.tenant_service import AccessLevel, TenantService
+
+
+@pytest.fixture
+def service(db_session):
+    return TenantService(version_check_seconds=3600)
+
+
+def test_lookups_are_served_from_cache_once_warm(service, sql_statements):
+    tenant = service.create_tenant('Acme', 'Acme', owner_user_id='1')
+
+    assert service.get_tenant_by_domain('ACME').id == tenant.id
+    assert service.get_tenant_by_api_key(tenant.api_key).id == tenant.id
+    assert service.get_tenant_by_domain('unknown') is None
+    assert service.check_user_access(tenant.id, 1, 'read')
+    sql_statements.clear()
+
+    for _ in range(100):
+        assert service.get_tenant(tenant.id).domain == 'acme'
+        assert service.get_tenant_by_domain('acme').id == tenant.id
+        assert service.get_tenant_by_api_key(tenant.api_key).id == tenant.id
+        assert service.get_tenant_by_domain('unknown') is None
+        assert service.check_user_access(tenant.id, 1, 'read')
+        assert not service.check_user_access(tenant.id, 2, 'read')
+
+    assert sql_statements == []
+
+
+def test_membership_changes_invalidate_access_decisions(service):
+    tenant = service.create_tenant('Acme', 'acme', owner_user_id='1')
+    assert not service.check_user_access(tenant.id, 2, 'write')
+
+    assert service.add_user_to_tenant(tenant.id, '2', AccessLevel.WRITE, ['write'])
+    assert service.check_user_access(tenant.id, 2, 'write')
+    assert service.get_user_tenants(2) == [tenant.id]
+
+    assert service.remove_user_from_tenant(tenant.id, '2')
+    assert not service.check_user_access(tenant.id, 2, 'write')
+    assert service.get_user_tenants(2) == []
+
+
+def test_cached_grants_end_when_membership_expires(service):
+    tenant = service.create_tenant('Acme', 'acme', owner_user_id='1')
+    service.add_user_to_tenant(tenant.id, '3', AccessLevel.READ, ['read'],
+                               expires_at=datetime.now() + timedelta(milliseconds=50))
+    assert service.check_user_access(tenant.id, 3, 'read')
+
+    time.sleep(0.1)
+    assert not service.check_user_access(tenant.id, 3, 'read')
+
+
+def test_other_workers_drop_their_cache_when_the_version_changes(service):
+    tenant = service.create_tenant('Acme', 'acme', owner_user_id='1')
+    old_key = tenant.api_key
+
+    other_worker = TenantService(version_check_seconds=3600)
+    assert other_worker.get_tenant_by_api_key(old_key).id == tenant.id
+
+    new_key = service.rotate_api_key(tenant.id, '1')
+    # Still within the other worker's check interval
+    assert other_worker.get_tenant_by_api_key(old_key) is not None
+
+    other_worker._next_version_check = 0.0
+    assert other_worker.get_tenant_by_api_key(old_key) is None
+    assert other_worker.get_tenant_by_api_key(new_key).id == tenant.id
@@ -0,0 +1,114 @@
+"""
+Tests for streaming live trace exports.
+"""
+
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.trace_export import trace_exporter
+
+URL = '/live-data/api/live-traces/export'
+HEADERS = {'User-Agent': 'pytest'}
+T0 = datetime(2026, 10, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def client(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'LOGIN_DISABLED', True)
+    return app.test_client()
+
+
+@pytest.fixture
+def traces(db_session):
+    """25 traces a minute apart; every fifth failed, odd ones on gpt-4o, all from the 'webhook' source."""
+    from app.models import DataSource, LiveTrace
+
+    source = DataSource(name='webhook', source_type='webhook', connection_config={})
+    db_session.add(source)
+    db_session.flush()
+    db_session.add_all([
+        LiveTrace(external_trace_id=f"t{n:02d}", name='call', status='error' if n % 5 == 0 else 'success',
+                  model='gpt-4o' if n % 2 else 'gemini-1.5-pro', start_time=T0 + timedelta(minutes=n),
+                  cost_usd=0.25, tags=['export'], data_source_id=source.id if n < 20 else None,
+                  tenant_id='tenant-a')
+        for n in range(25)
+    ])
+    db_session.commit()
+
+
+def ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_filters_are_pushed_down_and_rows_stream_in_batches(client, traces, monkeypatch):
+    monkeypatch.setattr(trace_exporter, 'batch_size', 4)
+    response = client.get(URL, headers=HEADERS, buffered=False, query_string={
+        'status': 'success', 'model': 'gpt-4o', 'source': 'webhook',
+        'start': (T0 + timedelta(minutes=2)).isoformat() + 'Z', 'end': (T0 + timedelta(minutes=18)).isoformat()
+    })
+    assert response.mimetype == 'application/x-ndjson'
+    chunks = list(response.iter_encoded())
+    rows = [json.loads(line) for chunk in chunks for line in chunk.decode().splitlines()]
+    assert len(chunks) == 2
+
+    assert [row['external_trace_id'] for row in rows] == ['t03', 't07', 't09', 't11', 't13', 't17']
+    assert rows[0]['cost_usd'] == 0.25
+    assert rows[0]['tags'] == ['export']
+    assert 'input_text' not in rows[0]
+
+
+def test_export_resumes_after_the_last_row(client, traces):
+    first = ndjson(client.get(URL, headers=HEADERS, query_string={'limit': 10, 'fields': 'external_trace_id'}))
+    last = first[-1]
+    assert set(last) == {'id', 'start_time', 'external_trace_id'}
+
+    rest = ndjson(client.get(URL, headers=HEADERS, query_string={
+        'after_time': last['start_time'], 'after_id': last['id'], 'fields': 'external_trace_id'
+    }))
+    assert [row['external_trace_id'] for row in first + rest] == [f"t{n:02d}" for n in range(25)]
+
+
+def test_csv_export_and_bad_arguments(client, traces):
+    response = client.get(URL, headers=HEADERS, query_string={'format': 'csv', 'fields': 'status,tags'})
+    assert response.headers['Content-Disposition'] == 'attachment; filename="live_traces.csv"'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert len(rows) == 25
+    assert rows[0]['status'] == 'error' and json.loads(rows[0]['tags']) == ['export']
+
+    assert client.get(URL, headers=HEADERS, query_string={'format': 'xml'}).status_code == 400
+    assert client.get(URL, headers=HEADERS, query_string={'fields': 'password'}).status_code == 400
+    assert client.get(URL, headers=HEADERS, query_string={'start': 'yesterday'}).status_code == 400
+
+
+def test_arrow_stream_has_one_schema_across_batches(client, traces, monkeypatch):
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.ipc
+
+    monkeypatch.setattr(trace_exporter, 'batch_size', 7)
+    response = client.get(URL, headers=HEADERS, query_string={'format': 'arrow'})
+    table = pyarrow.ipc.open_stream(response.get_data()).read_all()
+
+    assert table.num_rows == 25
+    assert table.schema.field('start_time').type == pyarrow.timestamp('us')
+    assert table.column('data_source_id').null_count == 5
+
+
+def test_tenant_id_is_only_honoured_for_the_requests_own_tenant(client, traces, db_session):
+    from app.models import LiveTrace
+
+    db_session.add(LiveTrace(external_trace_id='b00', name='call', status='success', start_time=T0,
+                             tenant_id='tenant-b'))
+    db_session.commit()
+
+    # Outside a tenant context the argument cannot select someone else's tenant
+    rows = ndjson(client.get(URL, headers=HEADERS, query_string={'tenant_id': 'tenant-b'}))
+    assert len(rows) == 26
+
+
+def test_only_the_export_route_is_registered(client):
+    assert client.post('/live-data/webhooks/langfuse', json={}, headers=HEADERS).status_code == 404
+    assert client.get('/live-data/api/sync-status', headers=HEADERS).status_code == 404
@@ -0,0 +1,107 @@
+"""
+Tests for event-driven anomaly detection from the ingest trace stream.
+"""
+
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.rolling_stats import TraceWindow
+from app.services.trace_stream import TraceStream, trace_stream
+
+NOW = datetime(2026, 3, 10, 12, 0, 0)
+NOW_TS = (NOW - datetime(1970, 1, 1)).total_seconds()
+
+
+def trace(trace_id, seconds_ago=0.0, status='success', duration_ms=100, cost_usd=0.01):
+    return {'external_trace_id': trace_id, 'status': status, 'duration_ms': duration_ms,
+            'cost_usd': cost_usd, 'start_time': NOW - timedelta(seconds=seconds_ago)}
+
+
+def test_stream_is_bounded_and_only_queues_with_consumers():
+    stream = TraceStream(maxsize=3)
+    stream.publish(trace('ignored'))
+    assert stream.qsize() == 0
+
+    stream.attach()
+    stream.publish_many(trace(f"t{i}") for i in range(5))
+    assert stream.stats == {'published': 3, 'dropped': 2, 'consumed': 0}
+
+    batch = stream.get_batch(timeout=0.1)
+    assert [event['external_trace_id'] for event in batch] == ['t0', 't1', 't2']
+    assert set(batch[0]) == {'external_trace_id', 'status', 'start_time', 'duration_ms', 'cost_usd',
+                             'model', 'received_at'}
+    assert stream.get_batch(timeout=0.01) == []
+
+    stream.publish(trace('late'))
+    stream.detach()
+    assert stream.qsize() == 0
+
+
+def test_trace_window_counts_updates_once_and_evicts():
+    window = TraceWindow(window_seconds=30)
+    window.add(trace('a', 5, status='success', duration_ms=100), NOW_TS)
+    window.add(trace('b', 20, status='error', duration_ms=300), NOW_TS)
+    window.add(trace('old', 3600), NOW_TS)  # backfilled history is outside the window
+    # A re-delivered trace replaces its earlier contribution
+    window.add(trace('a', 5, status='failed', duration_ms=200), NOW_TS)
+
+    metrics = window.metrics(NOW_TS)
+    assert metrics['total_traces'] == 2
+    assert metrics['error_rate'] == 100
+    assert metrics['avg_latency_ms'] == pytest.approx(250)
+
+    metrics = window.metrics(NOW_TS + 15)
+    assert metrics['total_traces'] == 1
+    assert metrics['avg_latency_ms'] == pytest.approx(200)
+    assert window.metrics(NOW_TS + 60) == {'error_rate': 0, 'avg_latency_ms': 0, 'total_cost': 0.0,
+                                           'total_traces': 0, 'success_rate': 100}
+
+
+@pytest.fixture
+def stream_engine(app, monkeypatch):
+    from app.services import anomaly_monitoring_engine as engine_module
+
+    def no_polling(*args, **kwargs):
+        raise AssertionError("streaming mode must not query aggregate metrics")
+
+    monkeypatch.setattr(engine_module.live_data_service, 'get_unified_performance_metrics', no_polling)
+    engine = engine_module.AnomalyMonitoringEngine(engine_module.MonitoringConfig(
+        mode='stream', poll_interval_seconds=30, enable_auto_response=False
+    ))
+    yield engine
+    engine.stop_monitoring()
+
+
+def test_stream_batches_detect_without_polling(stream_engine):
+    healthy = [trace(f"ok{i}", i % 20) for i in range(50)]
+    assert stream_engine._process_trace_batch(healthy, NOW_TS) == []
+
+    failing = [trace(f"err{i}", 1, status='error') for i in range(100)]
+    anomalies = stream_engine._process_trace_batch(failing, NOW_TS + 1)
+    assert 'error_rate' in {a.metric_name for a in anomalies}
+
+    # The same anomaly is not raised again on every following event
+    repeated = stream_engine._process_trace_batch([trace('err-more', 0, status='error')], NOW_TS + 2)
+    assert 'error_rate' not in {a.metric_name for a in repeated}
+
+
+def test_stream_mode_alerts_within_a_second(stream_engine):
+    assert stream_engine.start_monitoring()
+    assert trace_stream.active
+
+    published = time.time()
+    trace_stream.publish_many(
+        dict(trace(f"live{i}", status='error'), start_time=datetime.utcnow()) for i in range(20)
+    )
+    deadline = published + 2
+    while stream_engine.alert_queue.empty() and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert not stream_engine.alert_queue.empty()
+    assert time.time() - published < 1
+    assert stream_engine.get_status()['trace_stream']['consumed'] >= 20
+
+    stream_engine.stop_monitoring()
+    assert not trace_stream.active
@@ -0,0 +1,145 @@
+"""
+Tests for the persistent memory-mapped prompt vector index.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from app.services import vector_index
+from app.services.vector_index import PromptVectorIndex, normalize_rows, top_k
+
+
+DIM = 32
+
+
+@pytest.fixture
+def vectors():
+    return np.random.default_rng(42).standard_normal((500, DIM)).astype(np.float32)
+
+
+@pytest.fixture
+def index(tmp_path, vectors):
+    idx = PromptVectorIndex(str(tmp_path), DIM, model_name='test-model')
+    idx.upsert((i, vectors[i], 'v1') for i in range(len(vectors)))
+    return idx
+
+
+def test_top_k_matches_full_sort():
+    scores = np.random.default_rng(0).random(1000)
+    assert top_k(scores, 10).tolist() == np.argsort(-scores)[:10].tolist()
+    assert top_k(scores, 5000).tolist() == np.argsort(-scores).tolist()
+
+
+def test_search_returns_exact_cosine_ranking(index, vectors):
+    query = vectors[7] + 0.05
+    expected = np.argsort(-(normalize_rows(vectors) @ normalize_rows(query)[0]))[:5]
+
+    hits = index.search(query, k=5)
+
+    assert [pid for pid, _ in hits] == expected.tolist()
+    assert hits[0][0] == 7
+    assert hits[0][1] == pytest.approx(1.0, abs=0.05)
+
+
+def test_min_score_filters_results(index, vectors):
+    hits = index.search(vectors[3], k=50, min_score=0.5)
+    assert hits[0][0] == 3
+    assert all(score >= 0.5 for _, score in hits)
+
+
+def test_index_persists_and_is_shared(tmp_path, index, vectors):
+    reader = PromptVectorIndex(str(tmp_path), DIM, model_name='test-model')
+    assert len(reader) == 500
+    assert reader.fingerprint(10) == 'v1'
+
+    index.upsert([(10, vectors[20], 'v2')])
+    index.remove([20])
+
+    hits = reader.search(vectors[20], k=1)
+    assert hits[0][0] == 10
+    assert reader.fingerprint(10) == 'v2'
+    assert reader.fingerprint(20) is None
+    assert len(reader) == 499
+
+
+def test_removed_rows_are_reused(tmp_path, index, vectors):
+    index.remove([1, 2, 3])
+    index.upsert([(1000, vectors[1], 'new')])
+
+    assert len(index) == 498
+    assert index.search(vectors[1], k=1)[0][0] == 1000
+    meta_rows = PromptVectorIndex(str(tmp_path), DIM, model_name='test-model')._count
+    assert meta_rows == 500
+
+
+def test_incremental_changes_append_to_the_log(tmp_path, index, vectors):
+    reader = PromptVectorIndex(str(tmp_path), DIM, model_name='test-model')
+    snapshot = os.stat(index.meta_path)
+    logged = len(open(index.log_path).readlines())
+
+    index.upsert([(7, vectors[8], 'v2')])
+    index.remove([9])
+
+    assert os.stat(index.meta_path) == snapshot
+    assert len(open(index.log_path).readlines()) == logged + 2
+    assert reader.search(vectors[8], k=1)[0][0] == 7
+    assert reader.fingerprint(9) is None
+
+
+def test_log_is_compacted_into_the_snapshot(tmp_path, index, vectors, monkeypatch):
+    reader = PromptVectorIndex(str(tmp_path), DIM, model_name='test-model')
+    monkeypatch.setattr(vector_index, 'LOG_COMPACT_BYTES', 0)
+    monkeypatch.setattr(index, '_meta_size', 200)
+
+    for i in range(5):
+        index.upsert([(2000 + i, vectors[i], 'late')])
+
+    assert os.path.getsize(index.log_path) < 200 * 2
+    assert len(reader) == 505
+    assert reader.fingerprint(2004) == 'late'
+    assert len(PromptVectorIndex(str(tmp_path), DIM, model_name='test-model')) == 505
+
+
+def test_reset_leaves_mapped_matrix_intact(tmp_path, index, vectors):
+    mapped = index._matrix
+    PromptVectorIndex(str(tmp_path), DIM, model_name='another-model')
+
+    # The old file is replaced, not truncated, so existing mappings stay readable
+    assert np.allclose(mapped[0], normalize_rows(vectors[0])[0])
+
+
+def test_capacity_grows(tmp_path):
+    idx = PromptVectorIndex(str(tmp_path), DIM)
+    data = np.random.default_rng(1).standard_normal((3000, DIM)).astype(np.float32)
+    idx.upsert((i, data[i], 'v') for i in range(3000))
+    assert len(idx) == 3000
+    assert idx.search(data[2999], k=1)[0][0] == 2999
+
+
+def test_model_change_resets_index(tmp_path, index):
+    other = PromptVectorIndex(str(tmp_path), DIM, model_name='another-model')
+    assert len(other) == 0
+
+
+def test_ivf_mode_finds_clustered_neighbours(tmp_path):
+    rng = np.random.default_rng(7)
+    centers = rng.standard_normal((20, DIM))
+    data = np.concatenate([c + 0.1 * rng.standard_normal((100, DIM)) for c in centers])
+    idx = PromptVectorIndex(str(tmp_path), DIM, mode='ivf', ivf_min_size=100, ivf_probe=3)
+    idx.upsert((i, data[i], 'v') for i in range(len(data)))
+    assert idx.needs_ivf_rebuild()
+
+    idx.build_ivf(n_lists=20)
+    assert not idx.needs_ivf_rebuild()
+
+    exact = np.argsort(-(normalize_rows(data) @ normalize_rows(data[250])[0]))[:10]
+    hits = idx.search(data[250], k=10)
+    recall = len({pid for pid, _ in hits} & set(exact.tolist())) / 10
+    assert hits[0][0] == 250
+    assert recall >= 0.9
+
+    # Incremental inserts are assigned to a list and found without a rebuild
+    idx.upsert([(5000, data[250] + 0.01, 'v')])
+    assert 5000 in {pid for pid, _ in idx.search(data[250], k=3)}
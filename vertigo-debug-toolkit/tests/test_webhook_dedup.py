@@ -0,0 +1,81 @@
+"""
+Tests for in-memory webhook deduplication and group-committed event logging.
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from app.services.webhook_dedup import DUPLICATE, NEW, POSSIBLE, BloomFilter, WebhookDedupIndex
+
+T0 = 1_800_000_000.0
+
+
+def test_bloom_filter_false_positive_rate():
+    bloom = BloomFilter(capacity=5000, error_rate=0.01)
+    for i in range(5000):
+        bloom.add(f"trace-{i}")
+    assert all(f"trace-{i}" in bloom for i in range(5000))
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 200
+
+
+def test_index_is_exact_for_recent_keys_and_defers_older_ones():
+    index = WebhookDedupIndex(window_seconds=300, lru_size=2)
+    key = ('trace-1', 'trace.created')
+    assert index.check(key, T0) == NEW
+    index.add(key, T0)
+    assert index.check(key, T0 + 10) == DUPLICATE
+    assert index.check(('trace-1', 'trace.updated'), T0 + 10) == NEW
+
+    # Evicted from the LRU but inside the window: only the bloom filter knows
+    index.add(('trace-2', 'trace.created'), T0 + 1)
+    index.add(('trace-3', 'trace.created'), T0 + 2)
+    assert index.check(key, T0 + 20) == POSSIBLE
+
+    # Outside the window (plus one partition of slack) the key is forgotten
+    index.add(('trace-4', 'trace.created'), T0 + 500)
+    assert index.check(key, T0 + 500) == NEW
+    assert index.get_stats()['lru_keys'] == 2
+
+
+def span_event(span_id, trace_id):
+    return {'type': 'span.created', 'id': span_id, 'timestamp': datetime.utcnow().isoformat(),
+            'data': {'trace': {'id': trace_id}}}
+
+
+def test_duplicates_skip_the_database_and_events_are_group_committed(db_session, webhook_service, sql_statements):
+    first = [webhook_service.process_webhook_payload(span_event(f"s{i}", f"t{i}")) for i in range(200)]
+    again = [webhook_service.process_webhook_payload(span_event(f"s{i}", f"t{i}")) for i in range(200)]
+    assert webhook_service.event_log.pending() == 200
+    assert webhook_service.event_log.flush() == 200
+
+    assert all(r['success'] and r.get('processed') for r in first)
+    assert all('duplicate' in r['message'] for r in again)
+    # One warm-up read and one batched insert instead of a COUNT and INSERT per event
+    assert sql_statements.verbs('webhook_events') == ['SELECT', 'INSERT']
+    assert db_session.execute(text("SELECT COUNT(*) FROM webhook_events")).scalar() == 200
+
+
+def test_possible_hits_are_confirmed_against_the_database(db_session, webhook_service):
+    webhook_service.dedup_index.lru_size = 1
+    webhook_service.process_webhook_payload(span_event('s1', 't1'))
+    webhook_service.process_webhook_payload(span_event('s2', 't2'))
+
+    # t1 left the LRU; the bloom hit flushes the buffered log and checks the table
+    assert webhook_service.is_event_duplicate('t1', 'span.created', datetime.utcnow())
+    assert webhook_service.event_log.pending() == 0
+    assert webhook_service.dedup_index.stats[POSSIBLE] == 1
+    assert not webhook_service.is_event_duplicate('t1', 'span.created', datetime.utcnow() + timedelta(minutes=30))
+
+
+def test_index_is_warmed_from_logged_events(db_session, webhook_service):
+    db_session.execute(
+        text("INSERT INTO webhook_events (trace_id, event_type, source, event_data, received_at, status) "
+             "VALUES ('t9', 'span.created', 'langwatch', '{}', :received_at, 'success')"),
+        {'received_at': datetime.utcnow() - timedelta(minutes=1)}
+    )
+    db_session.commit()
+
+    result = webhook_service.process_webhook_payload(span_event('s9', 't9'))
+    assert 'duplicate' in result['message']
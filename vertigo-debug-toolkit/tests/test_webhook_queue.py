@@ -0,0 +1,123 @@
+"""
+Tests for the durable webhook ingestion queue.
+"""
+
+import hashlib
+import hmac
+import json
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+from app.services.webhook_queue import WebhookQueue
+
+
+def span_event(span_id, trace_id):
+    return {'type': 'span.created', 'id': span_id, 'timestamp': datetime.utcnow().isoformat(),
+            'data': {'trace': {'id': trace_id}}}
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return WebhookQueue(str(tmp_path / 'queue.db'), batch_size=10, max_attempts=3, base_backoff_seconds=0.05)
+
+
+def test_items_are_claimed_once_and_removed_when_done(queue):
+    handled = []
+    queue._handler = lambda payload, received_at: handled.append(payload['n'])
+    for n in range(15):
+        queue.enqueue({'n': n})
+
+    assert len(queue.claim_batch('a')) == 10
+    # Claimed items are invisible to other workers until the visibility timeout
+    assert [item[1]['n'] for item in queue.claim_batch('b')] == [10, 11, 12, 13, 14]
+
+    queue.visibility_timeout_seconds = 0
+    assert queue.process_batch() == 10
+    assert queue.process_batch() == 5
+    assert handled == list(range(15))
+    assert queue.get_metrics()['depth'] == 0
+
+
+def test_failures_back_off_then_dead_letter(queue):
+    calls = []
+
+    def handler(payload, received_at):
+        calls.append(time.time())
+        raise RuntimeError('database unavailable')
+
+    queue._handler = handler
+    queue.enqueue({'type': 'trace.created'})
+
+    assert queue.process_batch() == 1
+    # Not ready again until the backoff has passed
+    assert queue.process_batch() == 0
+    for _ in range(2):
+        time.sleep(0.25)
+        assert queue.process_batch() == 1
+
+    metrics = queue.get_metrics()
+    assert len(calls) == 3
+    assert metrics['depth'] == 0 and metrics['dead_letters'] == 1
+    assert metrics['retried'] == 2 and metrics['dead_lettered'] == 1
+
+    queue._handler = lambda payload, received_at: None
+    assert queue.requeue_dead_letters() == 1
+    assert queue.process_batch() == 1
+    assert queue.get_metrics()['dead_letters'] == 0
+
+
+def test_metrics_report_depth_and_lag(queue):
+    queue.enqueue({'n': 1}, received_at=time.time() - 30)
+    queue.enqueue({'n': 2})
+    queue.claim_batch('a')
+
+    metrics = queue.get_metrics()
+    assert metrics['depth'] == 2 and metrics['in_flight'] == 2 and metrics['ready'] == 0
+    assert metrics['lag_seconds'] >= 30
+
+
+def test_webhook_is_acknowledged_after_enqueue_and_processed_by_the_queue(
+        app, db_session, webhook_service, queue, monkeypatch):
+    from app.blueprints.webhooks import routes
+    from app.blueprints import health
+
+    webhook_service.webhook_secret = 'secret'
+    monkeypatch.setattr(routes, 'webhook_service', webhook_service)
+    monkeypatch.setattr(routes, 'webhook_queue', queue)
+    monkeypatch.setattr(health, 'webhook_queue', queue)
+    monkeypatch.setattr(queue, 'start', lambda: None)
+    queue._handler = webhook_service.process_queued_payload
+
+    body = json.dumps(span_event('s1', 't1')).encode()
+    signature = 'sha256=' + hmac.new(b'secret', body, hashlib.sha256).hexdigest()
+    client = app.test_client()
+    response = client.post('/api/webhooks/langwatch', data=body, content_type='application/json',
+                           headers={'X-LangWatch-Signature': signature})
+
+    assert response.status_code == 202
+    assert response.get_json()['queued'] is True
+    assert client.get('/health/metrics').get_json()['webhook_queue']['depth'] == 1
+
+    assert queue.process_batch() == 1
+    webhook_service.event_log.flush()
+    assert db_session.execute(
+        text("SELECT status FROM webhook_events WHERE trace_id = 't1'")
+    ).scalar() == 'success'
+    assert queue.get_metrics()['processed'] == 1
+
+
+def test_queued_traces_are_stored_for_the_tenant_that_received_them(db_session, webhook_service):
+    from app.services.webhook_service import QUEUED_TENANT_KEY
+
+    payload = {'type': 'trace.created', 'id': 'evt-1', 'timestamp': datetime.utcnow().isoformat(),
+               'data': {'trace': {'id': 't1', 'name': 'call', 'status': 'completed',
+                                  'startTime': datetime.utcnow().isoformat()}},
+               QUEUED_TENANT_KEY: 'tenant-a'}
+    webhook_service.process_queued_payload(payload, datetime.utcnow())
+
+    assert db_session.execute(
+        text("SELECT tenant_id FROM live_traces WHERE external_trace_id = 't1'")
+    ).scalar() == 'tenant-a'
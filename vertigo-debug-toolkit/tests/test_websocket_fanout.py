@@ -0,0 +1,114 @@
+"""
+Tests for coalescing, backpressured WebSocket fan-out.
+"""
+
+from flask_socketio import SocketIO
+
+from app.services.websocket_fanout import FanoutScheduler
+from app.services.websocket_service import MessageType, WebSocketConnection, WebSocketMessage, WebSocketService
+
+
+class Recorder:
+    def __init__(self):
+        self.sent = []
+
+    def __call__(self, event, data, connection_id):
+        self.sent.append((event, data, connection_id))
+
+
+def scheduler(rooms, **kwargs):
+    recorder = Recorder()
+    everyone = sorted({cid for members in rooms.values() for cid in members})
+    fanout = FanoutScheduler(recorder, lambda room: everyone if room is None else rooms.get(room, []), **kwargs)
+    return fanout, recorder
+
+
+def test_updates_coalesce_per_room_and_type_within_a_tick():
+    fanout, recorder = scheduler({'performance': ['a', 'b'], 'alerts': ['a']})
+    for i in range(10):
+        fanout.publish('performance_update', {'n': i}, room='performance', coalesce_key='performance_update')
+        fanout.publish('cache_stats', {'n': i}, room='performance', coalesce_key='cache_stats')
+    fanout.publish('alert_notification', {'id': 1}, room='alerts')
+    fanout.publish('alert_notification', {'id': 2}, room='alerts')
+
+    assert fanout.tick() == 6
+    assert sorted((e, d['n'], c) for e, d, c in recorder.sent if e != 'alert_notification') == [
+        ('cache_stats', 9, 'a'), ('cache_stats', 9, 'b'),
+        ('performance_update', 9, 'a'), ('performance_update', 9, 'b'),
+    ]
+    # Alerts are not coalesced and keep their order
+    assert [d['id'] for e, d, c in recorder.sent if e == 'alert_notification'] == [1, 2]
+
+    stats = fanout.get_stats()
+    assert stats['published'] == 22
+    assert stats['coalesced'] == 18
+    assert stats['delivered'] == 6
+    assert stats['dropped'] == 0
+    assert stats['queue_latency_ms']['p99'] is not None
+
+
+def test_slow_consumer_gets_latest_state_and_bounded_queue():
+    fanout, recorder = scheduler({'performance': ['slow']}, max_queue_per_connection=3, max_messages_per_tick=1)
+
+    fanout.publish('alert_notification', {'id': 'keep'}, room='performance', critical=True)
+    for i in range(6):
+        fanout.publish('chart', {'n': i}, room='performance', coalesce_key=f"chart:{i}")
+    fanout.tick()
+    assert recorder.sent == [('alert_notification', {'id': 'keep'}, 'slow')]
+    # Six charts into a queue of three: the four oldest charts were dropped
+    assert fanout.get_stats()['dropped'] == 4
+    assert fanout.get_stats()['max_queue_depth'] == 2
+
+    # While queued, stale updates are merged into the pending message
+    fanout.publish('chart', {'n': 'newest'}, room='performance', coalesce_key='chart:5')
+    while fanout.tick():
+        pass
+    assert [d['n'] for e, d, c in recorder.sent[1:]] == [4, 'newest']
+    assert fanout.queued_messages() == 0
+
+
+def test_critical_messages_are_not_displaced():
+    fanout, recorder = scheduler({'alerts': ['a']}, max_queue_per_connection=2, max_messages_per_tick=0)
+    for i in range(2):
+        fanout.publish('alert_notification', {'id': i}, room='alerts', critical=True)
+    fanout.tick()
+    fanout.publish('cache_stats', {}, room='alerts', coalesce_key='cache_stats')
+    fanout.tick()
+
+    assert fanout.get_stats()['dropped'] == 1
+    fanout.max_messages_per_tick = 10
+    fanout.tick()
+    assert [d['id'] for e, d, c in recorder.sent] == [0, 1]
+
+
+def test_service_routes_pushes_through_fanout(monkeypatch):
+    socketio = SocketIO()
+    service = WebSocketService(socketio)
+    sent = []
+    monkeypatch.setattr(socketio, 'emit', lambda event, data, to=None, **kw: sent.append((event, to)))
+
+    for cid, user in (('sid-1', 'u1'), ('sid-2', 'u2')):
+        service.connections[cid] = WebSocketConnection(id=cid, user_id=user, rooms={'performance'})
+    service.rooms['performance'] = {'sid-1', 'sid-2'}
+
+    for i in range(50):
+        service.send_performance_update({'i': i})
+        service.send_cache_stats_update({'i': i})
+    service.send_visualization_update('latency', {})
+    service.send_visualization_update('cost', {})
+    service.send_tenant_update('t1', {})
+    service.fanout.publish_to(['sid-1'], 'user_activity', {})
+    assert service.broadcast_message(WebSocketMessage(type=MessageType.ERROR, data={}, target_user='u2')) == 1
+    service.fanout.tick()
+
+    assert sorted(sent) == sorted([
+        ('performance_update', 'sid-1'), ('performance_update', 'sid-2'),
+        ('cache_stats', 'sid-1'), ('cache_stats', 'sid-2'),
+        ('user_activity', 'sid-1'), ('error', 'sid-2'),
+    ])  # visualizations go to the (empty) analytics room, tenant t1 has no connections
+    stats = service.get_connection_stats()
+    assert stats['messages_delivered'] == 6
+    assert stats['messages_coalesced'] == 98
+    assert stats['messages_dropped'] == 0
+    assert stats['queued_messages'] == 0
+    assert set(stats['queue_latency_ms']) == {'p50', 'p95', 'p99', 'max'}